@@ -375,7 +375,7 @@ class ZarrWrite:
                 chunk of zarr array is allowed to not be of length equal to zarr chunk size)
     """
     def __init__(self, zarr_path: str, desired_chunk_shape: dict = None, append_dim: str = 'time', expand_dim: str = 'beam',
-                 float_no_data_value: float = np.nan, int_no_data_value: int = 999):
+                 float_no_data_value: float = np.nan, int_no_data_value: int = 999, use_synchronizer: bool = True):
         """
         Initialize zarr write class
 
@@ -393,6 +393,10 @@ class ZarrWrite:
             float, no data value for variables that are dtype float
         int_no_data_value
             int, no data value for variables that are dtype int
+        use_synchronizer
+            if True, open the zarr data store with a zarr.ProcessSynchronizer, which locks each chunk on write.  Only
+            set this to False if no other process will write to the same chunks at the same time, see
+            group_writes_by_chunk
         """
 
         self.zarr_path = zarr_path
@@ -401,6 +405,7 @@ class ZarrWrite:
         self.expand_dim = expand_dim
         self.float_no_data_value = float_no_data_value
         self.int_no_data_value = int_no_data_value
+        self.use_synchronizer = use_synchronizer
 
         self.rootgroup = None
         self.zarr_array_names = []
@@ -418,7 +423,7 @@ class ZarrWrite:
         Open the zarr data store, will create a new one if it does not exist.  Get all the existing array names.
         """
 
-        sync = zarr.ProcessSynchronizer(self.zarr_path + '.sync')
+        sync = zarr.ProcessSynchronizer(self.zarr_path + '.sync') if self.use_synchronizer else None
         self.rootgroup = zarr.open(self.zarr_path, mode='a', synchronizer=sync)
         self.get_array_names()
 
@@ -979,7 +984,8 @@ class ZarrWrite:
             is None (the case when this is not the first write in a set of distributed writes) this is still returned but not used.
         """
 
-        if self.zarr_path:
+        sync = None
+        if self.zarr_path and self.use_synchronizer:
             sync = zarr.ProcessSynchronizer(self.zarr_path + '.sync')
         newarr = self.rootgroup.create_dataset(var_name, shape=dims_of_arrays[var_name][1], chunks=chunksize,
                                                dtype=xarr[var_name].dtype, synchronizer=sync,
@@ -1072,13 +1078,15 @@ class ZarrWrite:
             else:
                 self._write_new_dataset_rootgroup(xarr, data_loc_copy, var, dims_of_arrays, chunksize, startingshp)
 
-            # _ARRAY_DIMENSIONS is used by xarray for connecting dimensions with zarr arrays
-            self.rootgroup[var].attrs['_ARRAY_DIMENSIONS'] = dims_of_arrays[var][0]
+            # _ARRAY_DIMENSIONS is used by xarray for connecting dimensions with zarr arrays.  Only write it if it changed,
+            #  so that writes to existing arrays only touch the chunks of the array
+            if self.rootgroup[var].attrs.get('_ARRAY_DIMENSIONS', None) != list(dims_of_arrays[var][0]):
+                self.rootgroup[var].attrs['_ARRAY_DIMENSIONS'] = dims_of_arrays[var][0]
         return self.zarr_path
 
 
 def zarr_write(zarr_path: str, xarr: xr.Dataset, attrs: dict, desired_chunk_shape: dict, dataloc: Union[list, np.ndarray],
-               append_dim: str = 'time', finalsize: tuple = None, push_forward: list = None):
+               append_dim: str = 'time', finalsize: tuple = None, push_forward: list = None, use_synchronizer: bool = True):
     """
     Convenience function for writing with ZarrWrite
 
@@ -1102,6 +1110,8 @@ def zarr_write(zarr_path: str, xarr: xr.Dataset, attrs: dict, desired_chunk_shap
         need to resize the zarr for that expected size before writing)
     push_forward
         list of [index of push, total amount to push] for each push
+    use_synchronizer
+        if True, lock each zarr chunk on write, see ZarrWrite
 
     Returns
     -------
@@ -1109,12 +1119,149 @@ def zarr_write(zarr_path: str, xarr: xr.Dataset, attrs: dict, desired_chunk_shap
         path to zarr data store
     """
 
-    zw = ZarrWrite(zarr_path, desired_chunk_shape, append_dim=append_dim)
+    zw = ZarrWrite(zarr_path, desired_chunk_shape, append_dim=append_dim, use_synchronizer=use_synchronizer)
     zarr_path = retry_call(zw.write_to_zarr, (xarr, attrs, dataloc), {'finalsize': finalsize, 'push_forward': push_forward},
                            exceptions=(PermissionError,))
     return zarr_path
 
 
+def zarr_write_group(zarr_path: str, xarrays: list, desired_chunk_shape: dict, datalocs: list, append_dim: str = 'time'):
+    """
+    Write a group of datasets to an existing zarr data store, one after the other, without the zarr.ProcessSynchronizer
+    chunk locks.  Used with group_writes_by_chunk, where each group of writes shares no zarr chunks with any other group,
+    so the groups can be written at the same time.
+
+    Parameters
+    ----------
+    zarr_path
+        path to zarr data store
+    xarrays
+        list of xarray Datasets, data to write to zarr
+    desired_chunk_shape
+        variable name: chunk size as tuple, for each variable in the input xarr
+    datalocs
+        list of the write indices for each dataset, see get_write_indices_zarr
+    append_dim
+        dimension name that you are appending to (generally time)
+
+    Returns
+    -------
+    str
+        path to zarr data store
+    """
+
+    for xarr, dataloc in zip(xarrays, datalocs):
+        zarr_path = zarr_write(zarr_path, xarr, None, desired_chunk_shape, dataloc, append_dim=append_dim,
+                               use_synchronizer=False)
+    return zarr_path
+
+
+def return_append_dim_chunk_lengths(zarr_path: str, append_dim: str = 'time', default_length: int = None):
+    """
+    Return the chunk lengths along the append dimension for all arrays in the zarr data store.  Kluster writes all
+    arrays with the same chunk length, but older data stores might have been written with a different chunk length.
+
+    Parameters
+    ----------
+    zarr_path
+        path to zarr data store
+    append_dim
+        dimension name that you are appending to (generally time)
+    default_length
+        chunk length returned if the data store does not exist or has no arrays with the append dimension
+
+    Returns
+    -------
+    list
+        sorted list of the unique chunk lengths
+    """
+
+    chunk_lengths = set()
+    if zarr_path is not None and os.path.exists(zarr_path):
+        rootgroup = zarr.open(zarr_path, mode='r')
+        for varname, arr in rootgroup.arrays():
+            dims = arr.attrs.get('_ARRAY_DIMENSIONS', [])
+            if append_dim in dims:
+                chunk_lengths.add(int(arr.chunks[dims.index(append_dim)]))
+    if not chunk_lengths and default_length:
+        chunk_lengths.add(int(default_length))
+    return sorted(chunk_lengths)
+
+
+def _chunks_in_write(dataloc: Union[list, np.ndarray], chunk_lengths: list):
+    """
+    Return the zarr chunks that the write indices cover, as (chunk length, chunk index) for each chunk length
+
+    Parameters
+    ----------
+    dataloc
+        either [start time index, end time index] or np.array of indices (-1 for indices that are not written)
+    chunk_lengths
+        list of the chunk lengths along the append dimension, see return_append_dim_chunk_lengths
+
+    Returns
+    -------
+    set
+        set of (chunk length, chunk index) for all chunks the write touches
+    """
+
+    chunks = set()
+    if isinstance(dataloc, list):
+        if dataloc[1] <= dataloc[0]:
+            return chunks
+        for chunk_length in chunk_lengths:
+            chunks.update((chunk_length, c) for c in range(dataloc[0] // chunk_length, (dataloc[1] - 1) // chunk_length + 1))
+    else:
+        dataloc = np.asarray(dataloc)
+        dataloc = dataloc[dataloc != -1]
+        for chunk_length in chunk_lengths:
+            chunks.update((chunk_length, int(c)) for c in np.unique(dataloc // chunk_length))
+    return chunks
+
+
+def group_writes_by_chunk(data_locs: list, chunk_lengths: list):
+    """
+    Group the writes so that no two groups write to the same zarr chunk.  Writes that share a chunk (directly or through
+    other writes) are put in the same group, and are written one after the other in zarr_write_group.  The groups can
+    then be written at the same time without locks.  Kluster writes are generally chunk aligned, so most writes end up
+    in a group of their own.
+
+    Parameters
+    ----------
+    data_locs
+        list of the write indices for each write, see get_write_indices_zarr
+    chunk_lengths
+        list of the chunk lengths along the append dimension, see return_append_dim_chunk_lengths
+
+    Returns
+    -------
+    list
+        list of lists of the index of each write in data_locs, groups are in order of their first write
+    """
+
+    parent = list(range(len(data_locs)))
+
+    def _find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    chunk_owner = {}
+    for cnt, dataloc in enumerate(data_locs):
+        for chnk in _chunks_in_write(dataloc, chunk_lengths):
+            if chnk in chunk_owner:
+                root_a, root_b = _find(chunk_owner[chnk]), _find(cnt)
+                if root_a != root_b:
+                    parent[max(root_a, root_b)] = min(root_a, root_b)
+            else:
+                chunk_owner[chnk] = cnt
+    groups = {}
+    for cnt in range(len(data_locs)):
+        groups.setdefault(_find(cnt), []).append(cnt)
+    return [groups[ky] for ky in sorted(groups)]
+
+
 def distrib_zarr_write(zarr_path: str, xarrays: list, attributes: dict, chunk_sizes: dict, data_locs: list,
                        finalsize: tuple, push_forward: list, client: Client, append_dim: str = 'time',
                        write_in_parallel: bool = False, skip_dask: bool = False, show_progress: bool = True):
@@ -1123,8 +1270,11 @@ def distrib_zarr_write(zarr_path: str, xarrays: list, attributes: dict, chunk_si
     zarr_path.  We use the function (and not the class directly) in Dask when we map it across all the workers.  Dask
     serializes data when mapping, so passing classes causes issues.
 
-    Currently we wait between each write.  This seems to deal with the occassional permissions error that pops up
-    when letting dask write in parallel.  Maybe we aren't using the sync object correctly?  Needs more testing.
+    The first write is always done on its own, as it resizes the arrays and pushes existing data forward to make room
+    for the new data.  If write_in_parallel is False, we then wait between each write.  This seems to deal with the
+    occassional permissions error that pops up when letting dask write in parallel.  Otherwise, the remaining writes
+    are grouped so that no two groups touch the same zarr chunk (see group_writes_by_chunk) and the groups are written
+    at the same time without the zarr.ProcessSynchronizer chunk locks.
 
     Parameters
     ----------
@@ -1149,9 +1299,9 @@ def distrib_zarr_write(zarr_path: str, xarrays: list, attributes: dict, chunk_si
         dimension name that you are appending to (generally time)
     write_in_parallel
         if True and skip_dask is False, will use the first write to set up the zarr datastore, and all subsequent
-        writes will be done in parallel.  We have this as optional, because on government machines (I suspect due to
-        the antivirus scans) this can occassionally fail, where parallel writes generate permission denied errors.
-        For now we leave this default off.
+        writes will be done in parallel, one task for each group of writes that share zarr chunks.  We have this as
+        optional, because on government machines (I suspect due to the antivirus scans) this can occassionally fail,
+        where parallel writes generate permission denied errors.  For now we leave this default off.
     skip_dask
         if True, skip the dask client mapping as you are not running dask distributed
     show_progress
@@ -1182,15 +1332,19 @@ def distrib_zarr_write(zarr_path: str, xarrays: list, attributes: dict, chunk_si
         # waiting here allows the first write to expand the array size using the push_forward and finalsize
         wait(futs)
         if len(xarrays) > 1:
-            for i in range(len(xarrays) - 1):
-                futs.append(client.submit(zarr_write, zarr_path, xarrays[i + 1], None, chunk_sizes,
-                                          data_locs[i + 1], append_dim=append_dim))
-                if not write_in_parallel:  # wait on each future, write one data chunk at a time
-                    wait(futs)
-            if write_in_parallel:  # don't wait on the futures until you append all of them
-                # if show_progress:
-                #     progress(futs, multi=False)
+            if write_in_parallel:
+                # the remaining writes go to existing arrays.  Writes that share a zarr chunk are written in order by
+                #  one worker, all other writes are written at the same time without the chunk locks
+                chunk_lengths = return_append_dim_chunk_lengths(zarr_path, append_dim, chunk_sizes.get(append_dim, (None,))[0])
+                for write_group in group_writes_by_chunk(data_locs[1:], chunk_lengths):
+                    futs.append(client.submit(zarr_write_group, zarr_path, [xarrays[i + 1] for i in write_group], chunk_sizes,
+                                              [data_locs[i + 1] for i in write_group], append_dim=append_dim))
                 wait(futs)
+            else:
+                for i in range(len(xarrays) - 1):
+                    futs.append(client.submit(zarr_write, zarr_path, xarrays[i + 1], None, chunk_sizes,
+                                              data_locs[i + 1], append_dim=append_dim))
+                    wait(futs)  # wait on each future, write one data chunk at a time
     return futs
 
 
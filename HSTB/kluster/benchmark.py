@@ -0,0 +1,593 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import argparse
+from datetime import datetime
+import numpy as np
+import xarray as xr
+from pyproj import CRS
+from dask.distributed import Client, LocalCluster
+
+from HSTB.kluster import __version__ as kluster_version
+from HSTB.kluster import kluster_variables
+from HSTB.kluster.modules.orientation import build_orientation_vectors
+from HSTB.kluster.modules.beampointingvector import build_beam_pointing_vectors
+from HSTB.kluster.modules.svcorrect import run_ray_trace_v2, run_ray_trace_by_ssv
+from HSTB.kluster.modules.georeference import georef_by_worker
+from HSTB.kluster.modules.tpu import calculate_tpu
+from HSTB.kluster.modules.backscatter import Kmallscatter
+from HSTB.kluster.backends._zarr import distrib_zarr_write, _get_indices_dataset_notexist
+
+# the order the processing stages are run in benchmark_processing_stages, the output of each stage feeds the next
+processing_stages = ['orientation', 'beam_pointing_vectors', 'ray_trace', 'georeference', 'tpu', 'backscatter', 'zarr_write']
+
+
+def _time_function(func, args: tuple, repeat: int = 3):
+    """
+    Run the provided function repeat times and return the best time and the result of the last run
+
+    Parameters
+    ----------
+    func
+        function to time
+    args
+        tuple of positional arguments to pass to the function
+    repeat
+        number of times to run the function
+
+    Returns
+    -------
+    float
+        minimum run time in seconds
+    object
+        result of the last run of the function
+    """
+
+    times = []
+    result = None
+    for _ in range(repeat):
+        starttime = time.perf_counter()
+        result = func(*args)
+        times.append(time.perf_counter() - starttime)
+    return min(times), result
+
+
+def build_synthetic_ray_trace_data(number_of_pings: int = 1000, number_of_beams: int = 400, number_of_ssv: int = 1,
+                                   swath_angle: float = 65.0, depth: float = 50.0):
+    """
+    Build synthetic inputs for run_ray_trace_v2, a flat seafloor at the given depth observed with a symmetric swath and
+    a surface sound speed value that cycles through number_of_ssv unique values.
+
+    Parameters
+    ----------
+    number_of_pings
+        number of pings (time dimension)
+    number_of_beams
+        number of beams per ping
+    number_of_ssv
+        number of unique surface sound speed values across the pings
+    swath_angle
+        maximum beam angle from nadir in degrees
+    depth
+        depth of the flat seafloor in meters
+
+    Returns
+    -------
+    tuple
+        positional arguments for run_ray_trace_v2 (cast, beam_azimuth, beam_angle, two_way_travel_time,
+        surface_sound_speed, z_waterline_offset, additional_offsets)
+    """
+
+    cast = [[0.0, 2.0, 5.0, 10.0, 20.0, 30.0, 50.0, 75.0, 100.0, 500.0, 1000.0, 12000.0],
+            [1500.0, 1499.8, 1499.1, 1497.6, 1495.2, 1493.0, 1490.4, 1488.9, 1487.5, 1483.0, 1482.1, 1520.0]]
+    times = np.arange(number_of_pings, dtype=np.float64)
+    beams = np.arange(number_of_beams)
+    angles = np.deg2rad(np.linspace(-swath_angle, swath_angle, number_of_beams))
+    angles = np.tile(angles, (number_of_pings, 1))
+    azimuth = np.where(angles < 0, 3 * np.pi / 2, np.pi / 2)
+    traveltime = 2 * depth / np.cos(angles) / 1492.0
+    ssv = 1500.0 + np.arange(number_of_pings) % max(number_of_ssv, 1) * 0.1
+
+    beam_angle = xr.DataArray(angles, coords=[times, beams], dims=['time', 'beam'])
+    beam_azimuth = xr.DataArray(azimuth, coords=[times, beams], dims=['time', 'beam'])
+    two_way_travel_time = xr.DataArray(traveltime, coords=[times, beams], dims=['time', 'beam'])
+    surface_sound_speed = xr.DataArray(ssv, coords=[times], dims=['time'])
+    additional_offsets = [np.zeros(angles.shape), np.zeros(angles.shape), np.zeros(angles.shape)]
+    return cast, beam_azimuth, beam_angle, two_way_travel_time, surface_sound_speed, 0.5, additional_offsets
+
+
+def benchmark_ray_trace(number_of_pings: int = 1000, number_of_beams: int = 400, number_of_ssv: int = 1, repeat: int = 3):
+    """
+    Compare the compiled ray trace (run_ray_trace_v2) with the numpy ray trace (run_ray_trace_by_ssv) on synthetic data.
+    The compiled ray trace is run once before timing so that the compile time is not included.
+
+    Parameters
+    ----------
+    number_of_pings
+        number of pings (time dimension)
+    number_of_beams
+        number of beams per ping
+    number_of_ssv
+        number of unique surface sound speed values across the pings
+    repeat
+        number of times to run each method, the best time is reported
+
+    Returns
+    -------
+    dict
+        dict of timing results and the maximum absolute difference between the two methods for each output
+    """
+
+    data = build_synthetic_ray_trace_data(number_of_pings, number_of_beams, number_of_ssv)
+    run_ray_trace_v2(*build_synthetic_ray_trace_data(2, 4, 1))  # compile
+
+    compiled_time, compiled_result = _time_function(run_ray_trace_v2, data, repeat)
+    numpy_time, numpy_result = _time_function(run_ray_trace_by_ssv, data, repeat)
+    max_difference = {ky: float(np.abs(compiled_result[cnt].values - numpy_result[cnt].values).max()) for cnt, ky in
+                      enumerate(['alongtrack', 'acrosstrack', 'depthoffset'])}
+    return {'number_of_pings': number_of_pings, 'number_of_beams': number_of_beams, 'number_of_ssv': number_of_ssv,
+            'compiled_seconds': compiled_time, 'numpy_seconds': numpy_time,
+            'speedup': numpy_time / compiled_time if compiled_time else np.inf, 'max_difference': max_difference}
+
+
+def build_synthetic_sonar_data(number_of_pings: int = 3000, number_of_beams: int = 400, number_of_heads: int = 1,
+                               ping_rate: float = 4.0, attitude_rate: float = 50.0, depth: float = 50.0,
+                               swath_angle: float = 65.0, seed: int = 0):
+    """
+    Build a synthetic survey for benchmarking the processing stages.  The vessel runs north at 5 knots over a flat
+    seafloor at the given depth, with a few degrees of sinusoidal roll/pitch/heave and a small random noise component
+    so that the answers are not all identical.  Each head gets its own ping record with the same ping times, mirroring
+    the dual head ping records kluster generates on conversion.  The same seed always generates the same data.
+
+    Parameters
+    ----------
+    number_of_pings
+        number of pings (time dimension) for each head
+    number_of_beams
+        number of beams per ping
+    number_of_heads
+        number of sonar heads, each head gets a ping record
+    ping_rate
+        pings per second
+    attitude_rate
+        attitude records per second
+    depth
+        depth of the flat seafloor in meters
+    swath_angle
+        maximum beam angle from nadir in degrees
+    seed
+        seed for the random noise
+
+    Returns
+    -------
+    dict
+        {'raw_att': attitude Dataset (roll, pitch, heading, heave), 'raw_nav': navigation Dataset at ping time
+        (latitude, longitude, altitude), 'raw_ping': list of ping record Datasets, one for each head}
+    """
+
+    rng = np.random.default_rng(seed)
+    start_time = 1600000000.0
+    ping_times = start_time + np.arange(number_of_pings) / ping_rate
+    att_times = np.arange(start_time - 5, ping_times[-1] + 5, 1 / attitude_rate)
+    raw_att = xr.Dataset({'roll': (['time'], (3 * np.sin(att_times / 5) + rng.normal(0, 0.05, att_times.size)).astype(np.float32)),
+                          'pitch': (['time'], (1.5 * np.sin(att_times / 7) + rng.normal(0, 0.05, att_times.size)).astype(np.float32)),
+                          'heading': (['time'], (2 * np.sin(att_times / 60) + rng.normal(0, 0.05, att_times.size)).astype(np.float32) % 360),
+                          'heave': (['time'], (0.3 * np.sin(att_times / 4)).astype(np.float32))},
+                         coords={'time': att_times})
+    # 5 knots north is about 2.57 meters per second, about 2.3e-5 degrees of latitude per second
+    raw_nav = xr.Dataset({'latitude': (['time'], 36.0 + (ping_times - start_time) * 2.3e-5),
+                          'longitude': (['time'], np.full(number_of_pings, -75.5)),
+                          'altitude': (['time'], (-35.0 + 0.1 * np.sin(ping_times / 30)).astype(np.float32))},
+                         coords={'time': ping_times})
+
+    raw_ping = []
+    beams = np.arange(number_of_beams)
+    for head in range(number_of_heads):
+        angles = np.linspace(swath_angle, -swath_angle, number_of_beams)
+        if number_of_heads > 1:  # split the swath across the heads, port head looks to port, etc.
+            angles = np.linspace(swath_angle, -swath_angle, number_of_beams * number_of_heads)[head::number_of_heads]
+        angles = np.tile(angles, (number_of_pings, 1)) + rng.normal(0, 0.01, (number_of_pings, number_of_beams))
+        traveltime = 2 * depth / np.cos(np.deg2rad(angles)) / 1492.0 + rng.normal(0, 1e-5, angles.shape)
+        raw_ping.append(xr.Dataset({'beampointingangle': (['time', 'beam'], angles.astype(np.float32)),
+                                    'tiltangle': (['time', 'beam'], np.full(angles.shape, 0.5, dtype=np.float32)),
+                                    'traveltime': (['time', 'beam'], traveltime.astype(np.float32)),
+                                    'delay': (['time', 'beam'], np.zeros(angles.shape, dtype=np.float32)),
+                                    'soundspeed': (['time'], np.full(number_of_pings, 1500.0, dtype=np.float32)),
+                                    'qualityfactor': (['time', 'beam'], rng.integers(0, 4, angles.shape).astype(np.float32)),
+                                    'reflectivity': (['time', 'beam'], rng.normal(-25, 3, angles.shape).astype(np.float32)),
+                                    'pulselength': (['time', 'beam'], np.full(angles.shape, 0.00037, dtype=np.float32)),
+                                    'tvg': (['time', 'beam'], np.full(angles.shape, 90.0, dtype=np.float32)),
+                                    'fixedgain': (['time', 'beam'], np.full(angles.shape, 30.0, dtype=np.float32)),
+                                    'absorption': (['time', 'beam'], np.full(angles.shape, 6.4, dtype=np.float32))},
+                                   coords={'time': ping_times + head * 1e-4, 'beam': beams},
+                                   attrs={'system_identifier': str(40111 + head)}))
+    return {'raw_att': raw_att, 'raw_nav': raw_nav, 'raw_ping': raw_ping}
+
+
+def _return_ping_chunks(raw_ping: list, pings_per_chunk: int):
+    """
+    Split each head of the synthetic ping records into chunks of pings, the same way the Fqpr splits the ping records
+    into chunks for processing
+
+    Parameters
+    ----------
+    raw_ping
+        list of ping record Datasets, one for each head
+    pings_per_chunk
+        number of pings in each chunk
+
+    Returns
+    -------
+    list
+        list of ping record Datasets, one for each chunk of each head
+    """
+
+    chunks = []
+    for rp in raw_ping:
+        for start in range(0, rp.time.size, pings_per_chunk):
+            chunks.append(rp.isel(time=slice(start, start + pings_per_chunk)))
+    return chunks
+
+
+def _load_result(result):
+    """
+    Load any lazy (dask backed) xarray objects in the result of a stage, so that the time reported includes the
+    computation and not just the building of the task graph.
+    """
+
+    if isinstance(result, (list, tuple)):
+        return [_load_result(res) for res in result]
+    if isinstance(result, (xr.DataArray, xr.Dataset)):
+        return result.load()
+    return result
+
+
+def _run_and_load(func, *args):
+    return _load_result(func(*args))
+
+
+def _time_stage(func, chunk_args: list, client: Client = None, repeat: int = 3):
+    """
+    Run the function once for each chunk in chunk_args and return the best total time across repeat runs.  If a client
+    is provided, the chunks are mapped across the cluster workers and the time includes gathering the results.  The
+    inputs are scattered to the workers before timing, as kluster does in Fqpr._submit_data_to_cluster.
+
+    Parameters
+    ----------
+    func
+        function to time
+    chunk_args
+        list of tuples of positional arguments, one tuple for each chunk
+    client
+        optional dask distributed client
+    repeat
+        number of times to run all the chunks
+
+    Returns
+    -------
+    float
+        minimum total run time in seconds
+    list
+        results of the last run, one for each chunk
+    """
+
+    if client is not None:
+        chunk_args = [client.scatter(list(args), hash=False) for args in chunk_args]
+    times = []
+    results = []
+    for _ in range(repeat):
+        starttime = time.perf_counter()
+        if client is not None:
+            futs = [client.submit(_run_and_load, func, *args, pure=False) for args in chunk_args]
+            results = client.gather(futs)
+        else:
+            results = [_run_and_load(func, *args) for args in chunk_args]
+        times.append(time.perf_counter() - starttime)
+    return min(times), results
+
+
+def _calculate_tpu_waterline(*args):
+    """
+    calculate_tpu for a waterline vertical reference, the synthetic data does not include the sbet error variables that
+    the default ellipse vertical reference requires
+    """
+
+    return calculate_tpu(*args, vert_ref='waterline')
+
+
+def _process_kmall_backscatter(chnk: xr.Dataset, slant_range: xr.DataArray, beam_angle: xr.DataArray):
+    """
+    Run the kmall backscatter processing on a chunk of the synthetic ping record
+    """
+
+    bscatter = Kmallscatter({}, chnk.reflectivity, slant_range, chnk.soundspeed, beam_angle, 1.0, 1.0, chnk.pulselength,
+                            chnk.tvg, chnk.fixedgain, chnk.absorption)
+    return bscatter.process()
+
+
+def _write_to_zarr(zarr_folder: str, heads: list, client: Client = None):
+    """
+    Write the processed outputs for each head to a new zarr store using the same distributed zarr write that the Fqpr
+    uses, one zarr store for each head.  The stores are removed after writing.
+
+    Parameters
+    ----------
+    zarr_folder
+        folder to write the zarr stores in
+    heads
+        list of lists of xarray Datasets, the processed chunks for each head
+    client
+        optional dask distributed client, if provided the writes are done in parallel on the cluster
+    """
+
+    for datasets in heads:
+        zarr_path = os.path.join(zarr_folder, 'benchmark_{}.zarr'.format(time.perf_counter_ns()))
+        finalsize = (sum([d.time.size for d in datasets]), datasets[0].beam.size)
+        chunk_sizes = {ky: val for ky, val in kluster_variables.ping_chunks.items() if ky in datasets[0].variables}
+        data_locs = _get_indices_dataset_notexist([d.time for d in datasets])
+        if client is not None:
+            datasets = client.scatter(datasets)
+        distrib_zarr_write(zarr_path, datasets, {}, chunk_sizes, data_locs, finalsize, [], client,
+                           write_in_parallel=client is not None, skip_dask=client is None, show_progress=False)
+        shutil.rmtree(zarr_path)
+
+
+def benchmark_processing_stages(number_of_pings: int = 3000, number_of_beams: int = 400, number_of_heads: int = 1,
+                                pings_per_chunk: int = 1000, repeat: int = 3, client: Client = None, seed: int = 0):
+    """
+    Time each of the processing stages on a synthetic survey (see build_synthetic_sonar_data).  The stages are run
+    in the processing order and the output of each stage feeds the next, so the inputs to each stage look like the
+    real thing.  The ping records are split into chunks of pings_per_chunk pings, and each chunk is run serially, or
+    mapped across the cluster if a client is provided.
+
+    | orientation - orientation.build_orientation_vectors
+    | beam_pointing_vectors - beampointingvector.build_beam_pointing_vectors
+    | ray_trace - svcorrect.run_ray_trace_v2
+    | georeference - georeference.georef_by_worker
+    | tpu - tpu.calculate_tpu
+    | backscatter - backscatter.Kmallscatter.process
+    | zarr_write - backends._zarr.distrib_zarr_write of the x, y, z, tvu, thu variables to a temporary zarr store
+
+    Parameters
+    ----------
+    number_of_pings
+        number of pings (time dimension) for each head
+    number_of_beams
+        number of beams per ping
+    number_of_heads
+        number of sonar heads
+    pings_per_chunk
+        number of pings in each chunk
+    repeat
+        number of times to run each stage, the best time is reported
+    client
+        optional dask distributed client, if provided the chunks are mapped across the cluster
+    seed
+        seed for the synthetic data
+
+    Returns
+    -------
+    dict
+        {stage name: {'seconds': best time, 'soundings_per_second': soundings processed per second}}
+    """
+
+    data = build_synthetic_sonar_data(number_of_pings, number_of_beams, number_of_heads, seed=seed)
+    raw_att, raw_nav = data['raw_att'], data['raw_nav']
+    chunks = _return_ping_chunks(data['raw_ping'], pings_per_chunk)
+    total_soundings = number_of_pings * number_of_beams * number_of_heads
+    cast = [[0.0, 2.0, 5.0, 10.0, 20.0, 30.0, 50.0, 75.0, 100.0, 500.0, 1000.0, 12000.0],
+            [1500.0, 1499.8, 1499.1, 1497.6, 1495.2, 1493.0, 1490.4, 1488.9, 1487.5, 1483.0, 1482.1, 1520.0]]
+    tx_orientation = [np.array([1, 0, 0]), 0.0, 0.0, 0.0, '1600000000']
+    rx_orientation = [np.array([0, 1, 0]), 0.0, 0.0, 0.0, '1600000000']
+    input_crs = CRS.from_epsg(4326)
+    horizontal_crs = CRS.from_epsg(32618)
+    run_ray_trace_v2(*build_synthetic_ray_trace_data(2, 4, 1))  # compile outside of the timing
+    if client is not None:  # each worker process compiles its own copy
+        client.run(run_ray_trace_v2, *build_synthetic_ray_trace_data(2, 4, 1))
+
+    results = {}
+    stage_args = [(raw_att, chnk.traveltime, chnk.delay, chnk.time, tx_orientation, rx_orientation, 0) for chnk in chunks]
+    results['orientation'], orientation = _time_stage(build_orientation_vectors, stage_args, client, repeat)
+
+    chunk_heading = [raw_att['heading'].interp(time=chnk.time) for chnk in chunks]
+    stage_args = [(chunk_heading[cnt], chnk.beampointingangle, chnk.tiltangle, orientation[cnt][0], orientation[cnt][1], False, False)
+                  for cnt, chnk in enumerate(chunks)]
+    results['beam_pointing_vectors'], bpv = _time_stage(build_beam_pointing_vectors, stage_args, client, repeat)
+
+    stage_args = [(cast, bpv[cnt][0], bpv[cnt][1], chnk.traveltime, chnk.soundspeed, 0.5,
+                   [np.zeros(chnk.traveltime.shape), np.zeros(chnk.traveltime.shape), np.zeros(chnk.traveltime.shape)])
+                  for cnt, chnk in enumerate(chunks)]
+    results['ray_trace'], svcorr = _time_stage(run_ray_trace_v2, stage_args, client, repeat)
+
+    chunk_nav = [raw_nav.interp(time=chnk.time) for chnk in chunks]
+    chunk_heave = [raw_att['heave'].interp(time=chnk.time) for chnk in chunks]
+    stage_args = [(svcorr[cnt], chunk_nav[cnt].altitude, chunk_nav[cnt].longitude, chunk_nav[cnt].latitude, chunk_heading[cnt],
+                   chunk_heave[cnt], 0.0, 'waterline', input_crs, horizontal_crs, 0.0) for cnt in range(len(chunks))]
+    results['georeference'], georef = _time_stage(georef_by_worker, stage_args, client, repeat)
+
+    chunk_roll = [raw_att['roll'].interp(time=chnk.time) for chnk in chunks]
+    stage_args = [(chunk_roll[cnt], chnk.beampointingangle, bpv[cnt][1], svcorr[cnt][1], svcorr[cnt][2], chnk.soundspeed,
+                   georef[cnt][5], None, chnk.qualityfactor) for cnt, chnk in enumerate(chunks)]
+    results['tpu'], tpu = _time_stage(_calculate_tpu_waterline, stage_args, client, repeat)
+
+    slant_ranges = [np.sqrt(svcorr[cnt][0] ** 2 + svcorr[cnt][1] ** 2 + svcorr[cnt][2] ** 2) for cnt in range(len(chunks))]
+    stage_args = [(chnk, slant_ranges[cnt], bpv[cnt][1]) for cnt, chnk in enumerate(chunks)]
+    results['backscatter'], _ = _time_stage(_process_kmall_backscatter, stage_args, client, repeat)
+
+    outputs = [xr.Dataset({'x': georef[cnt][0], 'y': georef[cnt][1], 'z': georef[cnt][2], 'tvu': tpu[cnt][0],
+                           'thu': tpu[cnt][1]}) for cnt in range(len(chunks))]
+    chunks_per_head = len(outputs) // number_of_heads
+    heads = [outputs[hd * chunks_per_head:(hd + 1) * chunks_per_head] for hd in range(number_of_heads)]
+    zarr_folder = tempfile.mkdtemp()
+    try:  # the zarr write is run here and not on the workers, it maps the writes to the cluster itself
+        results['zarr_write'], _ = _time_stage(_write_to_zarr, [(zarr_folder, heads, client)], None, repeat)
+    finally:
+        shutil.rmtree(zarr_folder, ignore_errors=True)
+    return {stage: {'seconds': results[stage], 'soundings_per_second': total_soundings / results[stage] if results[stage] else np.inf}
+            for stage in processing_stages}
+
+
+def run_benchmark_suite(number_of_pings: int = 3000, number_of_beams: int = 400, number_of_heads: int = 1,
+                        pings_per_chunk: int = 1000, repeat: int = 3, use_cluster: bool = True, n_workers: int = None,
+                        output_file: str = None, seed: int = 0):
+    """
+    Run benchmark_processing_stages without a cluster (each chunk run serially in this process) and, if use_cluster,
+    again with a dask LocalCluster.  Results are returned with the settings and environment used, and are saved as
+    JSON if output_file is provided, so that runs can be compared with compare_benchmark_results.
+
+    Parameters
+    ----------
+    number_of_pings
+        number of pings (time dimension) for each head
+    number_of_beams
+        number of beams per ping
+    number_of_heads
+        number of sonar heads
+    pings_per_chunk
+        number of pings in each chunk
+    repeat
+        number of times to run each stage, the best time is reported
+    use_cluster
+        if True, also runs the stages on a dask LocalCluster
+    n_workers
+        number of workers for the LocalCluster, if None uses the dask default
+    output_file
+        optional path to the JSON file to write the results to
+    seed
+        seed for the synthetic data
+
+    Returns
+    -------
+    dict
+        {'settings': benchmark settings, 'environment': versions and machine info, 'results': {'serial': stage results,
+        'cluster': stage results}}
+    """
+
+    benchmark = {'settings': {'number_of_pings': number_of_pings, 'number_of_beams': number_of_beams,
+                              'number_of_heads': number_of_heads, 'pings_per_chunk': pings_per_chunk, 'repeat': repeat,
+                              'seed': seed, 'n_workers': n_workers},
+                 'environment': {'kluster': kluster_version, 'python': platform.python_version(), 'numpy': np.__version__,
+                                 'xarray': xr.__version__, 'platform': platform.platform(), 'processor': platform.processor(),
+                                 'cpu_count': os.cpu_count(), 'date': datetime.utcnow().strftime('%c')},
+                 'results': {}}
+    benchmark['results']['serial'] = benchmark_processing_stages(number_of_pings, number_of_beams, number_of_heads,
+                                                                 pings_per_chunk, repeat, None, seed)
+    if use_cluster:
+        cluster = LocalCluster(n_workers=n_workers)
+        client = Client(cluster)
+        try:
+            benchmark['results']['cluster'] = benchmark_processing_stages(number_of_pings, number_of_beams, number_of_heads,
+                                                                          pings_per_chunk, repeat, client, seed)
+        finally:
+            client.close()
+            cluster.close()
+    if output_file:
+        save_benchmark_results(benchmark, output_file)
+    return benchmark
+
+
+def save_benchmark_results(benchmark: dict, output_file: str):
+    """
+    Save the return from run_benchmark_suite to a JSON file
+
+    Parameters
+    ----------
+    benchmark
+        return from run_benchmark_suite
+    output_file
+        path to the JSON file
+    """
+
+    with open(output_file, 'w') as ofile:
+        json.dump(benchmark, ofile, indent=4)
+
+
+def load_benchmark_results(output_file: str):
+    """
+    Load the benchmark results saved with save_benchmark_results
+
+    Parameters
+    ----------
+    output_file
+        path to the JSON file
+
+    Returns
+    -------
+    dict
+        the benchmark results, see run_benchmark_suite
+    """
+
+    with open(output_file, 'r') as ofile:
+        benchmark = json.load(ofile)
+    return benchmark
+
+
+def compare_benchmark_results(baseline: dict, current: dict, tolerance: float = 0.1):
+    """
+    Compare the stage times of two benchmark runs.  A stage is flagged as a regression if it is more than tolerance
+    (as a fraction of the baseline time) slower than the baseline.  Only the stages and run types (serial/cluster) found
+    in both runs are compared, and a warning is included if the two runs used different settings.
+
+    Parameters
+    ----------
+    baseline
+        return from run_benchmark_suite or load_benchmark_results, the reference run
+    current
+        return from run_benchmark_suite or load_benchmark_results, the run to check
+    tolerance
+        allowable slowdown as a fraction of the baseline time, ex: 0.1 = 10 percent slower is allowed
+
+    Returns
+    -------
+    dict
+        {run type: {stage: {'baseline_seconds', 'current_seconds', 'ratio', 'regression'}}}, with a 'settings_match'
+        entry that is False if the two runs used different settings
+    """
+
+    comparison = {'settings_match': baseline['settings'] == current['settings']}
+    for run_type, stages in current['results'].items():
+        if run_type not in baseline['results']:
+            continue
+        comparison[run_type] = {}
+        for stage, stage_result in stages.items():
+            if stage not in baseline['results'][run_type]:
+                continue
+            base_seconds = baseline['results'][run_type][stage]['seconds']
+            ratio = stage_result['seconds'] / base_seconds if base_seconds else np.inf
+            comparison[run_type][stage] = {'baseline_seconds': base_seconds, 'current_seconds': stage_result['seconds'],
+                                           'ratio': ratio, 'regression': bool(ratio > 1 + tolerance)}
+    return comparison
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time the kluster processing stages on synthetic sonar data')
+    parser.add_argument('-p', '--pings', type=int, default=3000, help='number of pings for each head')
+    parser.add_argument('-b', '--beams', type=int, default=400, help='number of beams per ping')
+    parser.add_argument('-s', '--heads', type=int, default=1, help='number of sonar heads')
+    parser.add_argument('-c', '--chunk', type=int, default=1000, help='number of pings in each chunk')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='number of runs for each stage, the best time is reported')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='number of LocalCluster workers')
+    parser.add_argument('--no-cluster', action='store_true', help='only run without the LocalCluster')
+    parser.add_argument('-o', '--output', default=None, help='path to the JSON file to write the results to')
+    parser.add_argument('--compare', default=None, help='path to a JSON file of baseline results to compare against')
+    args = parser.parse_args()
+
+    bmark = run_benchmark_suite(args.pings, args.beams, args.heads, args.chunk, args.repeat, not args.no_cluster,
+                                args.workers, args.output)
+    for rtype, rstages in bmark['results'].items():
+        for stg, sresult in rstages.items():
+            print('{} {}: {:.3f} seconds, {:.0f} soundings per second'.format(rtype, stg, sresult['seconds'],
+                                                                            sresult['soundings_per_second']))
+    if args.compare:
+        compared = compare_benchmark_results(load_benchmark_results(args.compare), bmark)
+        if not compared['settings_match']:
+            print('WARNING: baseline was run with different settings')
+        for rtype in bmark['results']:
+            for stg, cresult in compared.get(rtype, {}).items():
+                print('{} {}: {:.2f}x baseline{}'.format(rtype, stg, cresult['ratio'], ' REGRESSION' if cresult['regression'] else ''))
+        if any([cresult['regression'] for rtype in bmark['results'] for cresult in compared.get(rtype, {}).values()]):
+            sys.exit(1)
@@ -1,5 +1,7 @@
 import logging
 import os
+import json
+import tracemalloc
 import psutil
 import numpy as np
 
@@ -10,7 +12,7 @@ import numpy as np
 import dask
 from dask.distributed import Client
 from dask.distributed import get_client, Lock
-from xarray import DataArray
+from xarray import DataArray, Dataset
 from fasteners import InterProcessLock
 from HSTB.kluster import kluster_variables
 
@@ -221,43 +223,212 @@ def client_needs_restart(client: Client):
     return False
 
 
-def determine_optimal_chunks(client: Client, beams_per_ping: float, safety_margin: float = 0.75,
-                             chunks_per_worker: int = 2, mem_per_beam: float = 0.000015):
+def _data_nbytes(data):
     """
-    A very rudimentary placeholder-esque way to determine the chunk size and number of chunks for an array to process
-    in memory.  Too many chunks/Too big chunks and you run out of memory.  Too few and you aren't utilizing the resources
-    adequately.  Here we scale mainly based off of the number of workers and the amount of memory available in the cluster.
+    Return the total size in bytes of the arrays in the provided data, searching through lists, tuples and dicts
+
+    Parameters
+    ----------
+    data
+        data passed to one of the distrib functions, generally a list of xarray/numpy objects and scalars
+
+    Returns
+    -------
+    int
+        total size in bytes of all arrays found
+    """
+
+    if isinstance(data, (DataArray, Dataset, np.ndarray)):
+        return int(data.nbytes)
+    elif isinstance(data, (list, tuple)):
+        return sum([_data_nbytes(d) for d in data])
+    elif isinstance(data, dict):
+        return sum([_data_nbytes(d) for d in data.values()])
+    return 0
+
+
+def measure_peak_memory(func, data):
+    """
+    Run func(data) and measure the peak memory used, as the size of the input data plus the peak memory allocated
+    while running the function.  Used by the adaptive chunk planner to learn the memory use of each process on a
+    probe chunk.
+
+    Memory is measured with tracemalloc, which only sees allocations made through python (numpy arrays included).  If
+    other threads are running on the worker, their allocations are included, so the estimate errs on the high side.
+
+    Parameters
+    ----------
+    func
+        one of the distrib functions, ex: distrib_run_build_orientation_vectors
+    data
+        the data for one chunk, passed to func
+
+    Returns
+    -------
+    object
+        the result of func(data)
+    int
+        peak memory used in bytes
+    """
+
+    already_tracing = tracemalloc.is_tracing()
+    if not already_tracing:
+        tracemalloc.start()
+    try:
+        if hasattr(tracemalloc, 'reset_peak'):  # python 3.9+, otherwise the peak includes earlier allocations
+            tracemalloc.reset_peak()
+        base_memory = tracemalloc.get_traced_memory()[0]
+        result = func(data)
+        peak_memory = tracemalloc.get_traced_memory()[1] - base_memory
+    finally:
+        if not already_tracing:
+            tracemalloc.stop()
+    return result, int(max(peak_memory, 0) + _data_nbytes(data))
+
+
+def return_memory_profile_path(output_folder: str):
+    """
+    Return the path to the memory profile file for the converted data in output_folder.  The memory profile (learned
+    memory use of each process by sonar model, see update_memory_profile) is stored with the converted data, so that
+    it is always in a writable location and is not shared between projects.
+
+    Parameters
+    ----------
+    output_folder
+        Fqpr output folder, the folder containing the ping zarr folders
+
+    Returns
+    -------
+    str
+        path to the memory profile json file
+    """
+
+    return os.path.join(output_folder, 'memory_profile.json')
+
+
+def return_memory_profile(sonar_model: str, mode: str, profile_file: str):
+    """
+    Return the learned memory use of the given process for the given sonar model, see update_memory_profile
+
+    Parameters
+    ----------
+    sonar_model
+        sonar model identifier, ex: 'em2040'
+    mode
+        one of ['orientation', 'bpv', 'sv_corr', 'georef', 'tpu', 'backscatter', 'fused']
+    profile_file
+        path to the memory profile json file, see return_memory_profile_path, if None no profile is returned
+
+    Returns
+    -------
+    float
+        memory used per beam in bytes, None if this process has not been profiled for this sonar model
+    """
+
+    if profile_file is None or not os.path.exists(profile_file):
+        return None
+    try:
+        with open(profile_file, 'r') as pfile:
+            profile = json.load(pfile)
+    except (OSError, ValueError):
+        return None
+    return profile.get(str(sonar_model), {}).get(mode, None)
+
+
+def update_memory_profile(sonar_model: str, mode: str, mem_per_beam: float, profile_file: str):
+    """
+    Save the measured memory use of the given process for the given sonar model.  If there is already a value for this
+    process, we keep the larger of the two, so that the chunk planner sizes the chunks for the worst case seen.
+
+    Parameters
+    ----------
+    sonar_model
+        sonar model identifier, ex: 'em2040'
+    mode
+        one of ['orientation', 'bpv', 'sv_corr', 'georef', 'tpu', 'backscatter', 'fused']
+    mem_per_beam
+        memory used per beam in bytes
+    profile_file
+        path to the memory profile json file, see return_memory_profile_path
+
+    Returns
+    -------
+    float
+        the memory used per beam in bytes now stored in the profile
+    """
+
+    with InterProcessLock(profile_file + '.lock'):
+        profile = {}
+        if os.path.exists(profile_file):
+            try:
+                with open(profile_file, 'r') as pfile:
+                    profile = json.load(pfile)
+            except (OSError, ValueError):
+                profile = {}
+        sonar_profile = profile.setdefault(str(sonar_model), {})
+        sonar_profile[mode] = max(float(mem_per_beam), sonar_profile.get(mode, 0.0))
+        with open(profile_file, 'w') as pfile:
+            json.dump(profile, pfile, indent=4)
+    return sonar_profile[mode]
+
+
+def determine_optimal_chunks(client: Client, beams_per_ping: float, mem_per_beam: float,
+                             base_chunk_size: int = kluster_variables.ping_chunk_size, total_pings: int = None,
+                             safety_margin: float = 0.75, max_chunk_multiple: int = None):
+    """
+    Determine the chunk size and number of chunks to process at a time for one of the processes, using the memory used
+    per beam for that process (see measure_peak_memory, update_memory_profile) and the memory/threads available on each
+    worker.  Too many chunks/Too big chunks and you run out of memory.  Too few and you aren't utilizing the resources
+    adequately.
+
+    The chunk size is always a multiple of base_chunk_size, so that the written chunks line up with the zarr chunks on
+    disk.  We use bigger chunks when the worker memory allows it, but never so big that there are fewer chunks than
+    there are worker threads to process them.  The number of chunks at a time is then the number of chunks of that size
+    that fit in each worker's memory (no more than the number of threads on the worker) times the number of workers.
 
     Parameters
     ----------
     client
         dask distributed client
     beams_per_ping
-        avg number of beams per ping
+        number of beams per ping
+    mem_per_beam
+        memory used per beam in bytes for the process
+    base_chunk_size
+        chunk size (in pings) of the written data, the returned chunk size will be a multiple of this
+    total_pings
+        optional, total number of pings to process, used to make sure there are enough chunks to use all the workers
     safety_margin
         made up number to ensure we don't expect 100% of the memory to be available
-    chunks_per_worker
-        determines the number of chunks to build and process
-    mem_per_beam
-        metric I came up with looking at processes run, approx amount of memory used per beam in the svcorr process.
+    max_chunk_multiple
+        the largest multiple of base_chunk_size to allow, default is kluster_variables.max_chunk_multiple
 
     Returns
     -------
     int
         length in time dimension of each chunk
     int
-        total number of chunks to process
+        total number of chunks to process at a time
     """
 
-    nworker = get_number_of_workers(client)
-    memsize = get_max_cluster_allocated_memory(client)  # in GB
-
-    mem_per_worker = (memsize / nworker) * safety_margin
-    beams_per_chunk = (mem_per_worker / mem_per_beam) / chunks_per_worker
-    pings_per_chunk = beams_per_chunk / beams_per_ping
-    tot_chunks = nworker * chunks_per_worker
-
-    return int(pings_per_chunk), int(tot_chunks)
+    if max_chunk_multiple is None:
+        max_chunk_multiple = kluster_variables.max_chunk_multiple
+    worker_data = client.scheduler_info()['workers']
+    nworker = len(worker_data)
+    # memory_limit of 0 means the worker has no limit, use the system memory shared across the workers
+    mem_limits = [worker_data[wrk]['memory_limit'] or psutil.virtual_memory().total / nworker for wrk in worker_data]
+    mem_per_worker = min(mem_limits) * safety_margin
+    threads_per_worker = max(min([worker_data[wrk]['nthreads'] for wrk in worker_data]), 1)
+
+    base_chunk_memory = max(base_chunk_size * beams_per_ping * mem_per_beam, 1)
+    chunk_multiple = max(min(int(mem_per_worker // base_chunk_memory), max_chunk_multiple), 1)
+    if total_pings is not None:
+        # leave enough chunks that every worker thread gets one
+        total_base_chunks = int(np.ceil(total_pings / base_chunk_size))
+        chunk_multiple = max(min(chunk_multiple, total_base_chunks // (nworker * threads_per_worker)), 1)
+    pings_per_chunk = base_chunk_size * chunk_multiple
+    chunks_per_worker = max(min(int(mem_per_worker // (base_chunk_memory * chunk_multiple)), threads_per_worker), 1)
+    return int(pings_per_chunk), int(nworker * chunks_per_worker)
 
 
 def split_array_by_number_of_workers(client: Client, dataarray: DataArray, max_len: int = None):
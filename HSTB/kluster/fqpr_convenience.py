@@ -11,7 +11,8 @@ import laspy
 from pyproj import CRS, Transformer
 import json
 
-from HSTB.kluster.modules.backscatter import generate_avg_corrector, avg_correct
+from HSTB.kluster.modules.backscatter import generate_avg_corrector, avg_correct, compile_avg_corrector, return_avg_bins, \
+    avg_corrector_from_bins, distrib_accumulate_avg_bins
 from HSTB.kluster.fqpr_drivers import return_xyz_from_multibeam
 from HSTB.kluster.xarray_conversion import BatchRead
 from HSTB.kluster.fqpr_generation import Fqpr
@@ -20,6 +21,7 @@ from HSTB.kluster.dask_helpers import dask_find_or_start_client
 from HSTB.kluster.logging_conf import return_log_name
 from HSTB.kluster.dms import return_zone_from_min_max_long
 from HSTB.kluster import kluster_variables
+from HSTB.kluster.surface_cache import SurfaceRenderCache, return_tile_bounds, return_changed_tile_bounds
 
 from bathygrid.convenience import create_grid, load_grid, BathyGrid
 from bathycube.numba_cube import compile_now
@@ -94,7 +96,8 @@ def perform_all_processing(filname: Union[str, list], navfiles: list = None, inp
 
 
 def convert_multibeam(filname: Union[str, list], input_datum: Union[str, int] = None, outfold: str = None,
-                      client: Client = None, skip_dask: bool = False, show_progress: bool = True, parallel_write: bool = True):
+                      client: Client = None, skip_dask: bool = False, show_progress: bool = True, parallel_write: bool = True,
+                      streaming: bool = False):
     """
     Use fqpr_generation to process multibeam data on the local cluster and generate a new Fqpr instance saved to the
     provided output folder.
@@ -121,6 +124,9 @@ def convert_multibeam(filname: Union[str, list], input_datum: Union[str, int] =
         If true, uses dask.distributed.progress.  Disabled for GUI, as it generates too much text
     parallel_write
         if True, will write in parallel to disk.  Disable for permissions issues troubleshooting.
+    streaming
+        if True, will convert all files with a single streaming BatchRead (see BatchRead.batch_read_streaming), writing
+        full chunks to disk as each window of files is read and carrying the remainder into the next window
 
     Returns
     -------
@@ -129,10 +135,13 @@ def convert_multibeam(filname: Union[str, list], input_datum: Union[str, int] =
     """
 
     fqpr_inst = None
-    mfiles = return_files_from_path(filname, in_chunks=True)
+    if streaming:
+        mfiles = [mf for mf in [return_files_from_path(filname, in_chunks=False)] if mf]
+    else:
+        mfiles = return_files_from_path(filname, in_chunks=True)
     for filchunk in mfiles:
         mbes_read = BatchRead(filchunk, dest=outfold, client=client, skip_dask=skip_dask, show_progress=show_progress,
-                              parallel_write=parallel_write)
+                              parallel_write=parallel_write, streaming=streaming)
         fqpr_inst = Fqpr(mbes_read, show_progress=show_progress, parallel_write=parallel_write)
         fqpr_inst.read_from_source(build_offsets=False, skip_dask=skip_dask)
         outfold = fqpr_inst.multibeam.output_folder
@@ -285,7 +294,8 @@ def process_multibeam(fqpr_inst: Fqpr, run_orientation: bool = True, orientation
                       add_cast_files: Union[str, list] = None, input_datum: Union[str, int] = None,
                       use_epsg: bool = False, use_coord: bool = True, epsg: int = None, coord_system: str = 'WGS84',
                       vert_ref: str = 'waterline', vdatum_directory: str = None, cast_selection_method: str = 'nearest_in_time',
-                      only_this_line: str = None, only_these_times: tuple = None):
+                      only_this_line: str = None, only_these_times: tuple = None, fused: bool = False,
+                      fused_output_variables: list = None, incremental: bool = False):
     """
     Use fqpr_generation to process already converted data on the local cluster and generate sound velocity corrected,
     georeferenced soundings in the same data store as the converted data.
@@ -336,6 +346,16 @@ def process_multibeam(fqpr_inst: Fqpr, run_orientation: bool = True, orientation
         only process this line, subset the full dataset by the min time and maximum time of the line name provided.  ex: 0000_testline.all
     only_these_times
         only process this time region, expects this to be a tuple, (minimum time in UTC seconds, maximum time in UTC seconds)
+    fused
+        if True, will run orientation through georeference (and tpu if run_tpu) in a single pass on each chunk, see
+        Fqpr.process_fused.  Only used if all of orientation, beam vectors, sound velocity and georeference are run.
+    fused_output_variables
+        only used with fused=True, the variables to write to disk, ex: ['x', 'y', 'z', 'tvu', 'thu'].  If None, will
+        write all the variables that the processes generate.
+    incremental
+        if True and processing starts at sound velocity or georeferencing, only reprocess the pings whose inputs
+        (cast, navigation, installation parameters, vertical reference, coordinate system) changed since they were last
+        processed, see Fqpr.return_changed_time_ranges.  Ignored if only_this_line/only_these_times are provided.
 
     Returns
     -------
@@ -361,6 +381,20 @@ def process_multibeam(fqpr_inst: Fqpr, run_orientation: bool = True, orientation
         subset_time = [minimum_time, maximum_time]
 
     fqpr_inst.construct_crs(epsg=epsg, datum=coord_system, projected=True, vert_ref=vert_ref)
+    if incremental and subset_time is None and not add_cast_files and not run_orientation and not run_beam_vec and (run_svcorr or run_georef):
+        changed_ranges = fqpr_inst.return_changed_time_ranges(['sv_corr', 'georef'] if run_svcorr else ['georef'],
+                                                              cast_selection_method=cast_selection_method)
+        if changed_ranges:
+            subset_time = changed_ranges
+        else:  # the processing status says we need to process, but nothing changed, process everything to be safe
+            fqpr_inst.logger.info('process_multibeam: no changed inputs found, processing the full dataset')
+    if fused:
+        if run_orientation and run_beam_vec and run_svcorr and run_georef:
+            fqpr_inst.process_fused(subset_time=subset_time, add_cast_files=add_cast_files, cast_selection_method=cast_selection_method,
+                                    vdatum_directory=vdatum_directory, run_tpu=run_tpu, output_variables=fused_output_variables,
+                                    initial_interp=orientation_initial_interpolation)
+            return fqpr_inst
+        print('process_multibeam: fused processing requires running orientation through georeference, running each process separately')
     if run_orientation:
         fqpr_inst.get_orientation_vectors(initial_interp=orientation_initial_interpolation, subset_time=subset_time)
     if run_beam_vec:
@@ -499,20 +533,21 @@ def _add_points_to_mosaic(fqpr_inst: Fqpr, bgrid: BathyGrid, fqpr_crs: int, fqpr
         print(f'ERROR: this imported data {cont_name} has an EPSG of {fqpr_crs}, where the grid has an EPSG of {bgrid.epsg}')
         return
 
+    # compile the avg table once, each line is then a single lookup into the dense table
+    avg_lookup = compile_avg_corrector(avg_table) if avg_table is not None else None
     print()
     for mfile in multibeamfiles:
-        linedata = fqpr_inst.subset_variables_by_line(['x', 'y', 'corr_pointing_angle', 'backscatter'], line_names=mfile, filter_by_detection=True)
-        rp = linedata[mfile]
-        # drop nan values in georeferenced data, generally where number of beams vary between pings
-        data = rp.where(~np.isnan(rp['x']), drop=True)
-        if avg_table is not None:
-            acorr = avg_correct(np.rad2deg(data['corr_pointing_angle']), avg_table)
-        else:
-            acorr = 0.0
-        data = data.drop_vars('corr_pointing_angle')
+        points = fqpr_inst.subset.return_points_by_line(mfile, ('x', 'y', 'backscatter', 'corr_pointing_angle'))
+        if points is None or 'backscatter' not in points.dtype.names:
+            continue
+        points = points[~np.isnan(points['backscatter'])]
         # bathygrid is looking for a 'z' variable.
-        data = data.rename_vars({'backscatter': 'z'})
-        data['z'] = data['z'] - acorr
+        data = np.empty(points.size, dtype=[('x', np.float64), ('y', np.float64), ('z', np.float32)])
+        data['x'] = points['x']
+        data['y'] = points['y']
+        data['z'] = points['backscatter']
+        if avg_lookup is not None:
+            data['z'] -= avg_correct(np.rad2deg(points['corr_pointing_angle']), avg_lookup)
         if data['z'].any():
             try:
                 bgrid.add_points(data, '{}__{}'.format(cont_name, mfile), [mfile], fqpr_crs, fqpr_vertref, min_time=min_time, max_time=max_time)
@@ -586,11 +621,10 @@ def _add_points_to_surface(fqpr_inst: Union[dict, Fqpr], bgrid: BathyGrid, fqpr_
             multibeamfiles = [mfile for mfile in multibeamfiles if mfile in add_lines]
         print()
         for mfile in multibeamfiles:
-            linedata = fqpr_inst.subset_variables_by_line(['x', 'y', 'z', 'tvu', 'thu'], line_names=mfile, filter_by_detection=True)
-            rp = linedata[mfile]
-            # drop nan values in georeferenced data, generally where number of beams vary between pings
-            data = rp.where(~np.isnan(rp['z']), drop=True)
-            if data['z'].any():
+            # streams the ping chunks of the line, dropping nan values (generally where number of beams vary between
+            #  pings) and rejected soundings as each chunk is loaded
+            data = fqpr_inst.subset.return_points_by_line(mfile, ('x', 'y', 'z', 'tvu', 'thu'), filter_by_detection=True)
+            if data is not None and data['z'].any():
                 try:
                     bgrid.add_points(data, '{}__{}'.format(cont_name, mfile), [mfile], fqpr_crs, fqpr_vertref, min_time=min_time,
                                      max_time=max_time)
@@ -632,6 +666,32 @@ def _remove_points_from_surface(fqpr_inst: Union[Fqpr, str], bgrid: BathyGrid, r
         bgrid.remove_points(remove_cont)
 
 
+def _return_lines_to_update(fqpr_inst: Fqpr, bgrid: BathyGrid):
+    """
+    Find the lines of this FQPR instance in the grid whose soundings have changed since they were added to the grid.
+    Uses the sounding change records (see Fqpr.return_changed_lines) compared to the timestamp of each line container
+    in the grid.  For datasets without change records, all lines in the grid are returned if the last operation on the
+    FQPR instance is after the line was added.
+    """
+
+    cont_name = os.path.split(fqpr_inst.output_folder)[1]
+    added_times = {}
+    for existing_cont, tstmp in bgrid.container_timestamp.items():
+        try:
+            existname, linename = existing_cont.split('__')
+        except ValueError:  # grids created prior to 0.9.5 have container_chunkindex naming, now we just do container__linename
+            continue
+        if existname == cont_name:
+            added_times[linename] = datetime.strptime(tstmp, '%Y%m%d_%H%M%S')
+    if not added_times:
+        return []
+    changed_lines = fqpr_inst.return_changed_lines(added_times, line_names=list(added_times.keys()))
+    if changed_lines is None:
+        last_time = fqpr_inst.last_operation_date
+        changed_lines = [linename for linename, added_time in added_times.items() if last_time and last_time > added_time]
+    return changed_lines
+
+
 def _get_unique_crs_vertref(fqpr_instances: list):
     """
     Pull the CRS and vertical reference from each FQPR instance, check to make sure there aren't differences.  We cant
@@ -836,8 +896,59 @@ def _validate_fqpr_for_mosaic(fqpr_instances: list):
             raise ValueError(f'_validate_fqpr_for_mosaic: {f.output_folder} - could not find "backscatter" variable, have you processed backscatter?')
 
 
+def _return_avg_bins_all_lines(fqpr_inst: list, bins: np.ndarray, weight_by_line: bool = False):
+    """
+    Accumulate the backscatter sums and counts in each angle bin across all lines and all heads in the provided fqpr
+    instances.  Each line is split into ping chunks (see FqprSubset.return_ping_chunks) that are binned on the cluster,
+    so only the binned totals are ever brought back to the client.
+
+    Parameters
+    ----------
+    fqpr_inst
+        list of instances of fqpr_generation.Fqpr class that contains generated backscatter data
+    bins
+        bin edges in degrees, see backscatter.return_avg_bins
+    weight_by_line
+        if True, each line contributes its mean value in each bin equally, so that long lines do not dominate the
+        corrector.  if False, each sounding contributes equally.
+
+    Returns
+    -------
+    np.ndarray
+        sum of the backscatter values in each bin
+    np.ndarray
+        number of backscatter values in each bin (number of lines in each bin if weight_by_line)
+    """
+
+    sums = np.zeros(len(bins) - 1, dtype=np.float64)
+    counts = np.zeros(len(bins) - 1, dtype=np.int64)
+    for fq in fqpr_inst:
+        for mline, (linestart, lineend) in fq.return_line_dict().items():
+            chunks = fq.subset.return_ping_chunks(['backscatter', 'corr_pointing_angle'], linestart, lineend)
+            data_for_workers = [[chnk.backscatter, chnk.corr_pointing_angle, bins] for chnk in chunks
+                                if 'backscatter' in chnk and 'corr_pointing_angle' in chnk]
+            if not data_for_workers:
+                continue
+            try:
+                futs = fq.client.map(distrib_accumulate_avg_bins, data_for_workers)
+                results = fq.client.gather(futs)
+            except:  # client is not setup, run locally
+                results = [distrib_accumulate_avg_bins(dat) for dat in data_for_workers]
+            line_sums = np.sum([r[0] for r in results], axis=0)
+            line_counts = np.sum([r[1] for r in results], axis=0)
+            if weight_by_line:
+                hasdata = line_counts > 0
+                sums[hasdata] += line_sums[hasdata] / line_counts[hasdata]
+                counts[hasdata] += 1
+            else:
+                sums += line_sums
+                counts += line_counts
+    return sums, counts
+
+
 def return_avg_tables(fqpr_inst: list = None, avg_bin_size: float = 1.0, avg_angle: float = 45.0,
-                      avg_line: str = None, overwrite_existing_avg: bool = True):
+                      avg_line: str = None, overwrite_existing_avg: bool = True, avg_all_lines: bool = False,
+                      avg_weight_by_line: bool = False):
     """
     Helper function for building the angle varying gain tables used during backscatter processing.  This function is
     also wrapped into generate_new_mosaic, so you will most likely use it there.
@@ -859,6 +970,11 @@ def return_avg_tables(fqpr_inst: list = None, avg_bin_size: float = 1.0, avg_ang
         line in the first dataset
     overwrite_existing_avg
         if True, will overwrite the existing avg table with a new one.  if False, will use the existing avg table.
+    avg_all_lines
+        if True, will build the avg table from all lines and heads in all of the provided datasets, ignoring avg_line.
+        The data is binned chunk by chunk, so the full survey is never loaded in memory.
+    avg_weight_by_line
+        if avg_all_lines, set to True to give each line equal weight in the avg table, instead of each sounding
 
     Returns
     -------
@@ -874,6 +990,16 @@ def return_avg_tables(fqpr_inst: list = None, avg_bin_size: float = 1.0, avg_ang
                 avg_tables.append({float(k): float(v) for k, v in fqtbl.items()})
             except:
                 raise ValueError(f'_avgcorrect_fqprs: using existing avg tables, but unable to find avg table in FQPR {fq.output_folder}')
+    elif avg_all_lines:
+        print('Using all lines to determine AVG corrector...')
+        bins = return_avg_bins(avg_bin_size)
+        sums, counts = _return_avg_bins_all_lines(fqpr_inst, bins, avg_weight_by_line)
+        if not counts.any():
+            raise ValueError('_avgcorrect_fqprs: unable to find any processed backscatter in the provided fqpr instances')
+        avgtbl = avg_corrector_from_bins(sums, counts, bins, avg_angle)
+        for fq in fqpr_inst:
+            fq.write_attribute_to_ping_records({'avg_table': json.dumps(avgtbl)})
+            avg_tables.append({float(k): float(v) for k, v in avgtbl.items()})
     else:
         if avg_line:
             print(f'Using line {avg_line} to determine AVG corrector...')
@@ -904,7 +1030,8 @@ def return_avg_tables(fqpr_inst: list = None, avg_bin_size: float = 1.0, avg_ang
 def generate_new_mosaic(fqpr_inst: Union[Fqpr, list] = None, tile_size: float = 1024.0, gridding_algorithm: str = 'mean',
                         resolution: float = 8.0, process_backscatter: bool = True, create_mosaic: bool = True,
                         angle_varying_gain: bool = True, avg_angle: float = 45.0, avg_line: str = None, avg_bin_size: float = 1.0,
-                        overwrite_existing_avg: bool = True, process_backscatter_fixed_gain_corrected: bool = True,
+                        overwrite_existing_avg: bool = True, avg_all_lines: bool = False, avg_weight_by_line: bool = False,
+                        process_backscatter_fixed_gain_corrected: bool = True,
                         process_backscatter_tvg_corrected: bool = True, process_backscatter_transmission_loss_corrected: bool = True,
                         process_backscatter_area_corrected: bool = True, use_dask: bool = False, output_path: str = None,
                         export_path: str = None, export_format: str = 'geotiff', export_resolution: float = None,
@@ -957,6 +1084,10 @@ def generate_new_mosaic(fqpr_inst: Union[Fqpr, list] = None, tile_size: float =
     overwrite_existing_avg
         if True, will overwrite the existing avg table with a new one, if angle_varying_gain is True.  if False, will
         use the existing avg table.
+    avg_all_lines
+        if angle_varying_gain, set to True to build the avg table from all lines in all datasets, ignoring avg_line
+    avg_weight_by_line
+        if avg_all_lines, set to True to give each line equal weight in the avg table, instead of each sounding
     process_backscatter_fixed_gain_corrected
         if True and process_backscatter is True, will remove fixed gain from the raw reflectivity during backscatter processing,
         default is True and should probably be left so except for research purposes.
@@ -1007,7 +1138,8 @@ def generate_new_mosaic(fqpr_inst: Union[Fqpr, list] = None, tile_size: float =
                                        transmission_loss_corrected=process_backscatter_transmission_loss_corrected, area_corrected=process_backscatter_area_corrected)
         if angle_varying_gain:
             print('Building AVG tables...')
-            avgtables = return_avg_tables(fqpr_inst, avg_bin_size, avg_angle, avg_line, overwrite_existing_avg)
+            avgtables = return_avg_tables(fqpr_inst, avg_bin_size, avg_angle, avg_line, overwrite_existing_avg,
+                                          avg_all_lines, avg_weight_by_line)
 
         if create_mosaic:
             _validate_fqpr_for_mosaic(fqpr_inst)
@@ -1045,7 +1177,7 @@ def generate_new_mosaic(fqpr_inst: Union[Fqpr, list] = None, tile_size: float =
 
 def update_surface(surface_instance: Union[str, BathyGrid], add_fqpr: Union[Fqpr, list] = None, add_lines: list = None,
                    remove_fqpr: Union[Fqpr, list, str] = None, remove_lines: list = None, regrid: bool = True,
-                   regrid_option: str = 'update', use_dask: bool = False):
+                   regrid_option: str = 'update', use_dask: bool = False, update_fqpr: Union[Fqpr, list] = None):
     """
     Bathygrid instances can be updated with new points from new converted multibeam data, or have points removed from
     old multibeam data.  If you want to update the surface for changes in the multibeam data, provide the same FQPR instance
@@ -1075,6 +1207,10 @@ def update_surface(surface_instance: Union[str, BathyGrid], add_fqpr: Union[Fqpr
         regrid the entire grid.  Update mode will only update those tiles that have a point_count_changed=True
     use_dask
         if True, will start a dask LocalCluster instance and perform the gridding in parallel
+    update_fqpr
+        Either a list of Fqpr instances or a single Fqpr instance that are already in the surface.  Only the lines with
+        soundings that changed (cleaning, reprocessing) since they were added to the surface are removed and added back,
+        see Fqpr.return_changed_lines.  With regrid_option='update', only the tiles with those soundings are regridded.
 
     Returns
     -------
@@ -1103,6 +1239,7 @@ def update_surface(surface_instance: Union[str, BathyGrid], add_fqpr: Union[Fqpr
 
     oldrez = surface_instance.resolutions
     newrez = None
+    old_tile_bounds = return_tile_bounds(surface_instance)
     if remove_fqpr:
         if not isinstance(remove_fqpr, list):
             remove_fqpr = [remove_fqpr]
@@ -1148,6 +1285,27 @@ def update_surface(surface_instance: Union[str, BathyGrid], add_fqpr: Union[Fqpr
             else:
                 _add_points_to_surface(afqpr, surface_instance, unique_crs[0], unique_vertref[0])
 
+    if update_fqpr:
+        if not isinstance(update_fqpr, list):
+            update_fqpr = [update_fqpr]
+        _validate_fqpr_for_gridding(update_fqpr)
+        unique_crs, unique_vertref = _get_unique_crs_vertref(update_fqpr)
+        for ufqpr in update_fqpr:
+            update_lines = _return_lines_to_update(ufqpr, surface_instance)
+            if update_lines:
+                print(f'update_surface - update: {os.path.split(ufqpr.output_folder)[1]} has changed soundings in {len(update_lines)} lines')
+                _remove_points_from_surface(ufqpr, surface_instance, remove_lines=update_lines)
+                _add_points_to_surface(ufqpr, surface_instance, unique_crs[0], unique_vertref[0], add_lines=update_lines)
+
+    # drop the rendered display chunks of the changed tiles, the 2d view renders them again on the next draw
+    render_cache = SurfaceRenderCache(surface_instance.output_folder)
+    if os.path.exists(render_cache.index_file) and render_cache.writable:
+        if regrid and regrid_option == 'full':
+            render_cache.invalidate()
+        else:
+            render_cache.invalidate(return_changed_tile_bounds(old_tile_bounds, return_tile_bounds(surface_instance)))
+        render_cache.save()
+
     if regrid:
         if isinstance(surface_instance.grid_resolution, str):
             if surface_instance.name[:2].lower() == 'sr':
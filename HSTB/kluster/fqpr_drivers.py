@@ -9,6 +9,7 @@ import os
 import numpy as np
 
 from HSTB.kluster import kluster_variables
+from HSTB.kluster.mmap_reader import load_sidecar, save_sidecar, return_ping_start_end_time, ping_datagram_types
 from HSTB.drivers import kmall, par3, sbet, svp, PCSio, prr3, raw
 
 # these translators are used to figure out the numbering in the installation parametes for each sonar
@@ -85,6 +86,15 @@ def fast_read_multibeam_metadata(multibeam_file: str, gather_times: bool = True,
 
     _check_multibeam_file(multibeam_file)
     fileext = os.path.splitext(multibeam_file)[1]
+    # file level metadata is saved in the sidecar index file, only valid if the file has not changed since
+    dgram_index, cached = load_sidecar(multibeam_file)
+    if 'start_end' not in cached and dgram_index is not None and fileext in ping_datagram_types:
+        index_start_end = return_ping_start_end_time(dgram_index, fileext)
+        if index_start_end is not None:
+            cached['start_end'] = index_start_end
+    if 'mtype' in cached and (not gather_times or 'start_end' in cached) and (not gather_serialnumber or 'serialnums' in cached):
+        return cached['mtype'], cached['start_end'] if gather_times else None, cached['serialnums'] if gather_serialnumber else None
+
     if fileext == '.all':
         mtype = 'kongsberg_all'
         aread = par3.AllRead(multibeam_file)
@@ -136,6 +146,12 @@ def fast_read_multibeam_metadata(multibeam_file: str, gather_times: bool = True,
         rawread.close()
     else:
         raise NotImplementedError('fqpr_drivers: {} is supported by kluster, but not currently supported by fast_read_multibeam_metadata'.format(multibeam_file))
+    metadata = {'mtype': mtype}
+    if start_end is not None:
+        metadata['start_end'] = [float(t) for t in start_end]
+    if serialnums is not None:
+        metadata['serialnums'] = [sn.item() if isinstance(sn, np.generic) else sn for sn in serialnums]
+    save_sidecar(multibeam_file, metadata=metadata)
     return mtype, start_end, serialnums
 
 
@@ -8,9 +8,11 @@ import numpy as np
 import json
 import logging
 from copy import deepcopy
+from collections import deque
 from dask.distributed import wait, progress
 from pyproj import CRS, Transformer
 import traceback
+import operator
 
 from HSTB.kluster.modules.orientation import distrib_run_build_orientation_vectors
 from HSTB.kluster.modules.beampointingvector import distrib_run_build_beam_pointing_vector
@@ -21,15 +23,21 @@ from HSTB.kluster.modules.georeference import distrib_run_georeference, vertical
 from HSTB.kluster.modules.tpu import distrib_run_calculate_tpu
 from HSTB.kluster.modules.filter import FilterManager
 from HSTB.kluster.modules.backscatter import distrib_run_process_backscatter, return_backscatter_settings
+from HSTB.kluster.modules.fused import distrib_run_fused_processing, return_fused_output_variables
 from HSTB.kluster.xarray_conversion import BatchRead
 from HSTB.kluster.fqpr_vessel import trim_xyzrprh_to_times
 from HSTB.kluster.modules.visualizations import FqprVisualizations
 from HSTB.kluster.modules.export import FqprExport
 from HSTB.kluster.modules.subset import FqprSubset
+from HSTB.kluster.modules.edit_journal import SoundingEditJournal
+from HSTB.kluster.modules.spatial_index import SpatialIndex, return_spatial_index_path, merge_time_ranges
+from HSTB.kluster.modules.provenance import return_xyzrph_identifier, return_navigation_identifier, merge_provenance_records, \
+    return_record_index, return_time_ranges_from_mask, return_changed_lines
 from HSTB.kluster.xarray_helpers import combine_arrays_to_dataset, compare_and_find_gaps, \
     interp_across_chunks, slice_xarray_by_dim, get_beamwise_interpolation, fix_xarray_dataset_index
 from HSTB.kluster.backends._zarr import ZarrBackend
-from HSTB.kluster.dask_helpers import dask_find_or_start_client, get_number_of_workers
+from HSTB.kluster.dask_helpers import dask_find_or_start_client, get_number_of_workers, determine_optimal_chunks, \
+    measure_peak_memory, return_memory_profile, update_memory_profile, return_memory_profile_path
 from HSTB.kluster.fqpr_helpers import build_crs, seconds_to_formatted_string, print_progress_bar
 from HSTB.kluster.rotations import return_attitude_rotation_matrix
 from HSTB.kluster.logging_conf import return_logger
@@ -112,6 +120,7 @@ class Fqpr(ZarrBackend):
         self.tpu_time_complete = ''
         self.backscatter_time_complete = ''
         self.bscatter_settings = ''
+        self.fused_settings = None
 
         # plotting module
         self.plot = FqprVisualizations(self)
@@ -121,6 +130,8 @@ class Fqpr(ZarrBackend):
         self.subset = FqprSubset(self)
         # filter module
         self.filter = FilterManager(self)
+        # sounding flag edits from Points View cleaning, see set_variable_by_filter
+        self.edit_journal = SoundingEditJournal(self)
 
         self.debug = debug
         self.initialize_log()
@@ -563,6 +574,45 @@ class Fqpr(ZarrBackend):
         else:
             return None
 
+    def build_line_extents(self):
+        """
+        Lines converted before Kluster 1.1.8 do not have the min/max latitude/longitude of the line navigation in the
+        line attributes.  Read the navigation of each of those lines once and write the extents to the line attributes,
+        so that they are only built the first time.  Lines from before Kluster 0.8.3 (only the start/end times) get all
+        of the line attributes built, see BatchRead.build_additional_line_metadata.
+
+        Returns
+        -------
+        list
+            list of the names of the lines that were updated
+        """
+
+        original_lengths = {linename: len(lineattrs) for linename, lineattrs in self.multibeam.raw_ping[0].multibeam_files.items()}
+        if any([attrlength < 8 for attrlength in original_lengths.values()]):
+            self.multibeam.build_additional_line_metadata()
+        mfiles = deepcopy(self.multibeam.raw_ping[0].multibeam_files)
+        updated = []
+        for linename, lineattrs in mfiles.items():
+            if len(lineattrs) == 8:
+                line_nav = self.multibeam.return_raw_navigation(start_time=lineattrs[0], end_time=lineattrs[1])
+                if line_nav is None or not line_nav.time.size:
+                    self.print(f'build_line_extents: unable to read the navigation for {linename}', logging.WARNING)
+                    continue
+                line_lat, line_lon = line_nav.latitude.values, line_nav.longitude.values
+                lineattrs += [float(np.nanmin(line_lat)), float(np.nanmax(line_lat)), float(np.nanmin(line_lon)),
+                              float(np.nanmax(line_lon))]
+            if len(lineattrs) >= 12 and original_lengths[linename] < 12:
+                updated.append(linename)
+        if updated:
+            self.print(f'build_line_extents: built the line extents for {len(updated)} line(s)', logging.INFO)
+            try:
+                self.write_attribute_to_ping_records({'multibeam_files': mfiles})
+            except Exception as e:  # read only data, the extents are only kept in memory
+                self.print(f'build_line_extents: unable to save the line extents: {e}', logging.WARNING)
+                for rp in self.multibeam.raw_ping:
+                    rp.attrs['multibeam_files'] = deepcopy(mfiles)
+        return updated
+
     def return_next_unprocessed_line(self):
         """
         Return the next unprocessed line in this container, see line_is_processed
@@ -588,6 +638,8 @@ class Fqpr(ZarrBackend):
         """
         Must forcibly close the logging handlers to allow the data written to disk to be moved or deleted.
         """
+        if self.multibeam is not None:
+            self.edit_journal.flush()  # save any pending cleaning edits
         if self.client is not None and close_dask:
             if self.client.status in ("running", "connecting"):
                 self.client.close()
@@ -1126,6 +1178,43 @@ class Fqpr(ZarrBackend):
             self.print('nearest-in-distance-four-hours: selecting nearest cast for each {} pings...'.format(kluster_variables.ping_chunk_size), logging.INFO)
         return data
 
+    def _return_cast_chunks(self, idx_by_chunk: list, cast_selection_method: str, silent: bool = False):
+        """
+        Select the cast for each chunk using the provided cast selection method.  Defaults to nearest_in_time if the
+        method is not recognized.
+
+        Parameters
+        ----------
+        idx_by_chunk
+            list of xarray Datarrays, values are the integer indexes of the pings to use, coords are the time of ping
+        cast_selection_method
+            the method used to select the cast that goes with each chunk of the dataset, one of ['nearest_in_time',
+            'nearest_in_time_four_hours', 'nearest_in_distance', 'nearest_in_distance_four_hours']
+        silent
+            if True, will not print out messages
+
+        Returns
+        -------
+        list
+            list of lists, each sub-list is [xarray Datarray with times/indices for the chunk, integer index of the cast that
+            applies to that chunk]
+        """
+
+        if cast_selection_method == 'nearest_in_time':
+            cast_chunks = self.return_cast_idx_nearestintime(idx_by_chunk, silent=silent)
+        elif cast_selection_method == 'nearest_in_time_four_hours':
+            cast_chunks = self.return_cast_idx_nearestintime_fourhours(idx_by_chunk, silent=silent)
+        elif cast_selection_method == 'nearest_in_distance':
+            cast_chunks = self.return_cast_idx_nearestindistance(idx_by_chunk, silent=silent)
+        elif cast_selection_method == 'nearest_in_distance_four_hours':
+            cast_chunks = self.return_cast_idx_nearestindistance_fourhours(idx_by_chunk, silent=silent)
+        else:
+            msg = f'unexpected cast selection method "{cast_selection_method}", must be one of ' \
+                  f'{kluster_variables.cast_selection_methods} as of 0.9.6.  Defaulting to nearest_in_time.'
+            self.print(msg, logging.WARNING)
+            cast_chunks = self.return_cast_idx_nearestintime(idx_by_chunk, silent=silent)
+        return cast_chunks
+
     def return_runtime_idx_nearestintime(self, idx_by_chunk: list):
         """
         Find the runtime parameter that is nearest to each chunk in the provided chunk arrays
@@ -1175,7 +1264,7 @@ class Fqpr(ZarrBackend):
         for s_cnt, system in enumerate(systems):
             if system is None:  # get here if one of the heads is disabled (set to None)
                 continue
-            pings_per_chunk, max_chunks_at_a_time = self.get_cluster_params()
+            pings_per_chunk, max_chunks_at_a_time = self.get_cluster_params('sv_corr', self.multibeam.raw_ping[s_cnt])
             for applicable_index, timestmp, prefixes in system:
                 idx_by_chunk = self.return_chunk_indices(applicable_index, pings_per_chunk)
                 if method == 'nearest_in_time':
@@ -1392,13 +1481,28 @@ class Fqpr(ZarrBackend):
             addtl_offsets.append([x_offsets_by_beam, y_offsets_by_beam, z_offsets_by_beam])
         return addtl_offsets
 
-    def get_cluster_params(self):
+    def get_cluster_params(self, mode: str = None, rawping: xr.Dataset = None, dump_data: bool = True):
         """
-        Attempt to figure out what the chunk size and number of chunks at a time parameters should be given the dims
-        of the dataset.  It's pretty rough, definitely needs something more sophisticated, but this serves as a place
-        holder.
+        Figure out what the chunk size and number of chunks at a time parameters should be for the given process.
+
+        If the adaptive chunk planner is enabled (kluster_variables.adaptive_chunk_planner) and we have measured the
+        memory used by this process for this sonar model (see _submit_data_to_cluster), we use the memory per beam and the
+        memory/threads of each worker to size the chunks, see dask_helpers.determine_optimal_chunks.  Otherwise, we use
+        the zarr chunk size and one chunk per worker.
 
-        Basically uses the avg number of beams per ping and the worker memory size to get the chunk sizes (in time)
+        When the results are not written to disk (dump_data=False), the next process reads them from intermediate_dat
+        chunk for chunk, so every process must use the same chunks.  The chunk planner is not used in that case, all
+        processes get the zarr chunk size plan.
+
+        Parameters
+        ----------
+        mode
+            optional, one of ['orientation', 'bpv', 'sv_corr', 'georef', 'tpu', 'backscatter', 'fused'], the process
+            that we are chunking the data for
+        rawping
+            optional, xarray Dataset for the ping records that we are going to process
+        dump_data
+            if False, the results are kept in intermediate_dat for the next process, and the chunk planner is not used
 
         Returns
         -------
@@ -1411,20 +1515,20 @@ class Fqpr(ZarrBackend):
         if self.multibeam is None:
             self.print('Read from data first, multibeam is None', logging.ERROR)
             return
-        # This is the old way.  We would scale the chunksize on each run depending on the capabilities of the cluster.
-        # Unfortunately, it turns out you always want the written chunks to be of the same size, because you can't
-        # really change the zarr chunk size.  So instead, just return a constant that we made up that gets you near the
-        # desired 1MB per chunk that Zarr recommends.
-        #
-        #  We need to get an idea of how many beams there are in an average ping in this sector
-        # bpa = self.multibeam.select_array_from_rangeangle('beampointingangle', sector_identifier)
-        # try:
-        #     chk_indexes = int(len(bpa) / 10) * np.arange(10)
-        #     actual_beams_per_ping = int(np.count_nonzero(~np.isnan(bpa[chk_indexes]).values) / 10)
-        # except IndexError:
-        #     chk_indexes = np.array([0])
-        #     actual_beams_per_ping = int(np.count_nonzero(~np.isnan(bpa[chk_indexes]).values))
-        # pings_per_chunk, total_chunks = determine_optimal_chunks(self.client, actual_beams_per_ping)
+        # you always want the written chunks to be of the same size, because you can't really change the zarr chunk
+        # size.  So the chunk size is either the zarr chunk size that we made up to get near the desired 1MB per chunk
+        # that Zarr recommends, or a multiple of it from the chunk planner.
+        pingchunksize = self.multibeam.chunk_size[0]
+        if kluster_variables.adaptive_chunk_planner and dump_data and mode is not None and rawping is not None and self.client is not None:
+            mem_per_beam = return_memory_profile(rawping.attrs.get('sonartype', ''), mode, self._return_memory_profile_path())
+            if mem_per_beam:
+                try:
+                    pings_per_chunk, totchunks = determine_optimal_chunks(self.client, rawping.beam.size, mem_per_beam,
+                                                                          pingchunksize, total_pings=rawping.time.size)
+                    self.debug_print(f'get_cluster_params: {mode} using {pings_per_chunk} pings per chunk, {totchunks} chunks at a time', logging.INFO)
+                    return pings_per_chunk, totchunks
+                except (AttributeError, RuntimeError, KeyError, OSError):  # client is closed or not setup
+                    pass
         try:
             totchunks = get_number_of_workers(self.client)
         except (AttributeError, RuntimeError):
@@ -1432,7 +1536,6 @@ class Fqpr(ZarrBackend):
             # AttributeError, client is None, RuntimeError, client is closed
             totchunks = kluster_variables.default_number_of_chunks
         totchunks = totchunks * kluster_variables.sets_of_chunks_at_a_time
-        pingchunksize = self.multibeam.chunk_size[0]
         return pingchunksize, totchunks
 
     def _generate_chunks_orientation(self, ra: xr.Dataset, idx_by_chunk: list, timestmp: str, prefixes: str, silent: bool = False):
@@ -1499,7 +1602,8 @@ class Fqpr(ZarrBackend):
             data_for_workers.append([worker_att, worker_twtt, worker_delay, worker_tx_tstmp_idx, tx_orientation, rx_orientation, latency])
         return data_for_workers
 
-    def _generate_chunks_bpv(self, ra: xr.Dataset, idx_by_chunk: list, timestmp: str, run_index: int, silent: bool = False):
+    def _generate_chunks_bpv(self, ra: xr.Dataset, idx_by_chunk: list, timestmp: str, run_index: int, silent: bool = False,
+                             fused: bool = False):
         """
         Take a single system, and build the data for the distributed system to process.
         distrib_run_build_beam_pointing_vector requires the heading, beampointingangle, tx tiltangle, tx/rx orientation,
@@ -1517,6 +1621,8 @@ class Fqpr(ZarrBackend):
             the run counter that we are currently on, used in the in memory workflow to figure out which intermediate chunks of data to use
         silent
             if True, does not print out the log messages
+        fused
+            if True, the tx/rx vectors are left as None, to be populated on the worker by distrib_run_fused_processing
 
         Returns
         -------
@@ -1529,7 +1635,10 @@ class Fqpr(ZarrBackend):
 
         data_for_workers = []
         for cnt, chnk in enumerate(idx_by_chunk):
-            if 'orientation' in self.intermediate_dat[ra.system_identifier]:
+            if fused:
+                # workflow for fused processing, the orientation vectors are built on the worker
+                tx_rx_data = None
+            elif 'orientation' in self.intermediate_dat[ra.system_identifier]:
                 # workflow for data that is not written to disk.  Preference given for data in memory
                 intermediate_index = cnt + run_index
                 tx_rx_data = self.intermediate_dat[ra.system_identifier]['orientation'][timestmp][intermediate_index][0]
@@ -1557,7 +1666,8 @@ class Fqpr(ZarrBackend):
         return data_for_workers
 
     def _generate_chunks_svcorr(self, ra: xr.Dataset, cast_chunks: list, casts: list,
-                                prefixes: str, timestmp: str, addtl_offsets: list, run_index: int, silent: bool = False):
+                                prefixes: str, timestmp: str, addtl_offsets: list, run_index: int, silent: bool = False,
+                                fused: bool = False):
         """
         Take a single sector, and build the data for the distributed system to process.  Svcorrect requires the
         relative azimuth (to ship heading) and the corrected beam pointing angle (corrected for attitude/mounting angle)
@@ -1581,6 +1691,8 @@ class Fqpr(ZarrBackend):
             the run counter that we are currently on, used in the in memory workflow to figure out which intermediate chunks of data to use
         silent
             if True, does not print out the log messages
+        fused
+            if True, the beam pointing vectors are left as None, to be populated on the worker by distrib_run_fused_processing
 
         Returns
         -------
@@ -1613,7 +1725,10 @@ class Fqpr(ZarrBackend):
 
         for cnt, dat in enumerate(cast_chunks):
             intermediate_index = cnt + run_index
-            if 'bpv' in self.intermediate_dat[ra.system_identifier]:
+            if fused:
+                # workflow for fused processing, the beam pointing vectors are built on the worker
+                bpv_data = None
+            elif 'bpv' in self.intermediate_dat[ra.system_identifier]:
                 # workflow for data that is not written to disk.  Preference given for data in memory
                 bpv_data = self.intermediate_dat[ra.system_identifier]['bpv'][timestmp][intermediate_index][0]
                 try:  # drop the processing status record that is unnecessary
@@ -1631,7 +1746,7 @@ class Fqpr(ZarrBackend):
 
     def _generate_chunks_georef(self, ra: xr.Dataset, idx_by_chunk: xr.DataArray,
                                 prefixes: str, timestmp: str, z_offset: float, prefer_pp_nav: bool,
-                                vdatum_directory: str, run_index: int, silent: bool = False):
+                                vdatum_directory: str, run_index: int, silent: bool = False, fused: bool = False):
         """
         Take a single sector, and build the data for the distributed system to process.  Georeference requires the
         sv_corrected acrosstrack/alongtrack/depthoffsets, as well as navigation, heading, heave and the quality
@@ -1657,6 +1772,9 @@ class Fqpr(ZarrBackend):
             the run counter that we are currently on, used in the in memory workflow to figure out which intermediate chunks of data to use
         silent
             if True, does not print out the log messages
+        fused
+            if True, the sound velocity corrected offsets are left as None, to be populated on the worker by
+            distrib_run_fused_processing
 
         Returns
         -------
@@ -1731,7 +1849,10 @@ class Fqpr(ZarrBackend):
 
         for cnt, chnk in enumerate(idx_by_chunk):
             intermediate_index = cnt + run_index
-            if 'sv_corr' in self.intermediate_dat[ra.system_identifier]:
+            if fused:
+                # workflow for fused processing, the sound velocity corrected offsets are built on the worker
+                sv_data = None
+            elif 'sv_corr' in self.intermediate_dat[ra.system_identifier]:
                 # workflow for data that is not written to disk.  Preference given for data in memory
                 sv_data = self.intermediate_dat[ra.system_identifier]['sv_corr'][timestmp][intermediate_index][0]
                 try:  # drop the processing status record that is unnecessary
@@ -1780,7 +1901,8 @@ class Fqpr(ZarrBackend):
                                      input_datum, self.horizontal_crs, z_offset, vdatum_directory, fut_tide])
         return data_for_workers
 
-    def _generate_chunks_tpu(self, ra: xr.Dataset, idx_by_chunk: xr.DataArray, prefixes: str, timestmp: str, run_index: int, silent: bool = False):
+    def _generate_chunks_tpu(self, ra: xr.Dataset, idx_by_chunk: xr.DataArray, prefixes: str, timestmp: str, run_index: int, silent: bool = False,
+                             fused: bool = False):
         """
         Take a single sector, and build the data for the distributed system to process.  Georeference requires the
         sv_corrected acrosstrack/alongtrack/depthoffsets, as well as navigation, heading, heave and the quality
@@ -1800,6 +1922,9 @@ class Fqpr(ZarrBackend):
             the run counter that we are currently on, used in the in memory workflow to figure out which intermediate chunks of data to use
         silent
             if True, does not print out the log messages
+        fused
+            if True, the corrected beam angles, sound velocity corrected offsets and datum uncertainty are left as None,
+            to be populated on the worker by distrib_run_fused_processing
 
         Returns
         -------
@@ -1851,15 +1976,18 @@ class Fqpr(ZarrBackend):
                 # if reversed, we have to reverse the raw angles to match the already reversed corr angles
                 #  also load the numpy array, as leaving it as an xarray seems to cause problems with xarray ops later
                 raw_point = raw_point[..., ::-1].values
-            if 'datum_uncertainty' in ra and self.vert_ref not in ['waterline', 'ellipse']:
+            if 'datum_uncertainty' in ra and self.vert_ref not in ['waterline', 'ellipse'] and not fused:
                 datum_unc = ra.datum_uncertainty[chnk.values]
             else:
                 datum_unc = None
             try:
-                fut_corr_point = self.client.scatter(ra.corr_pointing_angle[chnk.values])
+                if fused:  # these are built on the worker in the fused workflow
+                    fut_corr_point, fut_acrosstrack, fut_depthoffset = None, None, None
+                else:
+                    fut_corr_point = self.client.scatter(ra.corr_pointing_angle[chnk.values])
+                    fut_acrosstrack = self.client.scatter(ra.acrosstrack[chnk.values])
+                    fut_depthoffset = self.client.scatter(ra.depthoffset[chnk.values])
                 fut_raw_point = self.client.scatter(raw_point)
-                fut_acrosstrack = self.client.scatter(ra.acrosstrack[chnk.values])
-                fut_depthoffset = self.client.scatter(ra.depthoffset[chnk.values])
                 fut_soundspeed = self.client.scatter(ra.soundspeed[chnk.values])
                 fut_qualityfactor = self.client.scatter(ra.qualityfactor[chnk.values])
                 fut_datumuncertainty = self.client.scatter(datum_unc)
@@ -1884,10 +2012,13 @@ class Fqpr(ZarrBackend):
                     chnk = chnk.assign_coords({'time': chnk.time.time + latency})
                 fut_roll = self.client.scatter(roll.where(roll['time'] == chnk.time, drop=True).assign_coords({'time': chnk.time.time - latency}))
             except:  # client is not setup, run locally
-                fut_corr_point = ra.corr_pointing_angle[chnk.values]
+                if fused:  # these are built on the worker in the fused workflow
+                    fut_corr_point, fut_acrosstrack, fut_depthoffset = None, None, None
+                else:
+                    fut_corr_point = ra.corr_pointing_angle[chnk.values]
+                    fut_acrosstrack = ra.acrosstrack[chnk.values]
+                    fut_depthoffset = ra.depthoffset[chnk.values]
                 fut_raw_point = raw_point
-                fut_acrosstrack = ra.acrosstrack[chnk.values]
-                fut_depthoffset = ra.depthoffset[chnk.values]
                 fut_soundspeed = ra.soundspeed[chnk.values]
                 fut_qualityfactor = ra.qualityfactor[chnk.values]
                 fut_datumuncertainty = datum_unc
@@ -1998,6 +2129,67 @@ class Fqpr(ZarrBackend):
             data_for_workers.append(dchunk)
         return data_for_workers
 
+    def _generate_chunks_fused(self, ra: xr.Dataset, idx_by_chunk: list, cast_chunks: list, casts: list, prefixes: str,
+                               timestmp: str, addtl_offsets: list, z_offset: float, prefer_pp_nav: bool,
+                               vdatum_directory: str, fused_settings: dict, run_index: int, silent: bool = False):
+        """
+        Build out the chunks of data for submitting to the cluster for fused processing.  We build the data for each
+        process in the same way we would if running that process alone, leaving the data that relies on the previous
+        process empty.  distrib_run_fused_processing will then take each chunk through all processes on the worker.
+
+        Parameters
+        ----------
+        ra
+            xarray Dataset for the raw_ping instance selected for processing
+        idx_by_chunk
+            list of dataarrays, values are the integer indexes of the pings to use, coords are the time of ping
+        cast_chunks
+            list of lists, each sub-list is [xarray Datarray with times/indices for the chunk, integer index of the cast that
+            applies to that chunk]
+        casts
+            list of [depth values, sv values] for each cast
+        prefixes
+            prefix identifier for the tx/rx, will vary for dual head systems
+        timestmp
+            timestamp of the installation parameters instance used
+        addtl_offsets
+            [float, additional x offset, float, additional y offset, float, additional z offset]
+        z_offset
+            reference point to transmitter
+        prefer_pp_nav
+            if True will use post-processed navigation/height (SBET)
+        vdatum_directory
+            if 'NOAA MLLW' 'NOAA MHW' is the vertical reference, a path to the vdatum directory is required here
+        fused_settings
+            dict of settings for fused processing, {'run_tpu': bool, 'output_variables': list}
+        run_index
+            the run counter that we are currently on
+        silent
+            if True, does not print out the log messages
+
+        Returns
+        -------
+        list
+            list of lists, each list contains future objects for distrib_run_fused_processing, see process_fused
+        """
+
+        orientation_data = self._generate_chunks_orientation(ra, idx_by_chunk, timestmp, prefixes, silent=silent)
+        bpv_data = self._generate_chunks_bpv(ra, idx_by_chunk, timestmp, run_index, silent=silent, fused=True)
+        svcorr_data = self._generate_chunks_svcorr(ra, cast_chunks, casts, prefixes, timestmp, addtl_offsets, run_index,
+                                                   silent=silent, fused=True)
+        georef_data = self._generate_chunks_georef(ra, idx_by_chunk, prefixes, timestmp, z_offset, prefer_pp_nav,
+                                                   vdatum_directory, run_index, silent=silent, fused=True)
+        if fused_settings['run_tpu']:
+            tpu_data = self._generate_chunks_tpu(ra, idx_by_chunk, prefixes, timestmp, run_index, silent=silent, fused=True)
+        else:
+            tpu_data = [None] * len(idx_by_chunk)
+
+        data_for_workers = []
+        for cnt in range(len(idx_by_chunk)):
+            data_for_workers.append([orientation_data[cnt], bpv_data[cnt], svcorr_data[cnt], georef_data[cnt],
+                                     tpu_data[cnt], fused_settings['output_variables']])
+        return data_for_workers
+
     def initialize_intermediate_data(self, sec_ident: str, ky: str):
         """
         self.intermediate_dat is the storage for all the futures generated by the main processes
@@ -2156,6 +2348,27 @@ class Fqpr(ZarrBackend):
         """
 
         self._validate_subset_time(subset_time, dump_data)
+        self._validate_georef_settings()
+
+        # first check to see if there is any data in memory.  If so, we just assume that you have the data you need.
+        if self.intermediate_dat is not None:
+            for rawping in self.multibeam.raw_ping:
+                if 'sv_corr' in self.intermediate_dat[rawping.system_identifier]:
+                    return
+
+        required = ['alongtrack', 'acrosstrack', 'depthoffset']
+        for req in required:
+            if req not in list(self.multibeam.raw_ping[0].keys()):
+                err = 'georef_xyz: unable to find {}'.format(req)
+                err += ' in ping data {}.  You must run sv_correct first.'.format(
+                    self.multibeam.raw_ping[0].system_identifier)
+                self.print(err, logging.ERROR)
+                raise ValueError(err)
+
+    def _validate_georef_settings(self):
+        """
+        Validate the vertical reference and coordinate system settings required for georeferencing
+        """
 
         if self.vert_ref is None:
             self.print("georef_xyz: set_vertical_reference must be run before georef_xyz", logging.ERROR)
@@ -2175,26 +2388,39 @@ class Fqpr(ZarrBackend):
                 self.print('georef_xyz: {} provided but vyperdatum is not found'.format(self.vert_ref), logging.ERROR)
                 raise ValueError('georef_xyz: {} provided but vyperdatum is not found'.format(self.vert_ref))
 
-        # first check to see if there is any data in memory.  If so, we just assume that you have the data you need.
-        if self.intermediate_dat is not None:
-            for rawping in self.multibeam.raw_ping:
-                if 'sv_corr' in self.intermediate_dat[rawping.system_identifier]:
-                    return
+    def _validate_process_fused(self, subset_time: list, run_tpu: bool):
+        """
+        Validation routine for running process_fused.  Ensures you have all the data you need before kicking
+        off the process.  As fused processing runs from orientation on, we only need the converted data and the
+        georeference settings.
 
-        required = ['alongtrack', 'acrosstrack', 'depthoffset']
-        for req in required:
-            if req not in list(self.multibeam.raw_ping[0].keys()):
-                err = 'georef_xyz: unable to find {}'.format(req)
-                err += ' in ping data {}.  You must run sv_correct first.'.format(
-                    self.multibeam.raw_ping[0].system_identifier)
-                self.print(err, logging.ERROR)
-                raise ValueError(err)
+        Parameters
+        ----------
+        subset_time
+            List of unix timestamps in seconds, used as ranges for times that you want to process.
+        run_tpu
+            if True, tpu is included in the fused processing
+        """
 
-    def _overwrite_georef_stats(self):
+        self._validate_get_orientation_vectors(subset_time, True)
+        self._validate_georef_settings()
+        if run_tpu and 'qualityfactor' not in self.multibeam.raw_ping[0]:
+            self.print("process_fused: sonar uncertainty ('qualityfactor') must exist to calculate uncertainty", logging.ERROR)
+            raise ValueError("process_fused: sonar uncertainty ('qualityfactor') must exist to calculate uncertainty")
+
+    def _overwrite_georef_stats(self, subset_time: list = None):
         """
         Each georeference run (assuming it is not a subset operation) will overwrite the attributed georeference
         max min values.  Have to write to disk with write_attribute and also set the currently loaded instance. Otherwise
         we would have to do the costly reload_pingrecords for the inmemory ping record to match the disk copy.
+
+        The line geohashes and the spatial index are only rebuilt for the lines that were processed, i.e. the lines
+        within subset_time if it is provided.
+
+        Parameters
+        ----------
+        subset_time
+            List of unix timestamps in seconds, used as ranges for times that were processed
         """
 
         if not self.subset.is_subset:  # this is not a subset operation, overwrite the global min/max values
@@ -2205,8 +2431,13 @@ class Fqpr(ZarrBackend):
                 maxx = max([np.nanmax(rp.x) for rp in self.multibeam.raw_ping])
                 maxy = max([np.nanmax(rp.y) for rp in self.multibeam.raw_ping])
                 maxz = round(np.float64(max([np.nanmax(rp.z) for rp in self.multibeam.raw_ping])), 3)
-                geohash_by_line = self.subset_variables_by_line(['geohash'])
-                geohash_dict = {}
+                processed_lines = self._return_lines_in_subset_time(subset_time)
+                if processed_lines is None:  # no subset time, all lines were processed
+                    geohash_dict = {}
+                    geohash_by_line = self.subset_variables_by_line(['geohash'])
+                else:
+                    geohash_dict = deepcopy(self.multibeam.raw_ping[0].attrs.get('geohashes', {}))
+                    geohash_by_line = self.subset_variables_by_line(['geohash'], line_names=processed_lines) if processed_lines else {}
                 for mline, linedataset in geohash_by_line.items():
                     if linedataset is None:
                         geohash_dict[mline] = []
@@ -2214,6 +2445,59 @@ class Fqpr(ZarrBackend):
                         geohash_dict[mline] = [x.decode() for x in np.unique(linedataset.geohash).tolist()]
                 newattr = {'min_x': minx, 'min_y': miny, 'min_z': minz, 'max_x': maxx, 'max_y': maxy, 'max_z': maxz, 'geohashes': geohash_dict}
                 self.write_attribute_to_ping_records(newattr)
+                self._update_spatial_index(geohash_by_line, rebuild=processed_lines is None)
+
+    def _return_lines_in_subset_time(self, subset_time: list = None):
+        """
+        Return the names of the lines that overlap the provided subset_time ranges
+
+        Parameters
+        ----------
+        subset_time
+            List of unix timestamps in seconds, used as ranges for times that you want to process.
+
+        Returns
+        -------
+        list
+            list of line names within the subset_time ranges, None if subset_time is not provided
+        """
+
+        if subset_time is None:
+            return None
+        if not isinstance(subset_time[0], list):
+            subset_time = [subset_time]
+        processed_lines = []
+        for mline, (linestart, lineend) in self.return_line_dict().items():
+            if any([linestart <= subtime[1] and lineend >= subtime[0] for subtime in subset_time]):
+                processed_lines.append(mline)
+        return processed_lines
+
+    def _update_spatial_index(self, geohash_by_line: dict, rebuild: bool = False):
+        """
+        Update the spatial index for each ping record with the geohash data for the provided lines.  The spatial index
+        is written next to the ping zarr folder and used for polygon selection, see subset.filter_subset_by_polygon
+
+        Parameters
+        ----------
+        geohash_by_line
+            dict of line name: dataset of the geohash variable for that line, see subset_variables_by_line
+        rebuild
+            if True, the spatial index is built from scratch, otherwise only the lines in geohash_by_line are replaced
+        """
+
+        if self.output_folder is None:
+            return
+        for rp in self.multibeam.raw_ping:
+            index_path = return_spatial_index_path(self.output_folder, rp.system_identifier)
+            sindex = SpatialIndex(None if rebuild else index_path)
+            sindex.index_path = index_path
+            for mline, linedataset in geohash_by_line.items():
+                if linedataset is None:
+                    sindex.remove_lines([mline])
+                    continue
+                sysmask = linedataset.system_identifier.values == np.uint64(rp.system_identifier)
+                sindex.update_line(mline, linedataset.geohash.values[sysmask], linedataset.time.values[sysmask])
+            sindex.save()
 
     def _validate_calculate_total_uncertainty(self, subset_time: list, dump_data: bool):
         """
@@ -2741,7 +3025,7 @@ class Fqpr(ZarrBackend):
             # when we process, we store the futures in self.intermediate_dat, so we can access it later
             self.initialize_intermediate_data(sys_ident, 'orientation')
             # get the settings we want to use for this sector, controls the amount of data we pass at once
-            pings_per_chunk, max_chunks_at_a_time = self.get_cluster_params()
+            pings_per_chunk, max_chunks_at_a_time = self.get_cluster_params('orientation', ra, dump_data=dump_data)
 
             # for each installation parameters record...
             for applicable_index, timestmp, prefixes in system:
@@ -2803,7 +3087,7 @@ class Fqpr(ZarrBackend):
             if dump_data:
                 self.print('Operating on system serial number = {}'.format(sys_ident), logging.INFO)
             self.initialize_intermediate_data(sys_ident, 'bpv')
-            pings_per_chunk, max_chunks_at_a_time = self.get_cluster_params()
+            pings_per_chunk, max_chunks_at_a_time = self.get_cluster_params('bpv', ra, dump_data=dump_data)
 
             for applicable_index, timestmp, prefixes in system:
                 if dump_data:
@@ -2873,7 +3157,7 @@ class Fqpr(ZarrBackend):
             if dump_data:
                 self.print('Operating on system serial number = {}'.format(sys_ident), logging.INFO)
             self.initialize_intermediate_data(sys_ident, 'sv_corr')
-            pings_per_chunk, max_chunks_at_a_time = self.get_cluster_params()
+            pings_per_chunk, max_chunks_at_a_time = self.get_cluster_params('sv_corr', ra, dump_data=dump_data)
 
             for applicable_index, timestmp, prefixes in system:
                 if dump_data:
@@ -2951,7 +3235,7 @@ class Fqpr(ZarrBackend):
             if dump_data:
                 self.print('Operating on system serial number = {}'.format(sys_ident), logging.INFO)
             self.initialize_intermediate_data(sys_ident, 'georef')
-            pings_per_chunk, max_chunks_at_a_time = self.get_cluster_params()
+            pings_per_chunk, max_chunks_at_a_time = self.get_cluster_params('georef', ra, dump_data=dump_data)
 
             for applicable_index, timestmp, prefixes in system:
                 if dump_data:
@@ -2970,7 +3254,7 @@ class Fqpr(ZarrBackend):
 
         if dump_data:
             self._reload_after_processing(skip_dask)
-            self._overwrite_georef_stats()
+            self._overwrite_georef_stats(subset_time)
             endtime = perf_counter()
             self.print('****Georeferencing sound velocity corrected beam offsets complete: {}****\n'.format(seconds_to_formatted_string(int(endtime - starttime))), logging.INFO)
 
@@ -3012,7 +3296,7 @@ class Fqpr(ZarrBackend):
             if dump_data:
                 self.print('Operating on system serial number = {}'.format(sys_ident), logging.INFO)
             self.initialize_intermediate_data(sys_ident, 'tpu')
-            pings_per_chunk, max_chunks_at_a_time = self.get_cluster_params()
+            pings_per_chunk, max_chunks_at_a_time = self.get_cluster_params('tpu', ra, dump_data=dump_data)
 
             for applicable_index, timestmp, prefixes in system:
                 if dump_data:
@@ -3076,7 +3360,7 @@ class Fqpr(ZarrBackend):
             if dump_data:
                 self.print('Operating on system serial number = {}'.format(sys_ident), logging.INFO)
             self.initialize_intermediate_data(sys_ident, 'backscatter')
-            pings_per_chunk, max_chunks_at_a_time = self.get_cluster_params()
+            pings_per_chunk, max_chunks_at_a_time = self.get_cluster_params('backscatter', ra, dump_data=dump_data)
 
             for applicable_index, timestmp, prefixes in system:
                 if dump_data:
@@ -3094,6 +3378,95 @@ class Fqpr(ZarrBackend):
             endtime = perf_counter()
             self.print('****Processing Backscatter complete: {}****\n'.format(seconds_to_formatted_string(int(endtime - starttime))), logging.INFO)
 
+    def process_fused(self, subset_time: list = None, add_cast_files: Union[str, list] = None,
+                      cast_selection_method: str = 'nearest_in_time', prefer_pp_nav: bool = True,
+                      vdatum_directory: str = None, run_tpu: bool = True, output_variables: list = None,
+                      initial_interp: bool = False):
+        """
+        Run orientation, beam pointing vectors, sound velocity correction, georeferencing and (optionally) tpu in a
+        single pass.  Each chunk of pings is sent to a worker that runs all processes in memory, only the variables in
+        output_variables are written to disk.  This avoids writing and then reloading each intermediate variable
+        between processes.
+
+        If you only retain a subset of the variables, any later processing must start again from orientation, as
+        the intermediate variables are not available to start from.
+
+        | To process only a section of the dataset, use subset_time.
+        | ex: subset_time=[1531317999, 1531321000] means only process times that are from 1531317999 to 1531321000
+        | ex: subset_time=[[1531317999, 1531318885], [1531318886, 1531321000]] means only process times that are
+                from either 1531317999 to 1531318885 or 1531318886 to 1531321000
+
+        Parameters
+        ----------
+        subset_time
+            List of unix timestamps in seconds, used as ranges for times that you want to process.
+        add_cast_files
+            either a list of files to include or the path to a directory containing files.  These are in addition to
+            the casts in the ping dataset.
+        cast_selection_method
+            the method used to select the cast that goes with each chunk of the dataset, one of ['nearest_in_time',
+            'nearest_in_time_four_hours', 'nearest_in_distance', 'nearest_in_distance_four_hours']
+        prefer_pp_nav
+            if True will use post-processed navigation/height (SBET)
+        vdatum_directory
+            if 'NOAA MLLW' 'NOAA MHW' is the vertical reference, a path to the vdatum directory is required here
+        run_tpu
+            if True, will include the tpu process
+        output_variables
+            list of variables to write to disk, ex: ['x', 'y', 'z', 'tvu', 'thu'].  If None, will write all variables
+            generated by the processes run, matching the output of running each process separately.
+        initial_interp
+            if True, will interpolate attitude to the ping record and store in the raw_ping datasets.
+        """
+
+        self._validate_process_fused(subset_time, run_tpu)
+        output_variables = return_fused_output_variables(output_variables, run_tpu)
+        self.fused_settings = {'run_tpu': run_tpu, 'output_variables': output_variables}
+        if initial_interp:
+            self.initial_att_interpolation()
+        if add_cast_files:
+            self.import_sound_velocity_files(add_cast_files)
+
+        self.print('****Running fused processing****\n', logging.INFO)
+        self.print('Writing variables: {}'.format(output_variables), logging.INFO)
+        starttime = perf_counter()
+        self.write_attribute_to_ping_records({'xyzrph': self.multibeam.xyzrph})
+        self.print('Using pyproj CRS: {}'.format(self.horizontal_crs.to_string()), logging.INFO)
+
+        skip_dask = False
+        if self.client is None:  # small datasets benefit from just running it without dask distributed
+            skip_dask = True
+
+        systems = self.multibeam.return_system_time_indexed_array(subset_time=subset_time)
+        for s_cnt, system in enumerate(systems):
+            if system is None:  # get here if one of the heads is disabled (set to None)
+                continue
+            ra = self.multibeam.raw_ping[s_cnt]
+            sys_ident = ra.system_identifier
+            self.print('Operating on system serial number = {}'.format(sys_ident), logging.INFO)
+            self.initialize_intermediate_data(sys_ident, 'fused')
+            pings_per_chunk, max_chunks_at_a_time = self.get_cluster_params('fused', ra)
+
+            for applicable_index, timestmp, prefixes in system:
+                self.print('using installation params {}'.format(timestmp), logging.INFO)
+                self.motion_latency = float(self.multibeam.xyzrph['latency'][timestmp])
+                self.generate_starter_orientation_vectors(prefixes, timestmp)
+                idx_by_chunk = self.return_chunk_indices(applicable_index, pings_per_chunk)
+                if len(idx_by_chunk[0]):  # if there are pings in this system that align with this installation parameter record
+                    self._submit_data_to_cluster(ra, 'fused', idx_by_chunk, max_chunks_at_a_time,
+                                                 timestmp, prefixes, skip_dask=skip_dask, prefer_pp_nav=prefer_pp_nav,
+                                                 vdatum_directory=vdatum_directory, cast_selection_method=cast_selection_method,
+                                                 fused_settings=self.fused_settings)
+                else:
+                    self.print('No pings found for {}-{}'.format(sys_ident, timestmp), logging.INFO)
+            del self.intermediate_dat[sys_ident]['fused']
+
+        self._reload_after_processing(skip_dask)
+        if all([vr in output_variables for vr in ['x', 'y', 'z', 'geohash']]):  # required for the georef stats
+            self._overwrite_georef_stats(subset_time)
+        endtime = perf_counter()
+        self.print('****Fused processing complete: {}****\n'.format(seconds_to_formatted_string(int(endtime - starttime))), logging.INFO)
+
     def export_pings_to_file(self, output_directory: str = None, file_format: str = 'csv', csv_delimiter=' ',
                              filter_by_detection: bool = True, format_type: str = 'xyz', z_pos_down: bool = True, export_by_identifiers: bool = True):
         """
@@ -3148,7 +3521,8 @@ class Fqpr(ZarrBackend):
 
         self.export.export_dataset_to_csv(dataset_name, dest_path)
 
-    def run_filter(self, filtername: str, *args, selected_index: list = None, save_to_disk: bool = True, **kwargs):
+    def run_filter(self, filtername: str, *args, selected_index: list = None, save_to_disk: bool = True,
+                   run_by_chunk: bool = False, **kwargs):
         """
         Run the filter module with the provided filtername, will match the filename of the filter python file.
 
@@ -3162,26 +3536,42 @@ class Fqpr(ZarrBackend):
             Points View.
         save_to_disk
             if True, will save the new sounding status to disk
+        run_by_chunk
+            if True, filters with a per chunk algorithm are run chunk by chunk on the cluster when saving the whole
+            dataset to disk, only writing the chunks with changed flags.  The new status is not returned in this case,
+            see filter.FilterManager.run_filter
+
+        Returns
+        -------
+        list
+            list of the new sounding status arrays, one for each sonar head, None if the filter was run by chunk or
+            not found
         """
 
-        return self.filter.run_filter(filtername, selected_index, save_to_disk=save_to_disk, **kwargs)
+        self.edit_journal.flush()  # filters read the flags from disk, save any pending cleaning edits first
+        return self.filter.run_filter(filtername, selected_index, save_to_disk=save_to_disk, run_by_chunk=run_by_chunk, **kwargs)
 
     def _submit_data_to_cluster(self, rawping: xr.Dataset, mode: str, idx_by_chunk: list, max_chunks_at_a_time: int,
                                 timestmp: str, prefixes: str, dump_data: bool = True, skip_dask: bool = False,
                                 prefer_pp_nav: bool = True, vdatum_directory: str = None,
-                                cast_selection_method: str = 'nearest_in_time', backscatter_settings: dict = None):
+                                cast_selection_method: str = 'nearest_in_time', backscatter_settings: dict = None,
+                                fused_settings: dict = None):
         """
         For all of the main processes, we break up our inputs into chunks, appended to a list (data_for_workers).
         Knowing the capacity of the cluster memory, we can determine how many chunks to run at a time
-        (max_chunks_at_a_time) and submit map those chunks to the cluster workers.  Append the resulting futures
-        to the futures_repo and wait inbetween mappings.  This limits the memory used so that we don't run out.
+        (max_chunks_at_a_time) and submit map those chunks to the cluster workers.  This limits the memory used so that
+        we don't run out.
+
+        The chunks are submitted in runs, with kluster_variables.pipelined_runs runs in flight at once.  While the
+        cluster processes run N, we write run N-1 to disk and load the data for run N+1, so the workers are not idle
+        during the write.  The max_chunks_at_a_time chunks are split across the runs in flight, see _return_chunks_per_run.
 
         Parameters
         ----------
         rawping
             xarray Dataset for the ping records
         mode
-            one of ['orientation', 'bpv', 'sv_corr', 'georef', 'tpu', 'backscatter']
+            one of ['orientation', 'bpv', 'sv_corr', 'georef', 'tpu', 'backscatter', 'fused']
         idx_by_chunk
             values are the integer indexes of the pings to use, coords are the time of ping
         max_chunks_at_a_time
@@ -3204,18 +3594,24 @@ class Fqpr(ZarrBackend):
             'nearest_in_time_four_hours', 'nearest_in_distance', 'nearest_in_distance_four_hours']
         backscatter_settings
             dict of settings for processing backscatter, see backscatter.py Bscatter.process
+        fused_settings
+            dict of settings for fused processing, {'run_tpu': bool, 'output_variables': list}, see process_fused
         """
 
         # clear out the intermediate data just in case there is old data there
         sys_ident = rawping.system_identifier
+        sonartype = rawping.attrs.get('sonartype', '')
         self.intermediate_dat[sys_ident][mode][timestmp] = []
-        tot_runs = int(np.ceil(len(idx_by_chunk) / max_chunks_at_a_time))
+        chunks_per_run = self._return_chunks_per_run(len(idx_by_chunk), max_chunks_at_a_time)
+        tot_runs = int(np.ceil(len(idx_by_chunk) / chunks_per_run))
+        in_flight = deque()  # submitted runs that have not been written yet, oldest first
+        new_provenance = {}  # provenance records for the chunks processed, see return_changed_time_ranges
         for rn in range(tot_runs):
             silent = (rn != 0) or not dump_data  # only messages for the first chunk, and only when we are writing to disk
-            start_r = rn * max_chunks_at_a_time
-            end_r = min(start_r + max_chunks_at_a_time, len(idx_by_chunk))  # clamp for last run
+            start_r = rn * chunks_per_run
+            end_r = min(start_r + chunks_per_run, len(idx_by_chunk))  # clamp for last run
             idx_by_chunk_subset = idx_by_chunk[start_r:end_r].copy()
-            start_run_index = rn * max_chunks_at_a_time
+            start_run_index = rn * chunks_per_run
 
             if mode == 'orientation':
                 kluster_function = distrib_run_build_orientation_vectors
@@ -3232,19 +3628,7 @@ class Fqpr(ZarrBackend):
                 chunk_function = self._generate_chunks_svcorr
                 comp_time = 'sv_time_complete'
                 profnames, casts, cast_times, castlocations = self.return_all_profiles()
-                if cast_selection_method == 'nearest_in_time':
-                    cast_chunks = self.return_cast_idx_nearestintime(idx_by_chunk_subset, silent=silent)
-                elif cast_selection_method == 'nearest_in_time_four_hours':
-                    cast_chunks = self.return_cast_idx_nearestintime_fourhours(idx_by_chunk_subset, silent=silent)
-                elif cast_selection_method == 'nearest_in_distance':
-                    cast_chunks = self.return_cast_idx_nearestindistance(idx_by_chunk_subset, silent=silent)
-                elif cast_selection_method == 'nearest_in_distance_four_hours':
-                    cast_chunks = self.return_cast_idx_nearestindistance_fourhours(idx_by_chunk_subset, silent=silent)
-                else:
-                    msg = f'unexpected cast selection method "{cast_selection_method}", must be one of ' \
-                          f'{kluster_variables.cast_selection_methods} as of 0.9.6.  Defaulting to nearest_in_time.'
-                    self.print(msg, logging.WARNING)
-                    cast_chunks = self.return_cast_idx_nearestintime(idx_by_chunk_subset, silent=silent)
+                cast_chunks = self._return_cast_chunks(idx_by_chunk_subset, cast_selection_method, silent=silent)
                 self.svmethod = cast_selection_method
                 addtl_offsets = self.return_additional_xyz_offsets(rawping, prefixes, timestmp, idx_by_chunk_subset)
                 chunkargs = [rawping, cast_chunks, casts, prefixes, timestmp, addtl_offsets, start_run_index]
@@ -3267,56 +3651,370 @@ class Fqpr(ZarrBackend):
                 runtime_chunks = self.return_runtime_idx_nearestintime(idx_by_chunk_subset)
                 self.bscatter_settings = return_backscatter_settings(self.multibeam_extension, **backscatter_settings)
                 chunkargs = [rawping, backscatter_settings, runtime_chunks, idx_by_chunk_subset, prefixes, timestmp, start_run_index]
+            elif mode == 'fused':
+                kluster_function = distrib_run_fused_processing
+                chunk_function = self._generate_chunks_fused
+                comp_time = ['orientation_time_complete', 'bpv_time_complete', 'sv_time_complete', 'georef_time_complete']
+                if fused_settings['run_tpu']:
+                    comp_time.append('tpu_time_complete')
+                profnames, casts, cast_times, castlocations = self.return_all_profiles()
+                cast_chunks = self._return_cast_chunks(idx_by_chunk_subset, cast_selection_method, silent=silent)
+                self.svmethod = cast_selection_method
+                addtl_offsets = self.return_additional_xyz_offsets(rawping, prefixes, timestmp, idx_by_chunk_subset)
+                refpt = self.multibeam.return_prefix_for_rp()
+                z_offset = float(self.multibeam.xyzrph[prefixes[refpt[2]] + '_z'][timestmp])
+                chunkargs = [rawping, idx_by_chunk_subset, cast_chunks, casts, prefixes, timestmp, addtl_offsets, z_offset,
+                             prefer_pp_nav, vdatum_directory, fused_settings, start_run_index]
             else:
-                self.print('Mode must be one of ["orientation", "bpv", "sv_corr", "georef", "tpu", "backscatter"]', logging.ERROR)
-                raise ValueError('Mode must be one of ["orientation", "bpv", "sv_corr", "georef", "tpu", "backscatter"]')
+                self.print('Mode must be one of ["orientation", "bpv", "sv_corr", "georef", "tpu", "backscatter", "fused"]', logging.ERROR)
+                raise ValueError('Mode must be one of ["orientation", "bpv", "sv_corr", "georef", "tpu", "backscatter", "fused"]')
             self.debug_print('Loading data for process', logging.INFO)
             if self.show_progress and rn != 0:  # first run we skip progress as it prints out the run info
                 print_progress_bar(rn + 1, tot_runs, prefix=f'Loading chunk    {rn + 1}/{tot_runs}:')
             data_for_workers = chunk_function(*chunkargs, silent=silent)
+            if dump_data and mode in ['sv_corr', 'georef', 'fused']:
+                for stage, records in self._return_chunk_provenance(mode, rawping, idx_by_chunk_subset, timestmp,
+                                                                    cast_chunks=cast_chunks if mode != 'georef' else None,
+                                                                    prefer_pp_nav=prefer_pp_nav).items():
+                    new_provenance.setdefault(stage, []).extend(records)
+            # if the chunk planner has not seen this process for this sonar yet, measure the memory used by the first chunk
+            profile_path = self._return_memory_profile_path()
+            probe_memory = rn == 0 and bool(data_for_workers) and kluster_variables.adaptive_chunk_planner and \
+                profile_path is not None and return_memory_profile(sonartype, mode, profile_path) is None
+            probe_beams = len(idx_by_chunk_subset[0]) * rawping.beam.size if probe_memory else 0
+            run_data, probe_fut = [], None
             try:
                 self.debug_print(f'Running {mode} process...', logging.INFO)
                 if self.show_progress and rn != 0:  # first run we skip progress as it prints out the run info
                     print_progress_bar(rn + 1, tot_runs, prefix=f'Processing chunk {rn + 1}/{tot_runs}:')
-                futs = self.client.map(kluster_function, data_for_workers)
+                if probe_memory:
+                    probe_fut = self.client.submit(measure_peak_memory, kluster_function, data_for_workers[0])
+                    futs = [self.client.submit(operator.getitem, probe_fut, 0)] + self.client.map(kluster_function, data_for_workers[1:])
+                else:
+                    futs = self.client.map(kluster_function, data_for_workers)
                 endtimes = [len(c) for c in idx_by_chunk]
-                futs_with_endtime = [[f, endtimes[cnt]] for cnt, f in enumerate(futs)]
-                self.intermediate_dat[sys_ident][mode][timestmp].extend(futs_with_endtime)
-                wait(self.intermediate_dat[sys_ident][mode][timestmp])
+                run_data = [[f, endtimes[cnt]] for cnt, f in enumerate(futs)]
             except:  # get here if client is closed or not setup
                 for cnt, dat in enumerate(data_for_workers):
                     endtime = len(idx_by_chunk[cnt])
-                    data = kluster_function(dat)
-                    self.intermediate_dat[sys_ident][mode][timestmp].append([data, endtime])
-            if dump_data:
-                self.__setattr__(comp_time, datetime.utcnow().strftime('%c'))
-                self.debug_print('writing to disk')
+                    if probe_memory and cnt == 0:
+                        data, peak_memory = measure_peak_memory(kluster_function, dat)
+                        self._update_memory_profile(sonartype, mode, peak_memory, probe_beams)
+                    else:
+                        data = kluster_function(dat)
+                    run_data.append([data, endtime])
+            if not dump_data:  # in memory workflow, all the results are retained in the intermediate data
+                self.intermediate_dat[sys_ident][mode][timestmp].extend(run_data)
+            in_flight.append([rn, run_data, probe_fut, probe_beams])
+            # finish the oldest run once the window is full.  The cluster works on the runs still in flight while we
+            #  write the oldest run to disk and load the data for the next run
+            while in_flight and (len(in_flight) >= kluster_variables.pipelined_runs or rn == tot_runs - 1):
+                finished_rn, finished_data, finished_probe, finished_beams = in_flight.popleft()
+                try:
+                    wait([f[0] for f in finished_data])
+                    if finished_probe is not None:
+                        self._update_memory_profile(sonartype, mode, self.client.submit(operator.getitem, finished_probe, 1).result(),
+                                                    finished_beams)
+                except:  # get here if client is closed or not setup, data was processed locally
+                    pass
+                if dump_data:
+                    for ctime in (comp_time if isinstance(comp_time, list) else [comp_time]):
+                        self.__setattr__(ctime, datetime.utcnow().strftime('%c'))
+                    self.debug_print('writing to disk')
+                    if self.show_progress:
+                        if finished_rn == 0:  # first progress bar run should be on a new line
+                            print()
+                        print_progress_bar(finished_rn + 1, tot_runs, prefix=f'Writing chunk    {finished_rn + 1}/{tot_runs}:')
+                    self.intermediate_dat[sys_ident][mode][timestmp] = finished_data
+                    self.write_intermediate_futs_to_zarr(mode, rawping.system_identifier, timestmp, skip_dask=skip_dask)
                 if self.show_progress:
-                    if rn == 0:  # first progress bar run should be on a new line
-                        print()
-                    print_progress_bar(rn + 1, tot_runs, prefix=f'Writing chunk    {rn + 1}/{tot_runs}:')
-                self.write_intermediate_futs_to_zarr(mode, rawping.system_identifier, timestmp, skip_dask=skip_dask)
-            if self.show_progress:
-                print_progress_bar(rn + 1, tot_runs, prefix=f'Chunk Complete   {rn + 1}/{tot_runs}:')
-        if mode == 'georef' and self.vert_ref == 'Aviso MLLW':  # free up the memory associated with the aviso model after all runs
+                    print_progress_bar(finished_rn + 1, tot_runs, prefix=f'Chunk Complete   {finished_rn + 1}/{tot_runs}:')
+        if new_provenance:
+            self._write_processing_provenance(sys_ident, new_provenance)
+        if mode in ['georef', 'fused'] and self.vert_ref == 'Aviso MLLW':  # free up the memory associated with the aviso model after all runs
             aviso_clear_model()
 
-    def write_intermediate_futs_to_zarr(self, mode: str, sys_ident: str, timestmp: str, skip_dask: bool = False):
+    def _return_chunks_per_run(self, total_chunks: int, max_chunks_at_a_time: int):
         """
-        Flush some of the intermediate data that was mapped to the cluster (and lives in futures objects) to disk, puts
-        it in the multibeam, as the time dimension should be the same.  Mode allows for selecting the output from one
-        of the main processes for writing.
+        _submit_data_to_cluster keeps kluster_variables.pipelined_runs runs in flight at once, so that the cluster is
+        processing one run while we write the previous run and load the next one.  To keep the memory used the same as
+        processing max_chunks_at_a_time chunks at once, the in flight chunks are split across the pipelined runs.  If
+        all the chunks fit in one run, we just use one run.
+
+        Parameters
+        ----------
+        total_chunks
+            total number of chunks to process
+        max_chunks_at_a_time
+            maximum number of data chunks to load and process at a time, see get_cluster_params
+
+        Returns
+        -------
+        int
+            number of chunks in each run
+        """
+
+        if total_chunks <= max_chunks_at_a_time:
+            return max(max_chunks_at_a_time, 1)
+        return max(int(np.ceil(max_chunks_at_a_time / max(kluster_variables.pipelined_runs, 1))), 1)
+
+    def _return_chunk_provenance(self, mode: str, rawping: xr.Dataset, idx_by_chunk: list, timestmp: str,
+                                 cast_chunks: list = None, cast_selection_method: str = 'nearest_in_time',
+                                 prefer_pp_nav: bool = True):
+        """
+        Build the provenance records for the provided chunks, the inputs that the sound velocity correction and
+        georeferencing processes use for each chunk.  Fused processing runs both, so it returns records for both.
+
+        | sv_corr - the installation parameters entry and the cast used
+        | georef - the installation parameters entry, the navigation source, the input datum, the vertical reference and the
+            horizontal coordinate system
 
         Parameters
         ----------
         mode
-            one of ['orientation', 'bpv', sv_corr', 'georef', 'tpu', 'backscatter']
-        sys_ident
-            the multibeam system identifier attribute, used as a key to find the intermediate data
+            one of ['sv_corr', 'georef', 'fused']
+        rawping
+            xarray Dataset for the ping records
+        idx_by_chunk
+            list of xarray Datarrays, values are the integer indexes of the pings to use, coords are the time of ping
         timestmp
             timestamp of the installation parameters instance used
-        skip_dask
-            if True will not use the dask.distributed client to submit tasks, will run locally instead
+        cast_chunks
+            optional, the return from _return_cast_chunks for these chunks, if not provided will select the casts using
+            cast_selection_method
+        cast_selection_method
+            the method used to select the cast that goes with each chunk of the dataset, only used if cast_chunks is None
+        prefer_pp_nav
+            if True will use post-processed navigation/height (SBET)
+
+        Returns
+        -------
+        dict
+            dict of {process: list of [start time, end time, inputs dict] for each chunk}
+        """
+
+        stages = ['sv_corr', 'georef'] if mode == 'fused' else [mode]
+        xyzrph_identifier = return_xyzrph_identifier(self.multibeam.xyzrph, timestmp)
+        if 'sv_corr' in stages:
+            profnames = self.return_all_profiles()[0]
+            if cast_chunks is None:
+                cast_chunks = self._return_cast_chunks(idx_by_chunk, cast_selection_method, silent=True)
+        records = {stage: [] for stage in stages}
+        for cnt, chnk in enumerate(idx_by_chunk):
+            start_time, end_time = float(chnk.time.min()), float(chnk.time.max())
+            if 'sv_corr' in stages:
+                cast_index = cast_chunks[cnt][1]
+                records['sv_corr'].append([start_time, end_time,
+                                           {'xyzrph': xyzrph_identifier,
+                                            'cast': profnames[cast_index] if cast_index is not None else None}])
+            if 'georef' in stages:
+                if prefer_pp_nav and self.has_sbet:
+                    navigation = return_navigation_identifier(rawping.attrs.get('nav_files', {}), start_time, end_time)
+                    input_datum = str(rawping.attrs.get('sbet_datum', ''))
+                else:
+                    navigation = 'multibeam'
+                    input_datum = str(rawping.attrs.get('input_datum', 'WGS84'))
+                records['georef'].append([start_time, end_time,
+                                          {'xyzrph': xyzrph_identifier, 'navigation': navigation, 'input_datum': input_datum,
+                                           'vertical_reference': self.vert_ref,
+                                           'horizontal_crs': self.horizontal_crs.to_epsg() if self.horizontal_crs else None}])
+        return records
+
+    def _write_processing_provenance(self, sys_ident: str, new_provenance: dict):
+        """
+        Merge the provenance records for the chunks just processed with the records in the processing_provenance
+        attribute and write the attribute to the ping records.  The attribute is laid out as
+        {process: {system identifier: list of [start time, end time, inputs dict]}}
+
+        Parameters
+        ----------
+        sys_ident
+            the multibeam system identifier attribute for the processed chunks
+        new_provenance
+            dict of {process: list of records}, see _return_chunk_provenance
+        """
+
+        provenance = deepcopy(self.multibeam.raw_ping[0].attrs.get('processing_provenance', {}))
+        for stage, records in new_provenance.items():
+            stage_provenance = provenance.setdefault(stage, {})
+            stage_provenance[sys_ident] = merge_provenance_records(stage_provenance.get(sys_ident, []), records)
+        self.write_attribute_to_ping_records({'processing_provenance': provenance})
+
+    def return_changed_time_ranges(self, modes: list, cast_selection_method: str = 'nearest_in_time',
+                                   prefer_pp_nav: bool = True):
+        """
+        Find the time ranges of the pings whose processing inputs have changed since they were last processed.  Each
+        processed chunk has a provenance record (see _return_chunk_provenance) in the processing_provenance attribute.
+        We rebuild the inputs for the pings in each record with the current casts, navigation, installation parameters
+        and settings, and compare against the stored inputs.  Pings without a record are treated as changed.
+
+        Used with process_multibeam(incremental=True), so that importing a new cast or a new SBET only reprocesses the
+        chunks that the new data applies to.  Set the vertical reference and coordinate system (construct_crs) before
+        running this, so that they are compared against the stored settings.
+
+        Parameters
+        ----------
+        modes
+            list of processes to check, any of ['sv_corr', 'georef']
+        cast_selection_method
+            the method used to select the cast that goes with each chunk of the dataset, one of ['nearest_in_time',
+            'nearest_in_time_four_hours', 'nearest_in_distance', 'nearest_in_distance_four_hours']
+        prefer_pp_nav
+            if True will use post-processed navigation/height (SBET)
+
+        Returns
+        -------
+        list
+            list of [start time, end time] for each range of pings that needs to be reprocessed, in the subset_time format
+        """
+
+        starts, ends = [], []
+        systems = self.multibeam.return_system_time_indexed_array()
+        for s_cnt, system in enumerate(systems):
+            if system is None:  # get here if one of the heads is disabled (set to None)
+                continue
+            ra = self.multibeam.raw_ping[s_cnt]
+            sys_ident = ra.system_identifier
+            provenance = ra.attrs.get('processing_provenance', {})
+            times = ra.time.values
+            changed = np.zeros(times.shape[0], dtype=bool)
+            for applicable_index, timestmp, prefixes in system:
+                applicable_index = np.asarray(applicable_index, dtype=bool)
+                for mode in modes:
+                    records = provenance.get(mode, {}).get(sys_ident, [])
+                    record_index = return_record_index(times, records)
+                    changed |= applicable_index & (record_index == -1)
+                    for rec_idx in np.unique(record_index[applicable_index & (record_index != -1)]):
+                        start_time, end_time, stored_inputs = records[rec_idx]
+                        # rebuild the chunk as it was processed, all the pings within the record time range
+                        chnk_idx = np.where(applicable_index & (times >= start_time) & (times <= end_time))[0]
+                        chnk = xr.DataArray(chnk_idx, dims=('time',), coords={'time': times[chnk_idx]})
+                        current = self._return_chunk_provenance(mode, ra, [chnk], timestmp, cast_selection_method=cast_selection_method,
+                                                                prefer_pp_nav=prefer_pp_nav)[mode][0]
+                        if current[2] != stored_inputs:
+                            changed |= applicable_index & (record_index == rec_idx)
+            sys_ranges = return_time_ranges_from_mask(times, changed)
+            self.print('{}: found {} pings with changed inputs to {} in {} time ranges'.format(sys_ident, int(changed.sum()), modes,
+                                                                                               len(sys_ranges)), logging.INFO)
+            starts.extend([rng[0] for rng in sys_ranges])
+            ends.extend([rng[1] for rng in sys_ranges])
+        return merge_time_ranges(np.array(starts, dtype=np.float64), np.array(ends, dtype=np.float64))
+
+    @property
+    def sounding_generation(self):
+        """
+        Counter incremented each time the soundings change, see record_sounding_changes
+
+        Returns
+        -------
+        int
+            current sounding generation, 0 if no changes have been recorded
+        """
+
+        return int(self.multibeam.raw_ping[0].attrs.get('sounding_generation', 0))
+
+    def record_sounding_changes(self, sys_ident: str, time_ranges: list):
+        """
+        Record that the soundings (the georeferenced/uncertainty/detection variables that a surface is built from) in
+        the given time ranges have changed.  Increments the sounding_generation counter and adds a change record for
+        each time range to the sounding_changes attribute, laid out as {system identifier: list of [start time, end time,
+        {'generation': int, 'time': str}]}.  Used to find the lines that need to be updated in a surface, see
+        return_changed_lines.
+
+        Parameters
+        ----------
+        sys_ident
+            the multibeam system identifier attribute for the changed pings
+        time_ranges
+            list of [start time, end time] for each range of changed pings, in utc seconds
+        """
+
+        if not time_ranges:
+            return
+        generation = self.sounding_generation + 1
+        change_info = {'generation': generation, 'time': datetime.utcnow().strftime('%c')}
+        new_records = [[float(trange[0]), float(trange[1]), change_info] for trange in time_ranges]
+        changes = deepcopy(self.multibeam.raw_ping[0].attrs.get('sounding_changes', {}))
+        changes[sys_ident] = merge_provenance_records(changes.get(sys_ident, []), new_records)
+        self.write_attribute_to_ping_records({'sounding_changes': changes, 'sounding_generation': generation})
+
+    def return_changed_lines(self, since: Union[datetime, dict], line_names: list = None):
+        """
+        Return the lines with soundings that have changed since the provided time, using the change records written by
+        record_sounding_changes.  Datasets processed before change tracking was added have no change records, and
+        return None so that the caller can fall back to last_operation_date.
+
+        Parameters
+        ----------
+        since
+            either a single datetime (utc) to compare all lines against, or a dict of {line name: datetime} for a
+            separate time for each line, i.e. the time each line was added to a surface
+        line_names
+            optional, only check these lines
+
+        Returns
+        -------
+        list
+            list of the line names with changed soundings, None if this dataset has no change records
+        """
+
+        changes = self.multibeam.raw_ping[0].attrs.get('sounding_changes', None)
+        if not changes:
+            return None
+        records = [rec for sys_records in changes.values() for rec in sys_records]
+        line_times = {linename: ltimes[:2] for linename, ltimes in self.return_line_dict(line_names=line_names).items()}
+        return return_changed_lines(line_times, records, since)
+
+    def _return_memory_profile_path(self):
+        """
+        Path to the memory profile used by the chunk planner, stored with the converted data.  None if the data has not
+        been written to disk.
+        """
+
+        if self.multibeam is None or not self.multibeam.converted_pth:
+            return None
+        return return_memory_profile_path(self.multibeam.converted_pth)
+
+    def _update_memory_profile(self, sonartype: str, mode: str, peak_memory: int, number_of_beams: int):
+        """
+        Save the memory used by the probe chunk in _submit_data_to_cluster to the memory profile for this sonar, used in
+        get_cluster_params to size the chunks for the next run of this process.
+
+        Parameters
+        ----------
+        sonartype
+            sonar model identifier, ex: 'em2040'
+        mode
+            one of ['orientation', 'bpv', 'sv_corr', 'georef', 'tpu', 'backscatter', 'fused']
+        peak_memory
+            peak memory used in processing the probe chunk, in bytes
+        number_of_beams
+            number of beams (pings * beams per ping) in the probe chunk
+        """
+
+        if not number_of_beams or self._return_memory_profile_path() is None:
+            return
+        try:
+            mem_per_beam = update_memory_profile(sonartype, mode, peak_memory / number_of_beams,
+                                                 self._return_memory_profile_path())
+            self.debug_print(f'{sonartype} {mode}: measured {peak_memory / 1024 ** 2:.1f} MB for {number_of_beams} beams, '
+                             f'profile is now {mem_per_beam:.1f} bytes per beam', logging.INFO)
+        except OSError as e:  # unable to write the profile, the chunk planner will just probe again next time
+            self.debug_print(f'Unable to update the memory profile: {e}', logging.WARNING)
+
+    def _return_mode_settings(self, mode: str):
+        """
+        Build the settings used when writing the output of one of the main processes to disk.
+
+        Parameters
+        ----------
+        mode
+            one of ['orientation', 'bpv', sv_corr', 'georef', 'tpu', 'backscatter', 'fused']
+
+        Returns
+        -------
+        list
+            [intermediate data key, list of variable names to write, description of the data, dict of attributes to write]
         """
 
         if mode == 'orientation':
@@ -3384,9 +4082,44 @@ class Fqpr(ZarrBackend):
                               'backscatter_settings': self.bscatter_settings,
                               'reference': {'backscatter': 'None'},
                               'units': {'backscatter': 'dB'}}]
+        elif mode == 'fused':
+            # merge the settings of each process run, retaining only the variables that we are going to write
+            fused_modes = ['orientation', 'bpv', 'sv_corr', 'georef']
+            if self.fused_settings['run_tpu']:
+                fused_modes.append('tpu')
+            outputs = self.fused_settings['output_variables']
+            fused_attributes = {'reference': {}, 'units': {}}
+            for fmode in fused_modes:
+                for ky, val in self._return_mode_settings(fmode)[3].items():
+                    if ky in ['reference', 'units']:
+                        fused_attributes[ky].update({vr: vl for vr, vl in val.items() if vr in outputs})
+                    else:
+                        fused_attributes[ky] = val
+            mode_settings = ['fused', outputs + ['processing_status'], 'fused processing data', fused_attributes]
         else:
-            self.print('Mode must be one of ["orientation", "bpv", "sv_corr", "georef", "tpu", "backscatter"]', logging.ERROR)
-            raise ValueError('Mode must be one of ["orientation", "bpv", "sv_corr", "georef", "tpu", "backscatter"]')
+            self.print('Mode must be one of ["orientation", "bpv", "sv_corr", "georef", "tpu", "backscatter", "fused"]', logging.ERROR)
+            raise ValueError('Mode must be one of ["orientation", "bpv", "sv_corr", "georef", "tpu", "backscatter", "fused"]')
+        return mode_settings
+
+    def write_intermediate_futs_to_zarr(self, mode: str, sys_ident: str, timestmp: str, skip_dask: bool = False):
+        """
+        Flush some of the intermediate data that was mapped to the cluster (and lives in futures objects) to disk, puts
+        it in the multibeam, as the time dimension should be the same.  Mode allows for selecting the output from one
+        of the main processes for writing.
+
+        Parameters
+        ----------
+        mode
+            one of ['orientation', 'bpv', sv_corr', 'georef', 'tpu', 'backscatter', 'fused']
+        sys_ident
+            the multibeam system identifier attribute, used as a key to find the intermediate data
+        timestmp
+            timestamp of the installation parameters instance used
+        skip_dask
+            if True will not use the dask.distributed client to submit tasks, will run locally instead
+        """
+
+        mode_settings = self._return_mode_settings(mode)
 
         futs_data = []
         self.debug_print('writing - combining datasets', logging.INFO)
@@ -3403,6 +4136,8 @@ class Fqpr(ZarrBackend):
                 time_arrs = [_return_xarray_time(tr) for tr in futs_data]
             self.write('ping', futs_data, attributes=mode_settings[3], time_array=time_arrs, sys_id=sys_ident,
                        skip_dask=skip_dask)
+            if mode in ['georef', 'tpu', 'fused']:  # these processes write the variables used in surfaces
+                self.record_sounding_changes(sys_ident, [[np.min(tarr), np.max(tarr)] for tarr in time_arrs])
 
         self.intermediate_dat[sys_ident][mode_settings[0]][timestmp] = []
 
@@ -3841,14 +4576,17 @@ class Fqpr(ZarrBackend):
 
         self.subset.set_filter_by_polygon(polygon, geographic)
 
-    def set_variable_by_filter(self, var_name: str = 'detectioninfo', newval: Union[np.array, int, str, float] = 2, selected_index: list = None):
+    def set_variable_by_filter(self, var_name: str = 'detectioninfo', newval: Union[np.array, int, str, float] = 2, selected_index: list = None,
+                               use_journal: bool = False):
         """
         ping_filter is set upon selecting points in 2d/3d in Kluster.  See return_soundings_in_polygon.  Here we can take
         those points and set one of the variables with new data.  Optionally, you can include a selected_index that is a list
         of flattened indices to points in the ping_filter that you want to super-select, see subset module.
+
+        With use_journal, the edit is recorded in edit_journal and saved to disk on edit_journal.flush.
         """
 
-        self.subset.set_variable_by_filter(var_name, newval, selected_index)
+        self.subset.set_variable_by_filter(var_name, newval, selected_index, use_journal=use_journal)
 
     def get_variable_by_filter(self, var_name: str, selected_index: list = None, by_sonar_head: bool = False):
         """
@@ -3919,8 +4657,9 @@ class Fqpr(ZarrBackend):
 
         Used in fqpr_intelligence in generating processing actions to take as data is converted/updated.
 
-        Needs some more sophistication with time ranges (i.e. navigation was added, but only for xxxxxx.xx-xxxxxxxx.xx
-        time range, only process this segment)
+        In normal mode, if processing starts at sound velocity or georeferencing, the action is built with
+        incremental=True, so that process_multibeam only reprocesses the chunks whose inputs (cast, navigation,
+        installation parameters, vertical reference) changed, see return_changed_time_ranges.
 
         Parameters
         ----------
@@ -4046,6 +4785,8 @@ class Fqpr(ZarrBackend):
             kwargs['run_orientation'] = True
             kwargs['orientation_initial_interpolation'] = False
             kwargs['run_beam_vec'] = True
+        if process_mode == 'normal' and kwargs and not kwargs['run_orientation'] and (kwargs['run_svcorr'] or kwargs['run_georef']):
+            kwargs['incremental'] = True
 
         return args, kwargs
 
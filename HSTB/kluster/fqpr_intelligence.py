@@ -7,8 +7,10 @@ from types import FunctionType
 from typing import Union
 from copy import deepcopy
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from dask.distributed import Client
 import traceback
+import json
 
 from HSTB.kluster.fqpr_drivers import fast_read_multibeam_metadata, fast_read_sbet_metadata, fast_read_errorfile_metadata, \
     read_pospac_export_log, is_sbet, is_smrmsg, read_soundvelocity_file
@@ -64,6 +66,9 @@ class FqprIntel(LoggerClass):
 
         self.unique_id = 0
         self.monitors = {}
+        # file information for each file added, keyed by file path, see _gather_file_info_cached
+        self.file_info_cache = {}
+        self._file_info_cache_loaded = None
 
         self.action_container = fqpr_actions.FqprActionContainer(self)
         self._buffered_multibeam_line_groups = {}
@@ -109,6 +114,18 @@ class FqprIntel(LoggerClass):
         else:
             self.remove_file(filepath)
 
+    def _handle_monitor_batch(self, filepaths: list):
+        """
+        Add the batch of files from the directory monitoring object that have finished copying, see add_files
+
+        Parameters
+        ----------
+        filepaths
+            list of absolute file paths that came from the directory monitoring object
+        """
+
+        self.add_files(filepaths)
+
     def set_settings(self, settings: dict):
         """
         Set new settings for the FqprIntel object, triggers a regenerate actions action, to see if there are new
@@ -240,6 +257,7 @@ class FqprIntel(LoggerClass):
             # you have to recreate the DirectoryMonitor object, there is no restart
             self.monitors[folderpath] = monitor.DirectoryMonitor(folderpath, is_recursive)
             self.monitors[folderpath].bind_to(self._handle_monitor_event)
+            self.monitors[folderpath].bind_to_batch(self._handle_monitor_batch)
             self.monitors[folderpath].start()
             print('now monitoring {}'.format(folderpath))
         else:
@@ -296,12 +314,104 @@ class FqprIntel(LoggerClass):
         else:
             return data, '', False
 
+    def _file_info_cache_path(self):
+        """
+        Path to the file information cache for this project, stored next to the project file.  None if there is no
+        project file yet.
+        """
+
+        if self.project.path is None:
+            return None
+        return os.path.join(os.path.dirname(self.project.path), 'kluster_intel_cache.json')
+
+    def _load_file_info_cache(self):
+        """
+        Load the saved file information cache for this project, if we have not already loaded it.  Entries gathered
+        before the project existed are retained.
+        """
+
+        cache_path = self._file_info_cache_path()
+        if cache_path is not None and cache_path != self._file_info_cache_loaded and os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'r') as cache_file:
+                    saved_cache = json.load(cache_file, object_pairs_hook=_decode_cache_value)
+                saved_cache.update(self.file_info_cache)
+                self.file_info_cache = saved_cache
+            except (OSError, ValueError, TypeError):
+                self.print_msg('Unable to read from file information cache: {}'.format(cache_path), logging.WARNING)
+        self._file_info_cache_loaded = cache_path
+
+    def _save_file_info_cache(self):
+        """
+        Save the file information cache next to the project file.  Entries that can not be stored as json are not saved,
+        they are gathered again the next time.
+        """
+
+        cache_path = self._file_info_cache_path()
+        if cache_path is not None:
+            saved_cache = {}
+            for infile, cached in self.file_info_cache.items():
+                try:
+                    saved_cache[infile] = _encode_cache_value(cached)
+                except TypeError:
+                    self.print_msg('Unable to save file information for {} to the cache'.format(infile), logging.DEBUG)
+            try:
+                with open(cache_path, 'w') as cache_file:
+                    json.dump(saved_cache, cache_file)
+                self._file_info_cache_loaded = cache_path
+            except OSError:
+                self.print_msg('Unable to write to file information cache: {}'.format(cache_path), logging.WARNING)
+
+    def _gather_file_info_cached(self, infiles: list):
+        """
+        Gather the file information for each file, using the file information cache for files that have not changed
+        (same size and modified time) since they were last gathered.  The rest are gathered in a thread pool, see
+        kluster_variables.intel_gather_workers.
+
+        Parameters
+        ----------
+        infiles
+            list of full file paths
+
+        Returns
+        -------
+        list
+            list of [data type, file information or None, formatted exception or None] for each file, see gather_file_info
+        """
+
+        self._load_file_info_cache()
+        results = [None] * len(infiles)
+        to_gather = []
+        for cnt, infile in enumerate(infiles):
+            try:
+                signature = file_signature(infile)
+            except OSError:
+                signature = None
+            cached = self.file_info_cache.get(infile)
+            if signature is not None and cached is not None and list(cached[0]) == list(signature):
+                info = deepcopy(cached[2])
+                if info:
+                    info['time_added'] = datetime.now(tz=timezone.utc)
+                results[cnt] = [cached[1], info, None]
+            else:
+                to_gather.append([cnt, infile, signature])
+
+        if to_gather:
+            max_workers = max(1, min(kluster_variables.intel_gather_workers, len(to_gather)))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                gathered = list(executor.map(_gather_file_info_safe, [tg[1] for tg in to_gather]))
+            for (cnt, infile, signature), gathered_result in zip(to_gather, gathered):
+                results[cnt] = gathered_result
+                if signature is not None and gathered_result[2] is None:
+                    self.file_info_cache[infile] = [signature, gathered_result[0], deepcopy(gathered_result[1])]
+        return results
+
     def add_file(self, infile: str, silent: bool = True):
         """
         Starting point for FqprIntel, adding a file to the class which then adds it to one of the intel objects.
 
         We check to see if the file is in one of the approved file extension lists, or check in a more comprehensive way
-        (see sbet.is_sbet) before adding.
+        (see sbet.is_sbet) before adding.  See add_files to add many files at once.
 
         Parameters
         ----------
@@ -320,81 +430,103 @@ class FqprIntel(LoggerClass):
             True if a new project was created or loaded
         """
 
-        infile = os.path.normpath(infile)
-        fileext = os.path.splitext(infile)[1]
-        filename = os.path.split(infile)[1]
-        updated_type = ''
-        new_data = None
-        new_project = False
+        return self.add_files([infile], silent=silent)[0]
+
+    def add_files(self, infiles: list, silent: bool = True):
+        """
+        Add a batch of files to the intelligence modules.  The file information is gathered in parallel (and reused from
+        the project file information cache for files that have not changed), the files are added to the intel objects
+        in the order provided, and the matching/actions are rebuilt once for the whole batch.
+
+        Parameters
+        ----------
+        infiles
+            list of full file paths to the new files
+        silent
+            if silent, will not print messag on failing to add
+
+        Returns
+        -------
+        list
+            list of (updated_type, new_data, new_project) for each file, see add_file
+        """
+
+        infiles = [os.path.normpath(infile) for infile in infiles]
+        to_gather = []
+        for infile in infiles:
+            fileext = os.path.splitext(infile)[1]
+            filename = os.path.split(infile)[1]
+            if filename in excluded_files:
+                if not silent:
+                    self.print_msg('File is listed as an exluded file: {}'.format(infile), logging.ERROR)
+            elif fileext not in all_extensions:
+                if not silent:
+                    self.print_msg('File is not of a supported type: {}'.format(infile), logging.ERROR)
+            else:
+                to_gather.append(infile)
+        gathered = dict(zip(to_gather, self._gather_file_info_cached(to_gather)))
 
         rerun_mbes_file_match = False
         rerun_nav_file_match = False
         rerun_svp_file_match = False
+        any_updated = False
+        results = []
+        for infile in infiles:
+            updated_type = ''
+            new_data = None
+            new_project = False
+            if infile in gathered:
+                data_type, info, exception_msg = gathered[infile]
+                if exception_msg is not None:
+                    self.print_msg(f'Tried adding {infile} as a {data_type} file, failed to add to intel module.')
+                    self.print_msg('Exception logged: {}'.format(exception_msg))
+                elif data_type:
+                    intel = {'multibeam': self.multibeam_intel, 'svp': self.svp_intel, 'navigation': self.nav_intel,
+                             'naverror': self.naverror_intel, 'navlog': self.navlog_intel}[data_type]
+                    try:
+                        new_data, updated_type, rerun_match = self._add_to_intel(info, intel, data_type)
+                    except:
+                        self.print_msg(f'Tried adding {infile} as a {data_type} file, failed to add to intel module.', logging.ERROR)
+                        self.print_msg('Exception logged: {}'.format(traceback.format_exc(limit=1)), logging.ERROR)
+                        new_data, updated_type, rerun_match = None, '', False
+                    if rerun_match:
+                        if data_type == 'multibeam':
+                            rerun_mbes_file_match = True
+                        elif data_type == 'svp':
+                            rerun_svp_file_match = True
+                        else:
+                            rerun_nav_file_match = True
 
-        if filename in excluded_files:
-            if not silent:
-                self.print_msg('File is listed as an exluded file: {}'.format(infile), logging.ERROR)
-        elif fileext in supported_mbes:
-            try:
-                new_data, updated_type, rerun_mbes_file_match = self._add_to_intel(gather_multibeam_info(infile), self.multibeam_intel, 'multibeam')
-            except:
-                self.print_msg(f'Tried adding {infile} as a multibeam file based on file extension {fileext}, failed to add to intel module.')
-                self.print_msg('Exception logged: {}'.format(traceback.format_exc(limit=1)))
-        elif fileext in supported_svp:
-            try:
-                new_data, updated_type, rerun_svp_file_match = self._add_to_intel(gather_svp_info(infile), self.svp_intel, 'svp')
-            except:
-                self.print_msg(f'Tried adding {infile} as a sound velocity file based on file extension {fileext}, failed to add to intel module.')
-                self.print_msg('Exception logged: {}'.format(traceback.format_exc(limit=1)))
-        elif fileext in supported_sbet:  # sbet and smrmsg have the same file extension sometimes ('.out') depending on what the user has done
-            if is_sbet(infile):
-                try:
-                    new_data, updated_type, rerun_nav_file_match = self._add_to_intel(gather_navfile_info(infile), self.nav_intel, 'navigation')
-                except:
-                    self.print_msg(f'Tried adding {infile} as a post processed navigation file based on file extension {fileext}, failed to add to intel module.')
-                    self.print_msg('Exception logged: {}'.format(traceback.format_exc(limit=1)))
-            elif is_smrmsg(infile):
-                try:
-                    new_data, updated_type, rerun_nav_file_match = self._add_to_intel(gather_naverrorfile_info(infile), self.naverror_intel, 'naverror')
-                except:
-                    self.print_msg(f'Tried adding {infile} as a post processed navigation error file based on file extension {fileext}, failed to add to intel module.')
-                    self.print_msg('Exception logged: {}'.format(traceback.format_exc(limit=1)))
-        elif fileext in supported_export_log:
-            try:
-                new_data, updated_type, rerun_nav_file_match = self._add_to_intel(gather_exportlogfile_info(infile), self.navlog_intel, 'navlog')
-            except:
-                self.print_msg(f'Tried adding {infile} as an export log file based on file extension {fileext}, failed to add to intel module.')
-                self.print_msg('Exception logged: {}'.format(traceback.format_exc(limit=1)))
-        else:
-            if not silent:
-                self.print_msg('File is not of a supported type: {}'.format(infile), logging.ERROR)
-
-        # added files so lets load the existing project or setup a new one if there is no existing project
-        if new_data:
-            if self.project.path is None:
-                parent_dir = os.path.dirname(infile)
-                potential_project_file = os.path.join(parent_dir, 'kluster_project.json')
-                if os.path.exists(potential_project_file):
-                    self.project.open_project(potential_project_file, skip_dask=True)
-                    new_project = True
-                else:
-                    self.project._setup_new_project(os.path.dirname(infile))
-                    new_project = True
+            # added files so lets load the existing project or setup a new one if there is no existing project
+            if new_data:
+                if self.project.path is None:
+                    parent_dir = os.path.dirname(infile)
+                    potential_project_file = os.path.join(parent_dir, 'kluster_project.json')
+                    if os.path.exists(potential_project_file):
+                        self.project.open_project(potential_project_file, skip_dask=True)
+                        new_project = True
+                    else:
+                        self.project._setup_new_project(os.path.dirname(infile))
+                        new_project = True
+            if updated_type:
+                any_updated = True
+            results.append((updated_type, new_data, new_project))
 
-        # added files, so lets rebuild the matches for the appropriate category
+        # added files, so lets rebuild the matches for the appropriate category, once for the whole batch
         if rerun_mbes_file_match:
             self.match_multibeam_files_to_project()
-        elif rerun_nav_file_match:
+        if rerun_nav_file_match:
             self.match_navigation_files()
             self.match_navigation_files_to_project()
-        elif rerun_svp_file_match:
+        if rerun_svp_file_match:
             self.match_svp_files_to_project()
 
         # adding any new files should trigger rebuilding the action tab
-        if updated_type:
+        if any_updated:
             self.update_matches()
-
-        return updated_type, new_data, new_project
+        if to_gather:
+            self._save_file_info_cache()
+        return results
 
     def remove_file(self, infile: str):
         """
@@ -1620,6 +1752,115 @@ class SvpModule(IntelModule):
         return uid
 
 
+def file_signature(filename: str):
+    """
+    Return the size and modified time of the file, used to determine if the file has changed since we last gathered
+    information from it
+
+    Parameters
+    ----------
+    filename
+        full file path to a file
+
+    Returns
+    -------
+    tuple
+        (file size in bytes, modified time in nanoseconds)
+    """
+
+    stat_blob = os.stat(filename)
+    return stat_blob.st_size, stat_blob.st_mtime_ns
+
+
+def _encode_cache_value(value):
+    """
+    Convert the gathered file information to json compatible types for the FqprIntel file information cache.  Datetimes
+    and tuples are tagged so that _decode_cache_value can restore them, numpy values are converted to python values.
+    Raises TypeError for values that can not be stored.
+    """
+
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    elif isinstance(value, tuple):
+        return {'__tuple__': [_encode_cache_value(val) for val in value]}
+    elif isinstance(value, (list, np.ndarray)):
+        return [_encode_cache_value(val) for val in value]
+    elif isinstance(value, dict):
+        if not all([isinstance(ky, str) for ky in value.keys()]):
+            raise TypeError('file information cache only supports string keys')
+        return {ky: _encode_cache_value(val) for ky, val in value.items()}
+    elif isinstance(value, np.generic):
+        return value.item()
+    elif value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    raise TypeError('unable to store {} in the file information cache'.format(type(value)))
+
+
+def _decode_cache_value(pairs: list):
+    """
+    json object_pairs_hook for loading the FqprIntel file information cache, see _encode_cache_value
+    """
+
+    if len(pairs) == 1 and pairs[0][0] == '__datetime__':
+        return datetime.fromisoformat(pairs[0][1])
+    elif len(pairs) == 1 and pairs[0][0] == '__tuple__':
+        return tuple(pairs[0][1])
+    return OrderedDict(pairs)
+
+
+def gather_file_info(infile: str):
+    """
+    Determine the type of the provided file and gather the file information using the matching gather_xxxx function.
+
+    Parameters
+    ----------
+    infile
+        full file path to the file
+
+    Returns
+    -------
+    str
+        the data type of the file, one of 'multibeam', 'svp', 'navigation', 'naverror', 'navlog' or empty string if the
+        file is not a supported type
+    OrderedDict
+        attributes associated with one of the gather_xxxx functions, None if not a supported type
+    """
+
+    fileext = os.path.splitext(infile)[1]
+    if fileext in supported_mbes:
+        return 'multibeam', gather_multibeam_info(infile)
+    elif fileext in supported_svp:
+        return 'svp', gather_svp_info(infile)
+    elif fileext in supported_sbet:  # sbet and smrmsg have the same file extension sometimes ('.out') depending on what the user has done
+        if is_sbet(infile):
+            return 'navigation', gather_navfile_info(infile)
+        elif is_smrmsg(infile):
+            return 'naverror', gather_naverrorfile_info(infile)
+    elif fileext in supported_export_log:
+        return 'navlog', gather_exportlogfile_info(infile)
+    return '', None
+
+
+def _gather_file_info_safe(infile: str):
+    """
+    Run gather_file_info, returning the formatted exception instead of raising, for use in the thread pool in
+    FqprIntel.add_files
+
+    Returns
+    -------
+    list
+        [data type, file information, formatted exception or None]
+    """
+
+    try:
+        data_type, info = gather_file_info(infile)
+        return [data_type, info, None]
+    except:
+        fileext = os.path.splitext(infile)[1]
+        data_type = 'multibeam' if fileext in supported_mbes else 'svp' if fileext in supported_svp else fileext
+        return [data_type, None, traceback.format_exc(limit=1)]
+
+
 def gather_basic_file_info(filename: str):
     """
     Build out the basic file metadata that can be gathered from any file on the file system.
@@ -1982,16 +2223,15 @@ def intel_process(filname: Union[str, list], outfold: str = None, coord_system:
             filname = [os.path.join(filname, f) for f in os.listdir(filname)]
         else:
             filname = [filname]
-    for f in filname:
-        try:
-            updated_type, new_data, new_project = intel.add_file(f)
-        except Exception as e:
-            if logger:
-                logger.log(logging.ERROR, 'Unable to load from file {}'.format(f))
-                logger.log(logging.ERROR, e)
-            else:
-                print('Unable to load from file {}'.format(f))
-                print(e)
+    try:
+        intel.add_files(filname)
+    except Exception as e:
+        if logger:
+            logger.log(logging.ERROR, 'Unable to load from files {}'.format(filname))
+            logger.log(logging.ERROR, e)
+        else:
+            print('Unable to load from files {}'.format(filname))
+            print(e)
     while intel.has_actions:
         intel.execute_action()
     return intel, list(intel.project.fqpr_instances.values())
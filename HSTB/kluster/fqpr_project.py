@@ -13,6 +13,7 @@ from HSTB.kluster.fqpr_convenience import reload_data, reload_surface, get_attri
 from HSTB.kluster.fqpr_helpers import haversine
 from HSTB.kluster.fqpr_vessel import VesselFile, create_new_vessel_file, convert_from_fqpr_xyzrph, compare_dict_data, split_by_timestamp, trim_xyzrprh_to_times
 from HSTB.kluster.modules.autopatch import PatchTest
+from HSTB.kluster.modules.spatial_index import LineExtentIndex, return_line_extents
 from HSTB.kluster.logging_conf import LoggerClass
 from bathygrid.bgrid import BathyGrid
 
@@ -72,6 +73,9 @@ class FqprProject(LoggerClass):
         # ex: {'0001_20170822_144548_S5401_X.all': 'EM2040\\convert1'}
         self.convert_path_lookup = {}
 
+        # latitude/longitude extents of each line in the project, see regenerate_fqpr_lines and return_lines_in_box
+        self.line_extent_index = LineExtentIndex()
+
         # project settings, like the chosen vertical reference
         # ex: {'use_epsg': True, 'epsg': 26910, ...}
         self.settings = {}
@@ -341,6 +345,7 @@ class FqprProject(LoggerClass):
         self.fqpr_lines = {}
         self.fqpr_attrs = {}
         self.convert_path_lookup = {}
+        self.line_extent_index = LineExtentIndex()
         self.buffered_fqpr_navigation = {}
         self.point_cloud_for_line = {}
         self.node_vals_for_surf = {}
@@ -441,6 +446,7 @@ class FqprProject(LoggerClass):
                 else:
                     self.print_msg('remove_fqpr: On removing from project, unable to find loaded line attributes for {} in {}'.format(linename, relpath), logging.WARNING)
             if relpath in self.fqpr_lines:
+                self.line_extent_index.remove_lines(list(self.fqpr_lines[relpath].keys()))
                 self.fqpr_lines.pop(relpath)
             else:
                 self.print_msg('remove_fqpr: On removing from project, unable to find loaded lines for {}'.format(relpath), logging.WARNING)
@@ -532,7 +538,9 @@ class FqprProject(LoggerClass):
     def regenerate_fqpr_lines(self, pth: str):
         """
         After adding a new Fqpr object, we want to get the line information from the attributes so that we can quickly
-        access how many lines are in a project, and the time boundaries of these lines.
+        access how many lines are in a project, and the time boundaries of these lines.  The line extents from the
+        attributes are added to the line_extent_index.  Lines converted before the extents were added to the line
+        attributes get them from the navigation once, see Fqpr.build_line_extents.
 
         Parameters
         ----------
@@ -541,9 +549,15 @@ class FqprProject(LoggerClass):
         """
         for fq_name, fq_inst in self.fqpr_instances.items():
             if fq_name == pth:
+                if fq_name in self.fqpr_lines:
+                    self.line_extent_index.remove_lines(list(self.fqpr_lines[fq_name].keys()))
                 self.fqpr_lines[fq_name] = fq_inst.return_line_dict()
                 for linename in self.fqpr_lines[fq_name]:
                     self.convert_path_lookup[linename] = pth
+                if any([return_line_extents(fq_inst.line_attributes(linename)) is None for linename in self.fqpr_lines[fq_name]]):
+                    fq_inst.build_line_extents()
+                line_extents = {linename: return_line_extents(fq_inst.line_attributes(linename)) for linename in self.fqpr_lines[fq_name]}
+                self.line_extent_index.update_lines(line_extents)
 
     def build_visualizations(self, pth: str, visualization_type: str):
         """
@@ -711,7 +725,8 @@ class FqprProject(LoggerClass):
 
     def return_lines_in_box(self, min_lat: float, max_lat: float, min_lon: float, max_lon: float):
         """
-        With the given latitude/longitude boundaries, return the lines that are completely within these boundaries
+        With the given latitude/longitude boundaries, return the lines that are completely within these boundaries.
+        Uses the line extents in the line_extent_index, no navigation is read.
 
         Parameters
         ----------
@@ -729,21 +744,7 @@ class FqprProject(LoggerClass):
         list
             line names that fall within the box
         """
-        lines_in_box = []
-
-        for fq_proj in self.fqpr_lines:
-            for fq_line in self.fqpr_lines[fq_proj]:
-                lats, lons = self.return_line_navigation(fq_line)
-
-                line_min_lat = np.min(lats)
-                line_max_lat = np.max(lats)
-                line_min_lon = np.min(lons)
-                line_max_lon = np.max(lons)
-
-                if (line_max_lat < max_lat) and (line_min_lat > min_lat) and (line_max_lon < max_lon) and \
-                        (line_min_lon > min_lon):
-                    lines_in_box.append(fq_line)
-        return lines_in_box
+        return self.line_extent_index.query(min_lat, max_lat, min_lon, max_lon)
 
     def return_soundings_in_polygon(self, polygon: np.ndarray):
         """
@@ -960,7 +961,7 @@ class FqprProject(LoggerClass):
             fqpr_rel_pth = self.convert_path_lookup[multibeam_line]
             fq = self.fqpr_instances[fqpr_rel_pth]
             try:
-                start_time, end_time, start_latitude, start_longitude, end_latitude, end_longitude, line_az = fq.line_attributes(multibeam_line)
+                start_time, end_time, start_latitude, start_longitude, end_latitude, end_longitude, line_az = fq.line_attributes(multibeam_line)[:7]
                 start_position = [start_latitude, start_longitude]
                 end_position = [end_latitude, end_longitude]
             except:
@@ -1159,15 +1160,25 @@ class FqprProject(LoggerClass):
                 existname, linename = existblock.split('__')
             except:  # grids created prior to 0.9.5 have container_chunkindex naming, now we just do container__linename
                 existname = existblock
+                linename = None
             if existname in self.fqpr_instances:
                 existtime = None
-                for ename, etime in surf.container_timestamp.items():
-                    if ename.find(existname) != -1:
-                        existtime = datetime.strptime(etime, '%Y%m%d_%H%M%S')
-                        break
+                if existblock in surf.container_timestamp:
+                    existtime = datetime.strptime(surf.container_timestamp[existblock], '%Y%m%d_%H%M%S')
+                else:
+                    for ename, etime in surf.container_timestamp.items():
+                        if ename.find(existname) != -1:
+                            existtime = datetime.strptime(etime, '%Y%m%d_%H%M%S')
+                            break
                 if existtime:
-                    last_time = self.fqpr_instances[existname].last_operation_date
-                    if last_time > existtime:
+                    changed_lines = None
+                    if linename:  # use the sounding change records to only mark the lines that changed
+                        changed_lines = self.fqpr_instances[existname].return_changed_lines(existtime, line_names=[linename])
+                    if changed_lines is None:
+                        last_time = self.fqpr_instances[existname].last_operation_date
+                        if last_time > existtime:
+                            existing_needs_update.append(existblock)
+                    elif changed_lines:
                         existing_needs_update.append(existblock)
         existing_container_names = [exist if exist not in existing_needs_update else exist + '*' for exist in existing_container_names]
         possible_container_names = []
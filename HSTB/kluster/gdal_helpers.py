@@ -223,6 +223,69 @@ def gdal_raster_create(output_raster: str, data: list, geo_transform: list, crs:
     return dataset
 
 
+def gdal_raster_create_overviews(output_raster: str, data: list, geo_transform: list, crs: Union[CRS, int],
+                                 nodatavalue: float = 1000000.0, bandnames: tuple = (), block_size: int = 256,
+                                 resampling: str = 'AVERAGE'):
+    """
+    Build a tiled, compressed GeoTIFF from the provided data with internal overviews, halving the resolution until the
+    raster fits in one block.  Used for the rendered surface chunks, so that a viewer only reads the blocks in view at
+    the overview level that matches the zoom.
+
+    Parameters
+    ----------
+    output_raster
+        path to the output file we are writing here
+    data
+        list of numpy ndarrays, generally something like [2dim depth, 2dim uncertainty].  Can just be [2dim depth]
+    geo_transform
+        gdal geotransform for the raster [x origin, x pixel size, x rotation, y origin, y rotation, -y pixel size]
+    crs
+        pyproj CRS or an integer epsg code
+    nodatavalue
+        nodatavalue to use in raster
+    bandnames
+        list of string identifiers, should match the length of the data provided
+    block_size
+        width/height of the GeoTIFF blocks, overviews are built until the raster fits in one block
+    resampling
+        gdal resampling method for the overviews
+    """
+
+    gdal_raster_create(output_raster, data, geo_transform, crs, nodatavalue, bandnames,
+                       creation_options=['TILED=YES', f'BLOCKXSIZE={block_size}', f'BLOCKYSIZE={block_size}', 'COMPRESS=DEFLATE'])
+    maxdim = max(data[0].shape)
+    factors = []
+    factor = 2
+    while maxdim / factor >= block_size:
+        factors.append(factor)
+        factor *= 2
+    if factors:
+        dataset = gdal.Open(output_raster, gdal.GA_Update)
+        dataset.BuildOverviews(resampling, factors)
+        dataset = None
+
+
+def gdal_raster_alias(output_raster: str, source_raster: str, bandnames: tuple = ()):
+    """
+    Build a VRT that points to the source raster, with new band names.  The VRT uses the nodata value and the overviews
+    of the source raster.  Used to show a cached raster under a new name (ex: a vsimem path) without copying the data.
+
+    Parameters
+    ----------
+    output_raster
+        path to the output VRT, can be a vsimem path
+    source_raster
+        path to the source raster
+    bandnames
+        list of string identifiers for the bands of the VRT
+    """
+
+    dataset = gdal.BuildVRT(output_raster, [source_raster])
+    for cnt, bandname in enumerate(bandnames):
+        dataset.GetRasterBand(cnt + 1).SetDescription(bandname)
+    dataset = None
+
+
 def get_raster_bands(raster_source: str):
     """
     Return a list of all band names in the given GDAL supported raster file
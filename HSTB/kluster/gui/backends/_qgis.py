@@ -11,7 +11,7 @@ if not qgis_enabled:
 from HSTB.kluster.gui.backends._qt import qgis_core, qgis_gui
 from HSTB.kluster import __file__ as klusterdir
 
-from HSTB.kluster.gdal_helpers import gdal_raster_create, VectorLayer, gdal_output_file_exists, ogr_output_file_exists, get_raster_bands
+from HSTB.kluster.gdal_helpers import gdal_raster_create, gdal_raster_alias, VectorLayer, gdal_output_file_exists, ogr_output_file_exists, get_raster_bands
 from HSTB.kluster import kluster_variables
 
 from HSTB.shared import RegistryHelpers
@@ -2040,9 +2040,10 @@ class MapView(QtWidgets.QMainWindow):
         lyrname
             band layer name for the provided data
         data
-            list of either [2d array of depth] or [2d array of depth, 2d array of vert uncertainty]
+            list of either [2d array of depth] or [2d array of depth, 2d array of vert uncertainty], or the path to
+            the cached raster for this layer (see surface_cache.SurfaceRenderCache)
         geo_transform
-            [x origin, x pixel size, x rotation, y origin, y rotation, -y pixel size]
+            [x origin, x pixel size, x rotation, y origin, y rotation, -y pixel size], not used with a cached raster
         crs
             pyproj CRS or an integer epsg code
         resolution
@@ -2054,7 +2055,9 @@ class MapView(QtWidgets.QMainWindow):
         self.debug_print(f'2dview add_surface {surfname}, {lyrname}, {resolution} = {source}', logging.INFO)
 
         if not showlyr:
-            if all([lyrname.find(lyr) == -1 for lyr in ['density', 'hypothesis_count']]):
+            if isinstance(data, str):  # cached raster on disk, the vsimem source is a vrt pointing to it
+                gdal_raster_alias(source, data, (lyrname,))
+            elif all([lyrname.find(lyr) == -1 for lyr in ['density', 'hypothesis_count']]):
                 gdal_raster_create(source, data, geo_transform, crs, np.nan, (lyrname,))
             else:
                 gdal_raster_create(source, data, geo_transform, crs, 0, (lyrname,))
@@ -42,7 +42,7 @@ class ExportDialog(SaveStateDialog):
         self.hlayout_one.addWidget(self.start_msg)
         self.export_opts = QtWidgets.QComboBox()
         # self.export_opts.addItems(['csv', 'las', 'entwine'])  need to add entwine to the env
-        self.export_opts.addItems(['csv', 'las'])
+        self.export_opts.addItems(['csv', 'las', 'laz', 'parquet'])
         self.hlayout_one.addWidget(self.export_opts)
         self.csvdelimiter_lbl = QtWidgets.QLabel('Delimiter')
         self.hlayout_one.addWidget(self.csvdelimiter_lbl)
@@ -183,7 +183,7 @@ class ExportDialog(SaveStateDialog):
         else:
             self.status_msg.setText('')
             self.ok_button.setEnabled(True)
-        if combobox_text == 'csv':
+        if combobox_text in ['csv', 'parquet']:
             self.zdirect_check.show()
         else:
             self.zdirect_check.hide()
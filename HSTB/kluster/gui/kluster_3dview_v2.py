@@ -14,6 +14,8 @@ from matplotlib.colors import ListedColormap
 import numpy as np
 
 from HSTB.kluster import kluster_variables
+from HSTB.kluster.points_store import PointStore, return_decimation_cells, return_decimated_index, \
+    expand_decimated_selection, return_sorted_names
 
 from vispy import use, visuals, scene
 from vispy.util import keys
@@ -653,22 +655,9 @@ class ThreeDView(QtWidgets.QWidget):
         self.scatter_transform = None
         self.scatter_select_range = None
 
-        self.idrange = {}
-        self.idlookup = {}
-
         self.azimuth = None
-        self.id = np.array([], dtype=object)
-        self.head = np.array([], dtype=np.int8)
-        self.x = np.array([], dtype=np.float64)
-        self.y = np.array([], dtype=np.float64)
-        self.z = np.array([], dtype=np.float32)
-        self.rotx = np.array([], dtype=np.float64)
-        self.roty = np.array([], dtype=np.float64)
-        self.tvu = np.array([], dtype=np.float32)
-        self.rejected = np.array([], dtype=np.int32)
-        self.pointtime = np.array([], dtype=np.float64)
-        self.beam = np.array([], dtype=np.int32)
-        self.linename = np.array([], dtype=object)
+        # all loaded points, see the x, y, z... properties for the arrays
+        self.points = PointStore()
 
         # statistics are populated on display_points
         self.x_offset = 0.0
@@ -694,6 +683,8 @@ class ThreeDView(QtWidgets.QWidget):
         self.mean_beam = 0
         self.unique_systems = []
         self.unique_linenames = []
+        self._system_rank = None
+        self._linename_rank = None
 
         self.vertical_exaggeration = 1.0
         self.view_direction = 'north'
@@ -702,6 +693,9 @@ class ThreeDView(QtWidgets.QWidget):
         self.hide_lines = []
 
         self.displayed_points = None
+        self.point_cell = None  # decimation cell for each point when there are too many points to draw them all
+        self.visible_index = None  # index of the points that are not hidden (rejected/hidden lines)
+        self.display_index = None  # index of the points drawn in the scatter plot, see _build_display_index
         self.selected_points = None
         self.superselected_index = None
 
@@ -731,6 +725,21 @@ class ThreeDView(QtWidgets.QWidget):
         self._select_rect_color = clr
         self.line._color = clr
 
+    head = property(lambda self: self.points.head)
+    x = property(lambda self: self.points.x)
+    y = property(lambda self: self.points.y)
+    z = property(lambda self: self.points.z)
+    rotx = property(lambda self: self.points.rotx)
+    roty = property(lambda self: self.points.roty)
+    tvu = property(lambda self: self.points.tvu)
+    rejected = property(lambda self: self.points.rejected)
+    pointtime = property(lambda self: self.points.pointtime)
+    beam = property(lambda self: self.points.beam)
+    id_code = property(lambda self: self.points.id_code)
+    linename_code = property(lambda self: self.points.linename_code)
+    idrange = property(lambda self: self.points.idrange)
+    idlookup = property(lambda self: self.points.idlookup)
+
     @property
     def is_empty(self):
         if not self.z.any():
@@ -882,6 +891,7 @@ class ThreeDView(QtWidgets.QWidget):
         """
 
         self.azimuth = azimuth
+        rotx, roty = None, None
         if azimuth:
             cos_az = np.cos(azimuth)
             sin_az = np.sin(azimuth)
@@ -889,62 +899,22 @@ class ThreeDView(QtWidgets.QWidget):
 
             rotx = cos_az * x - sin_az * y
             roty = sin_az * x + cos_az * y
-            self.rotx = np.concatenate([self.rotx, rotx])
-            self.roty = np.concatenate([self.roty, roty])
-        else:
-            self.rotx = np.concatenate([self.rotx, x])
-            self.roty = np.concatenate([self.roty, y])
-
-        self.head = np.concatenate([self.head, head])
-
-        # expand the identifier to be the size of the input arrays
-        newid_array = np.full(head.shape[0], newid, dtype=object) + '_' + head.astype(str)
-        self.id = np.concatenate([self.id, newid_array])
-        uniqids = np.unique(newid_array)
-        for unid in uniqids:
-            headnum = int(unid[-1])
-            self.idlookup[unid] = newid
-            headwhere = np.where(head == headnum)[0]
-            headstart, headend = headwhere[0], headwhere[-1] + 1
-            self.idrange[unid] = [self.x.shape[0] + headstart, self.x.shape[0] + headend]
-
-        self.x = np.concatenate([self.x, x])
-        self.y = np.concatenate([self.y, y])
-        self.z = np.concatenate([self.z, z])
-        self.tvu = np.concatenate([self.tvu, tvu])
-        self.rejected = np.concatenate([self.rejected, rejected])
-        self.pointtime = np.concatenate([self.pointtime, pointtime])
-        self.beam = np.concatenate([self.beam, beam])
-        self.linename = np.concatenate([self.linename, linename])
+        self.points.add(head, x, y, z, tvu, rejected, pointtime, beam, newid, linename, rotx=rotx, roty=roty)
 
     def remove_points(self, system_id: str = None):
-        idrange = self.idrange.pop(system_id)
-        idlkup = self.idlookup.pop(system_id)
-        self.rotx = np.delete(self.rotx, slice(idrange[0], idrange[1]))
-        self.roty = np.delete(self.roty, slice(idrange[0], idrange[1]))
-        self.head = np.delete(self.head, slice(idrange[0], idrange[1]))
-        self.id = np.delete(self.id, slice(idrange[0], idrange[1]))
-        self.x = np.delete(self.x, slice(idrange[0], idrange[1]))
-        self.y = np.delete(self.y, slice(idrange[0], idrange[1]))
-        self.z = np.delete(self.z, slice(idrange[0], idrange[1]))
-        self.tvu = np.delete(self.tvu, slice(idrange[0], idrange[1]))
-        self.rejected = np.delete(self.rejected, slice(idrange[0], idrange[1]))
-        self.pointtime = np.delete(self.pointtime, slice(idrange[0], idrange[1]))
-        self.beam = np.delete(self.beam, slice(idrange[0], idrange[1]))
-        self.linename = np.delete(self.linename, slice(idrange[0], idrange[1]))
+        self.points.remove(system_id)
 
     def return_points(self):
         """
         Return all the data in the 3dview
         """
 
-        return [self.id, self.head, self.x, self.y, self.z, self.tvu, self.rejected, self.pointtime, self.beam, self.linename]
+        return [self.points.return_id(), self.head, self.x, self.y, self.z, self.tvu, self.rejected, self.pointtime,
+                self.beam, self.points.return_linename()]
 
     def return_lines_and_times(self):
         """
-        Return the unique line names and the associated time segments for each line in the points view.  This assumes that
-        data is added by line, in other words, that the self.linename array is sorted.  This should always be true the
-        way we add data to points view.
+        Return the unique line names and the associated time segments for each line in the points view.
 
         Returns
         -------
@@ -956,32 +926,7 @@ class ThreeDView(QtWidgets.QWidget):
             list of lists for the start time/end time for the line in utc seconds
         """
 
-        time_segments = []
-        systems = []
-        if self.linename.size > 0:
-            lsort = self.linename.argsort()  # necessary for dual head sonar, lines are not in order with multiple heads
-            linesort = self.linename[lsort]
-            timesort = self.pointtime[lsort]
-            idsort = self.id[lsort]
-            linenames, linestarts = np.unique(linesort, return_index=True)
-            lines_in_order = linestarts.argsort()
-            linenames, linestarts = linenames[lines_in_order], linestarts[lines_in_order]
-            for i in range(len(linenames) - 1):
-                line_timesort = timesort[linestarts[i]:linestarts[i + 1] - 1]
-                line_id = idsort[linestarts[i]:linestarts[i + 1] - 1]
-                for usystem in np.unique(line_id):
-                    tsegs = line_timesort[line_id == usystem]
-                    time_segments.append([tsegs.min(), tsegs.max()])
-                    systems.append(usystem)
-            line_timesort = timesort[linestarts[-1]:]
-            line_id = idsort[linestarts[-1]:]
-            for usystem in np.unique(line_id):
-                tsegs = line_timesort[line_id == usystem]
-                time_segments.append([tsegs.min(), tsegs.max()])
-                systems.append(usystem)
-        else:
-            linenames = []
-        return systems, linenames, time_segments
+        return self.points.return_lines_and_times()
 
     def _configure_2d_3d_view(self):
         """
@@ -1084,7 +1029,8 @@ class ThreeDView(QtWidgets.QWidget):
         Returns
         -------
         np.ndarray
-            (N,4) array, where N is the number of points and the values are the RGBA values for each point
+            (N,4) array, where N is the number of displayed points (see display_index) and the values are the RGBA
+            values for each point
         matplotlib.colors.ColorMap
             cmap object that we use later to build the color bar
         float
@@ -1093,7 +1039,8 @@ class ThreeDView(QtWidgets.QWidget):
             maximum value to use for the color bar
         """
 
-        # normalize the arrays and build the colors for each sounding
+        # normalize the arrays and build the colors for each displayed sounding
+        idx = self.display_index
         if self.is_empty:
             cmap = None
             clrs = np.array([], dtype=object)
@@ -1102,8 +1049,8 @@ class ThreeDView(QtWidgets.QWidget):
         elif color_by == 'id':
             if len(self.z) + 1 > 2**32:
                 raise NotImplementedError('Got more than 2^32 points, cant encode an ID as RGBA...')
-            # color each sounding by a unique id encoded as RGBA
-            ids = np.arange(1, len(self.z) + 1, dtype=np.uint32).view(np.uint8)
+            # color each sounding by a unique id encoded as RGBA, the id is the index of the point in all points
+            ids = (self.display_index + 1).astype(np.uint32).view(np.uint8)
             ids = ids.reshape(-1, 4)
             clrs = np.divide(ids, 255, dtype=np.float32)
             cmap = None
@@ -1114,33 +1061,29 @@ class ThreeDView(QtWidgets.QWidget):
         elif color_by == 'depth':
             min_val = self.min_z
             max_val = self.max_z
-            clrs, cmap = normalized_arr_to_rgb_v2((self.z - self.min_z) / (self.max_z - self.min_z), reverse=True)
+            clrs, cmap = normalized_arr_to_rgb_v2((self.z[idx] - self.min_z) / (self.max_z - self.min_z), reverse=True)
         elif color_by == 'vertical_uncertainty':
             min_val = self.min_tvu
             max_val = self.max_tvu
-            clrs, cmap = normalized_arr_to_rgb_v2((self.tvu - self.min_tvu) / (self.max_tvu - self.min_tvu))
+            clrs, cmap = normalized_arr_to_rgb_v2((self.tvu[idx] - self.min_tvu) / (self.max_tvu - self.min_tvu))
         elif color_by == 'beam':
             min_val = self.min_beam
             max_val = self.max_beam
-            clrs, cmap = normalized_arr_to_rgb_v2(self.beam / self.max_beam, band_count=self.max_beam)
+            clrs, cmap = normalized_arr_to_rgb_v2(self.beam[idx] / self.max_beam, band_count=self.max_beam)
         elif color_by == 'rejected':
             min_val = 0
             max_val = 3
             cmap = ListedColormap([kluster_variables.amplitude_color, kluster_variables.phase_color,
                                    kluster_variables.reject_color, kluster_variables.reaccept_color])
-            clrs = cmap(self.rejected / 3)
+            clrs = cmap(self.rejected[idx] / 3)
         elif color_by in ['system', 'linename']:
             min_val = 0
             if color_by == 'system':
-                vari = self.id
+                sys_idx = self._system_rank[self.id_code[idx]]
                 uvari = self.unique_systems
             else:
-                vari = self.linename
+                sys_idx = self._linename_rank[self.linename_code[idx]]
                 uvari = self.unique_linenames
-            sys_idx = np.zeros(vari.shape[0], dtype=np.int32)
-            for cnt, us in enumerate(uvari):
-                usidx = vari == us
-                sys_idx[usidx] = cnt
             max_val = len(uvari)
             clrs, cmap = normalized_arr_to_rgb_v2((sys_idx / max_val), band_count=max_val)
         else:
@@ -1149,14 +1092,11 @@ class ThreeDView(QtWidgets.QWidget):
         if self.selected_points is not None and self.selected_points.any() and color_selected:
             msk = np.zeros(self.displayed_points.shape[0], dtype=bool)
             msk[self.selected_points] = True
-            clrs[msk, :] = kluster_variables.selected_point_color
+            clrs[msk[idx], :] = kluster_variables.selected_point_color
             if self.superselected_index is not None:
                 msk[:] = False
                 msk[self.selected_points[self.superselected_index]] = True
-                clrs[msk, :] = kluster_variables.super_selected_point_color
-
-        msk = self._build_display_mask()
-        clrs = clrs[msk]
+                clrs[msk[idx], :] = kluster_variables.super_selected_point_color
 
         return clrs, cmap, min_val, max_val
 
@@ -1172,10 +1112,10 @@ class ThreeDView(QtWidgets.QWidget):
             (N,4) array, where N is the number of points and the values are the RGBA values for each point
         """
 
-        msk = self._build_display_mask()
+        pts = self.displayed_points[self.display_index]
         self.scatter.symbol = 'o'
         if self.is_3d:
-            self.scatter.set_data(self.displayed_points[msk], edge_color=clrs, face_color=clrs, size=3)
+            self.scatter.set_data(pts, edge_color=clrs, face_color=clrs, size=3)
             if self.view.camera.fresh_camera:
                 self.view.camera.center = (self.mean_x - self.x_offset, self.mean_y - self.y_offset, self.mean_z - self.min_z)
                 self.view.camera.distance = (self.max_x - self.x_offset) * 2
@@ -1183,13 +1123,13 @@ class ThreeDView(QtWidgets.QWidget):
                 self.view.camera.view_changed()
         else:
             if self.view_direction in ['north']:
-                self.scatter.set_data(self.displayed_points[msk][:, [0, 2]], edge_color=clrs, face_color=clrs, size=3)
+                self.scatter.set_data(pts[:, [0, 2]], edge_color=clrs, face_color=clrs, size=3)
                 self.view.camera.center = (self.mean_x - self.x_offset, self.mean_z - self.min_z)
                 if self.view.camera.fresh_camera:
                     self.view.camera.zoom((self.max_x - self.x_offset) + 10)  # try and fit the swath in view on load
                     self.view.camera.fresh_camera = False
             elif self.view_direction in ['east', 'arrow']:
-                self.scatter.set_data(self.displayed_points[msk][:, [1, 2]], edge_color=clrs, face_color=clrs, size=3)
+                self.scatter.set_data(pts[:, [1, 2]], edge_color=clrs, face_color=clrs, size=3)
                 self.view.camera.center = (self.mean_y - self.y_offset, self.mean_z - self.min_z)
                 if self.view.camera.fresh_camera:
                     self.view.camera.zoom((self.max_y - self.y_offset) + 10)  # try and fit the swath in view on load
@@ -1235,8 +1175,9 @@ class ThreeDView(QtWidgets.QWidget):
         self.mean_rejected = np.nanmean(self.rejected)
         self.mean_beam = np.nanmean(self.beam)
 
-        self.unique_systems = np.unique(self.id).tolist()
-        self.unique_linenames = np.unique(self.linename).tolist()
+        # sorted names of the systems/lines in the points, with the position of each code in the sorted names for coloring
+        self.unique_systems, self._system_rank = return_sorted_names(self.points.id_names, self.id_code)
+        self.unique_linenames, self._linename_rank = return_sorted_names(self.points.linenames, self.linename_code)
 
     def _build_display_mask(self):
         if not self.show_rejected:
@@ -1244,10 +1185,41 @@ class ThreeDView(QtWidgets.QWidget):
         else:
             msk = np.ones_like(self.rejected, dtype=bool)
         if self.hide_lines:
-            linemsk = ~np.isin(self.linename, self.hide_lines)
+            linemsk = ~self.points.linename_mask(self.hide_lines)
             msk = np.logical_and(msk, linemsk)
         return msk
 
+    def _build_display_index(self):
+        """
+        Build the index of the points to draw.  These are the points that are not hidden (see _build_display_mask),
+        with only one point drawn for each decimation cell if there are more than kluster_variables.pointsview_max_displayed
+        points (see points_store.return_decimation_cells).  Selection and cleaning still operate on all points, a
+        selected drawn point selects all the points in the cell, see expand_display_selection.
+        """
+
+        visible_index = np.where(self._build_display_mask())[0]
+        if self.visible_index is not None and np.array_equal(visible_index, self.visible_index):
+            return
+        self.visible_index = visible_index
+        self.display_index = return_decimated_index(self.point_cell, visible_index)
+
+    def expand_display_selection(self, selected: np.ndarray):
+        """
+        Expand the selected drawn points to all the points they stand for, when the drawn points are decimated
+
+        Parameters
+        ----------
+        selected
+            index of the selected drawn points in all points
+
+        Returns
+        -------
+        np.ndarray
+            index of the selected points in all points
+        """
+
+        return expand_decimated_selection(selected, self.point_cell, self.visible_index)
+
     def display_points(self, color_by: str = 'depth', vertical_exaggeration: float = 1.0, view_direction: str = 'north',
                        show_axis: bool = True, show_rejected: bool = True):
         """
@@ -1316,7 +1288,20 @@ class ThreeDView(QtWidgets.QWidget):
         if self.z_flipped:
             centered_z *= -1
 
-        self.displayed_points = np.stack([centered_x, centered_y, centered_z], axis=1)
+        self.displayed_points = np.empty((centered_z.shape[0], 3), dtype=np.float32)
+        self.displayed_points[:, 0] = centered_x
+        self.displayed_points[:, 1] = centered_y
+        self.displayed_points[:, 2] = centered_z
+        if self.is_3d:
+            self.point_cell = return_decimation_cells(self.displayed_points, kluster_variables.pointsview_max_displayed)
+        elif self.view_direction in ['north']:
+            self.point_cell = return_decimation_cells(self.displayed_points[:, [0, 2]], kluster_variables.pointsview_max_displayed)
+        else:
+            self.point_cell = return_decimation_cells(self.displayed_points[:, [1, 2]], kluster_variables.pointsview_max_displayed)
+        if self.point_cell is not None:
+            self.debug_print(f'points_view display_points - drawing one point for each of {self.point_cell.max() + 1} cells, {self.point_cell.size} points loaded', logging.INFO)
+        self.visible_index = None
+        self._build_display_index()
         clrs, cmap, minval, maxval = self._build_color_by_soundings(color_by)
 
         self.scatter = scene.visuals.Markers(parent=self.view.scene)
@@ -1338,17 +1323,19 @@ class ThreeDView(QtWidgets.QWidget):
         A quick highlight method that circumvents the slower set_data.  Simply set the new colors and update the data.
         """
 
+        if self.displayed_points is not None:
+            self._build_display_index()
         clrs, cmap, minval, maxval = self._build_color_by_soundings(color_by, color_selected)
         if self.scatter is not None:
-            msk = self._build_display_mask()
+            pts = self.displayed_points[self.display_index]
             self.scatter.symbol = 'o'
             if self.is_3d:
-                self.scatter.set_data(self.displayed_points[msk], edge_color=clrs, face_color=clrs, size=3)
+                self.scatter.set_data(pts, edge_color=clrs, face_color=clrs, size=3)
             else:
                 if self.view_direction in ['north']:
-                    self.scatter.set_data(self.displayed_points[msk][:, [0, 2]], edge_color=clrs, face_color=clrs, size=3)
+                    self.scatter.set_data(pts[:, [0, 2]], edge_color=clrs, face_color=clrs, size=3)
                 elif self.view_direction in ['east', 'arrow']:
-                    self.scatter.set_data(self.displayed_points[msk][:, [1, 2]], edge_color=clrs, face_color=clrs, size=3)
+                    self.scatter.set_data(pts[:, [1, 2]], edge_color=clrs, face_color=clrs, size=3)
         return cmap, minval, maxval
 
     def clear_display(self):
@@ -1370,21 +1357,11 @@ class ThreeDView(QtWidgets.QWidget):
         self.debug_print(f'points_view clearing all loaded data', logging.INFO)
 
         self.clear_display()
-        self.id = np.array([], dtype=object)
-        self.head = np.array([], dtype=np.int8)
-        self.x = np.array([], dtype=np.float64)
-        self.y = np.array([], dtype=np.float64)
-        self.z = np.array([], dtype=np.float32)
-        self.rotx = np.array([], dtype=np.float64)
-        self.roty = np.array([], dtype=np.float64)
-        self.tvu = np.array([], dtype=np.float32)
-        self.rejected = np.array([], dtype=np.int32)
-        self.pointtime = np.array([], dtype=np.float64)
-        self.beam = np.array([], dtype=np.int32)
-        self.linename = np.array([], dtype=object)
-
-        self.idrange = {}
-        self.idlookup = {}
+        self.points.clear()
+        self.displayed_points = None
+        self.point_cell = None
+        self.visible_index = None
+        self.display_index = None
         self.hide_lines = []
 
         if self.axis_x is not None:
@@ -1409,6 +1386,7 @@ class ThreeDWidget(QtWidgets.QWidget):
 
     points_selected = Signal(object, object, object, object, object, object, object, object, object, object)
     points_cleaned = Signal(object)
+    points_clean_undone = Signal(object, bool)
     patch_test_sig = Signal(bool)
 
     def __init__(self, parent=None, settings=None):
@@ -1711,7 +1689,7 @@ class ThreeDWidget(QtWidgets.QWidget):
     def _handle_point_selection(self, startpos, endpos, three_d: bool = False):
         linemsk = None
         if self.three_d_window.hide_lines:
-            linemsk = np.isin(self.three_d_window.linename, self.three_d_window.hide_lines)
+            linemsk = self.three_d_window.points.linename_mask(self.three_d_window.hide_lines)
         if three_d:
             # color the points by a unique rgba value, render with the new color and pull the id of the point by its color
             #  this is a workaround for the 3d camera transforms not working.  See https://github.com/vispy/vispy/issues/1336
@@ -1736,7 +1714,8 @@ class ThreeDWidget(QtWidgets.QWidget):
                     idx = idx - 1
                     # filter out the out of bounds indices
                     idx = idx[np.logical_and(idx > 0, idx < points_in_screen.shape[0])]
-                    points_in_screen[idx] = True
+                    # the drawn points might be decimated, select all the points that the drawn points stand for
+                    points_in_screen[self.three_d_window.expand_display_selection(idx)] = True
                     self.debug_print(f'points_view _handle_point_selection - remove background and out of bound indexes, left with {idx.size} points in selection', logging.INFO)
             self.three_d_window.scatter.update_gl_state(blend=True)
             self.three_d_window.scatter.antialias = 1
@@ -1767,7 +1746,7 @@ class ThreeDWidget(QtWidgets.QWidget):
         self.three_d_window.selected_points = points_in_screen
         self.three_d_window.superselected_index = None
         self.points_selected.emit(np.arange(self.three_d_window.selected_points.shape[0]),
-                                  self.three_d_window.linename[self.three_d_window.selected_points],
+                                  self.three_d_window.points.return_linename(self.three_d_window.selected_points),
                                   self.three_d_window.pointtime[self.three_d_window.selected_points],
                                   self.three_d_window.beam[self.three_d_window.selected_points],
                                   self.three_d_window.x[self.three_d_window.selected_points],
@@ -1775,7 +1754,7 @@ class ThreeDWidget(QtWidgets.QWidget):
                                   self.three_d_window.z[self.three_d_window.selected_points],
                                   self.three_d_window.tvu[self.three_d_window.selected_points],
                                   self.three_d_window.rejected[self.three_d_window.selected_points],
-                                  self.three_d_window.id[self.three_d_window.selected_points])
+                                  self.three_d_window.points.return_id(self.three_d_window.selected_points))
         self.three_d_window.highlight_selected_scatter(self.colorby.currentText())
 
     def clear_selection(self):
@@ -1789,7 +1768,7 @@ class ThreeDWidget(QtWidgets.QWidget):
         if not self.patch_test_running:
             points_in_screen = self._handle_point_selection(startpos, endpos, three_d)
             self.three_d_window.selected_points = points_in_screen
-            self.last_change_buffer.append([self.three_d_window.selected_points, self.three_d_window.rejected[self.three_d_window.selected_points]])
+            self.last_change_buffer.append([self.three_d_window.selected_points, self.three_d_window.rejected[self.three_d_window.selected_points], True])
             self.three_d_window.rejected[self.three_d_window.selected_points] = kluster_variables.rejected_flag
             self.points_cleaned.emit(kluster_variables.rejected_flag)
             self.three_d_window.highlight_selected_scatter(self.colorby.currentText(), False)
@@ -1807,7 +1786,8 @@ class ThreeDWidget(QtWidgets.QWidget):
             except AssertionError:
                 self.print(f'override_sounding_status: unable to override Points View rejected with new array, size does not match (new size {new_status.size} != {self.three_d_window.rejected.size}', logging.ERROR)
             self.three_d_window.selected_points = np.ones(self.three_d_window.rejected.shape[0], dtype=bool)
-            self.last_change_buffer.append([self.three_d_window.selected_points, self.three_d_window.rejected.copy()])
+            # filter results are saved by the filter, not in the edit journal
+            self.last_change_buffer.append([self.three_d_window.selected_points, self.three_d_window.rejected.copy(), False])
             self.three_d_window.rejected[self.three_d_window.selected_points] = new_status
             self.three_d_window.selected_points = None
             self.three_d_window.highlight_selected_scatter(self.colorby.currentText(), False)
@@ -1825,7 +1805,7 @@ class ThreeDWidget(QtWidgets.QWidget):
         is_rejected = self.three_d_window.rejected[points_in_screen] == kluster_variables.rejected_flag
         self.three_d_window.selected_points = points_in_screen[is_rejected]
         if is_rejected.any():
-            self.last_change_buffer.append([self.three_d_window.selected_points, self.three_d_window.rejected[self.three_d_window.selected_points]])
+            self.last_change_buffer.append([self.three_d_window.selected_points, self.three_d_window.rejected[self.three_d_window.selected_points], True])
             self.three_d_window.rejected[self.three_d_window.selected_points] = kluster_variables.accepted_flag
             self.points_cleaned.emit(kluster_variables.accepted_flag)
             if len(self.last_change_buffer) > kluster_variables.last_change_buffer_size:
@@ -1834,24 +1814,28 @@ class ThreeDWidget(QtWidgets.QWidget):
         self.three_d_window.highlight_selected_scatter(self.colorby.currentText(), False)
 
     def undo_clean(self):
+        """
+        Undo the last cleaning action in Points View.  The old status is shown here right away, the data is set back
+        by kluster_main.undo_pointsview_points_status
+        """
+
         if self.last_change_buffer:
-            last_select, last_status = self.last_change_buffer.pop(-1)
+            last_select, last_status, journaled = self.last_change_buffer.pop(-1)
             self.three_d_window.selected_points = last_select
             self.three_d_window.rejected[self.three_d_window.selected_points] = last_status
-            self.points_cleaned.emit(last_status)
+            self.points_clean_undone.emit(last_status, journaled)
             self.three_d_window.highlight_selected_scatter(self.colorby.currentText())
         else:
             self.print('undo_clean: no changes to undo', logging.INFO)
 
     def return_array(self, arr_name: str):
         idx = {}
-        select_id = self.three_d_window.id
+        select_id = self.three_d_window.id_code
         selarray = self.three_d_window.__getattribute__(arr_name)
-        uniq_ids = np.unique(select_id)
-        source_ids = [self.three_d_window.idlookup[uqid] for uqid in uniq_ids]
-        for uid, sid in zip(uniq_ids, source_ids):
-            headnum = int(uid[-1])
-            uid_filter = np.where(select_id == uid)[0]
+        uniq_codes = np.unique(select_id)
+        for ucode in uniq_codes:
+            uid = self.three_d_window.points.id_names[ucode]
+            uid_filter = np.where(select_id == ucode)[0]
             selarray_filtered = selarray[uid_filter]
             idx_key = self.three_d_window.idlookup[uid]
             if idx_key not in idx:
@@ -1874,12 +1858,12 @@ class ThreeDWidget(QtWidgets.QWidget):
 
         idx = {}
         if self.three_d_window.selected_points is not None:
-            select_id = self.three_d_window.id[self.three_d_window.selected_points]
-            uniq_ids = np.unique(select_id)
-            source_ids = [self.three_d_window.idlookup[uqid] for uqid in uniq_ids]
-            for uid, sid in zip(uniq_ids, source_ids):
+            select_id = self.three_d_window.id_code[self.three_d_window.selected_points]
+            uniq_codes = np.unique(select_id)
+            for ucode in uniq_codes:
+                uid = self.three_d_window.points.id_names[ucode]
                 headnum = int(uid[-1])
-                uid_filter = np.where(select_id == uid)[0]
+                uid_filter = np.where(select_id == ucode)[0]
                 selarray_filtered = selarray[uid_filter]
                 idx_key = self.three_d_window.idlookup[uid]
                 if idx_key not in idx:
@@ -1923,13 +1907,13 @@ class ThreeDWidget(QtWidgets.QWidget):
 
         idx = {}
         if self.three_d_window.selected_points is not None:
-            select_id = self.three_d_window.id[self.three_d_window.selected_points]
-            uniq_ids = np.unique(select_id)
-            source_ids = [self.three_d_window.idlookup[uqid] for uqid in uniq_ids]
-            for uid, sid in zip(uniq_ids, source_ids):
+            select_id = self.three_d_window.id_code[self.three_d_window.selected_points]
+            uniq_codes = np.unique(select_id)
+            for ucode in uniq_codes:
+                uid = self.three_d_window.points.id_names[ucode]
                 headnum = int(uid[-1])
                 data_start, data_end = self.three_d_window.idrange[uid]
-                uid_filter = np.where(select_id == uid)[0]
+                uid_filter = np.where(select_id == ucode)[0]
                 select_filtered = self.three_d_window.selected_points[uid_filter]
                 dat = select_filtered - data_start
                 idx_key = self.three_d_window.idlookup[uid]
@@ -349,7 +349,7 @@ class KlusterExplorer(TableWithCopy):
                     newline_attr['End Latitude'] = ln[1][4]
                     newline_attr['End Longitude'] = ln[1][5]
                     newline_attr['Heading (deg)'] = '{:3.3f}'.format(ln[1][6]).zfill(7)
-                    if len(ln[1]) == 8:  # added distance in kluster 1.1.1
+                    if len(ln[1]) >= 8:  # added distance in kluster 1.1.1
                         newline_attr['Distance (m)'] = ln[1][7]
                     else:
                         newline_attr['Distance (m)'] = ''
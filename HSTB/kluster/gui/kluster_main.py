@@ -136,6 +136,8 @@ class KlusterMain(QtWidgets.QMainWindow):
         self.two_d_dock = self.dock_this_widget('2d View', 'two_d_dock', self.two_d)
 
         self.points_view = kluster_3dview_v2.ThreeDWidget(self, self.settings_object)
+        # fqpr names with an edit_journal edit for each Points View cleaning action, see undo_pointsview_points_status
+        self.points_view_edits = []
         self.points_dock = self.dock_this_widget("Points View", 'points_dock', self.points_view)
         # for now we remove the ability to undock the three d window, vispy wont work if we do
         self.points_dock.setFeatures(QtWidgets.QDockWidget.DockWidgetMovable)
@@ -243,6 +245,7 @@ class KlusterMain(QtWidgets.QMainWindow):
 
         self.points_view.points_selected.connect(self.show_points_in_explorer)
         self.points_view.points_cleaned.connect(self.set_pointsview_points_status)
+        self.points_view.points_clean_undone.connect(self.undo_pointsview_points_status)
         self.points_view.patch_test_sig.connect(self.manual_patch_test)
 
         self.action_thread.tstarted.connect(self._start_action_progress)
@@ -993,11 +996,14 @@ class KlusterMain(QtWidgets.QMainWindow):
         self.intel.remove_file(filname)
 
     def _action_add_files(self, list_of_files):
+        existing_files = []
         for fil in list_of_files:
             if os.path.exists(fil):
-                self.intel.add_file(fil)
+                existing_files.append(fil)
             else:
                 self.print('Unable to find {}'.format(fil), logging.ERROR)
+        if existing_files:
+            self.intel.add_files(existing_files)
 
     def visualize_orientation(self, pth):
         self.project.build_visualizations(pth, 'orientation')
@@ -1701,7 +1707,7 @@ class KlusterMain(QtWidgets.QMainWindow):
                 for fcnt, ninfo in enumerate(fqinfo):
                     sonarid = f'{fqname}_{fcnt}'
                     fqheadsel = fqsel[fcnt].reshape(ninfo.shape)
-                    matches_sonar = self.points_view.three_d_window.id == sonarid
+                    matches_sonar = self.points_view.three_d_window.points.id_mask(sonarid)
                     # align the new sounding status values with the values in points view by querying by system/time/beam
                     pointsview_timebeam = np.column_stack([base_points_time[matches_sonar], base_points_beam[matches_sonar]])
                     results_timebeam = np.column_stack([subset_time, subset_beam])
@@ -2052,7 +2058,7 @@ class KlusterMain(QtWidgets.QMainWindow):
                 filterset = dlog.filter_chk.isChecked()
                 separateset = dlog.byidentifier_chk.isChecked()
                 z_pos_down = dlog.zdirect_check.isChecked()
-                if not dlog.canceled and export_type in ['csv', 'las', 'entwine']:
+                if not dlog.canceled and export_type in ['csv', 'las', 'laz', 'parquet', 'entwine']:
                     fq_chunks = []
                     for fq in fqprs:
                         relfq = self.project.path_relative_to_project(fq)
@@ -2862,33 +2868,77 @@ class KlusterMain(QtWidgets.QMainWindow):
 
         self.explorer.populate_explorer_with_points(point_index, linenames, point_times, beam, x, y, z, tvu, status, id)
 
-    def set_pointsview_points_status(self, new_status: Union[np.array, int, str, float] = 2):
+    def set_pointsview_points_status(self, new_status: Union[np.array, int, str, float] = 2, use_journal: bool = True):
         """
-        Take selected points in pointsview and set them to this new status (see detectioninfo).  Saved to memory and disk
+        Take selected points in pointsview and set them to this new status (see detectioninfo).  Set in memory right
+        away and saved to disk in the background, see Fqpr.edit_journal.  The journaled edits of each call are kept
+        for undo_pointsview_points_status.
 
         Parameters
         ----------
         new_status
             new integer flag for detection info status, 2 = Rejected
+        use_journal
+            if False, will save the new status to disk right away without an edit_journal edit, used to undo the filter
+            results, which are not journaled
         """
 
         if not self.points_view.patch_test_running:
             selected_points = self.points_view.return_select_index()
             if isinstance(new_status, np.ndarray):
                 new_status = self.points_view.split_by_selected(new_status)
+            edited = []
             for fqpr_name in selected_points:
                 fqpr = self.project.fqpr_instances[fqpr_name]
                 sel_points_idx = selected_points[fqpr_name]
-                if isinstance(new_status, dict):
-                    fqpr.set_variable_by_filter('detectioninfo', new_status[fqpr_name], sel_points_idx)
+                fqpr_status = new_status[fqpr_name] if isinstance(new_status, dict) else new_status
+                if use_journal:
+                    edit_count = len(fqpr.edit_journal.edits)
+                    fqpr.set_variable_by_filter('detectioninfo', fqpr_status, sel_points_idx, use_journal=True)
+                    if len(fqpr.edit_journal.edits) > edit_count:
+                        edited.append(fqpr_name)
+                    fqpr.edit_journal.flush(background=True)  # also writes the _soundings_last_cleaned attribute
                 else:
-                    fqpr.set_variable_by_filter('detectioninfo', new_status, sel_points_idx)
-                fqpr.write_attribute_to_ping_records({'_soundings_last_cleaned': datetime.utcnow().strftime('%c')})
+                    fqpr.edit_journal.flush()  # write the pending edits first, so they do not overwrite the new status
+                    fqpr.set_variable_by_filter('detectioninfo', fqpr_status, sel_points_idx)
+                    fqpr.write_attribute_to_ping_records({'_soundings_last_cleaned': datetime.utcnow().strftime('%c')})
                 self.project.refresh_fqpr_attribution(fqpr_name, relative_path=True)
+            if use_journal:
+                self.points_view_edits.append(edited)
+                if len(self.points_view_edits) > kluster_variables.last_change_buffer_size:
+                    self.points_view_edits.pop(0)
             self.points_view.clear_selection()
         else:
             self.print('Cleaning disabled while patch test is running', logging.WARNING)
 
+    def undo_pointsview_points_status(self, old_status: Union[np.array, int, str, float], journaled: bool):
+        """
+        Undo the last Points View cleaning action.  Cleaning actions are undone with the edit_journal of each Fqpr
+        edited by the action, filter results (not journaled) get the old status of the selected points again.
+
+        Parameters
+        ----------
+        old_status
+            the status of the selected points before the action, see set_pointsview_points_status
+        journaled
+            True if the action was saved with set_pointsview_points_status, and so has edit_journal edits
+        """
+
+        if not journaled:
+            self.set_pointsview_points_status(old_status, use_journal=False)
+            return
+        if not self.points_view_edits:
+            self.print('undo_pointsview_points_status: no edits found to undo', logging.WARNING)
+        else:
+            for fqpr_name in self.points_view_edits.pop(-1):
+                fqpr = self.project.fqpr_instances.get(fqpr_name, None)
+                if fqpr is None:  # container was removed from the project
+                    continue
+                fqpr.edit_journal.undo()
+                fqpr.edit_journal.flush(background=True)  # also writes the _soundings_last_cleaned attribute
+                self.project.refresh_fqpr_attribution(fqpr_name, relative_path=True)
+        self.points_view.clear_selection()
+
     def dock_this_widget(self, title, objname, widget):
         """
         All the kluster widgets go into dock widgets so we can undock and move them around.  This will wrap the
@@ -7,6 +7,7 @@ import logging
 from HSTB.kluster.gui.backends._qt import QtGui, QtCore, QtWidgets, Signal
 from HSTB.kluster.fqpr_project import return_project_data, reprocess_fqprs
 from HSTB.kluster import kluster_variables
+from HSTB.kluster.surface_cache import SurfaceRenderCache, return_render_cache_key
 from HSTB.kluster.fqpr_convenience import generate_new_surface, import_processed_navigation, overwrite_raw_navigation, \
     update_surface, reload_data, reload_surface, points_to_surface, generate_new_mosaic
 
@@ -159,7 +160,10 @@ class DrawNavigationWorker(MyWorker):
 
 class DrawSurfaceWorker(MyWorker):
     """
-    On opening a new surface, you have to get the surface tiles to display as in memory geotiffs in kluster_main
+    On opening a new surface, you have to get the surface tiles to display in kluster_main.  The chunks of tiles are
+    rendered once to the surface render cache (see surface_cache.SurfaceRenderCache), later draws only load the cached
+    files.  surface_data holds the path to the cached chunk file in place of the chunk data, unless the cache can not
+    be written to.
     """
 
     def __init__(self, parent=None):
@@ -196,18 +200,50 @@ class DrawSurfaceWorker(MyWorker):
                     surface_layer_name = 'depth'
                 else:
                     surface_layer_name = self.surface_layer_name
+                if surface_layer_name in ['density', 'hypothesis_count']:
+                    nodatavalue = 0
+                else:
+                    nodatavalue = np.nan
+                render_cache = SurfaceRenderCache(self.surf_object.output_folder)
+                if not render_cache.writable:
+                    self.parent().print(f'Unable to write the render cache {render_cache.cache_folder}, drawing the surface from memory', logging.WARNING)
+                    render_cache = None
+                else:
+                    render_cache.validate(return_render_cache_key(self.surf_object))
                 for resolution in self.resolution:
                     self.surface_data[resolution] = {}
+                    cached = render_cache.return_chunks(resolution, surface_layer_name) if render_cache else None
+                    if cached is not None:
+                        for chunk_count, chunk_file in enumerate(cached):
+                            self.surface_data[resolution][self.surface_layer_name + '_{}'.format(chunk_count + 1)] = [chunk_file, None]
+                        self.parent().debug_print(f'render cache: {self.surface_path} : {surface_layer_name} : {resolution}m loaded {len(cached)} cached chunks', logging.INFO)
+                        continue
                     chunk_count = 1
+                    chunk_files, geo_transforms, shapes = [], [], []
                     for geo_transform, maxdim, data in self.surf_object.get_chunks_of_tiles(resolution=resolution, layer=surface_layer_name,
                                                                                             override_maximum_chunk_dimension=kluster_variables.chunk_size_display,
                                                                                             nodatavalue=np.float32(np.nan), z_positive_up=self.surf_object.positive_up,
                                                                                             for_gdal=True):
                         data = list(data.values())
                         tilename = self.surface_layer_name + '_{}'.format(chunk_count)
-                        self.surface_data[resolution][tilename] = [data, geo_transform]
+                        if render_cache:
+                            shape = data[0].shape[::-1]  # data is transposed when written, see gdal_raster_create
+                            chunk_file = render_cache.return_chunk(resolution, surface_layer_name, geo_transform, shape)
+                            if chunk_file is None:
+                                chunk_file = render_cache.add_chunk(resolution, surface_layer_name, data, geo_transform,
+                                                                    self.surf_object.epsg, nodatavalue)
+                            chunk_files.append(chunk_file)
+                            geo_transforms.append(geo_transform)
+                            shapes.append(shape)
+                            self.surface_data[resolution][tilename] = [chunk_file, geo_transform]
+                        else:
+                            self.surface_data[resolution][tilename] = [data, geo_transform]
                         chunk_count += 1
                         self.parent().debug_print(f'surf_object.get_chunks_of_tiles: {self.surface_path} : {tilename} : {resolution}m geotransform {geo_transform} maxdimension {maxdim}', logging.INFO)
+                    if render_cache:
+                        render_cache.set_chunks(resolution, surface_layer_name, chunk_files, geo_transforms, shapes)
+                if render_cache:
+                    render_cache.save()
         except Exception as e:
             super().log_exception(e)
         self.tfinished.emit(True)
@@ -415,12 +451,12 @@ class FilterWorker(MyWorker):
     def filter_process(self, fq, subset_time=None, subset_beam=None):
         if self.mode == 'basic':
             self.parent().debug_print(f'run_filter {self.filter_name}, {self.kwargs}', logging.INFO)
-            new_status = fq.run_filter(self.filter_name, **self.kwargs)
+            new_status = fq.run_filter(self.filter_name, run_by_chunk=True, **self.kwargs)
             fq.multibeam.reload_pingrecords()
         elif self.mode == 'line':
             self.parent().debug_print(f'run_filter {self.filter_name}, {self.kwargs}', logging.INFO)
             fq.subset_by_lines(self.line_names)
-            new_status = fq.run_filter(self.filter_name, **self.kwargs)
+            new_status = fq.run_filter(self.filter_name, run_by_chunk=True, **self.kwargs)
             fq.restore_subset()
             fq.multibeam.reload_pingrecords()
         else:
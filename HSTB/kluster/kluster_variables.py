@@ -40,6 +40,7 @@ phase_detect_flag = 1
 rejected_flag = 2
 accepted_flag = 3
 last_change_buffer_size = 50
+pointsview_max_displayed = 1500000  # max number of points drawn in 3dview, above this the points are decimated for display, see points_store
 
 # qgis properties
 qgis_epsg = 4326
@@ -57,6 +58,13 @@ geohash_precision = 7  # our geohash string will have this many characters
 max_processing_status = 5  # when processing_status equals this value, the data is fully processed and ready to grid
 status_lookup = {0: 'converted', 1: 'orientation', 2: 'beamvector', 3: 'soundvelocity', 4: 'georeference', 5: 'tpu'}
 status_reverse_lookup = {'converted': 0, 'orientation': 1, 'beamvector': 2, 'soundvelocity': 3, 'georeference': 4, 'tpu': 5}
+adaptive_chunk_planner = True  # size the chunks and chunks at a time using the measured memory of each process, see dask_helpers.determine_optimal_chunks
+max_chunk_multiple = 4  # the adaptive chunk planner will build chunks up to this many times the ping_chunk_size
+pipelined_runs = 2  # number of runs in flight at once during processing, the chunks at a time are split across these runs
+intel_gather_workers = 8  # number of threads used to gather file information when adding files to the intelligence module
+ping_chunk_read_workers = 4  # number of ping chunks loaded at the same time when streaming line soundings to a surface
+filter_chunks_at_a_time = 8  # number of ping chunks filtered at the same time when running a filter by chunk, see BaseFilter.run_by_chunk
+datagram_index_sidecar = True  # save the datagram index and file metadata next to each multibeam file, see mmap_reader.return_datagram_index
 
 # raw.py EK/ES processing
 ek_build_heave = False  # the raw.py EK/ES driver will build a heave record if you enable this.  If the bottom detects are noisy, this can produce questionable data
@@ -93,6 +101,7 @@ default_vertical_reference = 'waterline'
 # export
 pings_per_las = 50000  # LAS export will put this many pings in one file before starting a new file
 pings_per_csv = 15000  # csv export will put this many pings in one file before starting a new file
+export_workers = 4  # number of lines exported at the same time in export_lines_to_file
 chunk_size_display = 5000  # width/height of the loaded grid chunks, lowering this creates more grid files but should lower the memory needed
 chunk_size_export = 20000  # width/height of the exported grid chunks, lowering this creates more grid files but should lower the memory needed
 
@@ -420,14 +429,15 @@ variable_descriptions = {'absorption': 'The mean absorption coefficient in dB/km
                          }
 
 int_parameters = ['converted_files_at_once', 'pings_per_las', 'pings_per_csv', 'max_profile_length', 'chunk_size_display',
-                  'chunk_size_export', 'max_converted_chunk_size']
+                  'chunk_size_export', 'max_converted_chunk_size', 'max_chunk_multiple', 'intel_gather_workers',
+                  'export_workers', 'ping_chunk_read_workers', 'filter_chunks_at_a_time', 'pointsview_max_displayed']
 float_parameters = ['default_heave_error', 'default_roll_sensor_error', 'default_pitch_sensor_error', 'default_heading_sensor_error',
                     'default_surface_sv_error', 'default_roll_patch_error', 'default_separation_model_error',
                     'default_waterline_error', 'default_horizontal_positioning_error', 'default_vertical_positioning_error',
                     'default_beam_opening_angle', 'mem_restart_threshold']
 str_parameters = ['pass_color', 'error_color', 'warning_color', 'amplitude_color', 'phase_color',
                   'reject_color', 'reaccept_color', 'ek_frequency_selection']
-bool_parameters = ['ek_build_heave']
+bool_parameters = ['ek_build_heave', 'adaptive_chunk_planner', 'datagram_index_sidecar']
 
 # retain the default values before overwriting with values written to the kluster initialization file
 kvar_initial_state = globals().copy()
@@ -0,0 +1,477 @@
+"""
+mmap_reader = datagram index for multibeam files, saved in a sidecar file next to each multibeam file.  The file is
+memory mapped, the datagram offsets are found in one numba compiled scan and the header fields are gathered directly
+from the mapped bytes into numpy arrays, without building a python object for each datagram.
+
+The datagram index (type, offset, size, time, ping counter) can be built for .all, .kmall and .s7k files, and is saved
+in the sidecar along with the file level metadata, see return_datagram_index.  The file level metadata is used for
+the file type, times and serial numbers in fast_read_multibeam_metadata (and so the intelligence file information),
+and the ping times in the index, if it has been built, provide the start and end time of the file.  Conversion chunks
+are still planned by file size, see xarray_conversion.determine_good_chunksize.
+
+Only the datagram headers are read here.  Conversion does not decode ping, attitude or navigation records from the
+memory mapped file, every record is read by the HSTB.drivers readers in fqpr_drivers.sequential_read_multibeam.
+"""
+
+import os
+import json
+import mmap
+import logging
+import tempfile
+import zipfile
+import numba
+import numpy as np
+
+from HSTB.kluster import kluster_variables
+
+all_stx = 2
+all_etx = 3
+all_attitude_type = 65  # 'A'
+all_position_type = 80  # 'P'
+all_rangeangle_type = 78  # 'N'
+all_header_size = 20  # length (4), stx, type, model (2), date (4), time (4), counter (2), serial (2)
+
+all_datagram_index_dtype = np.dtype([('offset', 'u8'), ('size', 'u4'), ('type', 'u1'), ('time', 'f8'),
+                                     ('counter', 'u2'), ('serial', 'u2')])
+# format independent datagram index, type is the .all datagram type, the .kmall datagram type (ex: '#MRZ') as a little
+#   endian uint32 or the .s7k record type identifier
+datagram_index_dtype = np.dtype([('type', 'u4'), ('offset', 'u8'), ('size', 'u4'), ('time', 'f8'), ('counter', 'u4')])
+kmall_mrz_type = int(np.frombuffer(b'#MRZ', dtype='<u4')[0])
+s7k_sync_pattern = 0x0000FFFF
+s7k_drf_size = 64
+ping_datagram_types = {'.all': [78, 88], '.kmall': [kmall_mrz_type], '.s7k': [7027]}
+sidecar_extension = '.kluster_index.npz'
+
+
+class MmapAllFile:
+    """
+    Memory mapped, read only view of a Kongsberg .all file.  Use as a context manager to ensure the map is closed.
+
+    | with MmapAllFile(r'C:/data_dir/0009_20170523_181119_FA2806.all') as mf:
+    |     idx = mf.index()
+    """
+
+    def __init__(self, multibeam_file: str):
+        self.multibeam_file = multibeam_file
+        self._fil = open(multibeam_file, 'rb')
+        if os.path.getsize(multibeam_file):
+            self._mmap = mmap.mmap(self._fil.fileno(), 0, access=mmap.ACCESS_READ)
+            self.buffer = np.frombuffer(self._mmap, dtype=np.uint8)
+        else:
+            self._mmap = None
+            self.buffer = np.zeros(0, dtype=np.uint8)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        # drop the numpy view first, mmap will not close with exported buffers
+        self.buffer = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._fil.close()
+
+    def index(self, start_pointer: int = 0, end_pointer: int = 0):
+        """
+        Build the index of all datagrams that start within start_pointer and end_pointer, see index_all_datagrams
+        """
+        return index_all_datagrams(self.buffer, start_pointer, end_pointer)
+
+
+
+@numba.njit(nogil=True)
+def _scan_all_datagrams(buffer: np.ndarray, start_pointer: int, end_pointer: int):
+    """
+    Walk the datagrams from start_pointer, following the length field of each datagram.  A datagram is valid if it
+    starts with STX and ends with ETX (followed by the two byte checksum).  If the datagram is not valid, we step forward
+    one byte and try again, which allows start_pointer to be anywhere in the file.
+
+    Returns the offset to the length field and the length (excluding the length field) of each valid datagram
+    """
+
+    buffer_size = buffer.shape[0]
+    max_datagrams = max((end_pointer - start_pointer) // all_header_size + 1, 1)
+    offsets = np.empty(max_datagrams, dtype=np.uint64)
+    sizes = np.empty(max_datagrams, dtype=np.uint32)
+    count = 0
+    pos = start_pointer
+    while pos < end_pointer and pos + all_header_size <= buffer_size:
+        size = np.uint32(buffer[pos]) | (np.uint32(buffer[pos + 1]) << 8) | (np.uint32(buffer[pos + 2]) << 16) | (np.uint32(buffer[pos + 3]) << 24)
+        etx_pos = pos + 4 + np.int64(size) - 3
+        if (size >= all_header_size - 4) and (etx_pos < buffer_size) and buffer[pos + 4] == all_stx and buffer[etx_pos] == all_etx:
+            offsets[count] = pos
+            sizes[count] = size
+            count += 1
+            pos += 4 + np.int64(size)
+        else:
+            pos += 1
+    return offsets[:count], sizes[:count]
+
+
+def _gather_fields(buffer: np.ndarray, offsets: np.ndarray, dtype: np.dtype):
+    """
+    Gather a fixed size record starting at each of the given byte offsets into a structured array of the given dtype
+
+    Parameters
+    ----------
+    buffer
+        uint8 view of the memory mapped file
+    offsets
+        1dim byte offset to the start of each record
+    dtype
+        numpy structured dtype describing the record
+
+    Returns
+    -------
+    np.ndarray
+        1dim structured array, one entry for each offset
+    """
+
+    if offsets.size == 0:
+        return np.zeros(0, dtype=dtype)
+    byte_idx = offsets.astype(np.int64)[:, None] + np.arange(dtype.itemsize, dtype=np.int64)
+    return np.ascontiguousarray(buffer[byte_idx]).view(dtype).ravel()
+
+
+def _all_datetime_to_utc(dates: np.ndarray, milliseconds: np.ndarray):
+    """
+    Convert the .all date (YYYYMMDD as an integer) and time (milliseconds since midnight) to UTC seconds.  Files span
+    at most a few dates, so we only build the datetime for each unique date.
+
+    Parameters
+    ----------
+    dates
+        1dim integer date, ex: 20170523
+    milliseconds
+        1dim milliseconds since midnight
+
+    Returns
+    -------
+    np.ndarray
+        1dim float64 UTC seconds
+    """
+
+    if dates.size == 0:
+        return np.zeros(0, dtype=np.float64)
+    unique_dates, date_idx = np.unique(dates, return_inverse=True)
+    day_seconds = np.array([np.datetime64('{:04d}-{:02d}-{:02d}'.format(d // 10000, (d // 100) % 100, d % 100), 's').astype(np.int64)
+                            if 19700101 <= d <= 30000101 else 0 for d in unique_dates.tolist()], dtype=np.float64)
+    return day_seconds[date_idx.ravel()] + milliseconds.astype(np.float64) / 1000
+
+
+def index_all_datagrams(buffer: np.ndarray, start_pointer: int = 0, end_pointer: int = 0):
+    """
+    Build the datagram index for the .all file in one scan.  Only datagrams that start within start_pointer and
+    end_pointer are included, matching the behavior of the sequential read in the HSTB.drivers readers, so that chunks
+    of a file can be indexed independently.
+
+    Parameters
+    ----------
+    buffer
+        uint8 view of the memory mapped file, see MmapAllFile
+    start_pointer
+        the start pointer that we start the scan at
+    end_pointer
+        the end pointer where we finish the scan, 0 for the end of the file
+
+    Returns
+    -------
+    np.ndarray
+        structured array of dtype all_datagram_index_dtype, one entry for each datagram
+    """
+
+    if not end_pointer or end_pointer > buffer.shape[0]:
+        end_pointer = buffer.shape[0]
+    offsets, sizes = _scan_all_datagrams(buffer, int(start_pointer), int(end_pointer))
+    header = _gather_fields(buffer, offsets + 4, np.dtype([('stx', 'u1'), ('type', 'u1'), ('model', '<u2'), ('date', '<u4'),
+                                                         ('time', '<u4'), ('counter', '<u2'), ('serial', '<u2')]))
+    dgram_index = np.zeros(offsets.size, dtype=all_datagram_index_dtype)
+    dgram_index['offset'] = offsets
+    dgram_index['size'] = sizes
+    dgram_index['type'] = header['type']
+    dgram_index['time'] = _all_datetime_to_utc(header['date'], header['time'])
+    dgram_index['counter'] = header['counter']
+    dgram_index['serial'] = header['serial']
+    return dgram_index
+
+
+@numba.njit(nogil=True)
+def _scan_kmall_datagrams(buffer: np.ndarray, start_pointer: int, end_pointer: int):
+    """
+    Walk the .kmall datagrams from start_pointer.  A datagram is valid if the type starts with '#' and the length is
+    repeated in the last four bytes of the datagram.  If the datagram is not valid, we step forward one byte and try again.
+
+    Returns the offset and the length of each valid datagram
+    """
+
+    buffer_size = buffer.shape[0]
+    max_datagrams = max((end_pointer - start_pointer) // 24 + 1, 1)
+    offsets = np.empty(max_datagrams, dtype=np.uint64)
+    sizes = np.empty(max_datagrams, dtype=np.uint32)
+    count = 0
+    pos = start_pointer
+    while pos < end_pointer and pos + 24 <= buffer_size:
+        size = np.uint32(buffer[pos]) | (np.uint32(buffer[pos + 1]) << 8) | (np.uint32(buffer[pos + 2]) << 16) | (np.uint32(buffer[pos + 3]) << 24)
+        end_pos = pos + np.int64(size)
+        if size >= 24 and end_pos <= buffer_size and buffer[pos + 4] == 35:  # 35 = '#'
+            trail = np.uint32(buffer[end_pos - 4]) | (np.uint32(buffer[end_pos - 3]) << 8) | (np.uint32(buffer[end_pos - 2]) << 16) | (np.uint32(buffer[end_pos - 1]) << 24)
+            if trail == size:
+                offsets[count] = pos
+                sizes[count] = size
+                count += 1
+                pos = end_pos
+                continue
+        pos += 1
+    return offsets[:count], sizes[:count]
+
+
+@numba.njit(nogil=True)
+def _scan_s7k_records(buffer: np.ndarray, start_pointer: int, end_pointer: int):
+    """
+    Walk the .s7k records from start_pointer.  A record is valid if the data record frame has the sync pattern and the
+    record size fits in the file.  If the record is not valid, we step forward one byte and try again.
+
+    Returns the offset and the size of each valid record
+    """
+
+    buffer_size = buffer.shape[0]
+    max_datagrams = max((end_pointer - start_pointer) // s7k_drf_size + 1, 1)
+    offsets = np.empty(max_datagrams, dtype=np.uint64)
+    sizes = np.empty(max_datagrams, dtype=np.uint32)
+    count = 0
+    pos = start_pointer
+    while pos < end_pointer and pos + s7k_drf_size <= buffer_size:
+        sync = np.uint32(buffer[pos + 4]) | (np.uint32(buffer[pos + 5]) << 8) | (np.uint32(buffer[pos + 6]) << 16) | (np.uint32(buffer[pos + 7]) << 24)
+        size = np.uint32(buffer[pos + 8]) | (np.uint32(buffer[pos + 9]) << 8) | (np.uint32(buffer[pos + 10]) << 16) | (np.uint32(buffer[pos + 11]) << 24)
+        if sync == s7k_sync_pattern and size >= s7k_drf_size and pos + np.int64(size) <= buffer_size:
+            offsets[count] = pos
+            sizes[count] = size
+            count += 1
+            pos += np.int64(size)
+        else:
+            pos += 1
+    return offsets[:count], sizes[:count]
+
+
+def _index_kmall_datagrams(buffer: np.ndarray, start_pointer: int, end_pointer: int):
+    offsets, sizes = _scan_kmall_datagrams(buffer, start_pointer, end_pointer)
+    header = _gather_fields(buffer, offsets + 4, np.dtype([('type', '<u4'), ('version', 'u1'), ('system', 'u1'),
+                                                         ('sounder', '<u2'), ('sec', '<u4'), ('nanosec', '<u4')]))
+    dgram_index = np.zeros(offsets.size, dtype=datagram_index_dtype)
+    dgram_index['type'] = header['type']
+    dgram_index['offset'] = offsets
+    dgram_index['size'] = sizes
+    dgram_index['time'] = header['sec'] + header['nanosec'] / 1e9
+    # MRZ common part follows the header (20) and the partition (4), ping counter after the common part size
+    is_mrz = dgram_index['type'] == kmall_mrz_type
+    dgram_index['counter'][is_mrz] = _gather_fields(buffer, offsets[is_mrz] + 26, np.dtype('<u2'))
+    return dgram_index
+
+
+def _index_s7k_records(buffer: np.ndarray, start_pointer: int, end_pointer: int):
+    offsets, sizes = _scan_s7k_records(buffer, start_pointer, end_pointer)
+    drf = _gather_fields(buffer, offsets + 20, np.dtype([('year', '<u2'), ('day', '<u2'), ('seconds', '<f4'),
+                                                       ('hours', 'u1'), ('minutes', 'u1'), ('version', '<u2'),
+                                                       ('type', '<u4')]))
+    dgram_index = np.zeros(offsets.size, dtype=datagram_index_dtype)
+    dgram_index['type'] = drf['type']
+    dgram_index['offset'] = offsets
+    dgram_index['size'] = sizes
+    if offsets.size:
+        unique_years, year_idx = np.unique(drf['year'], return_inverse=True)
+        year_seconds = np.array([np.datetime64('{:04d}-01-01'.format(yr), 's').astype(np.int64) if 1970 <= yr <= 3000 else 0
+                                 for yr in unique_years.tolist()], dtype=np.float64)
+        dgram_index['time'] = year_seconds[year_idx.ravel()] + (drf['day'].astype(np.float64) - 1) * 86400 + \
+            drf['hours'] * 3600.0 + drf['minutes'] * 60.0 + drf['seconds']
+    return dgram_index
+
+
+def index_multibeam_file(multibeam_file: str, start_pointer: int = 0, end_pointer: int = 0):
+    """
+    Build the format independent datagram index for a .all, .kmall or .s7k file in one scan of the memory mapped file.
+
+    Parameters
+    ----------
+    multibeam_file
+        path to the multibeam file
+    start_pointer
+        the start pointer that we start the scan at
+    end_pointer
+        the end pointer where we finish the scan, 0 for the end of the file
+
+    Returns
+    -------
+    np.ndarray
+        structured array of dtype datagram_index_dtype, one entry for each datagram
+    """
+
+    fileext = os.path.splitext(multibeam_file)[1]
+    if fileext not in ping_datagram_types:
+        raise NotImplementedError('mmap_reader: datagram index is only supported for {}, found {}'.format(list(ping_datagram_types.keys()), multibeam_file))
+    with MmapAllFile(multibeam_file) as mf:
+        buffer = mf.buffer
+        if not end_pointer or end_pointer > buffer.shape[0]:
+            end_pointer = buffer.shape[0]
+        if fileext == '.all':
+            all_index = index_all_datagrams(buffer, start_pointer, end_pointer)
+            dgram_index = np.zeros(all_index.size, dtype=datagram_index_dtype)
+            for ky in ['type', 'offset', 'size', 'time', 'counter']:
+                dgram_index[ky] = all_index[ky]
+        elif fileext == '.kmall':
+            dgram_index = _index_kmall_datagrams(buffer, int(start_pointer), int(end_pointer))
+        else:
+            dgram_index = _index_s7k_records(buffer, int(start_pointer), int(end_pointer))
+        del buffer
+    return dgram_index
+
+
+def return_sidecar_path(multibeam_file: str):
+    """
+    Return the path to the sidecar index file for the multibeam file, stored next to the multibeam file
+
+    Parameters
+    ----------
+    multibeam_file
+        path to the multibeam file
+
+    Returns
+    -------
+    str
+        path to the sidecar index file
+    """
+
+    return multibeam_file + sidecar_extension
+
+
+def _file_signature(multibeam_file: str):
+    filestat = os.stat(multibeam_file)
+    return [int(filestat.st_size), int(filestat.st_mtime_ns)]
+
+
+def load_sidecar(multibeam_file: str):
+    """
+    Load the sidecar index file for the multibeam file.  The sidecar is only valid if the file size and modified time
+    match the ones saved with the sidecar.  A corrupt or truncated sidecar is logged and treated like a missing one, the
+    index is rebuilt and the sidecar overwritten by return_datagram_index/save_sidecar.
+
+    Parameters
+    ----------
+    multibeam_file
+        path to the multibeam file
+
+    Returns
+    -------
+    np.ndarray
+        datagram index saved in the sidecar, None if the index has not been built
+    dict
+        file level metadata saved in the sidecar, see fqpr_drivers.fast_read_multibeam_metadata
+    """
+
+    sidecar_path = return_sidecar_path(multibeam_file)
+    if not kluster_variables.datagram_index_sidecar or not os.path.exists(sidecar_path):
+        return None, {}
+    try:
+        with np.load(sidecar_path, allow_pickle=False) as sidecar:
+            if list(sidecar['signature']) != _file_signature(multibeam_file):
+                return None, {}
+            dgram_index = sidecar['datagram_index'] if bool(sidecar['has_index']) else None
+            metadata = json.loads(str(sidecar['metadata']))
+    except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile) as e:
+        logging.getLogger(__name__).warning('load_sidecar: unable to read {}, rebuilding the index: {}'.format(sidecar_path, e))
+        return None, {}
+    return dgram_index, metadata
+
+
+def save_sidecar(multibeam_file: str, dgram_index: np.ndarray = None, metadata: dict = None):
+    """
+    Save the datagram index and/or the file level metadata to the sidecar index file.  Anything not provided is
+    retained from the existing sidecar, if it is still valid.  The sidecar is written to a temporary file in the same
+    directory and then moved over the existing sidecar, so an interrupted write never leaves a partial sidecar.  Failing
+    to write the sidecar (read only data directory) is not an error, the index is just rebuilt the next time.
+
+    Parameters
+    ----------
+    multibeam_file
+        path to the multibeam file
+    dgram_index
+        output of index_multibeam_file
+    metadata
+        file level metadata, see fqpr_drivers.fast_read_multibeam_metadata
+    """
+
+    if not kluster_variables.datagram_index_sidecar:
+        return
+    existing_index, existing_metadata = load_sidecar(multibeam_file)
+    if dgram_index is None:
+        dgram_index = existing_index
+    if metadata:
+        existing_metadata.update(metadata)
+    has_index = dgram_index is not None
+    if not has_index:
+        dgram_index = np.zeros(0, dtype=datagram_index_dtype)
+    sidecar_path = return_sidecar_path(multibeam_file)
+    try:
+        tmpfile, tmppath = tempfile.mkstemp(suffix='.tmp', prefix=os.path.basename(sidecar_path) + '.',
+                                            dir=os.path.dirname(os.path.abspath(sidecar_path)))
+    except OSError:
+        return
+    try:
+        with os.fdopen(tmpfile, 'wb') as sidecar:
+            np.savez(sidecar, signature=np.array(_file_signature(multibeam_file), dtype=np.int64), has_index=has_index,
+                     datagram_index=dgram_index, metadata=json.dumps(existing_metadata))
+        os.replace(tmppath, sidecar_path)
+    except OSError:
+        try:
+            os.remove(tmppath)
+        except OSError:
+            pass
+
+
+def return_datagram_index(multibeam_file: str):
+    """
+    Return the datagram index for the multibeam file, loading it from the sidecar index file if it is valid, otherwise
+    building it and saving it to the sidecar.
+
+    Parameters
+    ----------
+    multibeam_file
+        path to the multibeam file
+
+    Returns
+    -------
+    np.ndarray
+        structured array of dtype datagram_index_dtype, one entry for each datagram
+    """
+
+    dgram_index, _ = load_sidecar(multibeam_file)
+    if dgram_index is None:
+        dgram_index = index_multibeam_file(multibeam_file)
+        save_sidecar(multibeam_file, dgram_index=dgram_index)
+    return dgram_index
+
+
+def return_ping_start_end_time(dgram_index: np.ndarray, fileext: str):
+    """
+    Return the time of the first and last ping datagram in the index
+
+    Parameters
+    ----------
+    dgram_index
+        output of index_multibeam_file
+    fileext
+        file extension of the multibeam file, see ping_datagram_types
+
+    Returns
+    -------
+    list
+        [UTC start time in seconds, UTC end time in seconds], None if there are no ping datagrams
+    """
+
+    ping_times = dgram_index['time'][np.isin(dgram_index['type'], ping_datagram_types[fileext])]
+    if ping_times.size == 0:
+        return None
+    return [float(ping_times.min()), float(ping_times.max())]
@@ -4,11 +4,232 @@ from time import perf_counter
 import matplotlib.pyplot as plt
 
 from bathygrid.convenience import create_grid
+from bathygrid.grid_variables import depth_resolution_lookup
 from HSTB.kluster.fqpr_convenience import reprocess_sounding_selection
 from HSTB.kluster import kluster_variables
 from HSTB.kluster.fqpr_helpers import seconds_to_formatted_string
 
 
+def patch_rotation_matrix(roll: float, pitch: float, yaw: float):
+    """
+    Build the rpy rotation matrix for the provided angles, the numpy equivalent of rotations.build_mounting_angle_mat
+    for a single set of angles.
+
+    Parameters
+    ----------
+    roll
+        roll angle in degrees
+    pitch
+        pitch angle in degrees
+    yaw
+        yaw angle in degrees
+
+    Returns
+    -------
+    np.ndarray
+        (3, 3) rotation matrix
+    """
+
+    r, p, y = np.deg2rad(roll), np.deg2rad(pitch), np.deg2rad(yaw)
+    rcos, pcos, ycos = np.cos(r), np.cos(p), np.cos(y)
+    rsin, psin, ysin = np.sin(r), np.sin(p), np.sin(y)
+    return np.array([[ycos * pcos, ycos * psin * rsin - ysin * rcos, ycos * psin * rcos + ysin * rsin],
+                     [ysin * pcos, ysin * psin * rsin + ycos * rcos, ysin * psin * rcos - ycos * rsin],
+                     [-psin, pcos * rsin, pcos * rcos]])
+
+
+class PatchTestEngine:
+    """
+    In memory reprocessing kernel for the patch test.  The sound velocity corrected offsets (alongtrack, acrosstrack,
+    depthoffset), the heading and the georeferenced soundings are loaded once for the valid soundings of each line.  The
+    offsets already contain the two way travel time, ray trace and navigation, none of which depend on the patch test
+    parameters.  An adjustment of the mounting angles/translation is then applied as a rotation/translation of the cached
+    offsets, and the change in the offsets is georeferenced using the cached heading.  Nothing is written to disk and
+    the Fqpr processing pipeline is not run.
+
+    This treats the adjustment as a rigid rotation of the sounding about the transducer, ignoring the change in
+    refraction from the change in beam angle, which is small for the few tenths of a degree adjusted in a patch test.
+    """
+
+    def __init__(self, fqpr):
+        """
+        Parameters
+        ----------
+        fqpr
+            'Fully processed ping record', Kluster processed FQPR instance subset to the lines of interest
+        """
+
+        if fqpr.horizontal_crs is not None and not fqpr.horizontal_crs.is_projected:
+            raise ValueError('PatchTestEngine: the fast patch test requires a projected coordinate system, use fast_reprocess=False')
+        # depth is positive up relative to the depthoffset with ellipsoidally based vertical references, see georef_by_worker
+        self.z_sign = -1 if fqpr.vert_ref in kluster_variables.ellipse_based_vertical_references else 1
+        self.multibeam_indexes = {}  # the start/end index of the soundings for each line
+        self.soundings = None  # structured array of the cached offsets, heading and georeferenced position of each sounding
+
+        curr_point_index = 0
+        line_soundings = []
+        for linename in fqpr.return_line_dict().keys():
+            pts = fqpr.subset.return_points_by_line(linename, ('x', 'y', 'z', 'alongtrack', 'acrosstrack', 'depthoffset', 'heading'))
+            if pts is None:
+                continue
+            if not all([var in pts.dtype.names for var in ['alongtrack', 'acrosstrack', 'depthoffset', 'heading']]):
+                raise ValueError(f'PatchTestEngine: unable to find the sound velocity corrected offsets and heading for {linename}, use fast_reprocess=False')
+            line_soundings.append(pts)
+            self.multibeam_indexes[linename] = [curr_point_index, curr_point_index + pts.size]
+            curr_point_index += pts.size
+        if line_soundings:
+            self.soundings = np.concatenate(line_soundings)
+            self._offsets = np.column_stack([self.soundings['alongtrack'], self.soundings['acrosstrack'],
+                                             self.soundings['depthoffset']]).astype(np.float64)
+            hdng = np.deg2rad(self.soundings['heading'].astype(np.float64))
+            self._sin_hdng, self._cos_hdng = np.sin(hdng), np.cos(hdng)
+
+    def georeference(self, roll: float = 0.0, pitch: float = 0.0, heading: float = 0.0, x_offset: float = 0.0,
+                     y_offset: float = 0.0):
+        """
+        Return the georeferenced soundings with the provided adjustment applied, the adjustment being the total change
+        in the patch test parameters from the parameters the data was processed with.
+
+        Parameters
+        ----------
+        roll
+            roll adjustment value in degrees
+        pitch
+            pitch adjustment value in degrees
+        heading
+            heading adjustment value in degrees
+        x_offset
+            x offset adjustment value in meters
+        y_offset
+            y offset adjustment value in meters
+
+        Returns
+        -------
+        np.ndarray
+            structured array of the adjusted soundings (x, y, z), in the same order as the cached soundings
+        """
+
+        dtyp = [('x', np.float64), ('y', np.float64), ('z', np.float32)]
+        if self.soundings is None:
+            return np.empty(0, dtype=dtyp)
+        new_offsets = self._offsets @ patch_rotation_matrix(roll, pitch, heading).T
+        new_offsets[:, 0] += x_offset
+        new_offsets[:, 1] += y_offset
+        delta = new_offsets - self._offsets
+        points = np.empty(self.soundings.size, dtype=dtyp)
+        # rotate the vessel relative change in offsets by heading to get the change in easting/northing
+        points['x'] = self.soundings['x'] + delta[:, 0] * self._sin_hdng + delta[:, 1] * self._cos_hdng
+        points['y'] = self.soundings['y'] + delta[:, 0] * self._cos_hdng - delta[:, 1] * self._sin_hdng
+        points['z'] = self.soundings['z'] + self.z_sign * delta[:, 2]
+        return points
+
+
+class PatchTestGrid:
+    """
+    Reusable single resolution binning of the patch test soundings.  The node layout is built once from the first set
+    of soundings (with padding, so that the adjusted soundings still fall within the grid), each iteration then only
+    bins the soundings into the existing nodes.  Provides the layers (depth, x_slope, y_slope and the depth of each line)
+    that PatchTest uses from the bathygrid grid.
+    """
+
+    def __init__(self, points: np.ndarray, resolution: float = None, padding: float = 0.1):
+        """
+        Parameters
+        ----------
+        points
+            structured array of the soundings (x, y, z)
+        resolution
+            resolution of the grid nodes, if None will use the bathygrid depth resolution lookup for the median depth
+        padding
+            fraction of the extents of the soundings to add on each side of the grid
+        """
+
+        if resolution is None:
+            resolution = self.return_resolution_for_depth(float(np.nanmedian(np.abs(points['z']))))
+        self.resolutions = [resolution]
+        pad_x = (points['x'].max() - points['x'].min()) * padding + resolution
+        pad_y = (points['y'].max() - points['y'].min()) * padding + resolution
+        self.min_x = np.floor((points['x'].min() - pad_x) / resolution) * resolution
+        self.min_y = np.floor((points['y'].min() - pad_y) / resolution) * resolution
+        self.width = int(np.ceil((points['x'].max() + pad_x - self.min_x) / resolution))
+        self.height = int(np.ceil((points['y'].max() + pad_y - self.min_y) / resolution))
+        self.max_x = self.min_x + self.width * resolution
+        self.max_y = self.min_y + self.height * resolution
+        self.layers = {}  # the (height, width) gridded layers from the last call to grid
+
+    @staticmethod
+    def return_resolution_for_depth(depth: float):
+        """
+        Return the resolution from the bathygrid depth resolution lookup for the provided depth
+
+        Parameters
+        ----------
+        depth
+            depth in meters
+
+        Returns
+        -------
+        float
+            grid resolution in meters
+        """
+
+        max_depths = sorted(depth_resolution_lookup.keys())
+        for max_depth in max_depths:
+            if depth <= max_depth:
+                return float(depth_resolution_lookup[max_depth])
+        return float(depth_resolution_lookup[max_depths[-1]])
+
+    def _bin_mean(self, cell_idx: np.ndarray, z: np.ndarray):
+        ncells = self.width * self.height
+        sums = np.bincount(cell_idx, weights=z, minlength=ncells)
+        counts = np.bincount(cell_idx, minlength=ncells)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(counts > 0, sums / counts, np.nan).reshape(self.height, self.width)
+
+    def grid(self, points: np.ndarray, multibeam_indexes: dict):
+        """
+        Bin the soundings into the grid nodes, building the mean depth of all soundings and of each line and the slope
+        of the mean depth.  Soundings outside of the grid are dropped.
+
+        Parameters
+        ----------
+        points
+            structured array of the soundings (x, y, z)
+        multibeam_indexes
+            dict of {line name: [start index, end index]} of the soundings for each line
+        """
+
+        col = np.floor((points['x'] - self.min_x) / self.resolutions[0])
+        row = np.floor((points['y'] - self.min_y) / self.resolutions[0])
+        inside = (col >= 0) & (col < self.width) & (row >= 0) & (row < self.height) & ~np.isnan(points['z'])
+        cell_idx = np.full(points.size, -1, dtype=np.int64)
+        cell_idx[inside] = row[inside].astype(np.int64) * self.width + col[inside].astype(np.int64)
+
+        z = points['z'].astype(np.float64)
+        self.layers = {'depth': self._bin_mean(cell_idx[inside], z[inside])}
+        self.layers['y_slope'], self.layers['x_slope'] = np.gradient(self.layers['depth'], self.resolutions[0])
+        for linename, (strt, end) in multibeam_indexes.items():
+            line_inside = inside[strt:end]
+            self.layers[linename] = self._bin_mean(cell_idx[strt:end][line_inside], z[strt:end][line_inside])
+
+    def get_layers_by_name(self, layer_names: list):
+        """
+        Return the gridded layers by name, see grid
+
+        Parameters
+        ----------
+        layer_names
+            list of layer names, i.e. 'depth', 'x_slope', 'y_slope' or one of the line names
+
+        Returns
+        -------
+        list
+            list of (height, width) numpy arrays for each layer
+        """
+
+        return [self.layers[lname] for lname in layer_names]
+
+
 class PatchTest:
     """
     WARNING: This module is not finished.  I'm not currently getting good results from the model, I believe due to the
@@ -27,7 +248,7 @@ class PatchTest:
     The six parameters are roll, pitch, heading, x translation, y translation and horizontal scale factor.
     """
 
-    def __init__(self, fqpr, azimuth: float, sonar_head_index: int = None):
+    def __init__(self, fqpr, azimuth: float, sonar_head_index: int = None, fast_reprocess: bool = False):
         """
         Parameters
         ----------
@@ -37,10 +258,15 @@ class PatchTest:
             azimuth of one of the lines that we will use to rotate all points
         sonar_head_index
             only used with dual head systems, 0 = port head, 1 = starboard head
+        fast_reprocess
+            if True, will adjust the cached soundings with the PatchTestEngine and bin them with a PatchTestGrid on each
+            iteration, an approximation of the full reprocessing (see PatchTestEngine).  if False, will reprocess the
+            soundings with the full Kluster processing pipeline and build a new bathygrid grid on each iteration.
         """
 
         self.fqpr = fqpr
         self.azimuth = azimuth
+        self.fast_reprocess = fast_reprocess
         if self.fqpr.multibeam.is_dual_head():
             if sonar_head_index is None:
                 raise ValueError('PatchTest: Sonar head index must be provided if the sonar is a dual head system')
@@ -65,6 +291,7 @@ class PatchTest:
 
         self.multibeam_files = self.fqpr.multibeam.raw_ping[0].multibeam_files  # lookup for time/position/azimuth for each line
         self.multibeam_indexes = None  # the integer index of the line to look up the corresponding points
+        self.engine = None  # the PatchTestEngine with the cached soundings, if fast_reprocess
         self.points = None  # numpy structured array of all the rotated points we use
         self.min_x = None  # the minimum easting of the points
         self.min_y = None  # the minimum northing of the points
@@ -250,6 +477,12 @@ class PatchTest:
         file.  This is important later in constructing the L1 matrix.
         """
 
+        if self.fast_reprocess:
+            self.engine = PatchTestEngine(self.fqpr)
+            self.multibeam_indexes = deepcopy(self.engine.multibeam_indexes)
+            self.points = self.engine.georeference() if self.engine.soundings is not None else None
+            return
+
         curr_point_index = 0
         finalx = None
         finaly = None
@@ -291,6 +524,16 @@ class PatchTest:
         y_translation = np.round(float(np.mean(self.lstsq_result[4])), 4)
         hscale_factor = np.round(float(np.mean(self.lstsq_result[4])), 5)
         self._adjust_original_xyzrph(roll, pitch, heading, x_translation, y_translation, hscale_factor)
+        if self.fast_reprocess:
+            newpoints = self.engine.georeference(self.current_parameters['roll'] - self.initial_parameters['roll'],
+                                                 self.current_parameters['pitch'] - self.initial_parameters['pitch'],
+                                                 self.current_parameters['heading'] - self.initial_parameters['heading'],
+                                                 self.current_parameters['x_offset'] - self.initial_parameters['x_offset'],
+                                                 self.current_parameters['y_offset'] - self.initial_parameters['y_offset'])
+            if newpoints.size:
+                self._compute_covariance_matrix(newpoints['z'])
+                self.points = newpoints
+            return
         newfq, _ = reprocess_sounding_selection(self.fqpr, georeference=True, turn_off_dask=False)
 
         curr_point_index = 0
@@ -390,9 +633,15 @@ class PatchTest:
         Compute an in memory bathygrid grid, single resolution with depth automatically determined by the depth of the
         tiles, using the bathygrid depth lookup table.  We add points by line so that we can use the line name to return
         the gridded depth values for each line later.
+
+        With fast_reprocess, the soundings are binned into the PatchTestGrid built on the first run instead.
         """
 
-        if self.points is not None and self.points.size > 0:
+        if self.points is not None and self.points.size > 0 and self.fast_reprocess:
+            if self.grid is None:
+                self.grid = PatchTestGrid(self.points)
+            self.grid.grid(self.points, self.multibeam_indexes)
+        elif self.points is not None and self.points.size > 0:
             print('Building in memory grid for {} soundings...'.format(self.points.size))
             grid_class = create_grid(grid_type='single_resolution')
             for linename in self.multibeam_indexes:
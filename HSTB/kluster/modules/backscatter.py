@@ -2,6 +2,7 @@ import os
 import numpy as np
 import xarray as xr
 import matplotlib.pyplot as plt
+from typing import Union
 
 
 def generate_avg_corrector(corrected_bscatter: xr.DataArray, beam_angles_degrees: xr.DataArray, bin_size_degree: float = 1.0,
@@ -27,9 +28,88 @@ def generate_avg_corrector(corrected_bscatter: xr.DataArray, beam_angles_degrees
         dictionary of {angles (degrees): avg correctors (dB)}
     """
 
-    bins = np.arange(-90, 90 + bin_size_degree, bin_size_degree)
-    # get the mean bscatter value in each angle bin
-    meanvals = corrected_bscatter.groupby_bins(beam_angles_degrees, bins, right=True).mean().values
+    bins = return_avg_bins(bin_size_degree)
+    # get the sum/count of the bscatter values in each angle bin
+    sums, counts = accumulate_avg_bins(corrected_bscatter, beam_angles_degrees, bins)
+    return avg_corrector_from_bins(sums, counts, bins, reference_angle)
+
+
+def return_avg_bins(bin_size_degree: float = 1.0):
+    """
+    Return the angle bin edges used in building the angle varying gain corrector
+
+    Parameters
+    ----------
+    bin_size_degree
+        size of the bin used to generate the corrector, in degrees
+
+    Returns
+    -------
+    np.ndarray
+        bin edges in degrees, from -90 to 90
+    """
+
+    return np.arange(-90, 90 + bin_size_degree, bin_size_degree)
+
+
+def accumulate_avg_bins(corrected_bscatter: Union[xr.DataArray, np.ndarray], beam_angles_degrees: Union[xr.DataArray, np.ndarray],
+                        bins: np.ndarray):
+    """
+    Sum the processed backscatter values and count the number of values in each angle bin.  Sums and counts from
+    separate chunks of data can be added together, so that the angle varying gain corrector can be built from a whole
+    survey without loading it all at once.  Bins are closed on the right, (bins[i], bins[i + 1]].  NaN values are
+    ignored.
+
+    Parameters
+    ----------
+    corrected_bscatter
+        processed backscatter returned from one of the Bscatter classes below
+    beam_angles_degrees
+        corrected beam angles for the beams in degrees, same shape as corrected_bscatter
+    bins
+        bin edges in degrees, see return_avg_bins
+
+    Returns
+    -------
+    np.ndarray
+        sum of the backscatter values in each bin, length len(bins) - 1
+    np.ndarray
+        number of backscatter values in each bin, length len(bins) - 1
+    """
+
+    bscatter = np.ravel(np.asarray(corrected_bscatter, dtype=np.float64))
+    angles = np.ravel(np.asarray(beam_angles_degrees, dtype=np.float64))
+    bin_idx = np.digitize(angles, bins, right=True) - 1
+    valid = np.isfinite(bscatter) & np.isfinite(angles) & (bin_idx >= 0) & (bin_idx < len(bins) - 1)
+    sums = np.bincount(bin_idx[valid], weights=bscatter[valid], minlength=len(bins) - 1)
+    counts = np.bincount(bin_idx[valid], minlength=len(bins) - 1).astype(np.int64)
+    return sums, counts
+
+
+def avg_corrector_from_bins(sums: np.ndarray, counts: np.ndarray, bins: np.ndarray, reference_angle: float = 45):
+    """
+    Build the angle varying gain corrector from the backscatter sums and counts in each angle bin, see
+    accumulate_avg_bins.
+
+    Parameters
+    ----------
+    sums
+        sum of the backscatter values in each bin
+    counts
+        number of backscatter values in each bin
+    bins
+        bin edges in degrees, see return_avg_bins
+    reference_angle
+        angle used to determine the reference backscatter level
+
+    Returns
+    -------
+    dict
+        dictionary of {angles (degrees): avg correctors (dB)}
+    """
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        meanvals = np.where(counts > 0, sums / counts, np.nan)
     # fill in nan with nearest, to extend out the corrector to all angles
     msk = np.isnan(meanvals)
     meanvals[msk] = np.interp(np.flatnonzero(msk), np.flatnonzero(~msk), meanvals[~msk])
@@ -44,7 +124,54 @@ def generate_avg_corrector(corrected_bscatter: xr.DataArray, beam_angles_degrees
     return lookup
 
 
-def avg_correct(beam_angles_degrees: xr.DataArray, avg_corrector: dict):
+def distrib_accumulate_avg_bins(worker_dat: list):
+    """
+    Convenience function for mapping accumulate_avg_bins across cluster.  Assumes that you are mapping this function
+    with a list of data.
+
+    Parameters
+    ----------
+    worker_dat
+        [processed backscatter, corrected pointing angle in radians, bin edges in degrees]
+
+    Returns
+    -------
+    np.ndarray
+        sum of the backscatter values in each bin
+    np.ndarray
+        number of backscatter values in each bin
+    """
+
+    return accumulate_avg_bins(worker_dat[0], np.rad2deg(np.asarray(worker_dat[1])), worker_dat[2])
+
+
+def compile_avg_corrector(avg_corrector: dict):
+    """
+    Compile the avg corrector dict into a dense, uniformly binned lookup array, so that looking up the corrector for an
+    angle is a single index computation.  Build this once and pass it to avg_correct for each chunk of data.
+
+    Parameters
+    ----------
+    avg_corrector
+        dictionary of {angles (degrees): avg correctors (dB)}, see generate_avg_corrector
+
+    Returns
+    -------
+    tuple
+        (first angle in degrees, bin size in degrees, np.ndarray of avg correctors (dB) for each bin)
+    """
+
+    avg_angle = np.array([float(k) for k in avg_corrector.keys()])
+    avg_value = np.array([float(v) for v in avg_corrector.values()])
+    sort_idx = avg_angle.argsort()
+    avg_angle, avg_value = avg_angle[sort_idx], avg_value[sort_idx]
+    bin_size = float(avg_angle[1] - avg_angle[0]) if avg_angle.size > 1 else 1.0
+    if avg_angle.size > 2 and not np.allclose(np.diff(avg_angle), bin_size):
+        raise ValueError('compile_avg_corrector: expected the avg corrector angles to be uniformly spaced')
+    return float(avg_angle[0]), bin_size, avg_value
+
+
+def avg_correct(beam_angles_degrees: Union[xr.DataArray, np.ndarray], avg_corrector: Union[dict, tuple]):
     """
     Return the backscatter corrector for the provided beamangle and avg_corrector dataset
 
@@ -53,25 +180,24 @@ def avg_correct(beam_angles_degrees: xr.DataArray, avg_corrector: dict):
     Parameters
     ----------
     beam_angles_degrees
-        corrected beam angles for the beams in degrees, 2d array
+        corrected beam angles for the beams in degrees
     avg_corrector
-        dictionary of {angles (degrees): avg correctors (dB)}
+        dictionary of {angles (degrees): avg correctors (dB)}, or the compiled lookup from compile_avg_corrector
 
     Returns
     -------
     np.ndarray
-        avg backscatter corrector in dB
+        avg backscatter corrector in dB, same shape as beam_angles_degrees
     """
 
-    flat_angles = beam_angles_degrees.values.flatten()
-    sort_idx = flat_angles.argsort()
-    avg_angle, avg_value = list(avg_corrector.keys()), list(avg_corrector.values())
-    bins = avg_angle + [avg_angle[-1] + avg_angle[-1] - avg_angle[-2]]
-    bin_idx = np.digitize(flat_angles[sort_idx], bins, right=True)
-    corrector = np.array(avg_value)[bin_idx]
-    revsort_idx = np.argsort(sort_idx)
-    corrector = corrector[revsort_idx].reshape(beam_angles_degrees.shape)
-    return corrector
+    if isinstance(avg_corrector, dict):
+        avg_corrector = compile_avg_corrector(avg_corrector)
+    first_angle, bin_size, avg_value = avg_corrector
+    angles = np.asarray(beam_angles_degrees)
+    # bins are closed on the right, the same as np.digitize(right=True) against the table angles
+    bin_idx = np.ceil((angles - first_angle) / bin_size)
+    bin_idx = np.clip(np.nan_to_num(bin_idx), 0, avg_value.size - 1).astype(np.int32)
+    return avg_value[bin_idx]
 
 
 class BScatter:
@@ -0,0 +1,307 @@
+import threading
+import numpy as np
+from datetime import datetime
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
+from HSTB.kluster import kluster_variables
+
+
+class SoundingEditJournal:
+    """
+    Append only journal of the sounding flag (detectioninfo) edits made while cleaning in Points View.  Each edit is
+    stored sparsely, as the (time, beam, old flag, new flag) of only the soundings that changed.  Edits are applied to
+    the loaded ping records right away (patching the lazy dask array, nothing is read or written) and are written to
+    disk later with flush, which writes each touched ping chunk once no matter how many edits touched it.  Undo/redo
+    apply the old/new flags of the last edit in the same way.
+
+    The flush also writes the sounding_changes and _soundings_last_cleaned attributes, so that all attribute writes for
+    a cleaning edit happen on the thread that writes the edit.
+    """
+
+    def __init__(self, fqpr):
+        """
+        Parameters
+        ----------
+        fqpr
+            Fqpr instance that the edits are made to
+        """
+
+        self.fqpr = fqpr
+        self.edits = []  # list of applied edits, each edit is a list of [system identifier, times, beams, old flags, new flags]
+        self.undone = []  # list of undone edits, cleared on each new edit, see redo
+        self._pending = {}  # {system identifier: list of ping time arrays} for the pings with edits that are not on disk yet
+        self._base_detectioninfo = {}  # {system identifier: [ping record id, detectioninfo before any patches were applied]}
+        self._patches = {}  # {system identifier: [time index, beam index, flag]} for all soundings patched since the base
+        self._version = 0  # incremented on each applied edit, a flush only clears the patches if there are no newer edits
+        self._lock = threading.Lock()
+        self._executor = None
+        self._flush_future = None
+
+    @property
+    def pending_count(self):
+        """
+        Number of pings with edits that have not been written to disk
+        """
+
+        with self._lock:
+            return int(sum([np.unique(np.concatenate(tms)).size for tms in self._pending.values() if tms]))
+
+    def record(self, changes: list):
+        """
+        Record a new edit and apply it to the loaded ping records.  Soundings where the old and new flags are equal are
+        dropped.  Clears the redo history.
+
+        Parameters
+        ----------
+        changes
+            list of [system identifier, ping times, beam numbers, old flags, new flags] for each sonar head in the edit
+
+        Returns
+        -------
+        int
+            number of soundings changed by this edit
+        """
+
+        edit = []
+        for sys_ident, times, beams, old, new in changes:
+            old = np.broadcast_to(np.asarray(old, dtype=np.uint8), np.shape(times))
+            new = np.broadcast_to(np.asarray(new, dtype=np.uint8), np.shape(times))
+            changed = old != new
+            if changed.any():
+                edit.append([sys_ident, np.asarray(times, dtype=np.float64)[changed], np.asarray(beams, dtype=np.int32)[changed],
+                             old[changed].copy(), new[changed].copy()])
+        if not edit:
+            return 0
+        for sys_ident, times, beams, old, new in edit:
+            self._apply(sys_ident, times, beams, new)
+        self.edits.append(edit)
+        self.undone = []
+        return int(sum([e[1].size for e in edit]))
+
+    def undo(self, levels: int = 1):
+        """
+        Undo the last levels edits, setting the old flags for the edited soundings
+
+        Parameters
+        ----------
+        levels
+            number of edits to undo
+
+        Returns
+        -------
+        int
+            number of edits undone
+        """
+
+        cnt = 0
+        while cnt < levels and self.edits:
+            edit = self.edits.pop()
+            for sys_ident, times, beams, old, new in reversed(edit):
+                self._apply(sys_ident, times, beams, old)
+            self.undone.append(edit)
+            cnt += 1
+        return cnt
+
+    def redo(self, levels: int = 1):
+        """
+        Redo the last levels undone edits, setting the new flags for the edited soundings
+
+        Parameters
+        ----------
+        levels
+            number of edits to redo
+
+        Returns
+        -------
+        int
+            number of edits redone
+        """
+
+        cnt = 0
+        while cnt < levels and self.undone:
+            edit = self.undone.pop()
+            for sys_ident, times, beams, old, new in edit:
+                self._apply(sys_ident, times, beams, new)
+            self.edits.append(edit)
+            cnt += 1
+        return cnt
+
+    def _return_ping_record(self, sys_ident: str):
+        for rp in self.fqpr.multibeam.raw_ping:
+            if rp is not None and rp.system_identifier == sys_ident:
+                return rp
+        raise ValueError(f'SoundingEditJournal: unable to find ping record for system {sys_ident}')
+
+    def _apply(self, sys_ident: str, times: np.ndarray, beams: np.ndarray, flags: np.ndarray):
+        """
+        Set the flags for the soundings in the loaded detectioninfo of the ping record and mark the pings as pending.
+        Loaded (numpy) detectioninfo is set in place.  For lazy (dask) detectioninfo, the flags are merged into the one
+        sparse patch for the system (later flags replace earlier flags for the same sounding) and the patch is applied
+        to the detectioninfo from before any patches, so that there is only ever one patch layer in the dask graph.
+        """
+
+        rp = self._return_ping_record(sys_ident)
+        ping_times = rp.time.values
+        time_index = np.clip(np.searchsorted(ping_times, times), 0, ping_times.size - 1)
+        valid = ping_times[time_index] == times
+        if not valid.all():  # pings outside of the loaded records, i.e. outside the current subset
+            time_index, beams, flags, times = time_index[valid], beams[valid], flags[valid], times[valid]
+        detect = rp['detectioninfo']
+        with self._lock:
+            if isinstance(detect.data, np.ndarray):
+                detect.values[time_index, beams] = flags
+            else:
+                if sys_ident not in self._base_detectioninfo or self._base_detectioninfo[sys_ident][0] != id(rp):
+                    self._base_detectioninfo[sys_ident] = [id(rp), detect]
+                    self._patches.pop(sys_ident, None)
+                base = self._base_detectioninfo[sys_ident][1]
+                patch_time, patch_beam, patch_flags = _merge_patch(self._patches.get(sys_ident, None), time_index, beams,
+                                                                   flags, base.shape[1])
+                self._patches[sys_ident] = [patch_time, patch_beam, patch_flags]
+                patch = partial(_patch_block, time_index=patch_time, beam_index=patch_beam, flags=patch_flags)
+                rp['detectioninfo'] = base.copy(data=base.data.map_blocks(patch, dtype=base.dtype))
+            self._pending.setdefault(sys_ident, []).append(times)
+            self._version += 1
+
+    def flush(self, background: bool = False):
+        """
+        Write the pending edits to disk.  Each ping chunk (see kluster_variables.ping_chunk_size) with pending edits is
+        written once, with the current (patched) detectioninfo for that chunk, followed by the sounding_changes and
+        _soundings_last_cleaned attributes.  Once written, the patches are dropped and detectioninfo is read from disk
+        again, unless there were new edits during the write.
+
+        Parameters
+        ----------
+        background
+            if True, will write in a background thread and return the future for the write, one write is run at a time
+
+        Returns
+        -------
+        concurrent.futures.Future
+            future for the background write if background, else None
+        """
+
+        if background:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1)
+            self._flush_future = self._executor.submit(self._flush)
+            return self._flush_future
+        self.wait()
+        self._flush()
+        return None
+
+    def wait(self):
+        """
+        Block until the last background flush is complete
+        """
+
+        if self._flush_future is not None:
+            self._flush_future.result()
+            self._flush_future = None
+
+    def _flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            version = self._version
+            snapshot = []
+            for sys_ident, times in pending.items():
+                if not times:
+                    continue
+                rp = self._return_ping_record(sys_ident)
+                ping_times = rp.time.values
+                time_index = np.clip(np.searchsorted(ping_times, np.unique(np.concatenate(times))), 0, ping_times.size - 1)
+                chunk_starts = np.unique(time_index // kluster_variables.ping_chunk_size) * kluster_variables.ping_chunk_size
+                chunks = [rp['detectioninfo'].isel(time=slice(strt, strt + kluster_variables.ping_chunk_size)) for strt in chunk_starts]
+                snapshot.append([sys_ident, rp, chunks, times])
+        try:
+            for sys_ident, rp, chunks, times in snapshot:
+                chunks = [chnk.load() for chnk in chunks]
+                self.fqpr.write('ping', [chnk.to_dataset() for chnk in chunks], time_array=[chnk.time for chnk in chunks],
+                                sys_id=sys_ident, skip_dask=True)
+                self.fqpr.record_sounding_changes(sys_ident, [[float(chnk.time[0]), float(chnk.time[-1])] for chnk in chunks])
+            if snapshot:
+                self.fqpr.write_attribute_to_ping_records({'_soundings_last_cleaned': datetime.utcnow().strftime('%c')})
+        except:
+            with self._lock:  # keep the edits pending so that the next flush tries again
+                for sys_ident, rp, chunks, times in snapshot:
+                    self._pending.setdefault(sys_ident, []).extend(times)
+            raise
+        with self._lock:
+            if version == self._version:  # no new edits during the write, read detectioninfo from disk again
+                for sys_ident, rp, chunks, times in snapshot:
+                    base = self._base_detectioninfo.pop(sys_ident, None)
+                    self._patches.pop(sys_ident, None)
+                    if base is not None and base[0] == id(rp):
+                        rp['detectioninfo'] = base[1]
+
+
+def _merge_patch(patch: list, time_index: np.ndarray, beam_index: np.ndarray, flags: np.ndarray, number_of_beams: int):
+    """
+    Merge the new flags into the existing sparse patch, see SoundingEditJournal._apply.  Where a sounding is in both,
+    the new flag is kept.
+
+    Parameters
+    ----------
+    patch
+        list of [time index, beam index, flag] for the existing patch, or None if there is no patch yet
+    time_index
+        time index of each edited sounding in the full array
+    beam_index
+        beam index of each edited sounding in the full array
+    flags
+        new flag for each edited sounding
+    number_of_beams
+        size of the beam dimension of the full array
+
+    Returns
+    -------
+    np.ndarray
+        time index of each sounding in the merged patch
+    np.ndarray
+        beam index of each sounding in the merged patch
+    np.ndarray
+        flag for each sounding in the merged patch
+    """
+
+    time_index, beam_index, flags = np.asarray(time_index, dtype=np.int64), np.asarray(beam_index, dtype=np.int64), np.asarray(flags)
+    if patch is not None:
+        time_index = np.concatenate([patch[0], time_index])
+        beam_index = np.concatenate([patch[1], beam_index])
+        flags = np.concatenate([patch[2], flags])
+    # unique keeps the first occurrence, so search the reversed arrays to keep the newest flag for each sounding
+    _, newest = np.unique((time_index * number_of_beams + beam_index)[::-1], return_index=True)
+    keep = time_index.size - 1 - newest
+    return time_index[keep], beam_index[keep], flags[keep]
+
+
+def _patch_block(block: np.ndarray, time_index: np.ndarray = None, beam_index: np.ndarray = None, flags: np.ndarray = None,
+                 block_info: dict = None):
+    """
+    dask map_blocks function for setting the flags in the block of detectioninfo, see SoundingEditJournal._apply
+
+    Parameters
+    ----------
+    block
+        2d (time, beam) block of detectioninfo
+    time_index
+        time index of each edited sounding in the full array
+    beam_index
+        beam index of each edited sounding in the full array
+    flags
+        new flag for each edited sounding
+    block_info
+        provided by dask, contains the location of the block in the full array
+
+    Returns
+    -------
+    np.ndarray
+        block with the new flags set
+    """
+
+    (tstart, tend), (bstart, bend) = block_info[0]['array-location'][:2]
+    inblock = (time_index >= tstart) & (time_index < tend) & (beam_index >= bstart) & (beam_index < bend)
+    if inblock.any():
+        block = block.copy()
+        block[time_index[inblock] - tstart, beam_index[inblock] - bstart] = flags[inblock]
+    return block
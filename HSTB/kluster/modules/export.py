@@ -2,17 +2,32 @@ import numpy as np
 import xarray as xr
 import laspy
 import os
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
 from time import perf_counter
 from datetime import datetime
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    pyarrow_found = True
+except ImportError:
+    pyarrow_found = False
+
 from HSTB.kluster.pydro_helpers import is_pydro
 from HSTB.kluster.gdal_helpers import VectorLayer
 from HSTB.kluster.pdal_entwine import build_entwine_points
 from HSTB.kluster.fqpr_helpers import seconds_to_formatted_string
-from HSTB.kluster.xarray_helpers import slice_xarray_by_dim
+from HSTB.kluster.numba_helpers import format_fixed_point
 from HSTB.kluster import kluster_variables
 
 
+# variables loaded from the ping records for each chunk of exported soundings
+export_variables = ['x', 'y', 'z', 'thu', 'tvu', 'frequency', 'txsector_beam', 'detectioninfo']
+# file extension for each sounding export format
+export_extensions = {'csv': '.csv', 'las': '.las', 'entwine': '.las', 'laz': '.laz', 'parquet': '.parquet'}
+
+
 class FqprExport:
     """
     Visualizations in Matplotlib built on top of FQPR class.  Includes animations of beam vectors and vessel
@@ -33,96 +48,6 @@ class FqprExport:
         """
         self.fqpr = fqpr
 
-    def _generate_export_data(self, ping_dataset: xr.Dataset, filter_by_detection: bool = True, z_pos_down: bool = True):
-        """
-        Take the georeferenced data in the multibeam.raw_ping datasets held by fqpr_generation.Fqpr (ping_dataset is one of those
-        raw_ping datasets) and build the necessary arrays for exporting.
-
-        Parameters
-        ----------
-        ping_dataset
-            one of the multibeam.raw_ping xarray Datasets, must contain the x,y,z variables generated by georeferencing
-        filter_by_detection
-            if True, will filter the xyz data by the detection info flag (rejected by multibeam system)
-        z_pos_down
-            if True, will export soundings with z positive down (this is the native Kluster convention)
-
-        Returns
-        -------
-        xr.DataArray
-            x variable stacked in the time/beam dimension to create 1 dim representation.  rejected soundings removed
-            if filter_by_detection
-        xr.DataArray
-            y variable stacked in the time/beam dimension to create 1 dim representation.  rejected soundings removed
-            if filter_by_detection
-        xr.DataArray
-            z variable stacked in the time/beam dimension to create 1 dim representation.  rejected soundings removed
-            if filter_by_detection
-        xr.DataArray
-            horizontal uncertainty variable stacked in the time/beam dimension to create 1 dim representation.  rejected soundings removed
-            if filter_by_detection
-        xr.DataArray
-            vertical uncertainty variable stacked in the time/beam dimension to create 1 dim representation.  rejected soundings removed
-            if filter_by_detection
-        np.array
-            indexes of the original z data before stacking, used to unstack x
-        np.array
-            if detectioninfo exists, this is the integer classification for each sounding
-        np.array
-            if detectioninfo exists, boolean mask for the valid detections
-        bool
-            if tvu exists, True
-        """
-
-        uncertainty_included = False
-        nan_mask = ~np.isnan(ping_dataset['x'])
-        x_stck = ping_dataset['x'][nan_mask]
-        y_stck = ping_dataset['y'][nan_mask]
-        z_stck = ping_dataset['z'][nan_mask]
-        if 'tvu' in ping_dataset:
-            uncertainty_included = True
-            vunc_stck = ping_dataset['tvu'][nan_mask]
-            hunc_stck = ping_dataset['thu'][nan_mask]
-
-        # build mask with kongsberg detection info
-        classification = None
-        valid_detections = None
-        if 'detectioninfo' in ping_dataset:
-            dinfo = ping_dataset.detectioninfo
-            filter_stck = dinfo.values[nan_mask]
-            # filter_idx, filter_stck = stack_nan_array(dinfo, stack_dims=('time', 'beam'))
-            valid_detections = filter_stck != kluster_variables.rejected_flag
-            tot = len(filter_stck)
-            tot_valid = np.count_nonzero(valid_detections)
-            tot_invalid = tot - tot_valid
-        # filter points by mask
-        vunc = None
-        hunc = None
-        if filter_by_detection and valid_detections is not None:
-            x = x_stck[valid_detections]
-            y = y_stck[valid_detections]
-            z = z_stck[valid_detections]
-            classification = filter_stck[valid_detections]
-            if uncertainty_included:
-                vunc = vunc_stck[valid_detections]
-                hunc = hunc_stck[valid_detections]
-            print('{} total soundings, {} retained, {} filtered'.format(tot, tot_valid, tot_invalid))
-        else:
-            x = x_stck
-            y = y_stck
-            z = z_stck
-            if 'detectioninfo' in ping_dataset:
-                classification = filter_stck
-            if uncertainty_included:
-                vunc = vunc_stck
-                hunc = hunc_stck
-
-        # z positive down is the native convention in Kluster, if you want positive up, gotta flip
-        if not z_pos_down:
-            z = z * -1
-
-        return x, y, z, hunc, vunc, nan_mask, classification, valid_detections, uncertainty_included
-
     def _validate_export(self, output_directory: str, file_format: str):
         """
         Determine the final directory path for the export and ensure the provided options make sense
@@ -132,7 +57,7 @@ class FqprExport:
         output_directory
             optional, destination directory for the xyz exports, otherwise will auto export next to converted data
         file_format
-            optional, destination file format, default is csv file, options include ['csv', 'las', 'entwine']
+            optional, destination file format, default is csv file, options include ['csv', 'las', 'laz', 'parquet', 'entwine']
 
         Returns
         -------
@@ -152,6 +77,12 @@ class FqprExport:
         if file_format == 'entwine' and not is_pydro():
             self.fqpr.logger.error('export_pings_to_file: Only pydro environments support entwine tile building.  Please see https://entwine.io/configuration.html for instructions on installing entwine if you wish to use entwine outside of Kluster.  Kluster exported las files will work with the entwine build command')
             raise ValueError('export_pings_to_file: Only pydro environments support entwine tile building.  Please see https://entwine.io/configuration.html for instructions on installing entwine if you wish to use entwine outside of Kluster.  Kluster exported las files will work with the entwine build command')
+        if file_format == 'laz' and not laspy.LazBackend.detect_available():
+            self.fqpr.logger.error('export_pings_to_file: No LAZ backend found for laspy, please install lazrs or laszip to export to laz')
+            raise ValueError('export_pings_to_file: No LAZ backend found for laspy, please install lazrs or laszip to export to laz')
+        if file_format == 'parquet' and not pyarrow_found:
+            self.fqpr.logger.error('export_pings_to_file: pyarrow not found, please install pyarrow to export to parquet')
+            raise ValueError('export_pings_to_file: pyarrow not found, please install pyarrow to export to parquet')
 
         if output_directory is None:
             output_directory = self.fqpr.multibeam.converted_pth
@@ -163,19 +94,130 @@ class FqprExport:
         elif file_format == 'las':
             chunksize = kluster_variables.pings_per_las
             fldr_path, suffix = _create_folder(output_directory, 'las_export')
+        elif file_format == 'laz':
+            chunksize = kluster_variables.pings_per_las
+            fldr_path, suffix = _create_folder(output_directory, 'laz_export')
+        elif file_format == 'parquet':
+            chunksize = kluster_variables.pings_per_las
+            fldr_path, suffix = _create_folder(output_directory, 'parquet_export')
         elif file_format == 'entwine':
             chunksize = kluster_variables.pings_per_las
             fldr_path, suffix = _create_folder(output_directory, 'las_export')
             entwine_fldr_path, _ = _create_folder(output_directory, 'entwine_export')
         else:
-            self.fqpr.logger.error('export_pings_to_file: Only csv, las and entwine format options supported at this time')
-            raise ValueError('export_pings_to_file: Only csv, las and entwine format options supported at this time')
+            self.fqpr.logger.error('export_pings_to_file: Only csv, las, laz, parquet and entwine format options supported at this time')
+            raise ValueError('export_pings_to_file: Only csv, las, laz, parquet and entwine format options supported at this time')
         return chunksize, fldr_path, entwine_fldr_path, suffix
 
+    def _return_ping_chunks(self, start_time: float = None, end_time: float = None, raw_ping: list = None):
+        """
+        Generator that yields each block of ping_chunk_size pings between start_time and end_time, loaded into memory
+        with just the export_variables.  Lets the export stream through the zarr store instead of loading the whole
+        line at once.
+
+        Parameters
+        ----------
+        start_time
+            optional, start time of the pings to export in utc seconds
+        end_time
+            optional, end time of the pings to export in utc seconds
+        raw_ping
+            optional, the ping datasets to export from, if None will use all of the multibeam.raw_ping datasets
+
+        Returns
+        -------
+        xr.Dataset
+            loaded chunk of pings with the export variables
+        """
+
+        for ping_chunk in self.fqpr.subset.return_ping_chunks(export_variables, start_time, end_time, raw_ping=raw_ping):
+            yield ping_chunk.load()
+
+    def _return_sounding_writer(self, dest_path: str, file_format: str, csv_delimiter: str = ' ', format_type: str = 'xyz'):
+        """
+        Build the writer for the given file format, see CsvSoundingWriter, LasSoundingWriter and ParquetSoundingWriter
+        """
+
+        if file_format == 'csv':
+            return CsvSoundingWriter(dest_path, delimiter=csv_delimiter, format_type=format_type)
+        elif file_format in ['las', 'laz', 'entwine']:
+            return LasSoundingWriter(dest_path, horizontal_crs=self.fqpr.horizontal_crs, compress=file_format == 'laz')
+        elif file_format == 'parquet':
+            return ParquetSoundingWriter(dest_path)
+        else:
+            raise ValueError('_return_sounding_writer: Only csv, las, laz, parquet and entwine format options supported at this time')
+
+    def _write_ping_chunks(self, ping_chunks, output_directory: str, base_name: str, suffix: str = '', file_format: str = 'csv',
+                           csv_delimiter: str = ' ', filter_by_detection: bool = True, format_type: str = 'xyz',
+                           z_pos_down: bool = True, export_by_identifiers: bool = True):
+        """
+        Write each chunk of pings to the export files as it is loaded, appending to one file for each
+        sector/frequency combination (or one file if export_by_identifiers is False).  Only one chunk of pings is held in
+        memory at a time.
+
+        Parameters
+        ----------
+        ping_chunks
+            iterable of loaded ping datasets, see _return_ping_chunks
+        output_directory
+            destination directory for the exported files
+        base_name
+            the base name of the exported files
+        suffix
+            optional additional filename suffix
+        file_format
+            destination file format, one of ['csv', 'las', 'laz', 'parquet', 'entwine']
+        csv_delimiter
+            optional, if you choose file_format=csv, this will control the delimiter
+        filter_by_detection
+            optional, if True will only write soundings that are not rejected
+        format_type
+            optional, used in csv mode, will determine the columns/variables exported to the text file, one of ['xyz', 'xyzv', 'xyzhv'],
+            h being horizontal uncertainty and v being vertical uncertainty.
+        z_pos_down
+            if True, will export soundings with z positive down (this is the native Kluster convention), ignored for las
+            formats which are always positive up
+        export_by_identifiers
+            if True, will generate separate files for each combination of sector/frequency
+
+        Returns
+        -------
+        list
+            list of written file paths
+        """
+
+        if file_format in ['las', 'laz', 'entwine']:
+            z_pos_down = False  # LAS files should always be z positive up
+        extension = export_extensions[file_format]
+        writers = {}
+        try:
+            for ping_chunk in ping_chunks:
+                if filter_by_detection and 'detectioninfo' not in ping_chunk:
+                    self.fqpr.logger.error('_write_ping_chunks: Unable to filter by detection type, detectioninfo not found')
+                    return []
+                columns = _build_export_columns(ping_chunk, filter_by_detection=filter_by_detection, z_pos_down=z_pos_down)
+                for identifier, mask in _split_by_identifiers(columns, export_by_identifiers):
+                    if identifier:
+                        dest_name = '{}_{}_{}'.format(base_name, identifier[0], identifier[1])
+                    else:
+                        dest_name = base_name
+                    if suffix:
+                        dest_name += '_{}'.format(suffix)
+                    dest_path = os.path.join(output_directory, dest_name + extension)
+                    if dest_path not in writers:
+                        self.fqpr.logger.info('writing to {}'.format(dest_path))
+                        writers[dest_path] = self._return_sounding_writer(dest_path, file_format, csv_delimiter, format_type)
+                    writers[dest_path].write({ky: (val[mask] if val is not None else None) for ky, val in columns.items()})
+        finally:
+            for writer in writers.values():
+                writer.close()
+        return list(writers.keys())
+
     def export_lines_to_file(self, linenames: list = None, output_directory: str = None, file_format: str = 'csv', csv_delimiter=' ',
                              filter_by_detection: bool = True, format_type: str = 'xyz', z_pos_down: bool = True, export_by_identifiers: bool = True):
         """
-        Take each provided line name and export it to the file_format provided
+        Take each provided line name and export it to the file_format provided.  Lines are exported in parallel, using
+        kluster_variables.export_workers threads, each streaming the pings of the line in chunks.
 
         Parameters
         ----------
@@ -184,7 +226,7 @@ class FqprExport:
         output_directory
             optional, destination directory for the xyz exports, otherwise will auto export next to converted data
         file_format
-            optional, destination file format, default is csv file, options include ['csv', 'las', 'entwine']
+            optional, destination file format, default is csv file, options include ['csv', 'las', 'laz', 'parquet', 'entwine']
         csv_delimiter
             optional, if you choose file_format=csv, this will control the delimiter
         filter_by_detection
@@ -194,7 +236,7 @@ class FqprExport:
             h being horizontal uncertainty and v being vertical uncertainty.
         z_pos_down
             if True, will export soundings with z positive down (this is the native Kluster convention), only for csv
-            export
+            and parquet export
         export_by_identifiers
             if True, will generate separate files for each combination of serial number/sector/frequency
 
@@ -209,27 +251,16 @@ class FqprExport:
         chunksize, fldr_path, entwine_fldr_path, suffix = self._validate_export(output_directory, file_format)
         if not chunksize:
             return []
-        if linenames is None:
-            linenames = list(self.fqpr.multibeam.raw_ping[0].multibeam_files.keys())
+        line_dict = self.fqpr.return_line_dict(line_names=linenames)
 
         totalfiles = []
-        for linename in linenames:
-            try:
-                data_dict = self.fqpr.subset_variables_by_line(['x', 'y', 'z', 'thu', 'tvu', 'frequency', 'txsector_beam', 'detectioninfo'], [linename], filter_by_detection=filter_by_detection)
-            except:
-                data_dict = self.fqpr.subset_variables_by_line(['x', 'y', 'z', 'frequency', 'txsector_beam', 'detectioninfo'], [linename], filter_by_detection=filter_by_detection)
-            if data_dict:  # we could get the data_dict for all lines at once, but we do it line by line to avoid memory issues
-                line_rp = data_dict[linename]
-                new_files = []
-                if file_format == 'csv':
-                    new_files = self._export_pings_to_csv(rp=line_rp, output_directory=fldr_path, suffix=suffix, csv_delimiter=csv_delimiter, filter_by_detection=False,
-                                                          z_pos_down=z_pos_down, export_by_identifiers=export_by_identifiers, format_type=format_type,
-                                                          base_name=os.path.splitext(linename)[0])
-                elif file_format in ['las', 'entwine']:
-                    new_files = self._export_pings_to_las(rp=line_rp, output_directory=fldr_path, suffix=suffix, filter_by_detection=False,
-                                                          export_by_identifiers=export_by_identifiers, base_name=os.path.splitext(linename)[0])
-                if new_files:
-                    totalfiles += new_files
+        with ThreadPoolExecutor(max_workers=max(1, kluster_variables.export_workers)) as executor:
+            futs = [executor.submit(self._write_ping_chunks, self._return_ping_chunks(line_times[0], line_times[1]), fldr_path,
+                                    os.path.splitext(linename)[0], suffix=suffix, file_format=file_format, csv_delimiter=csv_delimiter,
+                                    filter_by_detection=filter_by_detection, format_type=format_type, z_pos_down=z_pos_down,
+                                    export_by_identifiers=export_by_identifiers) for linename, line_times in line_dict.items()]
+            for fut in futs:
+                totalfiles += fut.result()
 
         endtime = perf_counter()
         self.fqpr.logger.info('****Exporting xyz data to {} complete: {}****\n'.format(file_format, seconds_to_formatted_string(int(endtime - starttime))))
@@ -289,8 +320,8 @@ class FqprExport:
                              filter_by_detection: bool = True, format_type: str = 'xyz', z_pos_down: bool = True,
                              export_by_identifiers: bool = True):
         """
-        Uses the output of georef_along_across_depth to build sounding exports.  Currently you can export to csv, las or
-        entwine file formats, see file_format argument.  This will use all soundings in the dataset.
+        Uses the output of georef_along_across_depth to build sounding exports.  Currently you can export to csv, las,
+        laz, parquet or entwine file formats, see file_format argument.  This will use all soundings in the dataset.
 
         If you export to las and want to retain rejected soundings under the noise classification, set
         filter_by_detection to False.
@@ -305,7 +336,7 @@ class FqprExport:
         output_directory
             optional, destination directory for the xyz exports, otherwise will auto export next to converted data
         file_format
-            optional, destination file format, default is csv file, options include ['csv', 'las', 'entwine']
+            optional, destination file format, default is csv file, options include ['csv', 'las', 'laz', 'parquet', 'entwine']
         csv_delimiter
             optional, if you choose file_format=csv, this will control the delimiter
         filter_by_detection
@@ -315,7 +346,7 @@ class FqprExport:
             h being horizontal uncertainty and v being vertical uncertainty.
         z_pos_down
             if True, will export soundings with z positive down (this is the native Kluster convention), only for csv
-            export
+            and parquet export
         export_by_identifiers
             if True, will generate separate files for each combination of serial number/sector/frequency
 
@@ -336,23 +367,17 @@ class FqprExport:
         for rp in self.fqpr.multibeam.raw_ping:
             self.fqpr.logger.info('Operating on system {}'.format(rp.system_identifier))
             # build list of lists for the mintime and maxtime (inclusive) for each chunk, each chunk will contain number of pings equal to chunksize
-            chunktimes = [[float(rp.time.isel(time=int(i * chunksize))), float(rp.time.isel(time=int(min((i + 1) * chunksize - 1, rp.time.size - 1))))] for i in range(int(np.ceil(rp.time.size / 75000)))]
+            chunktimes = [[float(rp.time.isel(time=int(i * chunksize))), float(rp.time.isel(time=int(min((i + 1) * chunksize - 1, rp.time.size - 1))))] for i in range(int(np.ceil(rp.time.size / chunksize)))]
             for mintime, maxtime in chunktimes:
                 chunk_count += 1
                 if suffix:
                     new_suffix = suffix + '_{}'.format(chunk_count)
                 else:
                     new_suffix = '{}'.format(chunk_count)
-                new_files = None
-                slice_rp = slice_xarray_by_dim(rp, dimname='time', start_time=mintime, end_time=maxtime)
-
-                if file_format == 'csv':
-                    new_files = self._export_pings_to_csv(rp=slice_rp, output_directory=fldr_path, suffix=new_suffix, csv_delimiter=csv_delimiter,
-                                                          filter_by_detection=filter_by_detection, z_pos_down=z_pos_down,
-                                                          export_by_identifiers=export_by_identifiers, format_type=format_type)
-                elif file_format in ['las', 'entwine']:
-                    new_files = self._export_pings_to_las(rp=slice_rp, output_directory=fldr_path, suffix=new_suffix, filter_by_detection=filter_by_detection,
-                                                          export_by_identifiers=export_by_identifiers)
+                new_files = self._write_ping_chunks(self._return_ping_chunks(mintime, maxtime, raw_ping=[rp]), fldr_path,
+                                                    os.path.split(rp.output_path)[1], suffix=new_suffix, file_format=file_format,
+                                                    csv_delimiter=csv_delimiter, filter_by_detection=filter_by_detection,
+                                                    format_type=format_type, z_pos_down=z_pos_down, export_by_identifiers=export_by_identifiers)
                 if new_files:
                     written_files += new_files
             if file_format == 'entwine':
@@ -377,7 +402,7 @@ class FqprExport:
         output_directory
             optional, destination directory for the xyz exports, otherwise will auto export next to converted data
         file_format
-            optional, destination file format, default is csv file, options include ['csv', 'las', 'entwine']
+            optional, destination file format, default is csv file, options include ['csv', 'las', 'laz', 'parquet', 'entwine']
         csv_delimiter
             optional, if you choose file_format=csv, this will control the delimiter
         filter_by_detection
@@ -426,28 +451,23 @@ class FqprExport:
                     tvu = tvu[valid_detections]
                 rejected = rejected[valid_detections]
 
-            if file_format in ['las', 'entwine']:
+            if file_format in ['las', 'laz', 'entwine']:
                 z_pos_down = False
             if not z_pos_down:
                 z = z * -1
 
-            if file_format == 'csv':
-                if suffix:
-                    dest_path = os.path.join(fldr_path, '{}_{}.csv'.format(base_name, suffix))
-                else:
-                    dest_path = os.path.join(fldr_path, base_name + '.csv')
-                self.fqpr.logger.info('writing to {}'.format(dest_path))
-                if format_type == 'xyzv':
-                    self._csv_write(x, y, z, dest_path, csv_delimiter, vertical_uncertainty=tvu)
-                else:
-                    self._csv_write(x, y, z, dest_path, csv_delimiter)
+            if suffix:
+                dest_path = os.path.join(fldr_path, '{}_{}{}'.format(base_name, suffix, export_extensions[file_format]))
             else:
-                if suffix:
-                    dest_path = os.path.join(fldr_path, '{}_{}.las'.format(base_name, suffix))
-                else:
-                    dest_path = os.path.join(fldr_path, base_name + '.las')
-                self.fqpr.logger.info('writing to {}'.format(dest_path))
-                self._las_write(x, y, z, tvu, rejected, unc_included, dest_path)
+                dest_path = os.path.join(fldr_path, base_name + export_extensions[file_format])
+            self.fqpr.logger.info('writing to {}'.format(dest_path))
+            writer = self._return_sounding_writer(dest_path, file_format, csv_delimiter, format_type)
+            try:
+                writer.write({'x': x, 'y': y, 'z': z, 'thu': None, 'tvu': tvu if unc_included else None,
+                              'classification': rejected})
+            finally:
+                writer.close()
+            written_files = [dest_path]
 
             if file_format == 'entwine':
                 build_entwine_points(fldr_path, entwine_fldr_path)
@@ -459,309 +479,6 @@ class FqprExport:
 
         return written_files
 
-    def _export_pings_to_csv(self, rp: xr.Dataset, output_directory: str = None, suffix: str = None, csv_delimiter: str = ' ', filter_by_detection: bool = True,
-                             z_pos_down: bool = True, export_by_identifiers: bool = True, format_type: str = 'xyz', base_name: str = None):
-        """
-        Method for exporting pings to csv files.  See export_pings_to_file to use.
-
-        Parameters
-        ----------
-        rp
-            Dataset from FQPR for a sonar head
-        output_directory
-            destination directory for the xyz exports, otherwise will auto export next to converted data
-        suffix
-            optional additional filename suffix
-        csv_delimiter
-            optional, if you choose file_format=csv, this will control the delimiter
-        filter_by_detection
-            optional, if True will only write soundings that are not rejected
-        z_pos_down
-            if True, will export soundings with z positive down (this is the native Kluster convention)
-        export_by_identifiers
-            if True, will generate separate files for each combination of serial number/sector/frequency
-        format_type
-            optional, used in csv mode, will determine the columns/variables exported to the text file, one of ['xyz', 'xyzv', 'xyzhv'],
-            h being horizontal uncertainty and v being vertical uncertainty.
-        base_name
-            optional, the base name of the exported file, if None it will use the folder name of the converted data
-
-        Returns
-        -------
-        list
-            list of written file paths
-        """
-
-        written_files = []
-
-        if filter_by_detection and 'detectioninfo' not in rp:
-            self.fqpr.logger.error('_export_pings_to_csv: Unable to filter by detection type, detectioninfo not found')
-            return
-        if not base_name:
-            base_name = os.path.split(rp.output_path)[1]
-        if 'sounding' not in rp.coords:  # check if this is already stacked, if not, stack
-            rp = rp.stack({'sounding': ('time', 'beam')})
-        if export_by_identifiers:
-            for freq in np.unique(rp.frequency):
-                subset_rp = rp.where(rp.frequency == freq, drop=True)
-                for secid in np.unique(subset_rp.txsector_beam).astype(np.int32):
-                    sec_subset_rp = subset_rp.where(subset_rp.txsector_beam == secid, drop=True)
-                    if suffix:
-                        dest_path = os.path.join(output_directory, '{}_{}_{}_{}.csv'.format(base_name, secid, freq, suffix))
-                    else:
-                        dest_path = os.path.join(output_directory, '{}_{}_{}.csv'.format(base_name, secid, freq))
-                    self.fqpr.logger.info('writing to {}'.format(dest_path))
-                    export_data = self._generate_export_data(sec_subset_rp, filter_by_detection=filter_by_detection, z_pos_down=z_pos_down)
-                    x, y, z, hunc, vunc, nan_mask, classification, valid_detections, uncertainty_included = export_data
-                    if format_type == 'xyzhv':
-                        self._csv_write(x, y, z, dest_path, csv_delimiter, horizontal_uncertainty=hunc, vertical_uncertainty=vunc)
-                    elif format_type == 'xyzv':
-                        self._csv_write(x, y, z, dest_path, csv_delimiter, vertical_uncertainty=vunc)
-                    else:
-                        self._csv_write(x, y, z, dest_path, csv_delimiter)
-                    written_files.append(dest_path)
-
-        else:
-            if suffix:
-                dest_path = os.path.join(output_directory, '{}_{}.csv'.format(base_name, suffix))
-            else:
-                dest_path = os.path.join(output_directory, base_name + '.csv')
-            self.fqpr.logger.info('writing to {}'.format(dest_path))
-            export_data = self._generate_export_data(rp, filter_by_detection=filter_by_detection, z_pos_down=z_pos_down)
-            x, y, z, hunc, vunc, nan_mask, classification, valid_detections, uncertainty_included = export_data
-            if format_type == 'xyzhv':
-                self._csv_write(x, y, z, dest_path, csv_delimiter, horizontal_uncertainty=hunc, vertical_uncertainty=vunc)
-            elif format_type == 'xyzv':
-                self._csv_write(x, y, z, dest_path, csv_delimiter, vertical_uncertainty=vunc)
-            else:
-                self._csv_write(x, y, z, dest_path, csv_delimiter)
-            written_files.append(dest_path)
-
-        return written_files
-
-    def _csv_write(self, x: xr.DataArray, y: xr.DataArray, z: xr.DataArray, dest_path: str, delimiter: str,
-                   horizontal_uncertainty: xr.DataArray = None, vertical_uncertainty: xr.DataArray = None):
-        """
-        Write the data to csv
-
-        Parameters
-        ----------
-        x
-            x variable stacked in the time/beam dimension to create 1 dim representation.  rejected soundings removed
-            if filter_by_detection
-        y
-            y variable stacked in the time/beam dimension to create 1 dim representation.  rejected soundings removed
-            if filter_by_detection
-        z
-            z variable stacked in the time/beam dimension to create 1 dim representation.  rejected soundings removed
-            if filter_by_detection
-        horizontal_uncertainty
-            vertical uncertainty variable stacked in the time/beam dimension to create 1 dim representation.  rejected
-            soundings removed if filter_by_detection, Optional
-        vertical_uncertainty
-            vertical uncertainty variable stacked in the time/beam dimension to create 1 dim representation.  rejected
-            soundings removed if filter_by_detection, Optional
-        dest_path
-            output path to write to
-        delimiter
-            csv delimiter to use
-        """
-
-        if horizontal_uncertainty is not None and vertical_uncertainty is not None:
-            np.savetxt(dest_path, np.c_[x, y, z, horizontal_uncertainty, vertical_uncertainty],
-                       fmt=['%3.3f', '%2.3f', '%4.3f', '%4.3f', '%4.3f'],
-                       delimiter=delimiter,
-                       header='easting{}northing{}depth{}horizontal_uncertainty{}vertical_uncertainty'.format(delimiter, delimiter, delimiter, delimiter),
-                       comments='')
-        elif horizontal_uncertainty is not None:
-            np.savetxt(dest_path, np.c_[x, y, z, horizontal_uncertainty],
-                       fmt=['%3.3f', '%2.3f', '%4.3f', '%4.3f'],
-                       delimiter=delimiter,
-                       header='easting{}northing{}depth{}horizontal_uncertainty'.format(delimiter, delimiter, delimiter),
-                       comments='')
-        elif vertical_uncertainty is not None:
-            np.savetxt(dest_path, np.c_[x, y, z, vertical_uncertainty],
-                       fmt=['%3.3f', '%2.3f', '%4.3f', '%4.3f'],
-                       delimiter=delimiter,
-                       header='easting{}northing{}depth{}vertical_uncertainty'.format(delimiter, delimiter, delimiter),
-                       comments='')
-        else:
-            np.savetxt(dest_path, np.c_[x, y, z],
-                       fmt=['%3.3f', '%2.3f', '%4.3f'],
-                       delimiter=delimiter,
-                       header='easting{}northing{}depth'.format(delimiter, delimiter),
-                       comments='')
-
-    def _export_pings_to_las(self, rp: xr.Dataset, output_directory: str = None, suffix: str = '', filter_by_detection: bool = True,
-                             export_by_identifiers: bool = True, base_name: str = None):
-        """
-        Uses the output of georef_along_across_depth to build sounding exports.  Currently you can export to csv or las
-        file formats, see file_format argument.
-
-        If you export to las and want to retain rejected soundings under the noise classification, set
-        filter_by_detection to False.
-
-        Filters using the detectioninfo variable if present in multibeam and filter_by_detection is set.
-
-        Will generate an xyz file for each sector in multibeam.  Results in one xyz file for each freq/sector id/serial
-        number combination.
-
-        entwine export will build las first, and then entwine from las
-
-        Parameters
-        ----------
-        rp
-            Dataset from FQPR for a sonar head
-        output_directory
-            destination directory for the xyz exports, otherwise will auto export next to converted data
-        suffix
-            optional additional filename suffix
-        filter_by_detection
-            optional, if True will only write soundings that are not rejected
-        export_by_identifiers
-            if True, will generate separate files for each combination of serial number/sector/frequency
-        base_name
-            optional, the base name of the exported file, if None it will use the folder name of the converted data
-
-        Returns
-        -------
-        list
-            list of written file paths
-        """
-
-        z_pos_down = False  # LAS files should always be z positive up
-        written_files = []
-        if not base_name:
-            base_name = os.path.split(rp.output_path)[1]
-
-        if filter_by_detection and 'detectioninfo' not in rp:
-            self.fqpr.logger.error('_export_pings_to_las: Unable to filter by detection type, detectioninfo not found')
-            return
-        if 'sounding' not in rp.coords:  # check if this is already stacked, if not, stack
-            rp = rp.stack({'sounding': ('time', 'beam')})
-        if export_by_identifiers:
-            for freq in np.unique(rp.frequency):
-                subset_rp = rp.where(rp.frequency == freq, drop=True)
-                for secid in np.unique(subset_rp.txsector_beam).astype(np.int32):
-                    sec_subset_rp = subset_rp.where(subset_rp.txsector_beam == secid, drop=True)
-                    if suffix:
-                        dest_path = os.path.join(output_directory, '{}_{}_{}_{}.las'.format(base_name, secid, freq, suffix))
-                    else:
-                        dest_path = os.path.join(output_directory, '{}_{}_{}.las'.format(base_name, secid, freq))
-                    self.fqpr.logger.info('writing to {}'.format(dest_path))
-                    export_data = self._generate_export_data(sec_subset_rp, filter_by_detection=filter_by_detection, z_pos_down=z_pos_down)
-                    x, y, z, hunc, vunc, nan_mask, classification, valid_detections, uncertainty_included = export_data
-                    self._las_write(x, y, z, vunc, classification, uncertainty_included, dest_path)
-                    written_files.append(dest_path)
-        else:
-            if suffix:
-                dest_path = os.path.join(output_directory, '{}_{}.las'.format(base_name, suffix))
-            else:
-                dest_path = os.path.join(output_directory, base_name + '.las')
-            self.fqpr.logger.info('writing to {}'.format(dest_path))
-            export_data = self._generate_export_data(rp, filter_by_detection=filter_by_detection, z_pos_down=z_pos_down)
-            x, y, z, hunc, vunc, nan_mask, classification, valid_detections, uncertainty_included = export_data
-            self._las_write(x, y, z, vunc, classification, uncertainty_included, dest_path)
-            written_files.append(dest_path)
-
-        return written_files
-
-    def _las_write(self, x: xr.DataArray, y: xr.DataArray, z: xr.DataArray, uncertainty: xr.DataArray,
-                   classification: np.array, uncertainty_included: bool, dest_path: str):
-        """
-        Write the data to LAS format
-
-        Parameters
-        ----------
-        x
-            x variable stacked in the time/beam dimension to create 1 dim representation.  rejected soundings removed
-            if filter_by_detection
-        y
-            y variable stacked in the time/beam dimension to create 1 dim representation.  rejected soundings removed
-            if filter_by_detection
-        z
-            z variable stacked in the time/beam dimension to create 1 dim representation.  rejected soundings removed
-            if filter_by_detection
-        uncertainty
-            uncertainty variable stacked in the time/beam dimension to create 1 dim representation.  rejected soundings removed
-            if filter_by_detection
-        classification
-            if detectioninfo exists, this is the integer classification for each sounding
-        uncertainty_included
-            if tvu exists, True
-        dest_path
-            output path to write to
-        """
-
-        try:  # xarray
-            x = np.round(x.values, 2)
-            y = np.round(y.values, 2)
-            z = np.round(z.values, 3)
-        except:  # numpy
-            x = np.round(x, 2)
-            y = np.round(y, 2)
-            z = np.round(z, 3)
-
-        try:
-            vlrs = [laspy.header.VLR(user_id='LASF_Projection', record_id=2112, description='OGC Coordinate System WKT',
-                                     record_data=self.fqpr.horizontal_crs.to_wkt().encode('utf-8'))]
-        except Exception as e:
-            print('_las_write: Unable to build the Coordinate System VLR: {}'.format(e))
-
-        try:  # pre laspy 2.0
-            hdr = laspy.header.Header(file_version=1.4, point_format=6)  # pt format 3 includes GPS time
-            hdr.x_scale = 0.01  # xyz precision, las stores data as int
-            hdr.y_scale = 0.01
-            hdr.z_scale = 0.001
-            # offset apparently used to store only differences, but you still write the actual value?  needs more understanding.
-            hdr.x_offset = np.floor(float(x.min()))
-            hdr.y_offset = np.floor(float(y.min()))
-            hdr.z_offset = np.floor(float(z.min()))
-
-            try:
-                hdr.vlrs = vlrs
-                hdr.wkt = 1
-            except Exception as e:
-                print('_las_write: Unable to set the Coordinate system to the Header VLR: {}'.format(e))
-
-            outfile = laspy.file.File(dest_path, mode='w', header=hdr)
-            outfile.x = x
-            outfile.y = y
-            outfile.z = z
-            if classification is not None:
-                classification[np.where(classification < 2)] = 1  # 1 = Unclassified according to LAS spec
-                classification[np.where(classification == 2)] = 7  # 7 = Low Point (noise) according to LAS spec
-                outfile.classification = classification.astype(np.int8)
-            # if uncertainty_included:  # putting it in Intensity for now as integer mm, Intensity is an int16 field
-            #     outfile.intensity = (uncertainty.values * 1000).astype(np.int16)
-
-            outfile.close()
-        except:  # the new way starting in 2.0
-            las = laspy.create(file_version="1.4", point_format=6)
-            las.header.offsets = [np.floor(float(x.min())), np.floor(float(y.min())), np.floor(float(z.min()))]
-            las.header.scales = [0.01, 0.01, 0.001]
-
-            try:
-                las.header.vlrs = vlrs
-                las.header.global_encoding.wkt = 1
-            except Exception as e:
-                print('_las_write: Unable to set the Coordinate system to the Header VLR: {}'.format(e))
-
-            las.x = x
-            las.y = y
-            las.z = z
-            if classification is not None:
-                classification[np.where(classification < 2)] = 1  # 1 = Unclassified according to LAS spec
-                classification[np.where(classification == 2)] = 7  # 7 = Low Point (noise) according to LAS spec
-                las.classification = classification.astype(np.int8)
-            if uncertainty_included:
-                pass
-                # this seems to work to build a file that is supported by laspy and LASTools, but not the QGIS-Entwine workflow
-                # las.add_extra_dim(laspy.ExtraBytesParams(name='uncertainty', type=np.float32,
-                #                                          description='Total Vertical Uncertainty'))
-                # las.uncertainty = uncertainty.values
-            las.write(dest_path)
-
     def export_variable_to_csv(self, dataset_name: str, var_name: str, dest_path: str, reduce_method: str = None,
                                zero_centered: bool = False):
         """
@@ -901,3 +618,230 @@ def _create_folder(output_directory, fldrname):
         fldr_path = os.path.join(output_directory, fldrname + '_{}'.format(tstmp))
         os.mkdir(fldr_path)
     return fldr_path, suffix
+
+
+def _build_export_columns(ping_chunk: xr.Dataset, filter_by_detection: bool = True, z_pos_down: bool = True):
+    """
+    Flatten the (time, beam) variables of the loaded ping chunk to 1d sounding columns, dropping the empty beams and
+    the rejected soundings if filter_by_detection.
+
+    Parameters
+    ----------
+    ping_chunk
+        loaded chunk of pings, must contain the x,y,z variables generated by georeferencing
+    filter_by_detection
+        if True, will filter the xyz data by the detection info flag (rejected by multibeam system)
+    z_pos_down
+        if True, will export soundings with z positive down (this is the native Kluster convention)
+
+    Returns
+    -------
+    dict
+        dictionary of sounding columns (x, y, z, thu, tvu, classification, frequency, txsector_beam), variables not in
+        the ping chunk are None
+    """
+
+    x = ping_chunk['x'].values
+    valid = ~np.isnan(x)
+    if filter_by_detection and 'detectioninfo' in ping_chunk:
+        valid &= ping_chunk['detectioninfo'].values != kluster_variables.rejected_flag
+    columns = {}
+    for var in ['x', 'y', 'z', 'thu', 'tvu', 'frequency', 'txsector_beam', 'detectioninfo']:
+        columns[var] = ping_chunk[var].values[valid] if var in ping_chunk else None
+    columns['classification'] = columns.pop('detectioninfo')
+    # z positive down is the native convention in Kluster, if you want positive up, gotta flip
+    if not z_pos_down:
+        columns['z'] = columns['z'] * -1
+    return columns
+
+
+def _split_by_identifiers(columns: dict, export_by_identifiers: bool = True):
+    """
+    Return the (sector, frequency) identifier and sounding mask for each combination found in the sounding columns.  If
+    export_by_identifiers is False, returns a single empty identifier with a mask of all soundings.
+
+    Parameters
+    ----------
+    columns
+        dictionary of sounding columns, see _build_export_columns
+    export_by_identifiers
+        if True, will split up the soundings by sector and frequency
+
+    Returns
+    -------
+    list
+        list of (identifier, mask) for each combination with soundings
+    """
+
+    if not export_by_identifiers or columns['frequency'] is None or columns['txsector_beam'] is None:
+        if columns['x'].size:
+            return [((), np.ones(columns['x'].size, dtype=bool))]
+        return []
+    identifiers = []
+    for freq in np.unique(columns['frequency']):
+        freq_mask = columns['frequency'] == freq
+        for secid in np.unique(columns['txsector_beam'][freq_mask]).astype(np.int32):
+            identifiers.append(((secid, freq), freq_mask & (columns['txsector_beam'] == secid)))
+    return identifiers
+
+
+class CsvSoundingWriter:
+    """
+    Append sounding columns to a delimited text file, with the header written on the first write.  Text is formatted with
+    numba_helpers.format_fixed_point, which is much faster than np.savetxt for large exports.
+    """
+
+    def __init__(self, dest_path: str, delimiter: str = ' ', format_type: str = 'xyz'):
+        """
+        Parameters
+        ----------
+        dest_path
+            output path to write to
+        delimiter
+            csv delimiter to use
+        format_type
+            determines the columns written, one of ['xyz', 'xyzv', 'xyzhv'], h being horizontal uncertainty and v being
+            vertical uncertainty.
+        """
+
+        self.dest_path = dest_path
+        self.delimiter = delimiter
+        self.format_type = format_type
+        self.column_names = {'x': 'easting', 'y': 'northing', 'z': 'depth', 'thu': 'horizontal_uncertainty',
+                             'tvu': 'vertical_uncertainty'}
+        self.file = None
+        self.variables = None
+
+    def write(self, columns: dict):
+        """
+        Write the sounding columns to file
+
+        Parameters
+        ----------
+        columns
+            dictionary of sounding columns, see _build_export_columns
+        """
+
+        if self.file is None:
+            self.variables = ['x', 'y', 'z']
+            if self.format_type == 'xyzhv' and columns.get('thu') is not None:
+                self.variables.append('thu')
+            if self.format_type in ['xyzv', 'xyzhv'] and columns.get('tvu') is not None:
+                self.variables.append('tvu')
+            self.file = open(self.dest_path, 'wb')
+            self.file.write((self.delimiter.join([self.column_names[var] for var in self.variables]) + '\n').encode())
+        self.file.write(format_fixed_point(np.column_stack([columns[var] for var in self.variables]), 3, self.delimiter))
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class LasSoundingWriter:
+    """
+    Append sounding columns to a LAS 1.4 point format 6 file, or a compressed LAZ file if compress is True.  The header
+    offsets are set from the first chunk of soundings written.
+    """
+
+    def __init__(self, dest_path: str, horizontal_crs=None, compress: bool = False):
+        """
+        Parameters
+        ----------
+        dest_path
+            output path to write to
+        horizontal_crs
+            optional, pyproj CRS written to the WKT VLR
+        compress
+            if True, writes a LAZ file, requires a laspy LAZ backend
+        """
+
+        self.dest_path = dest_path
+        self.horizontal_crs = horizontal_crs
+        self.compress = compress
+        self.header = None
+        self.writer = None
+
+    def _open(self, x: np.ndarray, y: np.ndarray, z: np.ndarray):
+        self.header = laspy.LasHeader(version='1.4', point_format=6)
+        # offset apparently used to store only differences, but you still write the actual value?  needs more understanding.
+        self.header.offsets = [np.floor(float(x.min())), np.floor(float(y.min())), np.floor(float(z.min()))]
+        self.header.scales = [0.01, 0.01, 0.001]  # xyz precision, las stores data as int
+        if self.horizontal_crs is not None:
+            try:
+                self.header.vlrs.append(laspy.VLR(user_id='LASF_Projection', record_id=2112, description='OGC Coordinate System WKT',
+                                                  record_data=self.horizontal_crs.to_wkt().encode('utf-8')))
+                self.header.global_encoding.wkt = True
+            except Exception as e:
+                print('LasSoundingWriter: Unable to set the Coordinate system to the Header VLR: {}'.format(e))
+        # the writer updates the point count of its header as points are written, keep our header as the empty template
+        self.writer = laspy.open(self.dest_path, mode='w', header=deepcopy(self.header), do_compress=self.compress)
+
+    def write(self, columns: dict):
+        """
+        Write the sounding columns to file
+
+        Parameters
+        ----------
+        columns
+            dictionary of sounding columns, see _build_export_columns
+        """
+
+        if self.writer is None:
+            self._open(columns['x'], columns['y'], columns['z'])
+        las = laspy.LasData(deepcopy(self.header))
+        las.x = np.round(columns['x'], 2)
+        las.y = np.round(columns['y'], 2)
+        las.z = np.round(columns['z'], 3)
+        if columns.get('classification') is not None:
+            classification = columns['classification'].astype(np.uint8)
+            classification[columns['classification'] < 2] = 1  # 1 = Unclassified according to LAS spec
+            classification[columns['classification'] == 2] = 7  # 7 = Low Point (noise) according to LAS spec
+            las.classification = classification
+        self.writer.write_points(las.points)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+class ParquetSoundingWriter:
+    """
+    Append sounding columns to a Parquet file, one row group for each write.  Requires pyarrow.
+    """
+
+    def __init__(self, dest_path: str):
+        """
+        Parameters
+        ----------
+        dest_path
+            output path to write to
+        """
+
+        if not pyarrow_found:
+            raise ValueError('ParquetSoundingWriter: pyarrow not found, please install pyarrow to export to parquet')
+        self.dest_path = dest_path
+        self.column_names = {'x': 'easting', 'y': 'northing', 'z': 'depth', 'thu': 'horizontal_uncertainty',
+                             'tvu': 'vertical_uncertainty', 'classification': 'classification'}
+        self.writer = None
+
+    def write(self, columns: dict):
+        """
+        Write the sounding columns to file
+
+        Parameters
+        ----------
+        columns
+            dictionary of sounding columns, see _build_export_columns
+        """
+
+        table = pa.table({colname: columns[var] for var, colname in self.column_names.items() if columns.get(var) is not None})
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.dest_path, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
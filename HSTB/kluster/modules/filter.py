@@ -1,6 +1,10 @@
 import os
 import importlib.util
 from types import ModuleType
+import numpy as np
+
+from HSTB.kluster.modules.provenance import return_time_ranges_from_mask
+from HSTB.kluster import kluster_variables
 
 
 class FilterManager:
@@ -181,11 +185,16 @@ class FilterManager:
         filterclass = self.return_filter_class(filtername)
         return filterclass.controls
 
-    def run_filter(self, filtername: str, selected_index: list = None, save_to_disk: bool = True, **kwargs):
+    def run_filter(self, filtername: str, selected_index: list = None, save_to_disk: bool = True, run_by_chunk: bool = False,
+                   **kwargs):
         """
         Run the Filter class from the given filter name.  filtername should be the name of the file that contains the
         Filter class you want.
 
+        With run_by_chunk, if the filter has a per chunk algorithm (see BaseFilter._run_chunk_algorithm) and we are
+        saving the whole dataset to disk, the filter is run chunk by chunk on the cluster and only the chunks with
+        changed flags are written, see BaseFilter.run_by_chunk.  The new status is not returned in this case.
+
         Parameters
         ----------
         filtername
@@ -196,11 +205,22 @@ class FilterManager:
             Points View.
         save_to_disk
             if True, will save the new sounding status to disk
+        run_by_chunk
+            if True, will run the filter chunk by chunk when the filter supports it, see above.  Use this when you only
+            need the new status saved to disk, not returned
+
+        Returns
+        -------
+        list
+            list of the new sounding status arrays, one for each sonar head, None if run by chunk
         """
 
         filterclass = self.return_filter_class(filtername)
         if filterclass is not None:
             filterclass._selected_index = selected_index
+            if run_by_chunk and save_to_disk and not selected_index and filterclass.supports_chunks:
+                filterclass.run_by_chunk(**kwargs)
+                return None
             new_status = filterclass.run(**kwargs)
             if save_to_disk:
                 filterclass.save()
@@ -231,6 +251,23 @@ class BaseFilter:
         self.controls = []
         # text description of the filter, will show up in the GUI tooltip for the filter
         self.description = ''
+        # variables (other than detectioninfo) that _run_chunk_algorithm needs, only used if you implement _run_chunk_algorithm
+        self.chunk_variables = []
+
+    @property
+    def supports_chunks(self):
+        """
+        True if this filter implements the per chunk algorithm, see _run_chunk_algorithm
+        """
+
+        return type(self)._run_chunk_algorithm is not BaseFilter._run_chunk_algorithm
+
+    def _validate_arguments(self, **kwargs):
+        """
+        Optional, raise an exception here if the arguments (or the data) are not valid for the filter.  Called before
+        running the filter by chunk, call it in _run_algorithm as well if you want the same validation there.
+        """
+        pass
 
     def _run_algorithm(self, **kwargs):
         """
@@ -238,6 +275,27 @@ class BaseFilter:
         """
         raise NotImplementedError('BaseFilter: you must create a Filter class and implement this method')
 
+    @staticmethod
+    def _run_chunk_algorithm(chunk, **kwargs):
+        """
+        Optional, per chunk version of your custom algorithm.  If implemented (along with chunk_variables), the filter
+        can be run chunk by chunk on the cluster, without loading the whole dataset (see run_by_chunk).  This must be a
+        staticmethod that only uses the provided chunk, as it is sent to the dask workers without the filter class.
+
+        Parameters
+        ----------
+        chunk
+            xr.Dataset for a block of pings from one sonar head, containing detectioninfo and the chunk_variables
+        kwargs
+            the keyword arguments provided to run_filter, see controls
+
+        Returns
+        -------
+        np.ndarray
+            2d (time, beam) array of the new detectioninfo values for the chunk
+        """
+        raise NotImplementedError('BaseFilter: this filter does not have a per chunk algorithm')
+
     def run(self, **kwargs):
         self._run_algorithm(**kwargs)
         try:
@@ -246,6 +304,36 @@ class BaseFilter:
             print(f'BaseFilter: expect new_status returned from filter to be 2 dimensional, got {[ns.shape for ns in self.new_status]}')
         return self.new_status
 
+    def run_by_chunk(self, **kwargs):
+        """
+        Run the per chunk algorithm across the ping chunks of each sonar head, mapping the chunks on the dask cluster
+        (or locally if there is no cluster).  Only kluster_variables.filter_chunks_at_a_time chunks are run at once,
+        and only the chunks where the sounding flags changed are written back to disk.
+        """
+
+        self._validate_arguments(**kwargs)
+        missing_vars = [var for var in ['detectioninfo'] + self.chunk_variables if var not in self.fqpr.multibeam.raw_ping[0]]
+        if missing_vars:
+            raise ValueError(f'BaseFilter: unable to find {missing_vars}, have you processed this data?')
+        kernel = type(self)._run_chunk_algorithm
+        self.new_status = None
+        for rp in self.fqpr.multibeam.raw_ping:
+            chunks = self.fqpr.subset.return_ping_chunks(['detectioninfo'] + self.chunk_variables, raw_ping=[rp])
+            for i in range(0, len(chunks), kluster_variables.filter_chunks_at_a_time):
+                run_chunks = chunks[i:i + kluster_variables.filter_chunks_at_a_time]
+                data_for_workers = [[kernel, chnk, kwargs] for chnk in run_chunks]
+                try:
+                    futs = self.fqpr.client.map(distrib_run_filter_chunk, data_for_workers)
+                    results = self.fqpr.client.gather(futs)
+                except:  # client is not setup, run locally
+                    results = [distrib_run_filter_chunk(dat) for dat in data_for_workers]
+                changed = [(chnk['detectioninfo'].copy(data=newflags), chnk.time) for chnk, newflags in zip(run_chunks, results)
+                           if newflags is not None]
+                if changed:
+                    self.fqpr.write('ping', [c[0].to_dataset() for c in changed], time_array=[c[1] for c in changed],
+                                    sys_id=rp.system_identifier, skip_dask=True)
+                    self.fqpr.record_sounding_changes(rp.system_identifier, [[float(c[1][0]), float(c[1][-1])] for c in changed])
+
     def save(self):
         if not isinstance(self.new_status, list) or not self.new_status:
             print('BaseFilter: unable to save new sounding flags, new_status should be a list of arrays, one array for '
@@ -264,17 +352,42 @@ class BaseFilter:
                 rp_detect[:] = rp_detect_values  # write the change back to the xarray dataarray
                 # save to disk
                 self.fqpr.write('ping', [rp_detect.to_dataset()], time_array=[rp_detect.time], sys_id=rp.system_identifier, skip_dask=True)
+                self.fqpr.record_sounding_changes(rp.system_identifier, return_time_ranges_from_mask(rp_detect.time.values, sel_index.any(axis=1)))
         else:  # expect that the new_status is the same size as the existing status, no subset
             for cnt, rp in enumerate(self.fqpr.multibeam.raw_ping):
                 rp_detect = rp['detectioninfo'].load()  # convert to numpy and load in memory
                 rp_detect[:] = self.new_status[cnt]  # overwrite with new status
                 # save to disk
                 self.fqpr.write('ping', [rp_detect.to_dataset()], time_array=[rp_detect.time], sys_id=rp.system_identifier, skip_dask=True)
+                self.fqpr.record_sounding_changes(rp.system_identifier, [[float(rp_detect.time[0]), float(rp_detect.time[-1])]])
 
     def return_controls(self):
         return self.controls
 
 
+def distrib_run_filter_chunk(worker_dat: list):
+    """
+    Convenience function for mapping a filter per chunk algorithm across cluster.  Assumes that you are mapping this
+    function with a list of data.
+
+    Parameters
+    ----------
+    worker_dat
+        [per chunk algorithm (see BaseFilter._run_chunk_algorithm), xr.Dataset for the ping chunk, dict of keyword arguments]
+
+    Returns
+    -------
+    np.ndarray
+        2d (time, beam) array of the new detectioninfo values for the chunk, None if the flags did not change
+    """
+
+    chunk = worker_dat[1].load()
+    new_detect = np.asarray(worker_dat[0](chunk, **worker_dat[2]))
+    if np.array_equal(new_detect, chunk['detectioninfo'].values):
+        return None
+    return new_detect.astype(chunk['detectioninfo'].dtype)
+
+
 if __name__ == '__main__':
     fm = FilterManager()
     print('Filters currently loaded')
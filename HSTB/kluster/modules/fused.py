@@ -0,0 +1,100 @@
+from HSTB.kluster.modules.orientation import distrib_run_build_orientation_vectors
+from HSTB.kluster.modules.beampointingvector import distrib_run_build_beam_pointing_vector
+from HSTB.kluster.modules.svcorrect import distributed_run_sv_correct
+from HSTB.kluster.modules.georeference import distrib_run_georeference
+from HSTB.kluster.modules.tpu import distrib_run_calculate_tpu
+
+
+# names of the arrays returned by each process, in the order the distrib functions return them (minus processing status)
+fused_process_outputs = {'orientation': ['tx', 'rx'],
+                         'bpv': ['rel_azimuth', 'corr_pointing_angle'],
+                         'sv_corr': ['alongtrack', 'acrosstrack', 'depthoffset'],
+                         'georef': ['x', 'y', 'z', 'corr_heave', 'corr_altitude', 'datum_uncertainty', 'geohash'],
+                         'tpu': ['tvu', 'thu']}
+
+
+def distrib_run_fused_processing(dat: list):
+    """
+    Convenience function for mapping the full processing stack (orientation, beam pointing vectors, sound velocity
+    correction, georeferencing and optionally tpu) across the cluster.  Each chunk is taken through all processes in
+    memory on the worker, the intermediate arrays are never written to disk.  Only the arrays named in the
+    output_variables list are returned.
+
+    The data for each process is built in the same way as it is for that process alone, with the slots that depend on
+    the result of the previous process left as None.  Those slots are populated here as the chunk moves through the
+    processes.
+
+    distrib functions also return a processing status array, here it is the status of the last process run (4 if tpu
+    is not run, 5 otherwise)
+
+    Parameters
+    ----------
+    dat
+        [orientation_data, bpv_data, svcorr_data, georef_data, tpu_data (or None to skip tpu), output_variables]
+
+    Returns
+    -------
+    list
+        [xr.DataArray for each of the output_variables, processing_status]
+    """
+
+    orientation_data, bpv_data, svcorr_data, georef_data, tpu_data, output_variables = dat
+    results = {}
+
+    ans = distrib_run_build_orientation_vectors(orientation_data)
+    results.update(dict(zip(fused_process_outputs['orientation'], ans[:-1])))
+
+    bpv_data[3] = ans[:2]
+    ans = distrib_run_build_beam_pointing_vector(bpv_data)
+    results.update(dict(zip(fused_process_outputs['bpv'], ans[:-1])))
+
+    svcorr_data[1] = ans[:2]
+    ans = distributed_run_sv_correct(svcorr_data)
+    results.update(dict(zip(fused_process_outputs['sv_corr'], ans[:-1])))
+
+    georef_data[0] = ans[:3]
+    ans = distrib_run_georeference(georef_data)
+    results.update(dict(zip(fused_process_outputs['georef'], ans[:-1])))
+
+    if tpu_data is not None:
+        tpu_data[2] = results['corr_pointing_angle']
+        tpu_data[3] = results['acrosstrack']
+        tpu_data[4] = results['depthoffset']
+        if tpu_data[16] not in ['waterline', 'ellipse']:  # vert_ref, only use datum uncertainty with a separation model
+            tpu_data[6] = results['datum_uncertainty']
+        ans = distrib_run_calculate_tpu(tpu_data)
+        results.update(dict(zip(fused_process_outputs['tpu'], ans[:-1])))
+
+    processing_status = ans[-1]
+    return [results[ovar] for ovar in output_variables] + [processing_status]
+
+
+def return_fused_output_variables(output_variables: list = None, run_tpu: bool = True):
+    """
+    Validate the requested fused processing outputs, returning the default list of all process outputs if none are
+    provided.
+
+    Parameters
+    ----------
+    output_variables
+        list of variable names to retain from the fused processing, ex: ['x', 'y', 'z', 'tvu', 'thu']
+    run_tpu
+        if True, tpu is included in the fused processing
+
+    Returns
+    -------
+    list
+        validated list of variable names
+    """
+
+    valid_modes = ['orientation', 'bpv', 'sv_corr', 'georef']
+    if run_tpu:
+        valid_modes.append('tpu')
+    valid_variables = [vr for md in valid_modes for vr in fused_process_outputs[md]]
+    if not output_variables:
+        return valid_variables
+    invalid = [vr for vr in output_variables if vr not in valid_variables]
+    if invalid:
+        raise ValueError(f'return_fused_output_variables: {invalid} are not valid fused processing outputs, must be in {valid_variables}')
+    # retain the process order, so that the written dataset is consistent regardless of the order requested
+    return [vr for vr in valid_variables if vr in output_variables]
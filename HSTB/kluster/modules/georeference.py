@@ -7,7 +7,7 @@ from typing import Union
 from datetime import datetime
 import geohash
 from shapely import geometry
-import queue
+from shapely.prepared import prep
 import traceback
 
 from HSTB.kluster.xarray_helpers import stack_nan_array, reform_nan_array
@@ -389,6 +389,33 @@ def clear_vdatum_path():
         datum_data.remove_from_config('vdatum_path')
 
 
+geohash_base32 = np.frombuffer(b'0123456789bcdefghjkmnpqrstuvwxyz', dtype=np.uint8)
+geohash_base32_lookup = np.full(256, 255, dtype=np.uint8)
+geohash_base32_lookup[geohash_base32] = np.arange(32, dtype=np.uint8)
+
+
+def _geohash_bits(precision: int):
+    """
+    Return the number of longitude and latitude bits in a geohash of the given precision.  Each character is 5 bits,
+    interleaved starting with longitude, so longitude gets the extra bit when the total is odd.
+
+    Parameters
+    ----------
+    precision
+        length of the geohash string
+
+    Returns
+    -------
+    int
+        number of longitude bits
+    int
+        number of latitude bits
+    """
+
+    total_bits = 5 * precision
+    return (total_bits + 1) // 2, total_bits // 2
+
+
 def new_geohash(latitude: float, longitude: float, precision: int):
     """
     compute new geohash for given latitude longitude
@@ -413,12 +440,69 @@ def new_geohash(latitude: float, longitude: float, precision: int):
     return geohash.encode(latitude, longitude, precision=precision).encode()
 
 
+def _encode_geohash_array(latitude: np.ndarray, longitude: np.ndarray, precision: int):
+    """
+    Vectorized geohash encoding, builds the integer cell index for latitude and longitude, interleaves the bits and
+    maps each 5 bit group to the geohash base32 alphabet.  Matches the python-geohash encode, with NaN positions
+    returned as a blank string.
+
+    Parameters
+    ----------
+    latitude
+        numpy array of latitude values
+    longitude
+        numpy array of longitude values
+    precision
+        integer precision, the length of the returned string, up to 12
+
+    Returns
+    -------
+    np.array
+        array of bytestrings dtype='SX' where X is the precision you have given, same shape as latitude
+    """
+
+    if precision > 12:
+        raise ValueError('compute_geohash: precision must be less than or equal to 12, found {}'.format(precision))
+    latitude = np.asarray(latitude, dtype=np.float64)
+    longitude = np.asarray(longitude, dtype=np.float64)
+    shape = np.broadcast(latitude, longitude).shape
+    latitude = np.broadcast_to(latitude, shape).ravel()
+    longitude = np.broadcast_to(longitude, shape).ravel()
+    invalid = np.isnan(latitude) | np.isnan(longitude)
+    if (latitude[~invalid] > 90).any() or (latitude[~invalid] < -90).any():
+        raise ValueError('compute_geohash: invalid latitude, must be within -90 to 90 degrees')
+
+    lon_bits, lat_bits = _geohash_bits(precision)
+    with np.errstate(invalid='ignore'):
+        lon_wrapped = np.mod(longitude + 180.0, 360.0)
+        lat_int = np.floor((latitude + 90.0) / 180.0 * (1 << lat_bits))
+        lon_int = np.floor(lon_wrapped / 360.0 * (1 << lon_bits))
+    lat_int = np.clip(np.where(invalid, 0, lat_int), 0, (1 << lat_bits) - 1).astype(np.int64)
+    lon_int = np.clip(np.where(invalid, 0, lon_int), 0, (1 << lon_bits) - 1).astype(np.int64)
+
+    # interleave the bits, most significant first, starting with longitude
+    code = np.zeros(latitude.shape, dtype=np.int64)
+    for bit in range(5 * precision):
+        if bit % 2 == 0:
+            lon_bits -= 1
+            code = (code << 1) | ((lon_int >> lon_bits) & 1)
+        else:
+            lat_bits -= 1
+            code = (code << 1) | ((lat_int >> lat_bits) & 1)
+
+    chars = np.empty((latitude.shape[0], precision), dtype=np.uint8)
+    for cnt in range(precision):
+        chars[:, cnt] = geohash_base32[(code >> (5 * (precision - cnt - 1))) & 31]
+    chars[invalid] = ord(' ')
+    return chars.view('S{}'.format(precision)).reshape(shape)
+
+
 def compute_geohash(latitude: np.array, longitude: np.array, precision: int):
     """
     Geohash is a geocoding method to encode a specific latitude/longitude into a string representing an area of a given
-    precision.  String is a custom base32 implementation encoded string.  We use the python-geohash library to do this.
-    The result is a string of length = precision encoding the position.  Higher precision will give you a more
-    accurate geohash, i.e. smaller tile.
+    precision.  String is a custom base32 implementation encoded string.  Encoding is vectorized in numpy, see
+    _encode_geohash_array, and matches the python-geohash library.  The result is a string of length = precision
+    encoding the position.  Higher precision will give you a more accurate geohash, i.e. smaller tile.
 
     Parameters
     ----------
@@ -434,33 +518,87 @@ def compute_geohash(latitude: np.array, longitude: np.array, precision: int):
     np.array
         array of bytestrings dtype='SX' where X is the precision you have given
     """
-    if latitude.size > 1:
-        vectorhash = np.vectorize(new_geohash)
-        return vectorhash(latitude, longitude, precision)
-    else:
-        return new_geohash(latitude, longitude, precision)
 
+    ghash = _encode_geohash_array(latitude, longitude, precision)
+    if ghash.size == 1:
+        return ghash.ravel()[0]
+    return ghash
 
-def decode_geohash(ghash: Union[str, bytes]):
+
+def _decode_geohash_array(ghash: np.ndarray):
     """
-    Take the given geohash and return the centroid of the geohash cell
+    Vectorized geohash decoding, returns the lower left corner of each geohash cell and the cell size.  All geohashes
+    must be the same length.
 
     Parameters
     ----------
     ghash
-        string geohash or bytestring geohash
+        numpy array of bytestring geohashes, dtype='SX'
+
     Returns
     -------
+    np.ndarray
+        latitude of the southern edge of each cell
+    np.ndarray
+        longitude of the western edge of each cell
     float
-        latitude
+        cell height in degrees
     float
+        cell width in degrees
+    """
+
+    ghash = np.asarray(ghash)
+    if ghash.dtype.kind == 'U':
+        ghash = np.char.encode(ghash)
+    precision = ghash.dtype.itemsize
+    shape = ghash.shape
+    chars = np.ascontiguousarray(ghash).ravel().view(np.uint8).reshape(-1, precision)
+    values = geohash_base32_lookup[chars].astype(np.int64)
+    if (values == 255).any():
+        raise ValueError('decode_geohash: found invalid geohash characters')
+
+    code = np.zeros(chars.shape[0], dtype=np.int64)
+    for cnt in range(precision):
+        code = (code << 5) | values[:, cnt]
+    lat_int = np.zeros(chars.shape[0], dtype=np.int64)
+    lon_int = np.zeros(chars.shape[0], dtype=np.int64)
+    for bit in range(5 * precision):
+        bitval = (code >> (5 * precision - bit - 1)) & 1
+        if bit % 2 == 0:
+            lon_int = (lon_int << 1) | bitval
+        else:
+            lat_int = (lat_int << 1) | bitval
+
+    lon_bits, lat_bits = _geohash_bits(precision)
+    lat_size = 180.0 / (1 << lat_bits)
+    lon_size = 360.0 / (1 << lon_bits)
+    return (lat_int * lat_size - 90.0).reshape(shape), (lon_int * lon_size - 180.0).reshape(shape), lat_size, lon_size
+
+
+def decode_geohash(ghash: Union[str, bytes, np.ndarray]):
+    """
+    Take the given geohash and return the centroid of the geohash cell
+
+    Parameters
+    ----------
+    ghash
+        string geohash or bytestring geohash, or a numpy array of bytestring geohashes of the same length
+
+    Returns
+    -------
+    Union[float, np.ndarray]
+        latitude
+    Union[float, np.ndarray]
         longitude
     """
 
     if isinstance(ghash, str):
         return geohash.decode(ghash)
-    else:
+    elif isinstance(ghash, bytes):
         return geohash.decode(ghash.decode())
+    else:
+        lat, lon, lat_size, lon_size = _decode_geohash_array(ghash)
+        return lat + lat_size / 2, lon + lon_size / 2
 
 
 def geohash_to_polygon(ghash: Union[str, bytes]):
@@ -496,6 +634,9 @@ def polygon_to_geohashes(polygon: Union[np.array, geometry.Polygon], precision):
     Take a polygon and return a list of all of the geohash codes/cells that are completely inside and those that are
     intersecting
 
+    Builds the grid of geohash cells that cover the polygon envelope in one vectorized encode, and then tests each cell
+    against the prepared polygon.
+
     Parameters
     ----------
     polygon
@@ -514,36 +655,30 @@ def polygon_to_geohashes(polygon: Union[np.array, geometry.Polygon], precision):
     if not isinstance(polygon, geometry.Polygon):
         polygon = geometry.Polygon(polygon)
 
-    intersect_geohashes = set()
-    inner_geohashes = set()
-    outer_geohashes = set()
-
-    envelope = polygon.envelope
-    centroid = polygon.centroid
-
-    testing_geohashes = queue.Queue()
-    testing_geohashes.put(new_geohash(centroid.y, centroid.x, precision))
-
-    while not testing_geohashes.empty():
-        current_geohash = testing_geohashes.get()
-
-        if current_geohash not in inner_geohashes and current_geohash not in outer_geohashes and current_geohash not in intersect_geohashes:
-            current_polygon = geohash_to_polygon(current_geohash)
-
-            if envelope.intersects(current_polygon):
-                if polygon.contains(current_polygon):
-                    inner_geohashes.add(current_geohash)
-                if polygon.intersects(current_polygon):
-                    intersect_geohashes.add(current_geohash)
-                else:
-                    outer_geohashes.add(current_geohash)
-
-                for neighbor in geohash.neighbors(current_geohash.decode()):
-                    neighbor = neighbor.encode()
-                    if neighbor not in inner_geohashes and neighbor not in outer_geohashes and neighbor not in intersect_geohashes:
-                        testing_geohashes.put(neighbor)
-
-    return list(inner_geohashes), list(intersect_geohashes)
+    lon_bits, lat_bits = _geohash_bits(precision)
+    lat_size = 180.0 / (1 << lat_bits)
+    lon_size = 360.0 / (1 << lon_bits)
+    minx, miny, maxx, maxy = polygon.bounds
+    # pad by one cell, so that we include the cells that only touch the envelope edges
+    lat_start = max(int(np.floor((miny + 90.0) / lat_size)) - 1, 0)
+    lat_end = min(int(np.floor((maxy + 90.0) / lat_size)) + 1, (1 << lat_bits) - 1)
+    lon_start = max(int(np.floor((minx + 180.0) / lon_size)) - 1, 0)
+    lon_end = min(int(np.floor((maxx + 180.0) / lon_size)) + 1, (1 << lon_bits) - 1)
+    cell_south, cell_west = np.meshgrid(np.arange(lat_start, lat_end + 1) * lat_size - 90.0,
+                                        np.arange(lon_start, lon_end + 1) * lon_size - 180.0, indexing='ij')
+    cell_south, cell_west = cell_south.ravel(), cell_west.ravel()
+    cell_hashes = _encode_geohash_array(cell_south + lat_size / 2, cell_west + lon_size / 2, precision)
+
+    prepared_polygon = prep(polygon)
+    inner_geohashes = []
+    intersect_geohashes = []
+    for ghash, south, west in zip(cell_hashes, cell_south, cell_west):
+        current_polygon = geometry.box(west, south, west + lon_size, south + lat_size)
+        if prepared_polygon.intersects(current_polygon):
+            intersect_geohashes.append(bytes(ghash))
+            if prepared_polygon.contains(current_polygon):
+                inner_geohashes.append(bytes(ghash))
+    return inner_geohashes, intersect_geohashes
 
 
 def distance_between_coordinates(lat_one: Union[float, np.ndarray], lon_one: Union[float, np.ndarray],
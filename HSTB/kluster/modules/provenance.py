@@ -0,0 +1,175 @@
+import json
+import hashlib
+import numpy as np
+from datetime import datetime
+from typing import Union
+
+from HSTB.kluster.modules.spatial_index import merge_time_ranges
+
+
+def return_xyzrph_identifier(xyzrph: dict, timestmp: str):
+    """
+    Build an identifier for the installation parameters (offsets, angles, waterline, tpu parameters) used in processing,
+    the timestamp of the installation parameters entry and a hash of the values for that entry.  Editing the offsets of
+    an entry will change the identifier, even though the timestamp stays the same.
+
+    Parameters
+    ----------
+    xyzrph
+        dict of offsets/angles/tpu parameters from the fqpr instance, {parameter name: {timestamp: value}}
+    timestmp
+        timestamp of the installation parameters instance used
+
+    Returns
+    -------
+    str
+        identifier for the installation parameters, ex: '1495563079_f3a8...'
+    """
+
+    timestmp = str(timestmp)
+    entry = {ky: val[timestmp] for ky, val in xyzrph.items() if isinstance(val, dict) and timestmp in val}
+    entry_hash = hashlib.sha1(json.dumps(entry, sort_keys=True, default=str).encode()).hexdigest()
+    return '{}_{}'.format(timestmp, entry_hash)
+
+
+def return_navigation_identifier(nav_files: dict, start_time: float, end_time: float):
+    """
+    Build an identifier for the post processed navigation used for the pings from start_time to end_time, the sorted
+    names of the navigation files that overlap that time range.
+
+    Parameters
+    ----------
+    nav_files
+        the nav_files attribute written by import_post_processed_navigation, {file name: [start time, end time]}
+    start_time
+        time of the first ping in the chunk, in utc seconds
+    end_time
+        time of the last ping in the chunk, in utc seconds
+
+    Returns
+    -------
+    str
+        identifier for the navigation, ex: 'sbet: sbet_one.out, sbet_two.out'
+    """
+
+    overlapping = sorted([fname for fname, ftimes in nav_files.items() if ftimes[0] <= end_time and ftimes[1] >= start_time])
+    return 'sbet: ' + ', '.join(overlapping)
+
+
+def merge_provenance_records(existing_records: list, new_records: list):
+    """
+    Add new provenance records to the existing records for a process.  Each record is [start time, end time, inputs]
+    for one processed chunk.  Records later in the list take precedence over earlier records, so the new records are
+    appended to the end.  Existing records that are entirely within a new record are dropped, as they no longer apply
+    to any ping.
+
+    Parameters
+    ----------
+    existing_records
+        list of [start time, end time, inputs dict] for the chunks processed previously
+    new_records
+        list of [start time, end time, inputs dict] for the chunks just processed
+
+    Returns
+    -------
+    list
+        merged list of records
+    """
+
+    new_starts = np.array([rec[0] for rec in new_records], dtype=np.float64)
+    new_ends = np.array([rec[1] for rec in new_records], dtype=np.float64)
+    merged = []
+    for rec in existing_records:
+        if not np.any((new_starts <= rec[0]) & (new_ends >= rec[1])):
+            merged.append(rec)
+    return merged + [list(rec) for rec in new_records]
+
+
+def return_record_index(times: np.ndarray, records: list):
+    """
+    Find the provenance record that applies to each ping, the last record in the list whose time range contains the
+    ping time.
+
+    Parameters
+    ----------
+    times
+        1dim time of each ping
+    records
+        list of [start time, end time, inputs dict], see merge_provenance_records
+
+    Returns
+    -------
+    np.ndarray
+        1dim index of the record for each ping, -1 where no record applies
+    """
+
+    times = np.asarray(times, dtype=np.float64)
+    record_index = np.full(times.shape[0], -1, dtype=np.int64)
+    for cnt, rec in enumerate(records):
+        record_index[(times >= rec[0]) & (times <= rec[1])] = cnt
+    return record_index
+
+
+def return_time_ranges_from_mask(times: np.ndarray, mask: np.ndarray):
+    """
+    Return the time ranges of each run of consecutive pings where mask is True
+
+    Parameters
+    ----------
+    times
+        1dim time of each ping
+    mask
+        1dim boolean mask of the pings to include
+
+    Returns
+    -------
+    list
+        list of [start time, end time] for each run of pings
+    """
+
+    times = np.asarray(times, dtype=np.float64)
+    mask = np.asarray(mask, dtype=bool)
+    if not mask.any():
+        return []
+    edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    run_starts = np.where(edges == 1)[0]
+    run_ends = np.where(edges == -1)[0] - 1
+    return merge_time_ranges(times[run_starts], times[run_ends])
+
+
+def return_changed_lines(line_times: dict, change_records: list, since: Union[datetime, dict]):
+    """
+    Find the lines that have a sounding change record (see Fqpr.record_sounding_changes) made after the provided
+    time.  A line has changed if any change record overlapping the line time range was made after since.
+
+    Parameters
+    ----------
+    line_times
+        dict of {line name: [start time, end time]} in utc seconds
+    change_records
+        list of [start time, end time, {'generation': int, 'time': str}] for each change, time is in the '%c' format
+    since
+        either a single datetime to compare all lines against, or a dict of {line name: datetime} for a separate
+        time for each line.  Lines not in the dict are not returned.
+
+    Returns
+    -------
+    list
+        list of the line names that have changed
+    """
+
+    record_starts = np.array([rec[0] for rec in change_records], dtype=np.float64)
+    record_ends = np.array([rec[1] for rec in change_records], dtype=np.float64)
+    record_times = [datetime.strptime(rec[2]['time'], '%c') for rec in change_records]
+    changed = []
+    for linename, ltimes in line_times.items():
+        if isinstance(since, dict):
+            if linename not in since:
+                continue
+            line_since = since[linename]
+        else:
+            line_since = since
+        overlapping = np.where((record_starts <= ltimes[1]) & (record_ends >= ltimes[0]))[0]
+        if any(record_times[idx] > line_since for idx in overlapping):
+            changed.append(linename)
+    return changed
@@ -0,0 +1,340 @@
+import os
+import numpy as np
+
+
+def return_spatial_index_path(output_folder: str, sys_id: str):
+    """
+    Return the path to the spatial index file for the given system, stored next to the ping zarr folder
+
+    Parameters
+    ----------
+    output_folder
+        Fqpr output folder, the folder containing the ping zarr folders
+    sys_id
+        system identifier for the ping record
+
+    Returns
+    -------
+    str
+        path to the spatial index file
+    """
+
+    return os.path.join(output_folder, 'spatial_index_' + sys_id + '.npz')
+
+
+def build_ping_ranges(geohash: np.ndarray, times: np.ndarray):
+    """
+    Build the ping ranges for each geohash cell in a line.  For each cell, we find the runs of consecutive pings that
+    have at least one sounding in that cell and return the time of the first and last ping in each run.
+
+    Parameters
+    ----------
+    geohash
+        2dim (time, beam) geohash for each sounding, blank geohashes (no georeferenced answer) are ignored
+    times
+        1dim (time) time of each ping
+
+    Returns
+    -------
+    np.ndarray
+        1dim geohash cell for each run
+    np.ndarray
+        1dim time of the first ping in each run
+    np.ndarray
+        1dim time of the last ping in each run
+    """
+
+    geohash = np.asarray(geohash)
+    times = np.asarray(times, dtype=np.float64)
+    ping_index = np.broadcast_to(np.arange(geohash.shape[0])[:, None], geohash.shape).ravel()
+    geohash = geohash.ravel()
+    valid = geohash != b' ' * geohash.dtype.itemsize
+    geohash, ping_index = geohash[valid], ping_index[valid]
+    if not geohash.size:
+        return np.array([], dtype=geohash.dtype), np.array([], dtype=np.float64), np.array([], dtype=np.float64)
+
+    unique_cells, cell_index = np.unique(geohash, return_inverse=True)
+    # unique (cell, ping) pairs, sorted by cell and then ping
+    pairs = np.unique(cell_index.ravel().astype(np.int64) * times.shape[0] + ping_index)
+    pair_cell, pair_ping = pairs // times.shape[0], pairs % times.shape[0]
+    # a new run starts when the cell changes or the ping is not the next ping in the previous run
+    run_start = np.ones(pairs.shape[0], dtype=bool)
+    run_start[1:] = (pair_cell[1:] != pair_cell[:-1]) | (pair_ping[1:] != pair_ping[:-1] + 1)
+    start_idx = np.where(run_start)[0]
+    end_idx = np.append(start_idx[1:] - 1, pairs.shape[0] - 1)
+    return unique_cells[pair_cell[start_idx]], times[pair_ping[start_idx]], times[pair_ping[end_idx]]
+
+
+def merge_time_ranges(start_times: np.ndarray, end_times: np.ndarray):
+    """
+    Merge overlapping time ranges, returning the sorted disjoint time ranges
+
+    Parameters
+    ----------
+    start_times
+        1dim start time of each range
+    end_times
+        1dim end time of each range
+
+    Returns
+    -------
+    list
+        list of [start time, end time] for each merged range
+    """
+
+    if not len(start_times):
+        return []
+    sort_idx = np.argsort(start_times, kind='stable')
+    merged = [[float(start_times[sort_idx[0]]), float(end_times[sort_idx[0]])]]
+    for st, et in zip(start_times[sort_idx[1:]].tolist(), end_times[sort_idx[1:]].tolist()):
+        if st <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], et)
+        else:
+            merged.append([st, et])
+    return merged
+
+
+class SpatialIndex:
+    """
+    Spatial index of the soundings in a ping record, built during georeferencing.  For each line and each geohash cell,
+    we store the time ranges of the pings that have soundings in that cell.  Polygon selection can then look up the
+    ping ranges for the geohash cells that intersect the polygon and only load those pings, instead of scanning the
+    geohash variable for every line.
+
+    The index is saved as a numpy npz file next to the ping zarr folder, see return_spatial_index_path.  Lines are
+    updated individually, so reprocessing a subset of the dataset only rebuilds the index for those lines.
+    """
+
+    def __init__(self, index_path: str = None):
+        self.index_path = index_path
+        self.lines = np.array([], dtype=object)
+        self.cells = np.array([], dtype='S1')
+        self.start_times = np.array([], dtype=np.float64)
+        self.end_times = np.array([], dtype=np.float64)
+        self._modified_time = None
+        if self.index_path and os.path.exists(self.index_path):
+            self.load()
+
+    @property
+    def line_names(self):
+        return list(np.unique(self.lines))
+
+    def load(self):
+        """
+        Load the spatial index from the index_path
+        """
+
+        with np.load(self.index_path, allow_pickle=False) as indexdata:
+            self.lines = indexdata['lines'].astype(object)
+            self.cells = indexdata['cells']
+            self.start_times = indexdata['start_times']
+            self.end_times = indexdata['end_times']
+        self._modified_time = os.path.getmtime(self.index_path)
+
+    def save(self):
+        """
+        Save the spatial index to the index_path
+        """
+
+        if not self.index_path:
+            raise ValueError('SpatialIndex: no index_path provided, unable to save')
+        # np.savez adds the .npz extension if it is not there, write with a file handle to retain the provided path
+        with open(self.index_path, 'wb') as indexfile:
+            np.savez(indexfile, lines=self.lines.astype(str), cells=self.cells, start_times=self.start_times,
+                     end_times=self.end_times)
+        self._modified_time = os.path.getmtime(self.index_path)
+
+    def is_current(self):
+        """
+        Returns True if the index on disk has not changed since we loaded it
+
+        Returns
+        -------
+        bool
+            True if the loaded index matches the index on disk
+        """
+
+        if not self.index_path or not os.path.exists(self.index_path):
+            return self._modified_time is None
+        return self._modified_time == os.path.getmtime(self.index_path)
+
+    def remove_lines(self, line_names: list):
+        """
+        Remove all entries for the given lines
+
+        Parameters
+        ----------
+        line_names
+            list of line names to remove from the index
+        """
+
+        keep = ~np.isin(self.lines, line_names)
+        self.lines = self.lines[keep]
+        self.cells = self.cells[keep]
+        self.start_times = self.start_times[keep]
+        self.end_times = self.end_times[keep]
+
+    def update_line(self, line_name: str, geohash: np.ndarray, times: np.ndarray):
+        """
+        Replace the entries for this line with new entries built from the provided geohash array
+
+        Parameters
+        ----------
+        line_name
+            name of the multibeam file
+        geohash
+            2dim (time, beam) geohash for each sounding in the line
+        times
+            1dim (time) time of each ping in the line
+        """
+
+        self.remove_lines([line_name])
+        cells, start_times, end_times = build_ping_ranges(geohash, times)
+        self.lines = np.concatenate([self.lines, np.full(cells.shape[0], line_name, dtype=object)])
+        self.cells = np.concatenate([self.cells, cells])
+        self.start_times = np.concatenate([self.start_times, start_times])
+        self.end_times = np.concatenate([self.end_times, end_times])
+
+    def query(self, cells: list):
+        """
+        Return the merged ping time ranges for each line that has soundings in any of the provided geohash cells
+
+        Parameters
+        ----------
+        cells
+            list of bytestring geohash cells
+
+        Returns
+        -------
+        dict
+            dict of line name: list of [start time, end time] for each ping range
+        """
+
+        ranges = {}
+        if not len(cells) or not self.cells.size:
+            return ranges
+        match = np.isin(self.cells, np.array(cells, dtype=self.cells.dtype))
+        matched_lines = self.lines[match]
+        matched_start, matched_end = self.start_times[match], self.end_times[match]
+        for mline in np.unique(matched_lines):
+            linemask = matched_lines == mline
+            ranges[mline] = merge_time_ranges(matched_start[linemask], matched_end[linemask])
+        return ranges
+
+
+def return_line_extents(line_attributes: list):
+    """
+    Return the latitude/longitude extents of a line from the multibeam_files line attributes.  Only lines converted
+    with Kluster 1.1.8 or newer have the extents of the line navigation, see Fqpr.build_line_extents to add them to
+    older lines.
+
+    Parameters
+    ----------
+    line_attributes
+        multibeam_files entry for the line, [start time, end time, start latitude, start longitude, end latitude,
+        end longitude, azimuth, distance, min latitude, max latitude, min longitude, max longitude]
+
+    Returns
+    -------
+    list
+        [min latitude, max latitude, min longitude, max longitude], None if the attributes have no extents
+    """
+
+    if line_attributes is None or len(line_attributes) < 12:
+        return None
+    return [float(ext) for ext in line_attributes[8:12]]
+
+
+class LineExtentIndex:
+    """
+    Bounding box index of the line extents in a project, used to find the lines in a box without reading any
+    navigation.  The extents are stored in arrays sorted by minimum longitude, a query narrows the candidates with a
+    binary search on the minimum longitude and compares the rest of the box only for those lines.
+
+    Lines are added/removed as containers are added/removed from the project, the sorted arrays are rebuilt on the
+    next query after a change.
+    """
+
+    def __init__(self):
+        self.extents = {}  # {line name: [min latitude, max latitude, min longitude, max longitude]}
+        self._lines = np.array([], dtype=object)
+        self._bounds = np.zeros((0, 4), dtype=np.float64)
+        self._sorted = True
+
+    def __len__(self):
+        return len(self.extents)
+
+    def update_lines(self, line_extents: dict):
+        """
+        Add or replace the extents for the provided lines
+
+        Parameters
+        ----------
+        line_extents
+            dict of line name: [min latitude, max latitude, min longitude, max longitude], see return_line_extents
+        """
+
+        for line_name, extent in line_extents.items():
+            if extent is not None:
+                self.extents[line_name] = extent
+        self._sorted = False
+
+    def remove_lines(self, line_names: list):
+        """
+        Remove the extents for the provided lines
+
+        Parameters
+        ----------
+        line_names
+            list of line names to remove from the index
+        """
+
+        for line_name in line_names:
+            self.extents.pop(line_name, None)
+        self._sorted = False
+
+    def _sort(self):
+        if not self._sorted:
+            lines = list(self.extents.keys())
+            bounds = np.array([self.extents[lname] for lname in lines], dtype=np.float64).reshape(-1, 4)
+            order = np.argsort(bounds[:, 2], kind='stable')
+            self._lines = np.array(lines, dtype=object)[order]
+            self._bounds = bounds[order]
+            self._sorted = True
+
+    def query(self, min_lat: float, max_lat: float, min_lon: float, max_lon: float, contained: bool = True):
+        """
+        Return the lines within the provided box
+
+        Parameters
+        ----------
+        min_lat
+            float, minimum latitude in degrees
+        max_lat
+            float, maximum latitude in degrees
+        min_lon
+            float, minimum longitude in degrees
+        max_lon
+            float, maximum longitude in degrees
+        contained
+            if True, returns the lines that are completely within the box, otherwise returns the lines that intersect
+            the box
+
+        Returns
+        -------
+        list
+            line names that fall within the box
+        """
+
+        self._sort()
+        if contained:
+            start = np.searchsorted(self._bounds[:, 2], min_lon, side='right')
+            end = np.searchsorted(self._bounds[:, 2], max_lon, side='left')
+            bounds = self._bounds[start:end]
+            match = (bounds[:, 3] < max_lon) & (bounds[:, 0] > min_lat) & (bounds[:, 1] < max_lat)
+        else:
+            start = 0
+            end = np.searchsorted(self._bounds[:, 2], max_lon, side='right')
+            bounds = self._bounds[:end]
+            match = (bounds[:, 3] >= min_lon) & (bounds[:, 0] <= max_lat) & (bounds[:, 1] >= min_lat)
+        return self._lines[start:end][match].tolist()
@@ -1,6 +1,7 @@
 import os
 import numpy as np
 import xarray as xr
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from typing import Union
 
@@ -9,6 +10,8 @@ from pyproj import CRS, Transformer
 
 from HSTB.kluster.xarray_helpers import slice_xarray_by_dim
 from HSTB.kluster.modules.georeference import polygon_to_geohashes
+from HSTB.kluster.modules.spatial_index import SpatialIndex, return_spatial_index_path
+from HSTB.kluster.modules.provenance import return_time_ranges_from_mask
 from HSTB.kluster import kluster_variables
 
 
@@ -37,6 +40,7 @@ class FqprSubset:
         self.subset_times = []
 
         self.ping_filter = None
+        self.spatial_index = {}  # loaded spatial index for each system, see return_spatial_index
 
     @property
     def is_subset(self):
@@ -46,6 +50,7 @@ class FqprSubset:
             return True
 
     def _prepare_subset(self):
+        self.fqpr.edit_journal.flush()  # edits are applied to the loaded records, save them before the records are replaced
         if self.backup_fqpr != {}:
             self.restore_subset()
         self.subset_mintime = 0
@@ -253,6 +258,7 @@ class FqprSubset:
         """
 
         if self.backup_fqpr != {}:
+            self.fqpr.edit_journal.flush()
             self.fqpr.multibeam.raw_ping = self.backup_fqpr['raw_ping']
             self.fqpr.multibeam.raw_att = self.backup_fqpr['raw_att']
             self.backup_fqpr = {}
@@ -387,6 +393,108 @@ class FqprSubset:
             return_data[linename] = dset
         return return_data
 
+    def return_ping_chunks(self, variable_selection: list, start_time: float = None, end_time: float = None, raw_ping: list = None):
+        """
+        Slice the ping records to the given times and split them into blocks of ping_chunk_size pings.  The blocks
+        are not loaded, so that the caller can stream through the zarr store, loading one (or a few in parallel) at a
+        time.
+
+        Parameters
+        ----------
+        variable_selection
+            variable names you want from the fqpr dataset, variables not in the ping records are skipped
+        start_time
+            optional, start time of the pings in utc seconds
+        end_time
+            optional, end time of the pings in utc seconds
+        raw_ping
+            optional, the ping datasets to slice, if None will use all of the multibeam.raw_ping datasets
+
+        Returns
+        -------
+        list
+            list of xr.Dataset for each block of pings
+        """
+
+        if raw_ping is None:
+            raw_ping = self.fqpr.multibeam.raw_ping
+        chunks = []
+        for rp in raw_ping:
+            if rp is None:  # a head that was dropped from the records, see autopatch.PatchTest
+                continue
+            slice_rp = slice_xarray_by_dim(rp, dimname='time', start_time=start_time, end_time=end_time)
+            if slice_rp is None:
+                continue
+            slice_rp = slice_rp[[var for var in variable_selection if var in slice_rp]]
+            for i in range(0, slice_rp.time.size, kluster_variables.ping_chunk_size):
+                chunks.append(slice_rp.isel(time=slice(i, i + kluster_variables.ping_chunk_size)))
+        return chunks
+
+    def return_points_by_line(self, line_name: str, variable_selection: tuple = ('x', 'y', 'z', 'tvu', 'thu'),
+                              filter_by_detection: bool = True):
+        """
+        Build the structured array of georeferenced soundings for the line, loading the ping chunks of the line in
+        parallel (see kluster_variables.ping_chunk_read_workers) and compacting each one as it is loaded.  Only the
+        valid soundings for each chunk are retained, so the full (time, beam) arrays for the line are never held in memory.
+
+        Parameters
+        ----------
+        line_name
+            line name to return soundings for
+        variable_selection
+            variable names you want for each sounding, variables not in the ping records are skipped
+        filter_by_detection
+            if True, will drop the soundings with the detection info flag = 2 (rejected by multibeam system)
+
+        Returns
+        -------
+        np.ndarray
+            structured array of the soundings for the line, None if the line is not found
+        """
+
+        mfiles = self.fqpr.return_line_dict(line_names=line_name)
+        if line_name not in mfiles:
+            return None
+        starttime, endtime = mfiles[line_name][0], mfiles[line_name][1]
+        loadvars = list(variable_selection)
+        if filter_by_detection:
+            loadvars.append('detectioninfo')
+        chunks = self.return_ping_chunks(loadvars, starttime, endtime)
+        if not chunks:
+            return None
+        with ThreadPoolExecutor(max_workers=max(1, kluster_variables.ping_chunk_read_workers)) as executor:
+            points = list(executor.map(lambda chnk: compact_georeferenced_points(chnk.load(), variable_selection, filter_by_detection), chunks))
+        return np.concatenate(points)
+
+    def return_spatial_index(self, ping_dataset: xr.Dataset):
+        """
+        Return the spatial index for the provided ping record, loading it from disk if it has changed since we last
+        loaded it.  Returns None if there is no spatial index for this ping record, i.e. data georeferenced before the
+        spatial index was introduced.
+
+        Parameters
+        ----------
+        ping_dataset
+            one of the multibeam.raw_ping datasets
+
+        Returns
+        -------
+        SpatialIndex
+            spatial index for this ping record, or None if not found
+        """
+
+        if self.fqpr.output_folder is None:
+            return None
+        sys_id = ping_dataset.system_identifier
+        index_path = return_spatial_index_path(self.fqpr.output_folder, sys_id)
+        if sys_id in self.spatial_index and self.spatial_index[sys_id].index_path == index_path and self.spatial_index[sys_id].is_current():
+            return self.spatial_index[sys_id]
+        if not os.path.exists(index_path):
+            self.spatial_index.pop(sys_id, None)
+            return None
+        self.spatial_index[sys_id] = SpatialIndex(index_path)
+        return self.spatial_index[sys_id]
+
     def _soundings_by_poly(self, geo_polygon: np.ndarray, proj_polygon: np.ndarray, variable_selection: tuple, isolate_head: int = None):
         """
         Return soundings and sounding attributes that are within the box formed by the provided coordinates.
@@ -416,7 +524,7 @@ class FqprSubset:
             if rp is None or 'z' not in rp or (isolate_head is not None and isolate_head != rpcnt):
                 self.ping_filter.append(None)
                 continue
-            insidedata, intersectdata = filter_subset_by_polygon(rp, geo_polygon)
+            insidedata, intersectdata = filter_subset_by_polygon(rp, geo_polygon, spatial_index=self.return_spatial_index(rp))
             base_filter = np.zeros(rp.x.shape[0] * rp.x.shape[1], dtype=bool)
             if insidedata or intersectdata:
                 if insidedata:
@@ -553,7 +661,7 @@ class FqprSubset:
         self.ping_filter = []
         polypath = mpl_path.Path(proj_polygon)
         for cnt, rp in enumerate(self.fqpr.multibeam.raw_ping):
-            insidedata, intersectdata = filter_subset_by_polygon(rp, geo_polygon)
+            insidedata, intersectdata = filter_subset_by_polygon(rp, geo_polygon, spatial_index=self.return_spatial_index(rp))
             base_filter = np.zeros(rp.x.shape[0] * rp.x.shape[1], dtype=bool)
             if insidedata or intersectdata:
                 if insidedata:
@@ -570,13 +678,15 @@ class FqprSubset:
                         base_filter[startidx:endidx][linemask] = filt
             self.ping_filter.append(base_filter)
 
-    def set_variable_by_filter(self, variable_name: str, new_data: Union[np.array, list, float, int, str], selected_index: list = None):
+    def set_variable_by_filter(self, variable_name: str, new_data: Union[np.array, list, float, int, str], selected_index: list = None,
+                               use_journal: bool = False):
         """
         ping_filter is set upon selecting points in 2d/3d in Kluster.  See return_soundings_in_polygon.  Here we can take
         those points and set one of the variables with new data.  Optionally, you can include a selected_index that is a list
         of flattened indices to points in the ping_filter that you want to super-select.  See kluster_main.set_pointsview_points_status
 
-        new data are set in memory and saved to disk
+        new data are set in memory and saved to disk.  With use_journal, new detectioninfo flags are instead recorded in
+        the Fqpr edit_journal, which applies them in memory and saves them on edit_journal.flush, see edit_journal module
 
         Parameters
         ----------
@@ -587,8 +697,13 @@ class FqprSubset:
             sounding flag in detectioninfo, where all selected soundings would have new_data = 1 or 2
         selected_index
             super_selection of the ping_filter selection, done in points_view currently when selecting with the mouse
+        use_journal
+            if True, will record the edit in the edit_journal instead of writing to disk, only for detectioninfo
         """
 
+        if use_journal and variable_name != 'detectioninfo':
+            raise NotImplementedError('set_variable_by_filter: only detectioninfo edits can be journaled, got {}'.format(variable_name))
+        journal_changes = []
         for cnt, rp in enumerate(self.fqpr.multibeam.raw_ping):
             ping_filter = self.fqpr.subset.ping_filter[cnt]
             if ping_filter is None:
@@ -604,6 +719,18 @@ class FqprSubset:
                 point_idx = np.unravel_index(np.where(ping_filter)[0], data_var.shape)
             if not point_idx[0].any():  # no selected soundings, happens for first head in dual head when no selected soundings found for first head
                 continue
+            if use_journal:
+                if isinstance(new_data, list) and len(new_data) == len(self.fqpr.multibeam.raw_ping):
+                    head_data = new_data[cnt]
+                else:
+                    head_data = new_data
+                # only the selected soundings are read, to keep the old flags for undo
+                if isinstance(data_var.data, np.ndarray):
+                    old_data = data_var.values[point_idx]
+                else:
+                    old_data = data_var.data.vindex[point_idx[0], point_idx[1]].compute()
+                journal_changes.append([rp.system_identifier, rp.time.values[point_idx[0]], point_idx[1], old_data, head_data])
+                continue
             unique_time_vals, utime_index = np.unique(point_idx[0], return_inverse=True)
             rp_detect = data_var.isel(time=unique_time_vals).load()
             rp_detect_vals = rp_detect.values
@@ -616,6 +743,11 @@ class FqprSubset:
             rp_detect[:] = rp_detect_vals
             self.fqpr.write('ping', [rp_detect.to_dataset()], time_array=[rp_detect.time], sys_id=rp.system_identifier,
                             skip_dask=True)
+            changed_pings = np.zeros(rp.time.shape[0], dtype=bool)
+            changed_pings[unique_time_vals] = True
+            self.fqpr.record_sounding_changes(rp.system_identifier, return_time_ranges_from_mask(rp.time.values, changed_pings))
+        if journal_changes:
+            self.fqpr.edit_journal.record(journal_changes)
 
     def get_variable_by_filter(self, variable_name: str, selected_index: list = None, by_sonar_head: bool = False):
         """
@@ -710,10 +842,86 @@ def filter_subset_by_detection(ping_dataset: xr.Dataset):
     return ping_dataset
 
 
-def filter_subset_by_polygon(ping_dataset: xr.Dataset, polygon: np.array):
+def compact_georeferenced_points(ping_chunk: xr.Dataset, variable_selection: tuple = ('x', 'y', 'z', 'tvu', 'thu'),
+                                 filter_by_detection: bool = True):
+    """
+    Drop the NaN soundings (where we did not get a georeferenced answer) and optionally the rejected soundings from the
+    loaded ping chunk in one pass, returning a structured array of the remaining soundings.  x and y are stored as
+    float64, all other variables as float32.  Ping variables (i.e. heading) are repeated for each sounding
+    in the ping.
+
+    Parameters
+    ----------
+    ping_chunk
+        loaded block of pings from one of the raw_ping datasets, must contain z (or x, if z is not in the chunk)
+    variable_selection
+        variable names you want for each sounding, variables not in the ping chunk are skipped
+    filter_by_detection
+        if True, will drop the soundings with the detection info flag = 2 (rejected by multibeam system)
+
+    Returns
+    -------
+    np.ndarray
+        structured array of the valid soundings
+    """
+
+    valid = ~np.isnan(ping_chunk['z' if 'z' in ping_chunk else 'x'].values)
+    if filter_by_detection and 'detectioninfo' in ping_chunk:
+        valid &= ping_chunk['detectioninfo'].values != kluster_variables.rejected_flag
+    dtyp = [(var, np.float64 if var in ['x', 'y'] else np.float32) for var in variable_selection if var in ping_chunk]
+    points = np.empty(np.count_nonzero(valid), dtype=dtyp)
+    for var, _ in dtyp:
+        vals = ping_chunk[var].values
+        if vals.ndim == 1:
+            vals = np.broadcast_to(vals[:, None], valid.shape)
+        points[var] = vals[valid]
+    return points
+
+
+def _polygon_masks_for_slice(ping_dataset: xr.Dataset, starttime: float, endtime: float, inside_geohash: list,
+                             intersect_geohash: list, inside_mask_lines: dict, intersect_mask_lines: dict, key: str):
     """
-    Given the provided polygon coordinates, return the part of the ping dataset that is completely within
-    the polygon and the part of the dataset that intersects with the polygon
+    Build the inside/intersect geohash masks for the pings from starttime to endtime and add them to the provided
+    mask dicts.  See filter_subset_by_polygon.
+
+    Parameters
+    ----------
+    ping_dataset
+        one of the multibeam.raw_ping datasets, containing the ping variables
+    starttime
+        time of the first ping in the slice
+    endtime
+        time of the last ping in the slice
+    inside_geohash
+        list of bytestring geohash cells completely within the polygon
+    intersect_geohash
+        list of bytestring geohash cells that intersect the polygon
+    inside_mask_lines
+        dict of key: mask data for soundings in a geohash that is completely within the polygon
+    intersect_mask_lines
+        dict of key: mask data for soundings in a geohash that intersects with the polygon
+    key
+        key for the mask data in the mask dicts
+    """
+
+    slice_pd = slice_xarray_by_dim(ping_dataset, dimname='time', start_time=starttime, end_time=endtime)
+    ghash = np.ravel(slice_pd.geohash)
+    filt_start = int(np.where(ping_dataset.time == slice_pd.time[0])[0][0]) * ping_dataset.geohash.shape[1]
+    filt_end = filt_start + ghash.shape[0]
+    if inside_geohash:
+        linemask = np.isin(ghash, inside_geohash)
+        inside_mask_lines[key] = [linemask, filt_start, filt_end, starttime, endtime]
+    if intersect_geohash:
+        linemask = np.isin(ghash, intersect_geohash)
+        intersect_mask_lines[key] = [linemask, filt_start, filt_end, starttime, endtime]
+
+
+def filter_subset_by_polygon(ping_dataset: xr.Dataset, polygon: np.array, spatial_index: SpatialIndex = None):
+    """
+    Use the geohash to filter the dataset by polygon.  Returns the inside and intersect masks for the soundings in
+    the polygon, split up by line.  If the spatial index is provided, the masks are split up by the ping ranges in
+    the index that have soundings in the polygon geohash cells, so that only those pings are loaded.  Lines that are
+    not in the spatial index use the geohashes attribute and the full line.
 
     Parameters
     ----------
@@ -722,13 +930,17 @@ def filter_subset_by_polygon(ping_dataset: xr.Dataset, polygon: np.array):
     polygon
         coordinates of a polygon ex: np.array([[lon1, lat1], [lon2, lat2], ...]), first and last coordinate
         must be the same
+    spatial_index
+        optional spatial index for this ping dataset, see spatial_index.SpatialIndex
 
     Returns
     -------
-    xr.Dataset
-        1dim flattened bool mask for soundings in a geohash that is completely within the polygon
-    xr.Dataset
-        1dim flattened bool mask for soundings in a geohash that intersects with the polygon
+    dict
+        dict of [1dim flattened bool mask, start index, end index, start time, end time] for soundings in a geohash
+        that is completely within the polygon
+    dict
+        dict of [1dim flattened bool mask, start index, end index, start time, end time] for soundings in a geohash
+        that intersects with the polygon
     """
 
     if 'geohash' in ping_dataset.variables:
@@ -737,23 +949,37 @@ def filter_subset_by_polygon(ping_dataset: xr.Dataset, polygon: np.array):
             intersect_mask_lines = {}
             gprecision = int(ping_dataset.geohash.dtype.str[2:])  # ex: dtype='|S7', precision=7
             innerhash, intersecthash = polygon_to_geohashes(polygon, precision=gprecision)
+            indexed_lines = []
+            line_ranges = {}
+            if spatial_index is not None:
+                indexed_lines = spatial_index.line_names
+                line_ranges = spatial_index.query(intersecthash)  # intersecting cells include the inside cells
+            ping_times = ping_dataset.time.values
             for mline, mhashes in ping_dataset.attrs['geohashes'].items():
                 if mline in ping_dataset.attrs['multibeam_files']:  # this line might not exist in the lookup if this is a subset
-                    linestart, lineend = ping_dataset.attrs['multibeam_files'][mline][0], ping_dataset.attrs['multibeam_files'][mline][1]
                     mhashes = [x.encode() for x in mhashes]
                     inside_geohash = [x for x in innerhash if x in mhashes]
                     intersect_geohash = [x for x in intersecthash if x in mhashes and x not in inside_geohash]
                     if inside_geohash or intersect_geohash:
-                        slice_pd = slice_xarray_by_dim(ping_dataset, dimname='time', start_time=linestart, end_time=lineend)
-                        ghash = np.ravel(slice_pd.geohash)
-                        filt_start = int(np.where(ping_dataset.time == slice_pd.time[0])[0]) * ping_dataset.geohash.shape[1]
-                        filt_end = filt_start + ghash.shape[0]
-                        if inside_geohash:
-                            linemask = np.in1d(ghash, inside_geohash)
-                            inside_mask_lines[mline] = [linemask, filt_start, filt_end, linestart, lineend]
-                        if intersect_geohash:
-                            linemask = np.in1d(ghash, intersect_geohash)
-                            intersect_mask_lines[mline] = [linemask, filt_start, filt_end, linestart, lineend]
+                        if mline in indexed_lines:
+                            ping_ranges = []
+                            for rangestart, rangeend in line_ranges.get(mline, []):
+                                # trim to the pings in this dataset, can be a subset of the indexed data
+                                start_idx = np.searchsorted(ping_times, rangestart, side='left')
+                                end_idx = np.searchsorted(ping_times, rangeend, side='right') - 1
+                                if end_idx >= start_idx:
+                                    if ping_ranges and start_idx <= ping_ranges[-1][1] + 1:  # join ranges of consecutive pings
+                                        ping_ranges[-1][1] = max(end_idx, ping_ranges[-1][1])
+                                    else:
+                                        ping_ranges.append([start_idx, end_idx])
+                            for rcnt, (start_idx, end_idx) in enumerate(ping_ranges):
+                                _polygon_masks_for_slice(ping_dataset, float(ping_times[start_idx]), float(ping_times[end_idx]),
+                                                         inside_geohash, intersect_geohash, inside_mask_lines,
+                                                         intersect_mask_lines, '{}_{}'.format(mline, rcnt))
+                        else:
+                            linestart, lineend = ping_dataset.attrs['multibeam_files'][mline][0], ping_dataset.attrs['multibeam_files'][mline][1]
+                            _polygon_masks_for_slice(ping_dataset, linestart, lineend, inside_geohash, intersect_geohash,
+                                                     inside_mask_lines, intersect_mask_lines, mline)
             return inside_mask_lines, intersect_mask_lines
         else:  # treat dataset as if all the data needs to be brute force checked, i.e. all data intersects with polygon
             print('Warning: Unable to filter by polygon, cannot find the "geohashes" attribute in the ping record')
@@ -1,5 +1,6 @@
 import os, sys
 import numpy as np
+import numba
 import json
 from collections import OrderedDict
 import xarray as xr
@@ -858,7 +859,8 @@ def _convert_cast(cast: list, z_waterline_offset: float):
 
 def _process_cast_for_ssv(cast_depth: np.ndarray, cast_sv: np.ndarray, max_allowed_sv: float, ssv: float):
     """
-    Process the cast to add the surface sound velocity layer as the initial layer.
+    Process the cast to add the surface sound velocity layer as the initial layer.  Works on a copy of the cast, the
+    provided arrays are not changed.
 
     If the last layer(s) are greater than the max allowed sv value, we remove those layers and apply linear interpolation
     to determine the depth for the max allowed sv value and use that as the last layer.  Kongsberg extends casts down to
@@ -883,6 +885,7 @@ def _process_cast_for_ssv(cast_depth: np.ndarray, cast_sv: np.ndarray, max_allow
         cast sound velocity for each depth with ssv added at depth=0
     """
 
+    cast_depth, cast_sv = cast_depth.copy(), cast_sv.copy()
     # later layers can't have sound velocity that exceeds the max allowed sv layer, breaks the gradient calculation
     if (cast_sv >= max_allowed_sv).any():
         first_invalid_layer = np.where(cast_sv >= max_allowed_sv)[0][0]
@@ -1018,14 +1021,273 @@ def _interpolate_cumulative_table(cumulative_depth: np.ndarray, cumulative_h_dis
     return interp_across, interp_down
 
 
+@numba.njit(nogil=True)
+def _process_cast_for_ssv_numba(cast_depth: np.ndarray, cast_sv: np.ndarray, max_allowed_sv: float, ssv: float):
+    """
+    Compiled equivalent of _process_cast_for_ssv, see _process_cast_for_ssv.  Works on a copy of the cast, so that
+    each surface sound speed value is applied to the original cast.
+
+    Parameters
+    ----------
+    cast_depth
+        cast depths rel transmitter
+    cast_sv
+        cast sound velocity for each depth
+    max_allowed_sv
+        maximum allowed sv value for the cast layers
+    ssv
+        surface sound velocity value for this cast
+
+    Returns
+    -------
+    np.ndarray
+        cast depths rel transmitter with ssv added at depth=0
+    np.ndarray
+        cast sound velocity for each depth with ssv added at depth=0
+    """
+
+    depth = cast_depth.copy()
+    sv = cast_sv.copy()
+    first_invalid_layer = -1
+    for i in range(sv.shape[0]):
+        if sv[i] >= max_allowed_sv:
+            first_invalid_layer = i
+            break
+    if first_invalid_layer != -1:
+        layer_previous = first_invalid_layer - 1
+        sv1, sv2 = sv[layer_previous], sv[first_invalid_layer]
+        dpth1, dpth2 = depth[layer_previous], depth[first_invalid_layer]
+        new_depth = dpth1 + (max_allowed_sv - sv1) * ((dpth2 - dpth1) / (sv2 - sv1))
+        sv = sv[:first_invalid_layer + 1]
+        depth = depth[:first_invalid_layer + 1]
+        sv[-1] = max_allowed_sv
+        depth[-1] = new_depth
+
+    # insert surface sound speed layer
+    if depth[0] == 0:
+        sv[0] = ssv
+    else:
+        depth = np.concatenate((np.zeros(1, dtype=depth.dtype), depth))
+        sv = np.concatenate((np.full(1, ssv, dtype=sv.dtype), sv))
+
+    # remove the duplicate sv values in the profile to maintain good gradient answers
+    keep = np.ones(sv.shape[0], dtype=np.bool_)
+    for i in range(1, sv.shape[0]):
+        keep[i] = (sv[i] - sv[i - 1]) != 0
+    return depth[keep], sv[keep]
+
+
+@numba.njit(nogil=True, parallel=True)
+def _ray_trace_numba(processed_depth: np.ndarray, processed_sv: np.ndarray, processed_layers: np.ndarray,
+                     ssv_index: np.ndarray, beam_angle: np.ndarray, oneway_traveltime: np.ndarray):
+    """
+    Compiled ray trace for all beams in a chunk.  Steps each beam through the processed cast layers until the cumulative
+    ray time passes the one way travel time, linearly interpolating the horizontal distance and depth within that
+    layer.  Equivalent to running _build_beam_cumulative_tables and _interpolate_cumulative_table for each unique
+    surface sound speed value, without building the (layer, time, beam) cumulative tables.
+
+    Parameters
+    ----------
+    processed_depth
+        2dim (unique ssv, layer) processed cast depths for each unique surface sound speed value, see
+        _processed_casts_for_ssv
+    processed_sv
+        2dim (unique ssv, layer) processed cast sound velocity for each unique surface sound speed value
+    processed_layers
+        1dim (unique ssv) number of valid layers in each processed cast
+    ssv_index
+        1dim (time) index of the unique surface sound speed value for each ping
+    beam_angle
+        2dim (time, beam) values for beampointingangle at each beam, assume radians
+    oneway_traveltime
+        2dim (time, beam) values for the beam one way travel time in seconds
+
+    Returns
+    -------
+    np.ndarray
+        2dim (time, beam) values for the actual horizontal distance that applies to each beam
+    np.ndarray
+        2dim (time, beam) values for the actual vertical distance that applies to each beam
+    """
+
+    reflected_tan = np.tan(np.pi / 2)
+    ntime, nbeam = beam_angle.shape
+    interp_across = np.zeros((ntime, nbeam), dtype=np.float64)
+    interp_down = np.zeros((ntime, nbeam), dtype=np.float64)
+    for t in numba.prange(ntime):
+        u = ssv_index[t]
+        nlayers = processed_layers[u]
+        depth = processed_depth[u]
+        sv = processed_sv[u]
+        for b in range(nbeam):
+            oneway = oneway_traveltime[t, b]
+            if not (0.0 - oneway < 0):  # above the transducer, or no valid travel time
+                continue
+            # track the sine of the layer angle (Snell's law) instead of the angle itself, avoids the arcsin/sin/tan
+            #  for each layer.  The first layer uses the beam angle directly.
+            sin_angle = np.sin(beam_angle[t, b])
+            tan_angle = np.tan(beam_angle[t, b])
+            cum_depth = 0.0
+            cum_h_dist = 0.0
+            cum_raytime = 0.0
+            for i in range(1, nlayers):
+                depth_diff = depth[i] - depth[i - 1]
+                across_dist = depth_diff * tan_angle
+                ray_dist = np.sqrt(depth_diff ** 2 + across_dist ** 2)
+                ray_time = ray_dist / sv[i - 1]
+                next_depth = cum_depth + depth_diff
+                next_h_dist = across_dist + cum_h_dist
+                next_raytime = ray_time + cum_raytime
+                if not (next_raytime - oneway < 0):
+                    interp_across[t, b] = cum_h_dist + (oneway - cum_raytime) * ((next_h_dist - cum_h_dist) / (next_raytime - cum_raytime))
+                    interp_down[t, b] = cum_depth + (oneway - cum_raytime) * ((next_depth - cum_depth) / (next_raytime - cum_raytime))
+                    break
+                cum_depth = next_depth
+                cum_h_dist = next_h_dist
+                cum_raytime = next_raytime
+                # incidence angles for next layer, clip to clamp values where beams are reflected
+                sin_angle = min(max((sv[i] / sv[i - 1]) * sin_angle, -1.0), 1.0)
+                if abs(sin_angle) == 1.0:  # reflected beam, match np.tan(np.arcsin(1)) instead of dividing by zero
+                    tan_angle = sin_angle * reflected_tan
+                else:
+                    tan_angle = sin_angle / np.sqrt(1.0 - sin_angle ** 2)
+    return interp_across, interp_down
+
+
+def _processed_casts_for_ssv(cast_depth: np.ndarray, cast_sv: np.ndarray, unique_ssv: np.ndarray,
+                             max_allowed_sv: np.ndarray):
+    """
+    Build the processed cast (see _process_cast_for_ssv) for each unique surface sound speed value.  Returns the casts
+    stacked into 2d arrays for the compiled ray trace.
+
+    Parameters
+    ----------
+    cast_depth
+        cast depths rel transmitter
+    cast_sv
+        cast sound velocity for each depth
+    unique_ssv
+        1dim (unique ssv) unique surface sound speed values in the chunk
+    max_allowed_sv
+        1dim (unique ssv) maximum allowed sv layer value for each unique surface sound speed value
+
+    Returns
+    -------
+    np.ndarray
+        2dim (unique ssv, layer) processed cast depths
+    np.ndarray
+        2dim (unique ssv, layer) processed cast sound velocity
+    np.ndarray
+        1dim (unique ssv) number of valid layers in each processed cast
+    """
+
+    nunique = unique_ssv.shape[0]
+    processed_depth = np.zeros((nunique, cast_sv.shape[0] + 1), dtype=np.float64)
+    processed_sv = np.zeros((nunique, cast_sv.shape[0] + 1), dtype=np.float64)
+    processed_layers = np.zeros(nunique, dtype=np.int64)
+    for cnt, (ssv, max_sv) in enumerate(zip(unique_ssv, max_allowed_sv)):
+        if np.isnan(ssv):  # no valid surface sound speed, these pings are not traced
+            continue
+        if np.isnan(max_sv):  # nan beam angles in these pings, no layers exceed a nan max sv, so no trimming
+            max_sv = np.inf
+        pdepth, psv = _process_cast_for_ssv_numba(cast_depth, cast_sv, float(max_sv), float(ssv))
+        processed_layers[cnt] = psv.shape[0]
+        processed_depth[cnt, :psv.shape[0]] = pdepth
+        processed_sv[cnt, :psv.shape[0]] = psv
+    return processed_depth, processed_sv, processed_layers
+
+
 def run_ray_trace_v2(cast: list, beam_azimuth: xr.DataArray, beam_angle: xr.DataArray, two_way_travel_time: xr.DataArray,
                      surface_sound_speed: xr.DataArray, z_waterline_offset: float, additional_offsets: list):
     """
     Apply the provided sound velocity cast and surface sound speed value to ray trace the angles/traveltime through
+    each layer.  We step through the cumulative depth/distance/time for each layer and then apply linear interpolation
+    using the provded twowaytraveltime to get the actual alongtrack/acrosstrack/depthoffset for each beam.
+
+    Replaces the SoundSpeedProfile method.  Uses the numba compiled _ray_trace_numba to trace all beams in one call,
+    see run_ray_trace_by_ssv for the numpy version that loops over each unique surface sound speed value.
+
+    Parameters
+    ----------
+    cast
+        list of [depth values, sv values] for this cast
+    beam_azimuth
+        2dim (time, beam), beam-wise beam azimuth values relative to vessel heading at time of ping, assume radians
+    beam_angle
+        2dim (time, beam) values for beampointingangle at each beam, assume radians
+    two_way_travel_time
+        2dim (time, beam) values for the beam two way travel time in seconds
+    surface_sound_speed
+        1dim (time) values for surface sound speed in meters per second for each ping
+    z_waterline_offset
+        offset from transducer to waterline, positive down
+    additional_offsets
+        list of numpy arrays for [x (time, beam), y (time, beam), z (time, beam)] offsets
+
+    Returns
+    -------
+    list
+        [xarray DataArray (time, along track offset in meters), xarray DataArray (time, across track offset in meters),
+         xarray DataArray (time, down distance in meters)]
+    """
+
+    # build the arrays to hold the result, retain the original xarray coordinates to reform the xarray at the end
+    acrosstrack_answer = np.zeros_like(beam_azimuth)
+    alongtrack_answer = np.zeros_like(beam_azimuth)
+    depth_answer = np.zeros_like(beam_azimuth)
+    orig_time_coord = beam_azimuth.time
+    orig_beam_coord = beam_azimuth.beam
+
+    # convert xarray to numpy
+    beam_angle = beam_angle.values
+    beam_azimuth = beam_azimuth.values
+    two_way_travel_time = two_way_travel_time.values
+    surface_sound_speed = surface_sound_speed.values
+
+    # build the cast arrays, have them start at the transducer z depth
+    cast_depth_rel_tx, cast_soundvelocity = _convert_cast(cast, z_waterline_offset)
+    cast_depth_rel_tx, cast_soundvelocity = cast_depth_rel_tx.astype(np.float64), cast_soundvelocity.astype(np.float64)
+
+    # each ssv value has it's own processed cast, limited by the max ray parameter of the pings that use that ssv
+    unique_ssv_values, ssv_index = np.unique(surface_sound_speed, return_inverse=True)
+    ray_parameter_max = np.full(unique_ssv_values.shape, -np.inf, dtype=np.float64)
+    np.maximum.at(ray_parameter_max, ssv_index, np.max(np.sin(beam_angle) / surface_sound_speed[:, None], axis=1))
+    with np.errstate(divide='ignore'):
+        max_allowed_sv_layer_values = np.where(ray_parameter_max == 0, np.inf, 1 / ray_parameter_max)  # 0 = single beam case
+
+    processed_depth, processed_sv, processed_layers = _processed_casts_for_ssv(cast_depth_rel_tx, cast_soundvelocity,
+                                                                               unique_ssv_values.astype(np.float64),
+                                                                               max_allowed_sv_layer_values)
+    interp_across, interp_down = _ray_trace_numba(processed_depth, processed_sv, processed_layers,
+                                                  ssv_index.ravel().astype(np.int64), beam_angle.astype(np.float64),
+                                                  (two_way_travel_time / 2).astype(np.float64))
+
+    # pings without a valid surface sound speed value are left at zero
+    valid_ping = ~np.isnan(surface_sound_speed)
+    # here we use the beam azimuth to go from xy sv corrected beams to xyz soundings
+    # relying on the relative azimuth to determine direction/sign
+    interp_across = np.abs(interp_across[valid_ping])
+    acrosstrack_answer[valid_ping, :] = interp_across * np.sin(beam_azimuth[valid_ping]) + additional_offsets[1][valid_ping]
+    alongtrack_answer[valid_ping, :] = interp_across * np.cos(beam_azimuth[valid_ping]) + additional_offsets[0][valid_ping]
+    depth_answer[valid_ping, :] = interp_down[valid_ping] + additional_offsets[2][valid_ping]
+
+    # reform the xarray dataarrays
+    alongtrack_answer = xr.DataArray(np.round(alongtrack_answer, 3), coords=[orig_time_coord, orig_beam_coord], dims=['time', 'beam'])
+    acrosstrack_answer = xr.DataArray(np.round(acrosstrack_answer, 3), coords=[orig_time_coord, orig_beam_coord], dims=['time', 'beam'])
+    depth_answer = xr.DataArray(np.round(depth_answer, 3), coords=[orig_time_coord, orig_beam_coord], dims=['time', 'beam'])
+
+    return [alongtrack_answer, acrosstrack_answer, depth_answer]
+
+
+def run_ray_trace_by_ssv(cast: list, beam_azimuth: xr.DataArray, beam_angle: xr.DataArray, two_way_travel_time: xr.DataArray,
+                         surface_sound_speed: xr.DataArray, z_waterline_offset: float, additional_offsets: list):
+    """
+    Apply the provided sound velocity cast and surface sound speed value to ray trace the angles/traveltime through
     each layer.  We construct cumulative depth/distance/time for each layer and then apply linear interpolation using
     the provded twowaytraveltime to get the actual alongtrack/acrosstrack/depthoffset for each beam.
 
-    Replaces the SoundSpeedProfile method
+    Numpy version of run_ray_trace_v2, builds the cumulative tables for each unique surface sound speed value.
+    Retained for comparison with the compiled ray trace, see benchmark.benchmark_ray_trace.
 
     Parameters
     ----------
@@ -1081,13 +1343,13 @@ def run_ray_trace_v2(cast: list, beam_azimuth: xr.DataArray, beam_angle: xr.Data
         else:
             max_allowed_sv_layer_value = float(1 / rpmax)
 
-        # apply surface sv to the cast and clean it up
-        cast_depth_rel_tx, cast_soundvelocity = _process_cast_for_ssv(cast_depth_rel_tx, cast_soundvelocity, max_allowed_sv_layer_value, ssv)
+        # apply surface sv to the cast and clean it up, each ssv value starts from the converted cast
+        ssv_cast_depth, ssv_cast_soundvelocity = _process_cast_for_ssv(cast_depth_rel_tx, cast_soundvelocity, max_allowed_sv_layer_value, ssv)
 
         # build out the cumulative depth, horizontal distance and raytime by iterating through the cast layers
-        cumulative_depth, cumulative_h_dist, cumulative_raytime = _build_beam_cumulative_tables(cast_depth_rel_tx, cast_soundvelocity, subset_beam_angle)
+        cumulative_depth, cumulative_h_dist, cumulative_raytime = _build_beam_cumulative_tables(ssv_cast_depth, ssv_cast_soundvelocity, subset_beam_angle)
         # determine the correct acrosstrack/depth for our two way travel time values
-        interp_across, interp_down = _interpolate_cumulative_table(cumulative_depth, cumulative_h_dist, cumulative_raytime, cast_soundvelocity, two_way_travel_time[idx])
+        interp_across, interp_down = _interpolate_cumulative_table(cumulative_depth, cumulative_h_dist, cumulative_raytime, ssv_cast_soundvelocity, two_way_travel_time[idx])
 
         # here we use the beam azimuth to go from xy sv corrected beams to xyz soundings
         # relying on the relative azimuth to determine direction/sign
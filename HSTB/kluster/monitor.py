@@ -54,6 +54,7 @@ class DirectoryMonitor:
         self.watchdog_observer = Observer()
         self.watchdog_observer.schedule(self.my_event_handler, directory_path, recursive=is_recursive)
         self._observers = []
+        self._batch_observers = []
         self.seen_files = []
         self.file_buffer = {}
 
@@ -110,9 +111,11 @@ class DirectoryMonitor:
     def push_to_kluster_intelligence(self):
         """
         Method triggered on timer event.  Every second we check to see if a file is readable (has finished copying).
-        If so, we use newfile to trigger any observers which then get the newly written (or deleted) file
+        If so, we use newfile to trigger any observers which then get the newly written (or deleted) file.  If there are
+        batch observers (see bind_to_batch), all the created files that finished writing are pushed at once instead.
         """
 
+        finished_files = []
         for fil in list(self.file_buffer.keys()):
             try:
                 filesize = get_file_size(fil)
@@ -123,9 +126,15 @@ class DirectoryMonitor:
             if filesize != previous_file_size or filesize == 0:  # update the buffer if file size changed since we last checked
                 self.file_buffer[fil] = [file_event, filesize]
             else:  # this is a file that finished writing
-                self.file_event = file_event
-                self.newfile = fil
                 self.file_buffer.pop(fil)
+                if self._batch_observers and file_event == 'created':
+                    finished_files.append(fil)
+                else:
+                    self.file_event = file_event
+                    self.newfile = fil
+        if finished_files:
+            for callback in self._batch_observers:
+                callback(finished_files)
 
     def start(self):
         """
@@ -177,6 +186,19 @@ class DirectoryMonitor:
 
         self._observers.append(callback)
 
+    def bind_to_batch(self, callback: FunctionType):
+        """
+        Pass in a method as callback, method will be triggered with the list of all created files that finished
+        writing since the last check, instead of once for each file with bind_to
+
+        Parameters
+        ----------
+        callback
+            method that is run with the list of new files
+        """
+
+        self._batch_observers.append(callback)
+
 
 class IntelligenceMonitorHandler(PatternMatchingEventHandler):
     """
@@ -162,6 +162,87 @@ def is_inside_sm_parallel(points, polygon):
     return D
 
 
+def format_fixed_point(data: np.ndarray, decimals: int = 3, delimiter: str = ' '):
+    """
+    Format the 2d array of floats as delimited text, one row per line.  Matches np.savetxt with fmt='%.3f' (for
+    decimals=3) but formats with compiled code directly into a byte buffer, instead of formatting each value in python.
+
+    Parameters
+    ----------
+    data
+        (rows, columns) array of values to format
+    decimals
+        number of decimal places written for each value
+    delimiter
+        string written between each column
+
+    Returns
+    -------
+    bytes
+        the formatted text, each row terminated with a newline
+    """
+
+    data = np.ascontiguousarray(data, dtype=np.float64)
+    if data.ndim == 1:
+        data = data.reshape(-1, 1)
+    delim = np.frombuffer(delimiter.encode(), dtype=np.uint8)
+    return _format_fixed_point(data, decimals, delim).tobytes()
+
+
+@numba.njit(nogil=True)
+def _format_fixed_point(data: np.ndarray, decimals: int, delimiter: np.ndarray):
+    nrows, ncols = data.shape
+    maxwidth = 22 + decimals + delimiter.size  # sign, 19 integer digits, decimal point, fraction, delimiter
+    out = np.empty(nrows * ncols * maxwidth + nrows, dtype=np.uint8)
+    digits = np.empty(20, dtype=np.uint8)
+    scale = 10 ** decimals
+    pos = 0
+    for i in range(nrows):
+        for j in range(ncols):
+            if j > 0:
+                for k in range(delimiter.size):
+                    out[pos] = delimiter[k]
+                    pos += 1
+            val = data[i, j]
+            if np.isnan(val):
+                out[pos:pos + 3] = np.array([110, 97, 110], dtype=np.uint8)  # nan
+                pos += 3
+                continue
+            if np.isinf(val):
+                if val < 0:
+                    out[pos] = 45  # -
+                    pos += 1
+                out[pos:pos + 3] = np.array([105, 110, 102], dtype=np.uint8)  # inf
+                pos += 3
+                continue
+            scaled = np.int64(np.round(abs(val) * scale))
+            if val < 0 and scaled != 0:
+                out[pos] = 45  # -
+                pos += 1
+            intpart = scaled // scale
+            fracpart = scaled % scale
+            ndigits = 0
+            while True:
+                digits[ndigits] = 48 + intpart % 10
+                ndigits += 1
+                intpart = intpart // 10
+                if intpart == 0:
+                    break
+            for k in range(ndigits - 1, -1, -1):
+                out[pos] = digits[k]
+                pos += 1
+            if decimals > 0:
+                out[pos] = 46  # .
+                pos += 1
+                for k in range(decimals - 1, -1, -1):
+                    out[pos + k] = 48 + fracpart % 10
+                    fracpart = fracpart // 10
+                pos += decimals
+        out[pos] = 10  # newline
+        pos += 1
+    return out[:pos]
+
+
 if __name__ == '__main__':
     x = np.random.uniform(0, 100, size=1000000)
     x_bins = np.arange(100)
@@ -14,8 +14,11 @@ class Filter(BaseFilter):
         print(f'Running reject_all on {self.fqpr.output_folder}')
         self.new_status = []  # new_status will be a list where each element is a 2d array of new detectioninfo (sounding flag) values
         for cnt, rp in enumerate(self.fqpr.multibeam.raw_ping):  # for each sonar head...
-            # build a new array of all rejected flags, same size as existing detectioninfo
-            rp_detect = np.full(rp['detectioninfo'].shape, kluster_variables.rejected_flag, dtype=rp['detectioninfo'].dtype)
             # new status will be a list of arrays, one for each sonar head.
-            self.new_status.append(rp_detect)
+            self.new_status.append(self._run_chunk_algorithm(rp))
         print(f'reject_all complete')
+
+    @staticmethod
+    def _run_chunk_algorithm(chunk):
+        # build a new array of all rejected flags, same size as existing detectioninfo
+        return np.full(chunk['detectioninfo'].shape, kluster_variables.rejected_flag, dtype=chunk['detectioninfo'].dtype)
@@ -0,0 +1,370 @@
+import numpy as np
+
+
+class PointStore:
+    """
+    Columnar storage for the soundings loaded in Points View (see kluster_3dview_v2.ThreeDView).  Each variable is a
+    preallocated numpy array that grows by doubling, so adding a container is a copy into the free space instead of a
+    concatenate of every array.  The system identifier (container name + head index) and the line name of each
+    sounding are stored as integer codes into the id_names/linenames lists instead of an object array of strings.
+
+    The column properties (x, y, z, ...) return views of the filled part of the arrays, so setting values in place
+    (i.e. store.rejected[idx] = 2) sets the stored values.
+    """
+
+    columns = {'head': np.int8, 'x': np.float64, 'y': np.float64, 'z': np.float32, 'rotx': np.float64,
+               'roty': np.float64, 'tvu': np.float32, 'rejected': np.int32, 'pointtime': np.float64, 'beam': np.int32,
+               'id_code': np.int32, 'linename_code': np.int32}
+
+    def __init__(self, initial_size: int = 0):
+        """
+        Parameters
+        ----------
+        initial_size
+            number of points to allocate space for
+        """
+
+        self.size = 0
+        self._data = {}
+        self.id_names = []  # system identifier for each id code, container name + '_' + head index
+        self.linenames = []  # line name for each linename code
+        self.idrange = {}  # {system identifier: [start index, end index]} for the points of each system
+        self.idlookup = {}  # {system identifier: container name}
+        self._id_index = {}
+        self._linename_index = {}
+        self.clear(initial_size)
+
+    @property
+    def capacity(self):
+        return self._data['x'].shape[0]
+
+    def __len__(self):
+        return self.size
+
+    def _column(self, name: str):
+        return self._data[name][:self.size]
+
+    head = property(lambda self: self._column('head'))
+    x = property(lambda self: self._column('x'))
+    y = property(lambda self: self._column('y'))
+    z = property(lambda self: self._column('z'))
+    rotx = property(lambda self: self._column('rotx'))
+    roty = property(lambda self: self._column('roty'))
+    tvu = property(lambda self: self._column('tvu'))
+    rejected = property(lambda self: self._column('rejected'))
+    pointtime = property(lambda self: self._column('pointtime'))
+    beam = property(lambda self: self._column('beam'))
+    id_code = property(lambda self: self._column('id_code'))
+    linename_code = property(lambda self: self._column('linename_code'))
+
+    def clear(self, initial_size: int = 0):
+        """
+        Remove all points, and allocate space for initial_size points
+        """
+
+        self.size = 0
+        self._data = {nm: np.zeros(initial_size, dtype=dtyp) for nm, dtyp in self.columns.items()}
+        self.id_names = []
+        self.linenames = []
+        self.idrange = {}
+        self.idlookup = {}
+        self._id_index = {}
+        self._linename_index = {}
+
+    def _reserve(self, new_size: int):
+        if new_size > self.capacity:
+            new_capacity = max(new_size, 2 * self.capacity)
+            for nm, arr in self._data.items():
+                newarr = np.zeros(new_capacity, dtype=arr.dtype)
+                newarr[:self.size] = arr[:self.size]
+                self._data[nm] = newarr
+
+    def _return_codes(self, names: np.ndarray, lookup: dict, namelist: list):
+        uniq, inverse = np.unique(names, return_inverse=True)
+        codes = np.zeros(uniq.shape[0], dtype=np.int32)
+        for cnt, nm in enumerate(uniq):
+            if nm not in lookup:
+                lookup[nm] = len(namelist)
+                namelist.append(nm)
+            codes[cnt] = lookup[nm]
+        return codes[inverse.ravel()]
+
+    def add(self, head: np.array, x: np.array, y: np.array, z: np.array, tvu: np.array, rejected: np.array,
+            pointtime: np.array, beam: np.array, newid: str, linename: np.array, rotx: np.array = None,
+            roty: np.array = None):
+        """
+        Add the points from a container to the end of the store.  See ThreeDView.add_points.
+
+        Parameters
+        ----------
+        head
+            head index of the sounding
+        x
+            easting
+        y
+            northing
+        z
+            depth value
+        tvu
+            vertical uncertainty
+        rejected
+            detectioninfo flag for each sounding
+        pointtime
+            time of the sounding
+        beam
+            beam number of the sounding
+        newid
+            container name the sounding came from, ex: 'EM710_234_02_10_2019'
+        linename
+            line name for each sounding
+        rotx
+            optional easting rotated by the selection azimuth, x is used if not provided
+        roty
+            optional northing rotated by the selection azimuth, y is used if not provided
+        """
+
+        count = head.shape[0]
+        if not count:
+            return
+        start = self.size
+        self._reserve(start + count)
+        end = start + count
+        head = np.asarray(head)
+        for nm, arr in (('head', head), ('x', x), ('y', y), ('z', z), ('tvu', tvu), ('rejected', rejected),
+                        ('pointtime', pointtime), ('beam', beam), ('rotx', x if rotx is None else rotx),
+                        ('roty', y if roty is None else roty)):
+            self._data[nm][start:end] = arr
+        uheads = np.unique(head)
+        idcodes = np.zeros(uheads.max() + 1, dtype=np.int32)
+        for hd in uheads:
+            unid = '{}_{}'.format(newid, int(hd))
+            if unid not in self._id_index:
+                self._id_index[unid] = len(self.id_names)
+                self.id_names.append(unid)
+            idcodes[hd] = self._id_index[unid]
+            self.idlookup[unid] = newid
+            headwhere = np.where(head == hd)[0]
+            self.idrange[unid] = [start + headwhere[0], start + headwhere[-1] + 1]
+        self._data['id_code'][start:end] = idcodes[head]
+        self._data['linename_code'][start:end] = self._return_codes(np.asarray(linename), self._linename_index, self.linenames)
+        self.size = end
+
+    def remove(self, system_id: str):
+        """
+        Remove the points for the given system identifier (container name + '_' + head index), moving the points after
+        them down in place
+
+        Parameters
+        ----------
+        system_id
+            system identifier, see add
+        """
+
+        start, end = self.idrange.pop(system_id)
+        self.idlookup.pop(system_id, None)
+        count = end - start
+        for arr in self._data.values():
+            arr[start:self.size - count] = arr[end:self.size]
+        self.size -= count
+        for unid, rng in self.idrange.items():
+            if rng[0] >= end:
+                self.idrange[unid] = [rng[0] - count, rng[1] - count]
+
+    def id_mask(self, system_id: str):
+        """
+        Return a boolean mask of the points for the given system identifier
+        """
+
+        if system_id not in self._id_index:
+            return np.zeros(self.size, dtype=bool)
+        return self.id_code == self._id_index[system_id]
+
+    def linename_mask(self, linenames: list):
+        """
+        Return a boolean mask of the points that are in any of the given line names
+        """
+
+        codes = [self._linename_index[nm] for nm in linenames if nm in self._linename_index]
+        return np.isin(self.linename_code, codes)
+
+    def return_id(self, index: np.ndarray = None):
+        """
+        Return the system identifier string for each point (or each point in the index), as an object array
+        """
+
+        codes = self.id_code if index is None else self.id_code[index]
+        return np.array(self.id_names, dtype=object)[codes] if self.id_names else np.array([], dtype=object)
+
+    def return_linename(self, index: np.ndarray = None):
+        """
+        Return the line name string for each point (or each point in the index), as an object array
+        """
+
+        codes = self.linename_code if index is None else self.linename_code[index]
+        return np.array(self.linenames, dtype=object)[codes] if self.linenames else np.array([], dtype=object)
+
+    def return_lines_and_times(self):
+        """
+        Return the start/end time of each system in each line, see ThreeDView.return_lines_and_times
+
+        Returns
+        -------
+        list
+            list of the system identifier for each line/system
+        list
+            sorted list of the unique line names
+        list
+            list of [start time, end time] for each line/system in utc seconds
+        """
+
+        if not self.size:
+            return [], [], []
+        # sort lines by name, and then by system
+        line_rank = np.argsort(np.argsort(np.array(self.linenames, dtype=object)))
+        key = line_rank[self.linename_code].astype(np.int64) * len(self.id_names) + self.id_code
+        order = np.argsort(key, kind='stable')
+        ukeys, starts = np.unique(key[order], return_index=True)
+        sorted_times = self.pointtime[order]
+        mintimes = np.minimum.reduceat(sorted_times, starts)
+        maxtimes = np.maximum.reduceat(sorted_times, starts)
+        systems = [self.id_names[k % len(self.id_names)] for k in ukeys]
+        time_segments = [[mn, mx] for mn, mx in zip(mintimes, maxtimes)]
+        linenames = sorted([self.linenames[cd] for cd in np.unique(self.linename_code)])
+        return systems, linenames, time_segments
+
+
+def return_sorted_names(names: list, codes: np.ndarray):
+    """
+    Return the sorted unique names for the codes in the points, and the position of each code in the sorted names.
+    See PointStore, where names are the id_names or linenames and codes are the id_code or linename_code.
+
+    Parameters
+    ----------
+    names
+        name for each code
+    codes
+        code for each point
+
+    Returns
+    -------
+    list
+        sorted list of the names found in codes
+    np.ndarray
+        position of each code in the sorted list of names, -1 for codes that are not in the points
+    """
+
+    ucodes = np.unique(codes)
+    sorted_names = sorted([names[cd] for cd in ucodes])
+    rank = np.full(len(names), -1, dtype=np.int32)
+    for cd in ucodes:
+        rank[cd] = sorted_names.index(names[cd])
+    return sorted_names, rank
+
+
+def return_decimation_cells(points: np.ndarray, max_points: int):
+    """
+    Level of detail for display.  If there are more than max_points points, bins the points into a regular grid of cells
+    sized so that there are between half of max_points and max_points occupied cells.  Only one point per cell is
+    drawn (see return_decimated_index) and a selection of drawn points is expanded to all points in the same cells
+    (see expand_decimated_selection), so that selecting and cleaning act on all points.
+
+    Parameters
+    ----------
+    points
+        (N, dimensions) array of the displayed coordinates
+    max_points
+        maximum number of cells
+
+    Returns
+    -------
+    np.ndarray
+        cell number (0 to number of occupied cells - 1) for each point, None if there are less than max_points points
+    """
+
+    if points.shape[0] <= max_points:
+        return None
+    minpt = points.min(axis=0)
+    extent = np.maximum(points.max(axis=0) - minpt, 1e-6)
+    dims = points.shape[1]
+    cell_size = (np.prod(extent) / max_points) ** (1 / dims)
+    best_size = None
+    # soundings are mostly a surface, so the occupied cells are only a fraction of the cells in the volume.  Resize the
+    #  cells by the occupied cell count until we are between half of max_points and max_points
+    for _ in range(8):
+        occupied = np.count_nonzero(np.diff(np.sort(_return_cell_key(points, minpt, extent, cell_size)))) + 1
+        if occupied <= max_points:
+            best_size = cell_size
+            if occupied >= max_points // 2:
+                break
+        elif best_size is not None:
+            break
+        cell_size *= np.sqrt(occupied / max_points) * (1.05 if occupied > max_points else 1.0)
+    if best_size is None:  # fall back to every nth point
+        return np.arange(points.shape[0]) // int(np.ceil(points.shape[0] / max_points))
+    key = _return_cell_key(points, minpt, extent, best_size)
+    order = np.argsort(key)
+    sorted_key = key[order]
+    newcell = np.empty(sorted_key.size, dtype=bool)
+    newcell[0] = True
+    newcell[1:] = sorted_key[1:] != sorted_key[:-1]
+    point_cell = np.empty(key.size, dtype=np.int64)
+    point_cell[order] = np.cumsum(newcell) - 1
+    return point_cell
+
+
+def _return_cell_key(points: np.ndarray, minpt: np.ndarray, extent: np.ndarray, cell_size: float):
+    ncells = np.floor(extent / cell_size).astype(np.int64) + 1
+    cellidx = ((points - minpt) / cell_size).astype(np.int64)
+    return np.ravel_multi_index(tuple(cellidx.T), tuple(ncells))
+
+
+def return_decimated_index(point_cell: np.ndarray, index: np.ndarray):
+    """
+    Return the first point in each cell, only looking at the points in index (i.e. the points that are not hidden).
+    See return_decimation_cells.
+
+    Parameters
+    ----------
+    point_cell
+        cell number for each point, None if not decimated
+    index
+        sorted index of the points to pick from
+
+    Returns
+    -------
+    np.ndarray
+        sorted index of the points to draw
+    """
+
+    if point_cell is None:
+        return index
+    first = np.full(point_cell.max() + 1, point_cell.size, dtype=np.int64)
+    np.minimum.at(first, point_cell[index], index)
+    return np.sort(first[first < point_cell.size])
+
+
+def expand_decimated_selection(selected: np.ndarray, point_cell: np.ndarray, index: np.ndarray):
+    """
+    Expand a selection of the drawn points to all the points in index that are in the same cells.  See
+    return_decimation_cells.
+
+    Parameters
+    ----------
+    selected
+        index of the selected drawn points
+    point_cell
+        cell number for each point, None if not decimated
+    index
+        index of the points that can be selected, i.e. the points that are not hidden
+
+    Returns
+    -------
+    np.ndarray
+        index of all selected points
+    """
+
+    if point_cell is None:
+        return selected
+    selected_cells = np.zeros(point_cell.max() + 1, dtype=bool)
+    selected_cells[point_cell[selected]] = True
+    return index[selected_cells[point_cell[index]]]
@@ -0,0 +1,341 @@
+import os
+import json
+import numpy as np
+from typing import Union
+from pyproj import CRS
+
+from HSTB.kluster.gdal_helpers import gdal_raster_create_overviews
+from HSTB.kluster import kluster_variables
+
+
+class SurfaceRenderCache:
+    """
+    On disk cache of the rendered display chunks of a surface, used by the 2d view (see DrawSurfaceWorker).  Each chunk
+    from the surface get_chunks_of_tiles is written once as a tiled GeoTIFF with overviews, so showing a surface layer
+    again only opens the cached files, and QGIS reads just the blocks in view at the overview level for the zoom.  The
+    hillshade layer is rendered from the depth chunks, so it does not need its own files.
+
+    The cache lives next to the surface folder ('<surface folder>_render_cache') with an index file listing the chunks
+    of each resolution/layer.  Every invalidate increments the cache generation, chunks rendered after that are written
+    to new files, so that files still open in the 2d view are never overwritten.  Chunks that are no longer used are
+    deleted on the next save, if they are not open.
+    """
+
+    index_name = 'render_cache.json'
+
+    def __init__(self, surface_folder: str):
+        """
+        Parameters
+        ----------
+        surface_folder
+            path to the surface folder
+        """
+
+        surface_folder = os.path.normpath(surface_folder)
+        self.cache_folder = surface_folder + '_render_cache'
+        self.index_file = os.path.join(self.cache_folder, self.index_name)
+        self.generation = 0
+        self.chunk_count = 0  # number of chunk files written, used to give each file a unique name
+        self.key = None
+        self.layers = {}  # {resolution: {layer: {'complete': bool, 'chunks': [chunk record, ...]}}}
+        self.stale = []  # chunk files that are no longer used, removed in save
+        self._load()
+
+    def _load(self):
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, 'r') as ifile:
+                    index = json.load(ifile)
+                self.generation = index['generation']
+                self.chunk_count = index['chunk_count']
+                self.key = index['key']
+                self.layers = index['layers']
+                self.stale = index['stale']
+            except (ValueError, KeyError):  # corrupt or old index, start over
+                self.generation, self.chunk_count, self.key, self.layers, self.stale = 0, 0, None, {}, []
+
+    def save(self):
+        """
+        Write the cache index and remove the stale chunk files
+        """
+
+        os.makedirs(self.cache_folder, exist_ok=True)
+        still_stale = []
+        for chunk_file in self.stale:
+            try:
+                if os.path.exists(os.path.join(self.cache_folder, chunk_file)):
+                    os.remove(os.path.join(self.cache_folder, chunk_file))
+            except OSError:  # file is still open in the 2d view, try again next time
+                still_stale.append(chunk_file)
+        self.stale = still_stale
+        with open(self.index_file, 'w') as ifile:
+            json.dump({'generation': self.generation, 'chunk_count': self.chunk_count, 'key': self.key, 'layers': self.layers, 'stale': self.stale}, ifile, indent=2)
+
+    @property
+    def writable(self):
+        """
+        True if the cache folder can be written to
+        """
+
+        if os.path.exists(self.cache_folder):
+            return os.access(self.cache_folder, os.W_OK)
+        return os.access(os.path.dirname(self.cache_folder), os.W_OK)
+
+    def validate(self, key: dict):
+        """
+        Drop all cached chunks if the provided key does not match the key the chunks were rendered with.  The key holds
+        the surface attributes that change every chunk, see return_render_cache_key.
+
+        Parameters
+        ----------
+        key
+            dict of the surface attributes used when rendering the chunks
+
+        Returns
+        -------
+        bool
+            True if the cached chunks are still valid
+        """
+
+        if self.key == key:
+            return True
+        self.invalidate()
+        self.key = key
+        return False
+
+    def invalidate(self, bounds: list = None):
+        """
+        Drop the cached chunks that intersect any of the provided bounds, or all chunks if bounds is None.  If there
+        are any bounds, every resolution/layer is no longer complete, as the changed area might be outside of the cached
+        chunks.  The next draw reads the chunks again, but only writes the dropped/new chunks (see return_chunk).
+
+        Parameters
+        ----------
+        bounds
+            list of [min x, min y, max x, max y] for the changed areas of the surface, in the surface crs
+
+        Returns
+        -------
+        int
+            number of chunks dropped
+        """
+
+        dropped = 0
+        for resolution, layers in self.layers.items():
+            for layer, record in layers.items():
+                keep = []
+                for chunk in record['chunks']:
+                    if bounds is None or any([_bounds_intersect(chunk['bounds'], bnds) for bnds in bounds]):
+                        self.stale.append(chunk['file'])
+                        dropped += 1
+                    else:
+                        keep.append(chunk)
+                if bounds is None or bounds:
+                    record['chunks'] = keep
+                    record['complete'] = False
+        if bounds is None or bounds:
+            self.generation += 1
+        return dropped
+
+    def return_chunks(self, resolution: float, layer: str):
+        """
+        Return the cached chunk files for the resolution/layer, if every chunk of that resolution/layer is cached
+
+        Parameters
+        ----------
+        resolution
+            resolution of the surface in meters
+        layer
+            surface layer name, ex: 'depth'
+
+        Returns
+        -------
+        list
+            list of absolute paths to the cached chunk files, None if the resolution/layer is not completely cached
+        """
+
+        record = self.layers.get(_resolution_key(resolution), {}).get(layer)
+        if record is None or not record['complete']:
+            return None
+        return [os.path.join(self.cache_folder, chunk['file']) for chunk in record['chunks']]
+
+    def return_chunk(self, resolution: float, layer: str, geo_transform: list, shape: tuple):
+        """
+        Return the cached chunk file that matches the geotransform and shape of a chunk from get_chunks_of_tiles.  Used
+        to skip writing the chunks that are still valid when a resolution/layer is partially cached.
+
+        Parameters
+        ----------
+        resolution
+            resolution of the surface in meters
+        layer
+            surface layer name, ex: 'depth'
+        geo_transform
+            [x origin, x pixel size, x rotation, y origin, y rotation, -y pixel size]
+        shape
+            (rows, columns) of the chunk raster
+
+        Returns
+        -------
+        str
+            absolute path to the cached chunk file, None if there is no match
+        """
+
+        record = self.layers.get(_resolution_key(resolution), {}).get(layer)
+        if record is not None:
+            for chunk in record['chunks']:
+                if np.allclose(chunk['geo_transform'], geo_transform) and tuple(chunk['shape']) == tuple(shape):
+                    return os.path.join(self.cache_folder, chunk['file'])
+        return None
+
+    def add_chunk(self, resolution: float, layer: str, data: list, geo_transform: list, crs: Union[CRS, int],
+                  nodatavalue: float = np.nan):
+        """
+        Write a new chunk to the cache, as a tiled GeoTIFF with overviews.  The chunk is not part of the
+        resolution/layer until set_chunks is called.
+
+        Parameters
+        ----------
+        resolution
+            resolution of the surface in meters
+        layer
+            surface layer name, ex: 'depth'
+        data
+            list of the 2d array for the layer, as returned by get_chunks_of_tiles with for_gdal=True
+        geo_transform
+            [x origin, x pixel size, x rotation, y origin, y rotation, -y pixel size]
+        crs
+            pyproj CRS or an integer epsg code
+        nodatavalue
+            nodatavalue to use in the raster
+
+        Returns
+        -------
+        str
+            absolute path to the new chunk file
+        """
+
+        os.makedirs(self.cache_folder, exist_ok=True)
+        self.chunk_count += 1
+        chunk_file = os.path.join(self.cache_folder, f'{layer}_{resolution}_{self.generation}_{self.chunk_count}.tif')
+        gdal_raster_create_overviews(chunk_file, data, geo_transform, crs, nodatavalue, (layer,))
+        return chunk_file
+
+    def set_chunks(self, resolution: float, layer: str, chunk_files: list, geo_transforms: list, shapes: list):
+        """
+        Set the chunks of the resolution/layer, marking it as completely cached.  Chunk files of this resolution/layer
+        that are not in the new list are marked as stale.
+
+        Parameters
+        ----------
+        resolution
+            resolution of the surface in meters
+        layer
+            surface layer name, ex: 'depth'
+        chunk_files
+            list of absolute paths to the chunk files, see add_chunk and return_chunk
+        geo_transforms
+            list of the geotransform for each chunk
+        shapes
+            list of the (rows, columns) shape for each chunk
+        """
+
+        layers = self.layers.setdefault(_resolution_key(resolution), {})
+        newfiles = [os.path.basename(cfile) for cfile in chunk_files]
+        if layer in layers:
+            self.stale += [chunk['file'] for chunk in layers[layer]['chunks'] if chunk['file'] not in newfiles]
+        chunks = []
+        for cfile, geo_transform, shape in zip(newfiles, geo_transforms, shapes):
+            geo_transform = [float(gt) for gt in geo_transform]
+            chunks.append({'file': cfile, 'geo_transform': geo_transform, 'shape': [int(shape[0]), int(shape[1])],
+                           'bounds': _chunk_bounds(geo_transform, shape)})
+        layers[layer] = {'complete': True, 'chunks': chunks}
+
+
+def return_render_cache_key(surf_object):
+    """
+    Build the key for SurfaceRenderCache.validate from the surface attributes that change every rendered chunk.
+
+    Parameters
+    ----------
+    surf_object
+        bathygrid instance
+
+    Returns
+    -------
+    dict
+        render cache key
+    """
+
+    return {'epsg': surf_object.epsg, 'positive_up': bool(surf_object.positive_up),
+            'resolutions': [float(rez) for rez in surf_object.resolutions], 'chunk_size': kluster_variables.chunk_size_display}
+
+
+def return_tile_bounds(surf_object):
+    """
+    Return the bounds of the populated tiles in the surface, with the bathygrid point_count_changed flag for each tile.
+    Tiles flagged as changed are the tiles regridded by an 'update' regrid.
+
+    Parameters
+    ----------
+    surf_object
+        bathygrid instance
+
+    Returns
+    -------
+    dict
+        {(min x, min y, max x, max y): point count changed} for each tile, None if the surface tiles are not available
+    """
+
+    tiles = getattr(surf_object, 'tiles', None)
+    if tiles is None:
+        return None
+    tile_bounds = {}
+    for tile in np.ravel(tiles):
+        if tile is None:  # bathygrid leaves unpopulated tiles as None
+            continue
+        try:
+            tile_bounds[(float(tile.min_x), float(tile.min_y), float(tile.max_x), float(tile.max_y))] = bool(tile.point_count_changed)
+        except AttributeError:
+            return None
+    return tile_bounds
+
+
+def return_changed_tile_bounds(old_tile_bounds: dict, new_tile_bounds: dict):
+    """
+    Return the bounds of the tiles changed between the two return_tile_bounds results, the tiles flagged as changed in
+    the new bounds and the tiles that were removed from the surface (all points removed).
+
+    Parameters
+    ----------
+    old_tile_bounds
+        return_tile_bounds before the surface was updated
+    new_tile_bounds
+        return_tile_bounds after the points were added/removed, before gridding
+
+    Returns
+    -------
+    list
+        list of [min x, min y, max x, max y] for each changed tile, None if either tile bounds is None
+    """
+
+    if old_tile_bounds is None or new_tile_bounds is None:
+        return None
+    changed = [list(bnds) for bnds, chg in new_tile_bounds.items() if chg]
+    changed += [list(bnds) for bnds in old_tile_bounds if bnds not in new_tile_bounds]
+    return changed
+
+
+def _resolution_key(resolution: float):
+    return str(float(resolution))
+
+
+def _chunk_bounds(geo_transform: list, shape: tuple):
+    rows, cols = shape
+    xs = [geo_transform[0], geo_transform[0] + geo_transform[1] * cols]
+    ys = [geo_transform[3], geo_transform[3] + geo_transform[5] * rows]
+    return [min(xs), min(ys), max(xs), max(ys)]
+
+
+def _bounds_intersect(bounds_a: list, bounds_b: list):
+    return bounds_a[0] <= bounds_b[2] and bounds_b[0] <= bounds_a[2] and bounds_a[1] <= bounds_b[3] and bounds_b[1] <= bounds_a[3]
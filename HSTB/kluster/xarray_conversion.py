@@ -711,6 +711,84 @@ def _merge_constant_blocks(newblocks: list):
     return finalarr
 
 
+def _return_xarray_flush_blocks(xlens: list, xarrfutures: list, rec_length: int):
+    """
+    Used in streaming conversion, split the blocks into the records that can be written now (a multiple of rec_length)
+    and the remainder that is carried into the next window of files.  We always retain at least one record, so that the
+    split/duplicate correction between the end of this window and the start of the next one can be made before the
+    last record is written.
+
+    Parameters
+    ----------
+    xlens
+        list of int, length of the time dimension for each array, same order as xarrfutures
+    xarrfutures
+        list of dask futures, future represents xarray dataset for chunk
+    rec_length
+        int, length of time dimension for output block, equal to the chunksize of that datatype (ping, nav, etc)
+
+    Returns
+    -------
+    list
+        list of [start, end, xarray future] for the records to write, see _merge_constant_blocks
+    list
+        list of [start, end, xarray future] for the records to carry into the next window
+    """
+
+    totallen = sum(xlens)
+    flushlen = ((totallen - 1) // rec_length) * rec_length if totallen else 0
+    flush_blocks = []
+    remainder_blocks = []
+    running_total = 0
+    for arrlen, xarrfut in zip(xlens, xarrfutures):
+        if running_total + arrlen <= flushlen:
+            flush_blocks.append([0, arrlen, xarrfut])
+        elif running_total >= flushlen:
+            remainder_blocks.append([0, arrlen, xarrfut])
+        else:
+            cut_idx = flushlen - running_total
+            flush_blocks.append([0, cut_idx, xarrfut])
+            remainder_blocks.append([cut_idx, arrlen, xarrfut])
+        running_total += arrlen
+    return flush_blocks, remainder_blocks
+
+
+def _return_streaming_windows(fils: list, fil_start_end_times: dict):
+    """
+    Used in streaming conversion, sort the multibeam files by start time and group them into windows of at most
+    kluster_variables.converted_files_at_once files and kluster_variables.max_converted_chunk_size megabytes.
+
+    Parameters
+    ----------
+    fils
+        list of paths to multibeam files
+    fil_start_end_times
+        dictionary of file name and start/stop time, see BatchRead._gather_file_level_metadata
+
+    Returns
+    -------
+    list
+        list of lists of file paths, one list for each window
+    """
+
+    fils = sorted(fils, key=lambda f: fil_start_end_times[os.path.split(f)[1]][0])
+    windows = []
+    window = []
+    total_size = 0
+    for fil in fils:
+        fil_size = os.path.getsize(fil) / 1000000  # file size in MB
+        if window and (len(window) >= kluster_variables.converted_files_at_once or
+                       total_size + fil_size >= kluster_variables.max_converted_chunk_size):
+            windows.append(window)
+            window = []
+            total_size = 0
+        window.append(fil)
+        total_size += fil_size
+    if window:
+        windows.append(window)
+    return windows
+
+
 def _assess_need_for_split_correction(cur_xarr: xr.Dataset, next_xarr: xr.Dataset):
     """
     Taking blocks from workers, if the block after the current one has a start time equal to the current end time,
@@ -993,7 +1071,7 @@ class BatchRead(ZarrBackend):
 
     def __init__(self, filfolder: Union[str, list] = None, dest: str = None, address: str = None, client: Client = None,
                  minchunksize: int = 40000000, max_chunks: int = 20, filtype: str = 'zarr', skip_dask: bool = False,
-                 dashboard: bool = False, show_progress: bool = True, parallel_write: bool = True):
+                 dashboard: bool = False, show_progress: bool = True, parallel_write: bool = True, streaming: bool = False):
         """
         Parameters
         ----------
@@ -1024,6 +1102,9 @@ class BatchRead(ZarrBackend):
             If true, uses dask.distributed.progress.  Disabled for GUI, as it generates too much text
         parallel_write
             if True, will write in parallel to disk
+        streaming
+            if True, will use batch_read_streaming, converting and writing the files in time ordered windows to limit
+            the memory required for large file sets
         """
 
         super().__init__()
@@ -1038,6 +1119,7 @@ class BatchRead(ZarrBackend):
         self.raw_att = None
 
         self.parallel_write = parallel_write
+        self.streaming = streaming
         self.readsuccess = False
 
         self.client = client
@@ -1087,7 +1169,10 @@ class BatchRead(ZarrBackend):
             self.logger.error(self.filtype + ' is not a supported format.')
             raise NotImplementedError(self.filtype + ' is not a supported format.')
 
-        final_pths = self.batch_read(self.filtype)
+        if self.streaming:
+            final_pths = self.batch_read_streaming(self.filtype)
+        else:
+            final_pths = self.batch_read(self.filtype)
 
         if final_pths is not None:
             self.final_paths = final_pths
@@ -1430,6 +1515,69 @@ class BatchRead(ZarrBackend):
         del balanced_data
         return output_arrs, time_arrs, beam_shapes, chunksize, totallength
 
+    def _batch_read_flush_blocks(self, input_xarrs: list, datatype: str, chunksize: int):
+        """
+        Used in streaming conversion, see _batch_read_merge_blocks.  Only the complete blocks of chunksize records are
+        merged and returned for writing, the remaining records are merged into a single dataset that is carried into
+        the next window of files.
+
+        Parameters
+        ----------
+        input_xarrs
+            xarray objects representing data read from raw files
+        datatype
+            one of 'ping', 'attitude', 'navigation'
+        chunksize
+            size of new chunks, see batch_read_configure_options
+
+        Returns
+        -------
+        list
+            futures representing data merged into blocks of chunksize, None if there are not enough records to fill a block
+        list
+            xarray DataArrays for the time dimension of each returned future
+        list
+            list of the max beams in each chunk, if this is a datatype=ping.  Otherwise None.
+        Union[Future, xr.Dataset]
+            the records that were not written, to be carried into the next window
+        """
+
+        if self.client is not None:
+            xlens = self.client.gather(self.client.map(_return_xarray_timelength, input_xarrs))
+        else:
+            xlens = [_return_xarray_timelength(ix) for ix in input_xarrs]
+        flush_blocks, remainder_blocks = _return_xarray_flush_blocks(xlens, input_xarrs, chunksize)
+        if self.client is not None:
+            carry = self.client.submit(_merge_constant_blocks, remainder_blocks)
+        else:
+            carry = _merge_constant_blocks(remainder_blocks)
+        if not flush_blocks:
+            return None, None, None, carry
+
+        balanced_data, totallength = _return_xarray_constant_blocks([fb[1] for fb in flush_blocks],
+                                                                    [fb[2] for fb in flush_blocks], chunksize)
+        self.logger.info('Flushing {} total {} records across {} blocks of size {}, carrying {} records forward'.format(totallength, datatype,
+                                                                                                                        len(balanced_data), chunksize,
+                                                                                                                        sum(xlens) - totallength))
+        if self.client is not None:
+            output_arrs = self.client.map(_merge_constant_blocks, balanced_data)
+            output_arrs = self._batch_read_validate_blocks(output_arrs)
+            time_arrs = self.client.gather(self.client.map(_return_xarray_time, output_arrs))
+            if datatype == 'ping':
+                beam_shapes = self.client.gather(self.client.map(_return_xarray_beam, output_arrs))
+            else:
+                beam_shapes = None
+        else:
+            output_arrs = [_merge_constant_blocks(bd) for bd in balanced_data]
+            output_arrs = self._batch_read_validate_blocks(output_arrs)
+            time_arrs = [_return_xarray_time(oa) for oa in output_arrs]
+            if datatype == 'ping':
+                beam_shapes = [_return_xarray_beam(oa) for oa in output_arrs]
+            else:
+                beam_shapes = None
+        del balanced_data, flush_blocks, remainder_blocks
+        return output_arrs, time_arrs, beam_shapes, carry
+
     def _batch_read_sequential(self, chnks_flat: list):
         """
         Run sequential_read methods on the provided chunks
@@ -1659,7 +1807,7 @@ class BatchRead(ZarrBackend):
         del base_xarrfut, next_xarrfut
         return input_xarrs
 
-    def _batch_read_ping_specific_attribution(self, combattrs: dict):
+    def _batch_read_ping_specific_attribution(self, combattrs: dict, fil_start_end_times: dict = None):
         """
         Add in the ping record specific attribution
 
@@ -1667,6 +1815,8 @@ class BatchRead(ZarrBackend):
         ----------
         combattrs
             dictionary of basic attribution we want to add to
+        fil_start_end_times
+            optional, the output of _gather_file_level_metadata if already gathered
 
         Returns
         -------
@@ -1674,7 +1824,8 @@ class BatchRead(ZarrBackend):
             new dict with ping specific attribution included
         """
 
-        fil_start_end_times = self._gather_file_level_metadata(self.fils)
+        if fil_start_end_times is None:
+            fil_start_end_times = self._gather_file_level_metadata(self.fils)
         combattrs['multibeam_files'] = fil_start_end_times  # override with start/end time dict
         combattrs['output_path'] = self.converted_pth
         if 'skip_to_georeferencing' in combattrs:
@@ -1781,6 +1932,166 @@ class BatchRead(ZarrBackend):
 
         return finalpths
 
+    def _batch_read_streaming_write(self, datatype: str, input_xarrs: list, combattrs: dict, last_window: bool,
+                                    sysid: str = None):
+        """
+        Used in streaming conversion, write the complete blocks of the given data to disk and return the records that
+        need to be carried into the next window.  If this is the last window, all records are written.
+
+        Parameters
+        ----------
+        datatype
+            one of 'ping', 'attitude'
+        input_xarrs
+            xarray Dataset objects, corrected for splits/duplicates, sorted by time
+        combattrs
+            combined attribution for this window of files
+        last_window
+            if True, this is the last window of files, all records are written and nothing is carried forward
+        sysid
+            system identifier if writing ping records
+
+        Returns
+        -------
+        str
+            path to the written data directory, empty string if nothing was written.  If nothing was written, combattrs
+            was not written either, and must be merged into the attribution of the next window.
+        Union[Future, xr.Dataset]
+            records to carry into the next window, None if this is the last window
+        """
+
+        opts = batch_read_configure_options()
+        opts[datatype]['final_attrs'] = combattrs
+        if last_window:
+            opts[datatype]['output_arrs'], opts[datatype]['time_arrs'], opts[datatype]['beam_shapes'], opts[datatype]['chunksize'], _ = self._batch_read_merge_blocks(input_xarrs, datatype, opts[datatype]['chunksize'])
+            carry = None
+        else:
+            output_arrs, time_arrs, beam_shapes, carry = self._batch_read_flush_blocks(input_xarrs, datatype, opts[datatype]['chunksize'])
+            if output_arrs is None:
+                return '', carry
+            opts[datatype]['output_arrs'], opts[datatype]['time_arrs'], opts[datatype]['beam_shapes'] = output_arrs, time_arrs, beam_shapes
+        fpth = self._batch_read_write('zarr', datatype, opts, self.converted_pth, sysid=sysid)
+        del opts
+        return fpth, carry
+
+    def batch_read_streaming(self, output_mode: str = 'zarr'):
+        """
+        Streaming version of batch_read.  The multibeam files are sorted by start time and read in windows of
+        kluster_variables.converted_files_at_once files/kluster_variables.max_converted_chunk_size megabytes.  After
+        each window, only the complete blocks of ping_chunk_size/attitude_chunk_size records are written to the zarr
+        datastore, the rest are carried into the next window, where the split/duplicate correction between the end of
+        the last window and the start of the new one is made.  Memory used is bounded by the window size rather than
+        the size of the file set.
+
+        Parameters
+        ----------
+        output_mode
+            'zarr' is the only supported mode for streaming conversion
+
+        Returns
+        -------
+        dict
+            nested dictionary for each type (ping, attitude) with path to written data
+        """
+
+        starttime = perf_counter()
+
+        if output_mode != 'zarr':
+            msg = 'Only zarr mode is supported for streaming conversion: {}'.format(output_mode)
+            raise NotImplementedError(msg)
+
+        if not self.skip_dask and self.client is None:
+            self.client = dask_find_or_start_client()
+            if self.client is None:
+                return None
+
+        self._batch_read_file_setup()
+        self.logger.info('****Running streaming multibeam converter****')
+
+        fil_start_end_times = self._gather_file_level_metadata(self.fils)
+        windows = _return_streaming_windows(self.fils, fil_start_end_times)
+        finalpths = {'ping': [], 'attitude': []}
+        carry = {'ping': {}, 'attitude': None}
+        # attribution of windows that had nothing to write, merged into the attribution of the next write
+        pending_attrs = {'ping': {}, 'attitude': []}
+        for wcount, window in enumerate(windows):
+            last_window = wcount == len(windows) - 1
+            self.logger.info('Converting window {} of {}'.format(wcount + 1, len(windows)))
+            chnks_flat = self._batch_read_chunk_generation(window)
+            newrecfutures = self._batch_read_sequential(chnks_flat)
+            if self.client is not None:
+                xarrfutures = self.client.map(_sequential_to_xarray, newrecfutures)
+                if self.show_progress:
+                    progress(xarrfutures, multi=False)
+            else:
+                xarrfutures = [_sequential_to_xarray(nrf) for nrf in newrecfutures]
+            del newrecfutures
+
+            for datatype in ['ping', 'attitude']:
+                if self.client is not None:
+                    input_xarrs = self.client.map(_divide_xarray_futs, xarrfutures, [datatype] * len(xarrfutures))
+                else:
+                    input_xarrs = [_divide_xarray_futs(xf, dxf) for xf, dxf in zip(xarrfutures, [datatype] * len(xarrfutures))]
+                if input_xarrs:
+                    input_xarrs = self._batch_read_sort_futures_by_time(input_xarrs)
+                    if self.client is not None:
+                        finalattrs = self.client.gather(self.client.map(gather_dataset_attributes, input_xarrs))
+                    else:
+                        finalattrs = [gather_dataset_attributes(ix) for ix in input_xarrs]
+                else:
+                    finalattrs = []
+
+                if datatype == 'ping':
+                    if self.client is not None:
+                        system_ids = self.client.gather(self.client.map(_return_xarray_system_ids, input_xarrs))
+                    else:
+                        system_ids = [_return_xarray_system_ids(ix) for ix in input_xarrs]
+                    totalsystems = sorted(np.unique([s for system in system_ids for s in system] + list(carry['ping'].keys())))
+                    for system in totalsystems:
+                        self.logger.info('Operating on system identifier {}'.format(system))
+                        input_xarrs_by_system = self._batch_read_return_xarray_by_system(input_xarrs, system) if input_xarrs else []
+                        if system in carry['ping']:
+                            # carried records from the last window go first, so the block boundary between windows is corrected
+                            input_xarrs_by_system = [carry['ping'].pop(system)] + input_xarrs_by_system
+                        if len(input_xarrs_by_system) > 1:
+                            input_xarrs_by_system = self._batch_read_correct_block_boundaries(input_xarrs_by_system)
+                        sys_attrs = pending_attrs['ping'].pop(system, []) + finalattrs
+                        combattrs = combine_xr_attributes(sys_attrs) if sys_attrs else {}
+                        combattrs = self._batch_read_ping_specific_attribution(combattrs, fil_start_end_times)
+                        fpth, sys_carry = self._batch_read_streaming_write(datatype, input_xarrs_by_system, combattrs,
+                                                                           last_window, sysid=system)
+                        if sys_carry is not None:
+                            carry['ping'][system] = sys_carry
+                        if fpth:
+                            if fpth not in finalpths[datatype]:
+                                finalpths[datatype].append(fpth)
+                        else:
+                            pending_attrs['ping'][system] = sys_attrs
+                        del input_xarrs_by_system
+                else:
+                    if carry['attitude'] is not None:
+                        input_xarrs = [carry['attitude']] + input_xarrs
+                    if not input_xarrs:
+                        continue
+                    if len(input_xarrs) > 1:
+                        input_xarrs = self._batch_read_drop_duplicate_blobs(input_xarrs)
+                    att_attrs = pending_attrs['attitude'] + finalattrs
+                    combattrs = combine_xr_attributes(att_attrs) if att_attrs else {}
+                    fpth, carry['attitude'] = self._batch_read_streaming_write(datatype, input_xarrs, combattrs, last_window)
+                    if fpth:
+                        pending_attrs['attitude'] = []
+                        if fpth not in finalpths[datatype]:
+                            finalpths[datatype].append(fpth)
+                    else:
+                        pending_attrs['attitude'] = att_attrs
+                del input_xarrs
+            del xarrfutures
+
+        endtime = perf_counter()
+        self.logger.info('****Streaming conversion complete: {}****\n'.format(seconds_to_formatted_string(int(endtime - starttime))))
+
+        return finalpths
+
     def return_runtime_and_installation_settings_dicts(self):
         """
         installation and runtime parameters are saved as string (json.dumps) as attributes in each raw_ping
@@ -1920,7 +2231,7 @@ class BatchRead(ZarrBackend):
         """
         After conversion, we run this additional step to build the line specific values to store as metadata.  The end result
         is a 'multibeam_files' attribute that stores [mintime, maxtime, start_latitude, start_longitude, end_latitude,
-        end_longitude, azimuth, distance]
+        end_longitude, azimuth, distance, min_latitude, max_latitude, min_longitude, max_longitude]
 
         Parameters
         ----------
@@ -1986,8 +2297,11 @@ class BatchRead(ZarrBackend):
                     line_nav.isel(time=samp_idx)
                 line_dist = np.nansum(distance_between_coordinates(line_nav.latitude[:-1], line_nav.longitude[:-1],
                                                                    line_nav.latitude[1:], line_nav.longitude[1:]))
+                line_lat, line_lon = line_nav.latitude.values, line_nav.longitude.values
                 line_dict[line_name] += [float(start_position[0]), float(start_position[1]), float(end_position[0]),
-                                         float(end_position[1]), round(float(line_az), 3), round(float(line_dist))]
+                                         float(end_position[1]), round(float(line_az), 3), round(float(line_dist)),
+                                         float(np.nanmin(line_lat)), float(np.nanmax(line_lat)), float(np.nanmin(line_lon)),
+                                         float(np.nanmax(line_lon))]
 
         self.logger.info('Metadata build complete')
         if save_pths is not None:
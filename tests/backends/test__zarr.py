@@ -7,7 +7,8 @@ import zarr
 import tempfile
 
 from HSTB.kluster.backends._zarr import _get_indices_dataset_exists, _get_indices_dataset_notexist, \
-    _my_xarr_to_zarr_build_arraydimensions, _my_xarr_to_zarr_writeattributes, ZarrWrite, ZarrBackend, search_not_sorted
+    _my_xarr_to_zarr_build_arraydimensions, _my_xarr_to_zarr_writeattributes, ZarrWrite, ZarrBackend, search_not_sorted, \
+    group_writes_by_chunk, distrib_zarr_write, return_append_dim_chunk_lengths
 from HSTB.kluster.xarray_helpers import reload_zarr_records
 import unittest
 
@@ -890,3 +891,32 @@ class TestZarr(unittest.TestCase):
         with open(attrs, 'r') as attrsfile:
             data_on_disk = json.loads(attrsfile.read())
         assert data_on_disk == attributes
+
+    def test_group_writes_by_chunk(self):
+        # chunk aligned writes get their own group
+        assert group_writes_by_chunk([[0, 10], [10, 20], [20, 30]], [10]) == [[0], [1], [2]]
+        # writes that share a chunk are grouped, including through other writes
+        assert group_writes_by_chunk([[0, 5], [5, 15], [15, 20], [20, 30]], [10]) == [[0, 1, 2], [3]]
+        # index array writes, -1 is not written
+        assert group_writes_by_chunk([np.array([0, 1, -1]), np.array([12, 13]), np.array([9, 25])], [10]) == [[0, 2], [1]]
+        # aligned with one chunk length but not the other
+        assert group_writes_by_chunk([[0, 10], [10, 20]], [10, 20]) == [[0, 1]]
+
+    def test_zarr_distrib_write_parallel(self):
+        from dask.distributed import Client
+        client = Client(processes=False, n_workers=1, threads_per_worker=4)
+        try:
+            dataset_name, datasets, dataset_time_arrays, attributes, sysid = self._return_basic_datasets(0, 6)
+            zarr_path = self.zb._get_zarr_path(dataset_name, sysid)
+            chunk_sizes = {'time': (10,), 'beam': (400,), 'counter': (10,), 'beampointingangle': (10, 400)}
+            data_indices = _get_indices_dataset_notexist(dataset_time_arrays)
+            distrib_zarr_write(zarr_path, client.scatter(datasets), attributes, chunk_sizes, data_indices, (60, 400), [],
+                               client, write_in_parallel=True)
+            assert return_append_dim_chunk_lengths(zarr_path) == [10]
+            xdataset = reload_zarr_records(zarr_path, skip_dask=True)
+            assert np.array_equal(xdataset.counter.values, np.arange(60))
+            assert np.array_equal(xdataset.time.values, np.arange(60))
+            assert np.array_equal(xdataset.beampointingangle.values, np.concatenate([d.beampointingangle for d in datasets]))
+            assert xdataset.attrs['test_attribute'] == 'abc'
+        finally:
+            client.close()
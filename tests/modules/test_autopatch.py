@@ -0,0 +1,85 @@
+import unittest
+import numpy as np
+from types import SimpleNamespace
+
+from HSTB.kluster.modules.autopatch import PatchTestEngine, PatchTestGrid, patch_rotation_matrix
+
+
+class _FakeFqpr:
+    """
+    Stand in for a processed Fqpr with two lines, provides the sound velocity corrected offsets, heading and georeferenced
+    soundings for each line like FqprSubset.return_points_by_line
+    """
+
+    def __init__(self, projected: bool = True, vert_ref: str = 'waterline', variables: tuple = None):
+        self.horizontal_crs = SimpleNamespace(is_projected=projected)
+        self.vert_ref = vert_ref
+        soundings = np.zeros(6, dtype=[('x', np.float64), ('y', np.float64), ('z', np.float32), ('alongtrack', np.float32),
+                                       ('acrosstrack', np.float32), ('depthoffset', np.float32), ('heading', np.float32)])
+        soundings['acrosstrack'] = [-40.0, 0.0, 40.0, -40.0, 0.0, 40.0]
+        soundings['depthoffset'] = 20.0
+        soundings['heading'] = [0.0, 0.0, 0.0, 90.0, 90.0, 90.0]
+        soundings['x'] = 538000.0 + np.array([-40.0, 0.0, 40.0, 0.0, 0.0, 0.0])
+        soundings['y'] = 5292000.0 + np.array([0.0, 0.0, 0.0, 40.0, 0.0, -40.0])
+        soundings['z'] = 20.0
+        if variables is not None:
+            soundings = soundings[list(variables)]
+        self.lines = {'line_one': soundings[:3], 'line_empty': None, 'line_two': soundings[3:]}
+        self.subset = SimpleNamespace(return_points_by_line=lambda linename, variables: self.lines[linename])
+
+    def return_line_dict(self):
+        return {linename: [0.0, 1.0] for linename in self.lines}
+
+
+class TestAutoPatch(unittest.TestCase):
+
+    def test_patch_rotation_matrix(self):
+        assert np.allclose(patch_rotation_matrix(0.0, 0.0, 0.0), np.identity(3))
+        assert np.allclose(patch_rotation_matrix(0.0, 0.0, 90.0) @ [1.0, 0.0, 0.0], [0.0, 1.0, 0.0])
+        assert np.allclose(patch_rotation_matrix(90.0, 0.0, 0.0) @ [0.0, 1.0, 0.0], [0.0, 0.0, 1.0])
+
+    def test_engine_setup(self):
+        fq = _FakeFqpr()
+        engine = PatchTestEngine(fq)
+        assert engine.z_sign == 1
+        assert engine.multibeam_indexes == {'line_one': [0, 3], 'line_two': [3, 6]}  # lines without soundings are skipped
+        assert np.array_equal(engine.soundings[3:], fq.lines['line_two'])
+        assert PatchTestEngine(_FakeFqpr(vert_ref='ellipse')).z_sign == -1
+        with self.assertRaises(ValueError):
+            PatchTestEngine(_FakeFqpr(projected=False))
+        with self.assertRaises(ValueError):
+            PatchTestEngine(_FakeFqpr(variables=('x', 'y', 'z', 'alongtrack', 'acrosstrack', 'depthoffset')))
+
+    def test_engine_georeference(self):
+        engine = PatchTestEngine(_FakeFqpr())
+        pts = engine.georeference()
+        assert np.allclose(pts['x'], engine.soundings['x'])
+        assert np.allclose(pts['y'], engine.soundings['y'])
+        assert np.allclose(pts['z'], engine.soundings['z'])
+
+        # translation is applied along the heading of each ping
+        pts = engine.georeference(x_offset=1.0, y_offset=0.5)
+        assert np.allclose(pts['x'] - engine.soundings['x'], [0.5, 0.5, 0.5, 1.0, 1.0, 1.0])
+        assert np.allclose(pts['y'] - engine.soundings['y'], [1.0, 1.0, 1.0, -0.5, -0.5, -0.5])
+
+        # roll tilts the swath, nadir depth is unchanged and the outer beams move in opposite directions
+        pts = engine.georeference(roll=1.0)
+        dz = pts['z'] - engine.soundings['z']
+        assert np.isclose(dz[1], 0.0, atol=0.01)
+        assert np.isclose(dz[0], -dz[2], atol=0.01)
+        assert dz[2] > 0.5
+
+    def test_patch_grid(self):
+        engine = PatchTestEngine(_FakeFqpr())
+        pts = engine.georeference()
+        grid = PatchTestGrid(pts, resolution=2.0)
+        assert grid.min_x % 2.0 == 0
+        assert np.arange(grid.min_x, grid.max_x, grid.resolutions[0]).size == grid.width
+        grid.grid(pts, engine.multibeam_indexes)
+        dpth, xslope, lineone, linetwo = grid.get_layers_by_name(['depth', 'x_slope', 'line_one', 'line_two'])
+        assert dpth.shape == (grid.height, grid.width)
+        assert xslope.shape == dpth.shape
+        assert np.count_nonzero(~np.isnan(dpth)) == 5  # nadir of both lines fall in the same node
+        assert np.count_nonzero(~np.isnan(lineone)) == 3
+        assert np.count_nonzero(~np.isnan(linetwo)) == 3
+        assert np.nanmax(dpth) == 20.0
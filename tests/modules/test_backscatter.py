@@ -1623,4 +1623,40 @@ class TestKmallscatter(unittest.TestCase):
         assert np.allclose(self.bscatter.process(fixed_gain_corrected=False).values[0, 0],
                            self.rint_answer - self.areacorr_answer + self.tlloss_answer - self.tvg_answer)
         assert np.allclose(self.bscatter.process().values[0, 0],
-                           self.rint_answer - self.areacorr_answer + self.tlloss_answer - self.tvg_answer - self.fgain_answer)
\ No newline at end of file
+                           self.rint_answer - self.areacorr_answer + self.tlloss_answer - self.tvg_answer - self.fgain_answer)
+
+
+class TestAvgCorrector(unittest.TestCase):
+
+    def test_accumulate_avg_bins(self):
+        bins = return_avg_bins(30.0)
+        angles = np.array([[-60.0, -45.0, -10.0, 0.0], [10.0, 30.0, 45.0, np.nan]])
+        bscatter = np.array([[-30.0, -26.0, -20.0, np.nan], [-20.0, -22.0, -26.0, -18.0]])
+        sums, counts = accumulate_avg_bins(bscatter, angles, bins)
+        assert np.array_equal(counts, [1, 1, 1, 2, 1, 0])
+        assert np.allclose(sums, [-30.0, -26.0, -20.0, -42.0, -26.0, 0.0])
+
+    def test_avg_corrector_chunked(self):
+        bins = return_avg_bins(1.0)
+        angles = np.tile(np.linspace(-70, 70, 256), (20, 1))
+        bscatter = -20.0 - 0.2 * np.abs(angles)
+        full_table = generate_avg_corrector(bscatter, angles, 1.0, 45)
+        sums, counts = np.zeros(len(bins) - 1), np.zeros(len(bins) - 1, dtype=np.int64)
+        for i in range(0, 20, 7):
+            chnk_sums, chnk_counts = accumulate_avg_bins(bscatter[i:i + 7], angles[i:i + 7], bins)
+            sums += chnk_sums
+            counts += chnk_counts
+        chunk_table = avg_corrector_from_bins(sums, counts, bins, 45)
+        assert list(chunk_table.keys()) == list(full_table.keys())
+        assert np.allclose([float(v) for v in chunk_table.values()], [float(v) for v in full_table.values()])
+        assert np.isclose(float(chunk_table['45.0']), 0.0)
+
+    def test_avg_correct(self):
+        avg_table = {-90.0: 5.0, -45.0: 2.0, 0.0: 1.0, 45.0: 0.0}
+        lookup = compile_avg_corrector(avg_table)
+        assert lookup[0] == -90.0
+        assert lookup[1] == 45.0
+        angles = np.array([[-100.0, -90.0, -60.0, -45.0], [-10.0, 0.0, 30.0, 80.0]])
+        expected = np.array([[5.0, 5.0, 2.0, 2.0], [1.0, 1.0, 0.0, 0.0]])
+        assert np.array_equal(avg_correct(angles, lookup), expected)
+        assert np.array_equal(avg_correct(angles, avg_table), expected)
@@ -0,0 +1,113 @@
+import unittest
+import numpy as np
+import xarray as xr
+import dask.array as da
+from types import SimpleNamespace
+
+from HSTB.kluster.modules.edit_journal import SoundingEditJournal
+from HSTB.kluster import kluster_variables
+
+
+class _DiskArray:
+    """
+    Array like wrapper so that dask reads the numpy 'disk' array on each compute, like a zarr array
+    """
+
+    def __init__(self, data: np.ndarray):
+        self.data = data
+        self.shape, self.dtype, self.ndim = data.shape, data.dtype, data.ndim
+
+    def __getitem__(self, item):
+        return self.data[item].copy()
+
+
+class _FakeFqpr:
+    """
+    Stand in for Fqpr with a lazy detectioninfo read from the numpy 'disk' array, records the writes
+    """
+
+    def __init__(self, numpings: int = 10, numbeams: int = 4):
+        self.disk = np.zeros((numpings, numbeams), dtype=np.uint8)
+        times = np.arange(numpings, dtype=np.float64) + 1000.0
+        rp = xr.Dataset({'detectioninfo': (('time', 'beam'), da.from_array(_DiskArray(self.disk), chunks=(4, numbeams)))},
+                        coords={'time': times, 'beam': np.arange(numbeams)}, attrs={'system_identifier': '123'})
+        self.multibeam = SimpleNamespace(raw_ping=[rp])
+        self.writes = []
+        self.changes = []
+        self.attributes = []
+
+    def write(self, mode, datasets, time_array=None, sys_id=None, skip_dask=False):
+        for dset, tms in zip(datasets, time_array):
+            idx = np.searchsorted(self.multibeam.raw_ping[0].time.values, tms.values)
+            self.disk[idx] = dset['detectioninfo'].values
+            self.writes.append(idx)
+
+    def record_sounding_changes(self, sys_ident, time_ranges):
+        self.changes.append([sys_ident, time_ranges])
+
+    def write_attribute_to_ping_records(self, attr_dict):
+        self.attributes.append(list(attr_dict.keys()))
+
+
+class TestEditJournal(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.chunksize = kluster_variables.ping_chunk_size
+        kluster_variables.ping_chunk_size = 4
+
+    def tearDown(self) -> None:
+        kluster_variables.ping_chunk_size = self.chunksize
+
+    def test_record_undo_redo(self):
+        fq = _FakeFqpr()
+        journal = SoundingEditJournal(fq)
+        assert journal.record([['123', np.array([1000.0, 1001.0, 1009.0]), np.array([0, 1, 3]), 0, 2]]) == 3
+        assert journal.record([['123', np.array([1001.0, 1002.0]), np.array([1, 2]), [2, 0], [2, 2]]]) == 1  # no-op dropped
+        # all edits are merged into one patch applied to the unpatched detectioninfo, the graph does not grow per edit
+        base_layers = len(journal._base_detectioninfo['123'][1].data.__dask_graph__().layers)
+        assert len(fq.multibeam.raw_ping[0].detectioninfo.data.__dask_graph__().layers) == base_layers + 1
+        assert journal._patches['123'][0].size == 4
+        detect = fq.multibeam.raw_ping[0].detectioninfo.values
+        assert detect[0, 0] == 2 and detect[1, 1] == 2 and detect[2, 2] == 2 and detect[9, 3] == 2
+        assert detect.sum() == 8
+        assert not fq.writes  # nothing written until flush
+
+        assert journal.undo() == 1
+        assert fq.multibeam.raw_ping[0].detectioninfo.values[2, 2] == 0
+        assert len(fq.multibeam.raw_ping[0].detectioninfo.data.__dask_graph__().layers) == base_layers + 1
+        assert journal.undo(5) == 1
+        assert fq.multibeam.raw_ping[0].detectioninfo.values.sum() == 0
+        assert journal.redo(2) == 2
+        assert fq.multibeam.raw_ping[0].detectioninfo.values.sum() == 8
+        journal.record([['123', np.array([1005.0]), np.array([0]), 0, 1]])
+        assert journal.redo() == 0  # new edit clears the redo history
+
+    def test_flush(self):
+        fq = _FakeFqpr()
+        journal = SoundingEditJournal(fq)
+        journal.record([['123', np.array([1000.0, 1001.0]), np.array([0, 1]), 0, 2]])
+        journal.record([['123', np.array([1002.0, 1009.0]), np.array([2, 3]), 0, 2]])
+        assert journal.pending_count == 4
+        journal.flush(background=True)
+        journal.wait()
+        assert journal.pending_count == 0
+        # one write per touched ping chunk, regardless of the number of edits
+        assert len(fq.writes) == 2
+        assert np.array_equal(fq.writes[0], [0, 1, 2, 3])
+        assert np.array_equal(fq.writes[1], [8, 9])
+        assert fq.changes == [['123', [[1000.0, 1003.0], [1008.0, 1009.0]]]]
+        assert fq.attributes == [['_soundings_last_cleaned']]
+        assert fq.disk.sum() == 8
+        # patches are dropped after the write, detectioninfo is read from disk again
+        assert '123' not in journal._base_detectioninfo
+        assert '123' not in journal._patches
+        assert fq.multibeam.raw_ping[0].detectioninfo.values.sum() == 8
+
+        # undo after a flush is saved on the next flush
+        journal.undo()
+        journal.flush()
+        assert fq.disk.sum() == 4
+        # nothing pending, nothing written
+        journal.flush()
+        assert len(fq.writes) == 4
+        assert len(fq.attributes) == 2
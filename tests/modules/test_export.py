@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import laspy
+
+from HSTB.kluster.modules.export import CsvSoundingWriter, LasSoundingWriter, ParquetSoundingWriter, pyarrow_found, \
+    _split_by_identifiers
+
+
+def _build_columns(start: float, count: int):
+    x = np.arange(count, dtype=np.float64) * 0.51 + 538000.0 + start
+    y = np.arange(count, dtype=np.float64) * 0.37 + 5292000.0 + start
+    z = np.linspace(-1.2, 95.678, count) + start
+    return {'x': x, 'y': y, 'z': z, 'thu': np.full(count, 0.5), 'tvu': np.full(count, 0.25),
+            'classification': (np.arange(count) % 3).astype(np.int32), 'frequency': np.full(count, 300000),
+            'txsector_beam': (np.arange(count) % 2).astype(np.int32)}
+
+
+class TestExport(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.clsFolder = os.path.join(tempfile.gettempdir(), 'TestExport')
+        try:
+            os.mkdir(cls.clsFolder)
+        except FileExistsError:
+            shutil.rmtree(cls.clsFolder)
+            os.mkdir(cls.clsFolder)
+        cls.first = _build_columns(0.0, 50)
+        cls.second = _build_columns(10.0, 30)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        shutil.rmtree(cls.clsFolder)
+
+    def _expected(self, var: str):
+        return np.concatenate([self.first[var], self.second[var]])
+
+    def test_csv_writer(self):
+        dest = os.path.join(self.clsFolder, 'test.csv')
+        writer = CsvSoundingWriter(dest, delimiter=',', format_type='xyzhv')
+        writer.write(self.first)
+        writer.write(self.second)
+        writer.close()
+
+        with open(dest, 'r') as csvfile:
+            assert csvfile.readline().strip() == 'easting,northing,depth,horizontal_uncertainty,vertical_uncertainty'
+        data = np.loadtxt(dest, delimiter=',', skiprows=1)
+        assert data.shape == (80, 5)
+        for cnt, var in enumerate(['x', 'y', 'z', 'thu', 'tvu']):
+            assert np.allclose(data[:, cnt], np.round(self._expected(var), 3))
+
+    def test_csv_writer_xyz(self):
+        dest = os.path.join(self.clsFolder, 'test_xyz.csv')
+        writer = CsvSoundingWriter(dest)
+        writer.write(self.first)
+        writer.close()
+
+        data = np.loadtxt(dest, skiprows=1)
+        assert data.shape == (50, 3)
+        assert np.allclose(data[:, 2], np.round(self.first['z'], 3))
+
+    def test_las_writer(self):
+        dest = os.path.join(self.clsFolder, 'test.las')
+        writer = LasSoundingWriter(dest)
+        writer.write(self.first)
+        writer.write(self.second)
+        writer.close()
+
+        las = laspy.read(dest)
+        assert las.header.point_count == 80
+        assert np.allclose(las.x, self._expected('x'), atol=0.01)
+        assert np.allclose(las.y, self._expected('y'), atol=0.01)
+        assert np.allclose(las.z, self._expected('z'), atol=0.001)
+        expected_class = np.where(self._expected('classification') == 2, 7, 1)
+        assert np.array_equal(np.array(las.classification), expected_class)
+
+    @unittest.skipUnless(pyarrow_found, 'pyarrow not found')
+    def test_parquet_writer(self):
+        import pyarrow.parquet as pq
+
+        dest = os.path.join(self.clsFolder, 'test.parquet')
+        writer = ParquetSoundingWriter(dest)
+        writer.write(self.first)
+        writer.write(self.second)
+        writer.close()
+
+        pfile = pq.ParquetFile(dest)
+        assert pfile.metadata.num_row_groups == 2
+        table = pfile.read()
+        assert table.column_names == ['easting', 'northing', 'depth', 'horizontal_uncertainty', 'vertical_uncertainty',
+                                      'classification']
+        for var, colname in [('x', 'easting'), ('y', 'northing'), ('z', 'depth'), ('classification', 'classification')]:
+            assert np.array_equal(table.column(colname).to_numpy(), self._expected(var))
+
+    def test_split_by_identifiers(self):
+        identifiers = _split_by_identifiers(self.first)
+        assert [ident for ident, _ in identifiers] == [(0, 300000), (1, 300000)]
+        assert sum([mask.sum() for _, mask in identifiers]) == 50
+        identifiers = _split_by_identifiers(self.first, export_by_identifiers=False)
+        assert len(identifiers) == 1
+        assert identifiers[0][1].all()
@@ -132,6 +132,30 @@ class TestFilter(unittest.TestCase):
         new_status = self.fm.run_filter('filter_by_angle', save_to_disk=True, min_angle=-45, max_angle=45)
         assert np.count_nonzero(self.fm.fqpr.multibeam.raw_ping[0].detectioninfo == kluster_variables.rejected_flag) == expected_rejected_count
 
+    def test_filter_by_angle_by_chunk(self):
+        self._reset_filter()
+        expected_status = self.fm.run_filter('filter_by_angle', save_to_disk=False, min_angle=-45, max_angle=45)
+        assert self.fm.return_filter_class('filter_by_angle').supports_chunks
+        assert not self.fm.return_filter_class(self.test_filter).supports_chunks
+        # saving the whole dataset with run_by_chunk runs the filter chunk by chunk, nothing is returned
+        assert self.fm.run_filter('filter_by_angle', save_to_disk=True, run_by_chunk=True, min_angle=-45, max_angle=45) is None
+        assert np.array_equal(self.fm.fqpr.multibeam.raw_ping[0].detectioninfo.values, expected_status[0])
+        # running again does not change any chunks
+        generation = self.fm.fqpr.sounding_generation
+        self.fm.run_filter('filter_by_angle', save_to_disk=True, run_by_chunk=True, min_angle=-45, max_angle=45)
+        assert self.fm.fqpr.sounding_generation == generation
+        # by default the filter is run on the whole dataset and the new status is returned
+        new_status = self.fm.run_filter('filter_by_angle', save_to_disk=True, min_angle=-45, max_angle=45)
+        assert np.array_equal(new_status[0], expected_status[0])
+
+    def test_filter_chunk_kernel(self):
+        chunk = self.fm.fqpr.multibeam.raw_ping[0].isel(time=slice(0, 5))
+        kernel = self.fm.return_filter_class('reject_all')._run_chunk_algorithm
+        new_detect = filter.distrib_run_filter_chunk([kernel, chunk, {}])
+        assert new_detect.shape == chunk.detectioninfo.shape
+        assert (new_detect == kluster_variables.rejected_flag).all()
+        assert filter.distrib_run_filter_chunk([lambda chnk: chnk.detectioninfo.values, chunk, {}]) is None
+
     def test_filter_by_angle_selectedindex(self):
         self._reset_filter()
         selindex = np.zeros(self.fm.fqpr.multibeam.raw_ping[0].detectioninfo.values.flatten().shape, dtype=bool)
@@ -220,6 +220,19 @@ class TestGeoReference(unittest.TestCase):
         assert lat == pytest.approx(43.12339782714844, abs=0.00000001)
         assert lon == pytest.approx(-73.12294006347656, abs=0.00000001)
 
+    def test_geohash_vectorized(self):
+        lats = np.array([[43.123456789, -33.9, np.nan], [89.99, -89.99, 0.0]])
+        lons = np.array([[-73.123456789, 151.2, -73.0], [179.99, -180.0, 0.0]])
+        newhash_vector = compute_geohash(lats, lons, precision=7)
+        assert newhash_vector.dtype == np.dtype('S7')
+        assert newhash_vector.shape == (2, 3)
+        assert newhash_vector[0, 2] == b' ' * 7
+        for lat, lon, ghash in zip(lats.ravel(), lons.ravel(), newhash_vector.ravel()):
+            assert ghash == new_geohash(lat, lon, precision=7)
+        lat, lon = decode_geohash(newhash_vector[1])
+        for cnt, ghash in enumerate(newhash_vector[1]):
+            assert (lat[cnt], lon[cnt]) == decode_geohash(ghash)
+
     def test_geohash_polygon(self):
         polygon_test = np.array([[-70.1810536, 42.0519741], [-70.178872, 42.0501041], [-70.1813097, 42.0471989],
                                  [-70.1835136, 42.0490578], [-70.1810536, 42.0519741]])
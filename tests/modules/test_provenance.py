@@ -0,0 +1,57 @@
+import unittest
+import numpy as np
+from datetime import datetime
+
+from HSTB.kluster.modules.provenance import *
+
+
+class TestProvenance(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.xyzrph = {'tx_port_x': {'1495563079': 0.0, '1495600000': 0.1}, 'waterline': {'1495563079': -0.5}}
+        self.times = np.array([100.0, 101.0, 102.0, 103.0, 104.0, 105.0])
+
+    def test_return_xyzrph_identifier(self):
+        ident = return_xyzrph_identifier(self.xyzrph, '1495563079')
+        assert ident.startswith('1495563079_')
+        assert ident == return_xyzrph_identifier(self.xyzrph, 1495563079)
+        assert ident != return_xyzrph_identifier(self.xyzrph, '1495600000')
+        self.xyzrph['waterline']['1495563079'] = -0.6
+        assert ident != return_xyzrph_identifier(self.xyzrph, '1495563079')
+
+    def test_return_navigation_identifier(self):
+        nav_files = {'sbet_two.out': [200.0, 300.0], 'sbet_one.out': [50.0, 150.0]}
+        assert return_navigation_identifier(nav_files, 100.0, 120.0) == 'sbet: sbet_one.out'
+        assert return_navigation_identifier(nav_files, 140.0, 210.0) == 'sbet: sbet_one.out, sbet_two.out'
+        assert return_navigation_identifier(nav_files, 400.0, 410.0) == 'sbet: '
+
+    def test_merge_provenance_records(self):
+        existing = [[100.0, 102.0, {'cast': 'a'}], [103.0, 105.0, {'cast': 'a'}]]
+        merged = merge_provenance_records(existing, [[103.0, 105.0, {'cast': 'b'}]])
+        assert merged == [[100.0, 102.0, {'cast': 'a'}], [103.0, 105.0, {'cast': 'b'}]]
+        # partially covered records are retained, the new record takes precedence
+        merged = merge_provenance_records(merged, [[101.0, 103.0, {'cast': 'c'}]])
+        assert len(merged) == 3
+        assert merged[-1] == [101.0, 103.0, {'cast': 'c'}]
+
+    def test_return_record_index(self):
+        records = [[100.0, 102.0, {'cast': 'a'}], [103.0, 105.0, {'cast': 'b'}], [102.0, 103.0, {'cast': 'c'}]]
+        assert return_record_index(self.times, records).tolist() == [0, 0, 2, 2, 1, 1]
+        assert return_record_index(self.times, records[:1]).tolist() == [0, 0, 0, -1, -1, -1]
+        assert return_record_index(self.times, []).tolist() == [-1] * 6
+
+    def test_return_time_ranges_from_mask(self):
+        mask = np.array([True, True, False, False, True, True])
+        assert return_time_ranges_from_mask(self.times, mask) == [[100.0, 101.0], [104.0, 105.0]]
+        assert return_time_ranges_from_mask(self.times, np.zeros(6, dtype=bool)) == []
+        assert return_time_ranges_from_mask(self.times, np.ones(6, dtype=bool)) == [[100.0, 105.0]]
+
+    def test_return_changed_lines(self):
+        line_times = {'line1.all': [100.0, 102.0], 'line2.all': [103.0, 105.0]}
+        records = [[100.0, 105.0, {'generation': 1, 'time': 'Mon Oct  3 12:00:00 2022'}],
+                   [104.0, 104.0, {'generation': 2, 'time': 'Tue Oct  4 12:00:00 2022'}]]
+        assert return_changed_lines(line_times, records, datetime(2022, 10, 1)) == ['line1.all', 'line2.all']
+        assert return_changed_lines(line_times, records, datetime(2022, 10, 3, 18)) == ['line2.all']
+        assert return_changed_lines(line_times, records, {'line1.all': datetime(2022, 10, 1)}) == ['line1.all']
+        assert return_changed_lines(line_times, [], datetime(2022, 10, 1)) == []
+
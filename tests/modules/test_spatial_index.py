@@ -0,0 +1,75 @@
+import os
+import unittest
+import tempfile
+import numpy as np
+
+from HSTB.kluster.modules.spatial_index import *
+
+
+class TestSpatialIndex(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.geohash = np.array([[b'drqp4yz', b'drqp4yx', b'       '],
+                                 [b'drqp4yz', b'drqp4yz', b'drqp4yx'],
+                                 [b'drqp5nb', b'drqp5nb', b'drqp5nb'],
+                                 [b'drqp4yz', b'drqp5nb', b'       ']], dtype='S7')
+        self.times = np.array([100.0, 101.0, 102.0, 103.0])
+
+    def test_build_ping_ranges(self):
+        cells, start_times, end_times = build_ping_ranges(self.geohash, self.times)
+        ranges = sorted(zip(cells.tolist(), start_times.tolist(), end_times.tolist()))
+        assert ranges == [(b'drqp4yx', 100.0, 101.0), (b'drqp4yz', 100.0, 101.0), (b'drqp4yz', 103.0, 103.0),
+                          (b'drqp5nb', 102.0, 103.0)]
+
+    def test_build_ping_ranges_empty(self):
+        cells, start_times, end_times = build_ping_ranges(np.full((2, 2), b' ' * 7, dtype='S7'), self.times[:2])
+        assert cells.size == 0
+        assert start_times.size == 0
+        assert end_times.size == 0
+
+    def test_merge_time_ranges(self):
+        assert merge_time_ranges(np.array([5.0, 1.0, 2.0, 8.0]), np.array([6.0, 3.0, 4.0, 9.0])) == [[1.0, 4.0], [5.0, 6.0], [8.0, 9.0]]
+        assert merge_time_ranges(np.array([]), np.array([])) == []
+
+    def test_spatial_index_query(self):
+        sindex = SpatialIndex()
+        sindex.update_line('line_one', self.geohash, self.times)
+        sindex.update_line('line_two', self.geohash[2:], self.times[2:] + 100)
+        assert sindex.line_names == ['line_one', 'line_two']
+        assert sindex.query([b'drqp4yz']) == {'line_one': [[100.0, 101.0], [103.0, 103.0]], 'line_two': [[203.0, 203.0]]}
+        assert sindex.query([b'drqp4yx', b'drqp5nb']) == {'line_one': [[100.0, 101.0], [102.0, 103.0]], 'line_two': [[202.0, 203.0]]}
+        assert sindex.query([b'drqp000']) == {}
+        # replacing a line removes the old entries
+        sindex.update_line('line_one', self.geohash[2:3], self.times[2:3])
+        assert sindex.query([b'drqp4yz']) == {'line_two': [[203.0, 203.0]]}
+
+    def test_spatial_index_save_load(self):
+        index_path = return_spatial_index_path(tempfile.gettempdir(), '123')
+        assert os.path.split(index_path)[1] == 'spatial_index_123.npz'
+        sindex = SpatialIndex(index_path)
+        sindex.update_line('line_one', self.geohash, self.times)
+        sindex.save()
+        assert sindex.is_current()
+        reloaded = SpatialIndex(index_path)
+        assert reloaded.line_names == ['line_one']
+        assert reloaded.query([b'drqp5nb']) == sindex.query([b'drqp5nb'])
+        reloaded.remove_lines(['line_one'])
+        assert reloaded.query([b'drqp5nb']) == {}
+        os.remove(index_path)
+
+    def test_return_line_extents(self):
+        assert return_line_extents([100.0, 200.0]) is None
+        assert return_line_extents([100.0, 200.0, 47.1, -122.3, 47.0, -122.5, 90.0, 1000]) is None
+        assert return_line_extents([100.0, 200.0, 47.1, -122.3, 47.0, -122.5, 90.0, 1000, 46.9, 47.2, -122.6, -122.2]) == [46.9, 47.2, -122.6, -122.2]
+
+    def test_line_extent_index(self):
+        lindex = LineExtentIndex()
+        lindex.update_lines({'line_one': [47.0, 47.1, -122.5, -122.3], 'line_two': [47.0, 47.1, -122.25, -122.2],
+                             'line_three': [46.0, 46.1, -122.5, -122.3], 'line_four': None})
+        assert len(lindex) == 3
+        assert lindex.query(46.9, 47.2, -122.6, -122.1) == ['line_one', 'line_two']
+        assert lindex.query(46.9, 47.2, -122.6, -122.25) == ['line_one']  # line two is not completely within the box
+        assert lindex.query(46.9, 47.2, -122.6, -122.25, contained=False) == ['line_one', 'line_two']
+        assert lindex.query(0, 1, 0, 1) == []
+        lindex.remove_lines(['line_one'])
+        assert lindex.query(45.0, 48.0, -123.0, -122.0) == ['line_three', 'line_two']
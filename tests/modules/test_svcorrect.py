@@ -2,8 +2,9 @@ import json
 import unittest
 import xarray as xr
 import numpy as np
+from pytest import approx
 
-from HSTB.kluster.modules.svcorrect import run_ray_trace_v2
+from HSTB.kluster.modules.svcorrect import run_ray_trace_v2, run_ray_trace_by_ssv
 try:  # when running from pycharm console
     from kluster.tests.test_datasets import RealFqpr, load_dataset
     from kluster.tests.modules.module_test_arrays import expected_beam_azimuth, expected_corrected_beam_angles, \
@@ -39,3 +40,49 @@ class TestSvCorrect(unittest.TestCase):
         assert np.array_equal(alongtrack, expected_alongtrack)
         assert np.array_equal(acrosstrack, expected_acrosstrack)
         assert np.array_equal(depth, expected_depth)
+
+    def test_svcorrect_compiled_matches_by_ssv(self):
+        cast = [[0.0, 5.0, 20.0, 100.0, 500.0, 1000.0], [1500.0, 1499.0, 1495.0, 1485.0, 1480.0, 1483.0]]
+        times = np.arange(4)
+        beams = np.arange(5)
+        angles = np.deg2rad(np.tile(np.array([-60.0, -30.0, 0.0, 30.0, 60.0]), (4, 1)))
+        beam_angle = xr.DataArray(angles, dims=['time', 'beam'], coords={'time': times, 'beam': beams})
+        beam_azimuth = xr.DataArray(np.where(angles < 0, 3 * np.pi / 2, np.pi / 2), dims=['time', 'beam'],
+                                    coords={'time': times, 'beam': beams})
+        traveltime = xr.DataArray(2 * 400 / np.cos(angles) / 1490, dims=['time', 'beam'], coords={'time': times, 'beam': beams})
+        # a single surface sound speed value, so both methods process the same cast
+        surface_ss = xr.DataArray(np.full(4, 1500.5), dims=['time'], coords={'time': times})
+        additional_offsets = [np.zeros((4, 5)), np.zeros((4, 5)), np.zeros((4, 5))]
+
+        compiled = run_ray_trace_v2(cast, beam_azimuth, beam_angle, traveltime, surface_ss, 2.0, additional_offsets)
+        by_ssv = run_ray_trace_by_ssv(cast, beam_azimuth, beam_angle, traveltime, surface_ss, 2.0, additional_offsets)
+        for comp, orig in zip(compiled, by_ssv):
+            assert comp.values == approx(orig.values, abs=0.002)
+        # nadir beam has no acrosstrack and the outer beams are symmetric
+        assert compiled[1].values[0, 2] == 0.0
+        assert compiled[1].values[0, 0] == approx(-compiled[1].values[0, 4], abs=0.001)
+
+    def test_svcorrect_compiled_matches_by_ssv_multiple_ssv(self):
+        cast = [[0.0, 5.0, 20.0, 100.0, 500.0, 1000.0], [1500.0, 1499.0, 1495.0, 1485.0, 1480.0, 1483.0]]
+        times = np.arange(6)
+        beams = np.arange(5)
+        angles = np.deg2rad(np.tile(np.array([-60.0, -30.0, 0.0, 30.0, 60.0]), (6, 1)))
+        beam_angle = xr.DataArray(angles, dims=['time', 'beam'], coords={'time': times, 'beam': beams})
+        beam_azimuth = xr.DataArray(np.where(angles < 0, 3 * np.pi / 2, np.pi / 2), dims=['time', 'beam'],
+                                    coords={'time': times, 'beam': beams})
+        traveltime = xr.DataArray(2 * 400 / np.cos(angles) / 1490, dims=['time', 'beam'], coords={'time': times, 'beam': beams})
+        # the first ssv value matches the top of the cast, so the duplicate top layer is dropped for that ssv value only
+        surface_ss = xr.DataArray(np.array([1500.0, 1500.0, 1503.0, 1510.0, 1505.2, 1510.0]), dims=['time'], coords={'time': times})
+        additional_offsets = [np.zeros((6, 5)), np.zeros((6, 5)), np.zeros((6, 5))]
+
+        compiled = run_ray_trace_v2(cast, beam_azimuth, beam_angle, traveltime, surface_ss, 2.0, additional_offsets)
+        by_ssv = run_ray_trace_by_ssv(cast, beam_azimuth, beam_angle, traveltime, surface_ss, 2.0, additional_offsets)
+        for comp, orig in zip(compiled, by_ssv):
+            assert comp.values == approx(orig.values, abs=0.002)
+        # each ssv value is traced on its own, the same as tracing the pings with that ssv value alone
+        for ssv in np.unique(surface_ss.values):
+            idx = np.where(surface_ss.values == ssv)[0]
+            single = run_ray_trace_by_ssv(cast, beam_azimuth[idx], beam_angle[idx], traveltime[idx], surface_ss[idx], 2.0,
+                                          [off[idx] for off in additional_offsets])
+            for sngl, orig in zip(single, by_ssv):
+                assert np.array_equal(sngl.values, orig.values[idx])
@@ -0,0 +1,65 @@
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+import unittest
+import numpy as np
+
+from HSTB.kluster.benchmark import run_benchmark_suite, benchmark_ray_trace, load_benchmark_results, \
+    compare_benchmark_results, processing_stages
+
+
+class TestBenchmark(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.clsFolder = os.path.join(tempfile.gettempdir(), 'TestBenchmark')
+        try:
+            os.mkdir(cls.clsFolder)
+        except FileExistsError:
+            shutil.rmtree(cls.clsFolder)
+            os.mkdir(cls.clsFolder)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        shutil.rmtree(cls.clsFolder)
+
+    def test_benchmark_ray_trace(self):
+        for number_of_ssv in [1, 3]:
+            result = benchmark_ray_trace(number_of_pings=10, number_of_beams=8, number_of_ssv=number_of_ssv, repeat=1)
+            assert result['number_of_ssv'] == number_of_ssv
+            assert result['compiled_seconds'] >= 0
+            assert result['numpy_seconds'] >= 0
+            for ky in ['alongtrack', 'acrosstrack', 'depthoffset']:
+                assert result['max_difference'][ky] < 0.001
+
+    def test_run_benchmark_suite(self):
+        output_file = os.path.join(self.clsFolder, 'benchmark.json')
+        benchmark = run_benchmark_suite(number_of_pings=20, number_of_beams=8, number_of_heads=2, pings_per_chunk=10,
+                                        repeat=1, use_cluster=False, output_file=output_file)
+        assert list(benchmark['results'].keys()) == ['serial']
+        assert list(benchmark['results']['serial'].keys()) == list(processing_stages)
+        for stage_result in benchmark['results']['serial'].values():
+            assert stage_result['seconds'] >= 0
+            assert stage_result['soundings_per_second'] > 0
+        loaded = load_benchmark_results(output_file)
+        assert loaded['settings'] == benchmark['settings']
+        assert np.isclose(loaded['results']['serial']['ray_trace']['seconds'], benchmark['results']['serial']['ray_trace']['seconds'])
+
+        comparison = compare_benchmark_results(loaded, benchmark)
+        assert comparison['settings_match']
+        assert not any([stage['regression'] for stage in comparison['serial'].values()])
+
+    def test_benchmark_script(self):
+        output_file = os.path.join(self.clsFolder, 'benchmark_script.json')
+        cmd = [sys.executable, '-m', 'HSTB.kluster.benchmark', '-p', '20', '-b', '8', '-c', '10', '-r', '1', '--no-cluster',
+               '-o', output_file]
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        assert proc.returncode == 0, proc.stderr
+        assert os.path.exists(output_file)
+        assert 'serial ray_trace' in proc.stdout
+        # timings vary from run to run, exit code 1 (a regression against the baseline) is also a complete run
+        proc = subprocess.run(cmd[:-2] + ['--compare', output_file], capture_output=True, text=True)
+        assert proc.returncode in [0, 1], proc.stderr
+        assert 'x baseline' in proc.stdout
@@ -0,0 +1,53 @@
+import os
+import unittest
+import tempfile
+import numpy as np
+
+from HSTB.kluster.dask_helpers import measure_peak_memory, return_memory_profile, update_memory_profile, return_memory_profile_path, \
+    determine_optimal_chunks
+
+
+class FakeClient:
+    """
+    Only provides the scheduler_info that determine_optimal_chunks needs
+    """
+
+    def __init__(self, nworkers: int, memory_limit: int, nthreads: int):
+        self.workers = {f'tcp://127.0.0.1:{cnt}': {'memory_limit': memory_limit, 'nthreads': nthreads} for cnt in range(nworkers)}
+
+    def scheduler_info(self):
+        return {'workers': self.workers}
+
+
+class TestDaskHelpers(unittest.TestCase):
+
+    def test_measure_peak_memory(self):
+        data = np.ones(1000, dtype=np.float64)
+        result, peak_memory = measure_peak_memory(lambda x: (x * 2).sum(), data)
+        assert result == 2000
+        # at least the input array and the temporary doubled array
+        assert peak_memory >= 2 * data.nbytes
+
+    def test_memory_profile(self):
+        profile_file = os.path.join(tempfile.mkdtemp(), 'memory_profile.json')
+        assert return_memory_profile('em2040', 'sv_corr', profile_file) is None
+        assert update_memory_profile('em2040', 'sv_corr', 100.0, profile_file) == 100.0
+        # keeps the larger value
+        assert update_memory_profile('em2040', 'sv_corr', 50.0, profile_file) == 100.0
+        assert update_memory_profile('em2040', 'georef', 200.0, profile_file) == 200.0
+        assert return_memory_profile('em2040', 'sv_corr', profile_file) == 100.0
+        assert return_memory_profile('em2040', 'georef', profile_file) == 200.0
+        assert return_memory_profile('em710', 'sv_corr', profile_file) is None
+        assert return_memory_profile('em2040', 'sv_corr', None) is None
+        assert return_memory_profile_path(os.path.dirname(profile_file)) == profile_file
+
+    def test_determine_optimal_chunks(self):
+        # 4 workers, 2 threads, 4GB each, 3000 pings * 400 beams * 1000 bytes = 1.2GB per base chunk
+        client = FakeClient(4, 4 * 1024 ** 3, 2)
+        assert determine_optimal_chunks(client, 400, 1000, 3000, max_chunk_multiple=4) == (6000, 4)
+        # small memory use, chunks grow to the max multiple and every thread gets a chunk
+        assert determine_optimal_chunks(client, 400, 10, 3000, max_chunk_multiple=4) == (12000, 8)
+        # small dataset, keep the base chunk size so that all the worker threads are used
+        assert determine_optimal_chunks(client, 400, 10, 3000, total_pings=20000, max_chunk_multiple=4) == (3000, 8)
+        # dual head data with large memory use, a single base chunk per worker
+        assert determine_optimal_chunks(client, 800, 2000, 3000, max_chunk_multiple=4) == (3000, 4)
@@ -2,10 +2,15 @@ import os
 import shutil
 import unittest
 import numpy as np
+import xarray as xr
 import tempfile
+from unittest import mock
 
 from HSTB.drivers import par3
-from HSTB.kluster.fqpr_convenience import convert_multibeam, reload_data, process_multibeam, reprocess_sounding_selection, generate_new_surface
+from HSTB.kluster.dask_helpers import dask_find_or_start_client
+from HSTB.kluster.fqpr_convenience import convert_multibeam, reload_data, process_multibeam, reprocess_sounding_selection, \
+    generate_new_surface, return_avg_tables
+from HSTB.kluster.modules.backscatter import generate_avg_corrector, accumulate_avg_bins, return_avg_bins
 
 
 class TestFqprConvenience(unittest.TestCase):
@@ -138,6 +143,60 @@ class TestFqprConvenience(unittest.TestCase):
         assert float(z[0][0]) == 53.2859992980957
         assert float(z[0][399]) == 111.13099670410156
 
+    def test_reprocess_sounding_selection_chunk_plan(self):
+        # each process reads the in memory results of the previous process chunk for chunk, the chunk planner must not
+        #  give each process its own chunks
+        fqpr_copy = self.out.copy()
+        fqpr_copy.multibeam.xyzrph['rx_r']['1495563079'] = 10
+        if fqpr_copy.client is None:
+            fqpr_copy.client = dask_find_or_start_client(silent=True)
+        plans = [(50, 4), (100, 4), (150, 4), (200, 4)] * 4
+        with mock.patch('HSTB.kluster.fqpr_generation.return_memory_profile', return_value=1000.0), \
+                mock.patch('HSTB.kluster.fqpr_generation.determine_optimal_chunks', side_effect=plans) as planner:
+            newout, soundings = reprocess_sounding_selection(fqpr_copy, georeference=True, turn_off_dask=False)
+        assert not planner.called
+        chunk_lengths = [[d[1] for d in newout.intermediate_dat['40111'][mode]['1495563079']] for mode in ['orientation', 'bpv', 'sv_corr', 'georef']]
+        assert all([lengths == chunk_lengths[0] for lengths in chunk_lengths])
+        georef = [d[0].result() if hasattr(d[0], 'result') else d[0] for d in newout.intermediate_dat['40111']['georef']['1495563079']]
+        z = np.concatenate([d[2] for d in georef])
+        assert float(z[0][0]) == 53.2859992980957
+        assert float(z[0][399]) == 111.13099670410156
+
+    def test_return_avg_tables_all_lines(self):
+        linename = '0009_20170523_181119_FA2806.all'
+        fq = self.out.copy()
+        fq.process_backscatter()
+        line_table = return_avg_tables([fq], avg_line=linename)[0]
+        # with a single line, the all lines corrector is the corrector for that line, with or without weighting
+        for weight_by_line in [False, True]:
+            all_table = return_avg_tables([fq], avg_all_lines=True, avg_weight_by_line=weight_by_line)[0]
+            assert list(all_table.keys()) == list(line_table.keys())
+            assert np.allclose(list(all_table.values()), list(line_table.values()), atol=1e-4)
+
+        # a second, shorter line from the first 20 seconds of the line
+        fq_short = fq.copy()
+        starttime = float(fq_short.multibeam.raw_ping[0].time[0])
+        fq_short.subset_by_time(starttime, starttime + 20)
+        bins = return_avg_bins(1.0)
+        bscatter, bangle, line_tables, line_counts = [], [], [], []
+        for f in [fq, fq_short]:
+            bscatter.append(xr.concat([rp.backscatter for rp in f.multibeam.raw_ping], dim='time'))
+            bangle.append(xr.concat([np.rad2deg(rp.corr_pointing_angle) for rp in f.multibeam.raw_ping], dim='time'))
+            line_tables.append(np.array([float(v) for v in generate_avg_corrector(bscatter[-1], bangle[-1], 1.0, 45).values()]))
+            line_counts.append(accumulate_avg_bins(bscatter[-1], bangle[-1], bins)[1])
+
+        # each sounding weighted equally, same as the corrector for the soundings of both lines together
+        all_table = return_avg_tables([fq, fq_short], avg_all_lines=True)[0]
+        expected = generate_avg_corrector(np.concatenate([b.values.ravel() for b in bscatter]),
+                                          np.concatenate([a.values.ravel() for a in bangle]), 1.0, 45)
+        assert np.allclose(list(all_table.values()), [float(v) for v in expected.values()], atol=1e-4)
+
+        # each line weighted equally, the mean of the two line correctors where both lines have soundings
+        weighted_table = np.array(list(return_avg_tables([fq, fq_short], avg_all_lines=True, avg_weight_by_line=True)[0].values()))
+        in_both = (line_counts[0] > 0) & (line_counts[1] > 0)
+        assert in_both.any()
+        assert np.allclose(weighted_table[in_both], ((line_tables[0] + line_tables[1]) / 2)[in_both], atol=1e-4)
+
     def test_generate_new_surface_empty(self):
         bs = generate_new_surface()
         assert bs.data is None
@@ -1,6 +1,7 @@
 import os
 import shutil
 import logging
+from unittest import mock
 
 from HSTB.kluster.fqpr_convenience import process_multibeam, convert_multibeam, reload_data
 from HSTB.kluster.fqpr_generation import *
@@ -10,7 +11,7 @@ except ImportError:  # relative import as tests directory can vary in location d
     from .test_datasets import RealFqpr, RealDualheadFqpr, SyntheticFqpr, load_dataset
 
 from pytest import approx
-from datetime import datetime
+from datetime import datetime, timedelta
 import unittest
 import numpy as np
 import tempfile
@@ -141,6 +142,34 @@ class TestFqprGeneration(unittest.TestCase):
         assert rp.max_y == 5293236.823
         assert rp.max_z == 94.294
 
+    def test_process_testfile_fused(self):
+        """
+        Run conversion and fused processing on the test file, retaining only the gridding variables
+        """
+
+        linename = os.path.split(self.testfile)[1]
+        fused_path = tempfile.mkdtemp(dir=self.expected_output)
+        out = convert_multibeam(self.testfile, outfold=fused_path)
+        out = process_multibeam(out, coord_system='NAD83', fused=True, fused_output_variables=['x', 'y', 'z', 'tvu', 'thu', 'geohash'])
+        assert out.line_is_processed(linename)
+
+        rp = out.multibeam.raw_ping[0]
+        assert 'tx' not in rp
+        assert 'rel_azimuth' not in rp
+        assert 'depthoffset' not in rp
+        assert rp.current_processing_status == 5
+        assert '_total_uncertainty_complete' in rp.attrs
+
+        rp = rp.isel(time=0).isel(beam=0)
+        assert rp.processing_status.values == 5
+        assert rp.thu.values == approx(np.float32(8.10849), 0.0001)
+        assert rp.tvu.values == approx(np.float32(2.444148), 0.0001)
+        assert rp.x.values == approx(539028.450, 0.001)
+        assert rp.y.values == approx(5292783.977, 0.001)
+        assert rp.z.values == approx(np.float32(92.742), 0.001)
+        out.close()
+        shutil.rmtree(fused_path)
+
     def test_copy(self):
         self._access_processed_data()
         fqpr_copy = self.out.copy()
@@ -236,6 +265,42 @@ class TestFqprGeneration(unittest.TestCase):
         assert self.out.multibeam.chunk_size == (self.out.multibeam.raw_ping[0].beampointingangle.shape[0],
                                                  self.out.multibeam.raw_ping[0].beampointingangle.shape[1])
 
+    def test_return_chunks_per_run(self):
+        fq = Fqpr(show_progress=False)
+        with mock.patch.object(kluster_variables, 'pipelined_runs', 2):
+            assert fq._return_chunks_per_run(3, 4) == 4  # all chunks fit in one run
+            assert fq._return_chunks_per_run(4, 4) == 4
+            assert fq._return_chunks_per_run(10, 4) == 2  # split across the two runs in flight
+            assert fq._return_chunks_per_run(10, 5) == 3
+            assert fq._return_chunks_per_run(10, 1) == 1
+        with mock.patch.object(kluster_variables, 'pipelined_runs', 1):
+            assert fq._return_chunks_per_run(10, 4) == 4
+
+    def test_submit_data_to_cluster_pipelined(self):
+        # no client, so the chunks are processed locally, in the same order as they would be on the cluster
+        fq = Fqpr(show_progress=False)
+        rawping = mock.Mock(system_identifier='40111', attrs={'sonartype': 'em2040'})
+        fq.intermediate_dat = {'40111': {'tpu': {'1495563079': []}}}
+        idx_by_chunk = [np.arange(cnt * 10, cnt * 10 + 10) for cnt in range(7)]
+        events = []
+
+        def _load_chunks(ra, idx_subset, prefixes, timestmp, run_index, silent=False):
+            events.append(['load', [int(idx[0]) // 10 for idx in idx_subset]])
+            return [run_index + cnt for cnt in range(len(idx_subset))]
+
+        def _write_run(mode, sys_ident, timestmp, skip_dask=False):
+            events.append(['write', [dat[0] for dat in fq.intermediate_dat[sys_ident][mode][timestmp]]])
+
+        with mock.patch.object(kluster_variables, 'pipelined_runs', 2), \
+                mock.patch('HSTB.kluster.fqpr_generation.distrib_run_calculate_tpu', side_effect=lambda dat: dat), \
+                mock.patch.object(fq, '_generate_chunks_tpu', side_effect=_load_chunks), \
+                mock.patch.object(fq, 'write_intermediate_futs_to_zarr', side_effect=_write_run):
+            fq._submit_data_to_cluster(rawping, 'tpu', idx_by_chunk, 4, '1495563079', 'tx_port')
+        # 4 chunks at a time split across 2 runs in flight, each run is written while the next run is loaded
+        assert events == [['load', [0, 1]], ['load', [2, 3]], ['write', [0, 1]], ['load', [4, 5]], ['write', [2, 3]],
+                          ['load', [6]], ['write', [4, 5]], ['write', [6]]]
+        assert fq.tpu_time_complete
+
     def test_return_total_soundings(self):
         self._access_processed_data()
         ts = self.out.return_total_soundings(min_time=1495563100, max_time=1495563130)
@@ -616,6 +681,27 @@ class TestFqprGeneration(unittest.TestCase):
         assert len(self.out.multibeam.raw_ping[0].time) == 216
         assert len(self.out.multibeam.raw_att.time) == 5302
 
+    def test_return_points_by_line(self):
+        self._access_processed_data()
+        points = self.out.subset.return_points_by_line('0009_20170523_181119_FA2806.all', ('x', 'y', 'z', 'tvu'))
+        dset = self.out.subset_variables_by_line(['x', 'y', 'z', 'tvu'], filter_by_detection=True)['0009_20170523_181119_FA2806.all']
+
+        assert points.dtype.names == ('x', 'y', 'z', 'tvu')
+        assert points.size == dset.z.size
+        assert np.allclose(points['z'], dset.z.values)
+        assert self.out.subset.return_points_by_line('notaline.all') is None
+
+    def test_record_sounding_changes(self):
+        self._access_processed_data()
+        rp = self.out.multibeam.raw_ping[0]
+        generation = self.out.sounding_generation
+        before = datetime.utcnow() - timedelta(seconds=1)  # change times are stored without the fractional seconds
+        self.out.record_sounding_changes(rp.system_identifier, [[float(rp.time[10]), float(rp.time[20])]])
+
+        assert self.out.sounding_generation == generation + 1
+        assert self.out.return_changed_lines(before) == ['0009_20170523_181119_FA2806.all']
+        assert self.out.return_changed_lines(datetime.utcnow() + timedelta(days=1)) == []
+
     def test_intersects(self):
         self._access_processed_data()
         assert self.out.intersects(5293000, 5330000, 538950, 539300, geographic=False)
@@ -3,6 +3,7 @@ import shutil
 import unittest
 from datetime import datetime, timezone
 import tempfile
+from unittest import mock
 
 from HSTB.kluster.fqpr_intelligence import FqprIntel
 from HSTB.kluster.fqpr_convenience import generate_new_surface
@@ -95,6 +96,43 @@ class TestFqprIntelligence(unittest.TestCase):
         assert self.fintel.multibeam_intel.file_name == {}
         assert self.fintel.multibeam_intel.matching_fqpr == {}
 
+    def test_intel_add_files(self):
+        results = self.fintel.add_files([self.testfile, self.testsv])
+        assert [res[0] for res in results] == ['multibeam', 'svp']
+        assert os.path.normpath(self.testfile) in self.fintel.file_info_cache
+        assert os.path.exists(os.path.join(self.tmpfolder, 'kluster_intel_cache.json'))
+
+        # re-adding after a clear uses the cached file information
+        cached_info = self.fintel.file_info_cache[os.path.normpath(self.testfile)][2]
+        self.fintel.clear()
+        updated_type, new_data, new_project = self.fintel.add_file(self.testfile)
+        assert updated_type == 'multibeam'
+        assert new_data['data_start_time_utc'] == cached_info['data_start_time_utc']
+
+        # the saved cache is reloaded with the same file information
+        cached_sv = self.fintel.file_info_cache[os.path.normpath(self.testsv)]
+        newintel = FqprIntel(self.proj)
+        newintel._load_file_info_cache()
+        assert newintel.file_info_cache[os.path.normpath(self.testfile)][2] == cached_info
+        assert newintel.file_info_cache[os.path.normpath(self.testsv)][2]['profiles'] == cached_sv[2]['profiles']
+        assert newintel.file_info_cache[os.path.normpath(self.testsv)][2]['time_utc'] == cached_sv[2]['time_utc']
+
+    def test_intel_add_files_failure(self):
+        orig_add_to_intel = self.fintel._add_to_intel
+
+        def _fail_multibeam(data, intel, data_type):
+            if data_type == 'multibeam':
+                raise ValueError('failed to add')
+            return orig_add_to_intel(data, intel, data_type)
+
+        with mock.patch.object(self.fintel, '_add_to_intel', side_effect=_fail_multibeam):
+            results = self.fintel.add_files([self.testfile, self.testsv])
+        # the failed file is skipped, the rest of the batch is still added
+        assert [res[0] for res in results] == ['', 'svp']
+        assert results[0][1] is None
+        assert self.fintel.multibeam_intel.file_name == {}
+        assert self.fintel.svp_intel.file_name == {os.path.normpath(self.testsv): self.svname}
+
     def test_intel_add_sv(self):
         updated_type, new_data, new_project = self.fintel.add_file(self.testsv)
         assert updated_type == 'svp'
@@ -126,6 +126,17 @@ class TestFqprProject(unittest.TestCase):
         assert lat.size == 216
         assert lon.size == 216
 
+    def test_build_line_extents(self):
+        linename = '0009_20170523_181119_FA2806.all'
+        expected = list(self.out.line_attributes(linename)[8:12])
+        for rp in self.out.multibeam.raw_ping:  # line attributes from before Kluster 1.1.8, no extents
+            rp.attrs['multibeam_files'] = {lname: lattrs[:8] for lname, lattrs in rp.attrs['multibeam_files'].items()}
+        relpath, alreadyin = self.project.add_fqpr(self.out)
+        assert self.out.line_attributes(linename)[8:12] == approx(expected)
+        assert self.project.line_extent_index.extents[linename] == approx(expected)
+        assert not self.out.build_line_extents()
+        assert ['0009_20170523_181119_FA2806.all'] == self.project.return_lines_in_box(47, 48, -123, -122)
+
     def test_return_lines_in_box(self):
         relpath, alreadyin = self.project.add_fqpr(self.out)
         assert not self.project.return_lines_in_box(0, 1, 0, 1)
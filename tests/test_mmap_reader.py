@@ -0,0 +1,105 @@
+import os
+import struct
+import tempfile
+import unittest
+import numpy as np
+
+from HSTB.kluster.mmap_reader import MmapAllFile, all_attitude_type, all_position_type, \
+    all_rangeangle_type, index_multibeam_file, return_datagram_index, load_sidecar, save_sidecar, return_sidecar_path, \
+    return_ping_start_end_time, kmall_mrz_type
+
+
+def _build_datagram(dtype: int, date: int, ms: int, counter: int, body: bytes):
+    header = struct.pack('<BBHIIHH', 2, dtype, 2040, date, ms, counter, 40111)
+    payload = header + body + struct.pack('<BH', 3, 0)
+    return struct.pack('<I', len(payload)) + payload
+
+
+def _build_test_file(pth: str):
+    att_body = struct.pack('<H', 2) + struct.pack('<HHhhhH', 0, 0, 150, -200, 12, 9000) + \
+        struct.pack('<HHhhhH', 10, 0, 160, -210, 13, 9010) + struct.pack('<B', 0)
+    pos_body = struct.pack('<iiHHHHBB', int(45.5 * 20000000), int(-70.25 * 10000000), 0, 0, 0, 0, 0, 0)
+    tx = struct.pack('<hHfffHBBf', 125, 0, 0.001, 0.0002, 300000.0, 0, 0, 0, 0.0) + \
+        struct.pack('<hHfffHBBf', -75, 0, 0.001, 0.0004, 310000.0, 0, 0, 1, 0.0)
+    rx = struct.pack('<hBBHBbfhbB', 6000, 0, 0, 0, 10, 0, 0.05, -250, 0, 0) + \
+        struct.pack('<hBBHBbfhbB', -6000, 1, 0, 0, 11, 0, 0.06, -260, 0, 0)
+    rng_body = struct.pack('<HHHfi', 15000, 2, 2, 50000.0, 0) + tx + rx
+    with open(pth, 'wb') as fil:
+        fil.write(b'\x00\x01\x02')  # junk bytes, reader must skip to the first valid datagram
+        fil.write(_build_datagram(all_attitude_type, 20170523, 1000, 1, att_body))
+        fil.write(_build_datagram(all_position_type, 20170523, 1020, 2, pos_body))
+        fil.write(_build_datagram(all_rangeangle_type, 20170523, 1040, 3, rng_body))
+
+
+def _build_kmall_datagram(dtype: bytes, sec: int, nanosec: int, body: bytes):
+    size = 20 + len(body) + 4
+    return struct.pack('<I4sBBHII', size, dtype, 0, 0, 2040, sec, nanosec) + body + struct.pack('<I', size)
+
+
+class TestMmapReader(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.mkdtemp()
+        self.testfile = os.path.join(self.tmpdir, 'test.all')
+        _build_test_file(self.testfile)
+
+    def tearDown(self) -> None:
+        for fil in os.listdir(self.tmpdir):
+            os.remove(os.path.join(self.tmpdir, fil))
+        os.rmdir(self.tmpdir)
+
+    def test_index(self):
+        with MmapAllFile(self.testfile) as mf:
+            idx = mf.index()
+            assert list(idx['type']) == [all_attitude_type, all_position_type, all_rangeangle_type]
+            assert idx['offset'][0] == 3
+            assert idx['time'][0] == 1495497601.0
+            # only datagrams that start within the pointers are returned
+            assert list(mf.index(idx['offset'][1], idx['offset'][2])['type']) == [all_position_type]
+
+    def test_index_kmall(self):
+        kmall_file = os.path.join(self.tmpdir, 'test.kmall')
+        with open(kmall_file, 'wb') as fil:
+            fil.write(_build_kmall_datagram(b'#SKM', 1495497601, 0, b'\x00' * 12))
+            fil.write(_build_kmall_datagram(b'#MRZ', 1495497602, 500000000, struct.pack('<HHHH', 1, 1, 12, 57)))
+        idx = index_multibeam_file(kmall_file)
+        assert idx.size == 2
+        assert idx['type'][1] == kmall_mrz_type
+        assert idx['time'][1] == 1495497602.5
+        assert idx['counter'][1] == 57
+        assert return_ping_start_end_time(idx, '.kmall') == [1495497602.5, 1495497602.5]
+
+    def test_sidecar(self):
+        idx = return_datagram_index(self.testfile)
+        assert os.path.exists(return_sidecar_path(self.testfile))
+        assert idx.size == 3
+        save_sidecar(self.testfile, metadata={'mtype': 'kongsberg_all'})
+        cached_idx, metadata = load_sidecar(self.testfile)
+        assert np.array_equal(cached_idx, idx)
+        assert metadata == {'mtype': 'kongsberg_all'}
+        assert return_ping_start_end_time(cached_idx, '.all') == [1495497601.04, 1495497601.04]
+
+        # sidecar is invalidated when the file changes
+        with open(self.testfile, 'ab') as fil:
+            fil.write(b'\x00')
+        cached_idx, metadata = load_sidecar(self.testfile)
+        assert cached_idx is None
+        assert metadata == {}
+
+    def test_corrupt_sidecar(self):
+        idx = return_datagram_index(self.testfile)
+        sidecar_path = return_sidecar_path(self.testfile)
+        with open(sidecar_path, 'rb') as sfile:
+            sidecar_bytes = sfile.read()
+        for corrupt in [b'', sidecar_bytes[:len(sidecar_bytes) // 2], b'not a sidecar']:
+            with open(sidecar_path, 'wb') as sfile:
+                sfile.write(corrupt)
+            cached_idx, metadata = load_sidecar(self.testfile)
+            assert cached_idx is None
+            assert metadata == {}
+            # rebuilt and the corrupt sidecar overwritten
+            assert np.array_equal(return_datagram_index(self.testfile), idx)
+            cached_idx, _ = load_sidecar(self.testfile)
+            assert np.array_equal(cached_idx, idx)
+        # no temporary files are left behind
+        assert [fil for fil in os.listdir(os.path.dirname(sidecar_path)) if fil.endswith('.tmp')] == []
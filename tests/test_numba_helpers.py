@@ -1,7 +1,7 @@
 import numpy as np
 import unittest
 
-from HSTB.kluster.numba_helpers import bin2d, bin1d, hist2d_numba_seq
+from HSTB.kluster.numba_helpers import bin2d, bin1d, hist2d_numba_seq, format_fixed_point
 
 
 class TestNumbaHelper(unittest.TestCase):
@@ -25,3 +25,8 @@ class TestNumbaHelper(unittest.TestCase):
     def test_hist2d_numba_seq(self):
         hist2d = hist2d_numba_seq(self.x, self.y, np.array([2, 2]), np.array([[0, 10], [0, 10]]))
         assert np.array_equal(hist2d, np.array([[5., 0.], [0., 5.]]))
+
+    def test_format_fixed_point(self):
+        data = np.array([[538922.1234, 5292355.5678, 12.3456], [-1.25, np.nan, 0.0]])
+        assert format_fixed_point(data, 3, ' ') == b'538922.123 5292355.568 12.346\n-1.250 nan 0.000\n'
+        assert format_fixed_point(data[:, :1], 1, ',') == b'538922.1\n-1.2\n'
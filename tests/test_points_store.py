@@ -0,0 +1,86 @@
+import unittest
+import numpy as np
+
+from HSTB.kluster.points_store import PointStore, return_decimation_cells, return_decimated_index, \
+    expand_decimated_selection, return_sorted_names
+
+
+def _add_container(store: PointStore, newid: str, count: int, starttime: float, linenames: tuple = ('line_b', 'line_a')):
+    head = np.zeros(count, dtype=np.int8)
+    head[count // 2:] = 1
+    x = np.arange(count, dtype=np.float64)
+    linename = np.array([linenames[0]] * (count // 2) + [linenames[1]] * (count - count // 2), dtype=object)
+    store.add(head, x, x + 1, x.astype(np.float32), np.ones(count, dtype=np.float32), np.zeros(count, dtype=np.int32),
+              starttime + np.arange(count, dtype=np.float64), np.arange(count, dtype=np.int32), newid, linename)
+
+
+class TestPointStore(unittest.TestCase):
+
+    def test_add_remove(self):
+        store = PointStore(initial_size=4)
+        _add_container(store, 'em2040_a', 6, 1000.0)
+        _add_container(store, 'em2040_b', 4, 2000.0)
+        assert store.size == 10
+        assert store.capacity >= 10
+        assert store.id_names == ['em2040_a_0', 'em2040_a_1', 'em2040_b_0', 'em2040_b_1']
+        assert store.idrange == {'em2040_a_0': [0, 3], 'em2040_a_1': [3, 6], 'em2040_b_0': [6, 8], 'em2040_b_1': [8, 10]}
+        assert store.idlookup['em2040_b_1'] == 'em2040_b'
+        assert list(store.return_id([0, 9])) == ['em2040_a_0', 'em2040_b_1']
+        assert list(store.return_linename([0, 5])) == ['line_b', 'line_a']
+        assert store.id_mask('em2040_b_0').sum() == 2
+        assert store.linename_mask(['line_a']).sum() == 5
+
+        # the columns are views, in place edits are kept
+        store.rejected[[1, 2]] = 2
+        assert store.rejected[:3].tolist() == [0, 2, 2]
+
+        store.remove('em2040_a_1')
+        assert store.size == 7
+        assert store.pointtime.tolist() == [1000.0, 1001.0, 1002.0, 2000.0, 2001.0, 2002.0, 2003.0]
+        assert store.idrange == {'em2040_a_0': [0, 3], 'em2040_b_0': [3, 5], 'em2040_b_1': [5, 7]}
+        assert 'em2040_a_1' not in store.idlookup
+
+        store.clear()
+        assert store.size == 0
+        assert store.id_names == []
+
+    def test_return_lines_and_times(self):
+        store = PointStore()
+        _add_container(store, 'em2040_a', 6, 1000.0)
+        systems, linenames, time_segments = store.return_lines_and_times()
+        assert linenames == ['line_a', 'line_b']
+        assert systems == ['em2040_a_1', 'em2040_a_0']
+        assert time_segments == [[1003.0, 1005.0], [1000.0, 1002.0]]
+        assert PointStore().return_lines_and_times() == ([], [], [])
+
+    def test_return_sorted_names(self):
+        names, rank = return_sorted_names(['c', 'a', 'b'], np.array([0, 1, 1, 0]))
+        assert names == ['a', 'c']
+        assert rank.tolist() == [1, 0, -1]
+
+    def test_decimation(self):
+        grid = np.stack(np.meshgrid(np.arange(200.0), np.arange(200.0)), axis=-1).reshape(-1, 2)
+        pts = np.repeat(grid, 3, axis=0) + np.random.RandomState(0).rand(grid.shape[0] * 3, 2) * 0.01  # 3 points per spot
+        assert return_decimation_cells(pts, 200000) is None  # under the limit, nothing is decimated
+        allpoints = np.arange(pts.shape[0])
+        assert np.array_equal(return_decimated_index(None, allpoints), allpoints)
+
+        cells = return_decimation_cells(pts, 40000)
+        assert cells.size == pts.shape[0]
+        assert 20000 <= cells.max() + 1 <= 40000
+        drawn = return_decimated_index(cells, allpoints)
+        assert drawn.size == cells.max() + 1
+        assert np.unique(cells[drawn]).size == drawn.size  # one point for each cell
+
+        # selecting a drawn point selects all the points in the cell
+        selected = expand_decimated_selection(drawn[:1], cells, allpoints)
+        assert drawn[0] in selected
+        assert np.all(cells[selected] == cells[drawn[0]])
+        assert np.array_equal(np.sort(selected), np.where(cells == cells[drawn[0]])[0])
+
+        # hidden points are not drawn or selected
+        visible = allpoints[1::2]
+        drawn = return_decimated_index(cells, visible)
+        assert np.isin(drawn, visible).all()
+        selected = expand_decimated_selection(drawn[:1], cells, visible)
+        assert np.isin(selected, visible).all()
@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from osgeo import gdal
+from types import SimpleNamespace
+
+from HSTB.kluster.surface_cache import SurfaceRenderCache, return_tile_bounds, return_changed_tile_bounds
+from HSTB.kluster.gdal_helpers import gdal_raster_alias
+
+
+def _build_chunks(cache: SurfaceRenderCache, layer: str = 'depth', resolution: float = 1.0):
+    chunk_files, geo_transforms, shapes = [], [], []
+    for xorigin in [0.0, 600.0]:
+        data = [np.full((600, 500), xorigin, dtype=np.float32)]  # for_gdal data is transposed, 500 rows, 600 columns
+        geo_transform = [xorigin, resolution, 0, 500.0, 0, -resolution]
+        chunk_file = cache.return_chunk(resolution, layer, geo_transform, (500, 600))
+        if chunk_file is None:
+            chunk_file = cache.add_chunk(resolution, layer, data, geo_transform, 26917)
+        chunk_files.append(chunk_file)
+        geo_transforms.append(geo_transform)
+        shapes.append((500, 600))
+    cache.set_chunks(resolution, layer, chunk_files, geo_transforms, shapes)
+    return chunk_files
+
+
+class TestSurfaceCache(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.folder = tempfile.mkdtemp()
+        self.surface_folder = os.path.join(self.folder, 'srgrid_mean_auto')
+        os.mkdir(self.surface_folder)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.folder)
+
+    def test_render_cache(self):
+        cache = SurfaceRenderCache(self.surface_folder)
+        assert cache.cache_folder == self.surface_folder + '_render_cache'
+        assert not cache.validate({'epsg': 26917})
+        assert cache.return_chunks(1.0, 'depth') is None
+        chunk_files = _build_chunks(cache)
+        cache.save()
+
+        ds = gdal.Open(chunk_files[0])
+        assert ds.GetRasterBand(1).GetOverviewCount() == 1  # 600 columns, one overview above the 256 block size
+        assert ds.GetRasterBand(1).GetDescription() == 'depth'
+        ds = None
+        gdal_raster_alias('/vsimem/test_surface_cache_hillshade_1.tif', chunk_files[0], ('hillshade_1',))
+        ds = gdal.Open('/vsimem/test_surface_cache_hillshade_1.tif')
+        assert ds.GetRasterBand(1).GetDescription() == 'hillshade_1'
+        assert ds.GetRasterBand(1).ReadAsArray().shape == (500, 600)
+        ds = None
+        gdal.Unlink('/vsimem/test_surface_cache_hillshade_1.tif')
+
+        # reloaded from the index
+        cache = SurfaceRenderCache(self.surface_folder)
+        assert cache.validate({'epsg': 26917})
+        assert cache.return_chunks(1.0, 'depth') == chunk_files
+        assert cache.return_chunks(2.0, 'depth') is None
+
+        # only the chunk in the changed area is written again
+        assert cache.invalidate([[700.0, 100.0, 710.0, 110.0]]) == 1
+        assert cache.return_chunks(1.0, 'depth') is None
+        new_chunk_files = _build_chunks(cache)
+        assert new_chunk_files[0] == chunk_files[0]
+        assert new_chunk_files[1] != chunk_files[1]
+        cache.save()
+        assert not os.path.exists(chunk_files[1])
+        assert cache.return_chunks(1.0, 'depth') == new_chunk_files
+
+        # nothing changed
+        assert cache.invalidate([]) == 0
+        assert cache.return_chunks(1.0, 'depth') == new_chunk_files
+
+        # new key drops all chunks
+        assert not cache.validate({'epsg': 26918})
+        assert cache.return_chunks(1.0, 'depth') is None
+        cache.save()
+        assert not any([os.path.exists(cfile) for cfile in new_chunk_files])
+
+    def test_changed_tile_bounds(self):
+        tile_a = SimpleNamespace(min_x=0.0, min_y=0.0, max_x=10.0, max_y=10.0, point_count_changed=False)
+        tile_b = SimpleNamespace(min_x=10.0, min_y=0.0, max_x=20.0, max_y=10.0, point_count_changed=False)
+        old_bounds = return_tile_bounds(SimpleNamespace(tiles=np.array([[tile_a, tile_b]], dtype=object)))
+        assert old_bounds == {(0.0, 0.0, 10.0, 10.0): False, (10.0, 0.0, 20.0, 10.0): False}
+
+        # tile b emptied and removed, new tile c added
+        tile_c = SimpleNamespace(min_x=0.0, min_y=10.0, max_x=10.0, max_y=20.0, point_count_changed=True)
+        new_bounds = return_tile_bounds(SimpleNamespace(tiles=np.array([[tile_a, None], [tile_c, None]], dtype=object)))
+        assert return_changed_tile_bounds(old_bounds, new_bounds) == [[0.0, 10.0, 10.0, 20.0], [10.0, 0.0, 20.0, 10.0]]
+        assert return_tile_bounds(SimpleNamespace()) is None
+        assert return_changed_tile_bounds(None, new_bounds) is None
@@ -1,12 +1,17 @@
 import unittest
 import os
+import shutil
+import struct
+import tempfile
+from unittest import mock
 import numpy as np
 import xarray as xr
 
 from HSTB.kluster.xarray_conversion import return_xyzrph_from_mbes, _xarr_is_bit_set, _build_serial_mask, \
     _return_xarray_mintime, _return_xarray_timelength, _divide_xarray_indicate_empty_future, \
-    _return_xarray_constant_blocks, _merge_constant_blocks, _assess_need_for_split_correction, _correct_for_splits, \
-    _closest_prior_key_value, _closest_key_value, simplify_soundvelocity_profile, batch_read_configure_options
+    _return_xarray_constant_blocks, _return_xarray_flush_blocks, _merge_constant_blocks, _assess_need_for_split_correction, _correct_for_splits, \
+    _closest_prior_key_value, _closest_key_value, simplify_soundvelocity_profile, batch_read_configure_options, \
+    BatchRead
 from HSTB.kluster import kluster_variables
 
 
@@ -122,6 +127,22 @@ class TestXArrayConversion(unittest.TestCase):
         expected_data = [x1*4, x2 * 4, x3 *4]
         assert all([(c == chk).all() for c, chk in zip(chunkdata, expected_data)])
 
+    def test_return_xarray_flush_blocks(self):
+        x1 = self.tsttwo.isel(time=slice(0, 33))
+        x2 = self.tsttwo.isel(time=slice(33, 66))
+        x3 = self.tsttwo.isel(time=slice(66, 100))
+        flush, remainder = _return_xarray_flush_blocks([33, 33, 34], [x1, x2, x3], 30)
+        assert flush == [[0, 33, x1], [0, 33, x2], [0, 24, x3]]
+        assert remainder == [[24, 34, x3]]
+
+        # always retain at least one record for the split correction with the next window
+        flush, remainder = _return_xarray_flush_blocks([33, 33, 34], [x1, x2, x3], 10)
+        assert flush == [[0, 33, x1], [0, 33, x2], [0, 24, x3]]
+        assert remainder == [[24, 34, x3]]
+        flush, remainder = _return_xarray_flush_blocks([33, 33, 34], [x1, x2, x3], 200)
+        assert flush == []
+        assert remainder == [[0, 33, x1], [0, 33, x2], [0, 34, x3]]
+
     def test_merge_constant_blocks(self):
         newblocks = [[0, 3, self.tsttwo], [10, 13, self.tsttwo], [20, 23, self.tsttwo]]
         merged = _merge_constant_blocks(newblocks)
@@ -160,3 +181,67 @@ class TestXArrayConversion(unittest.TestCase):
                          'combine_attributes': False, 'output_arrs': [], 'time_arrs': [], 'beam_shapes': [], 'final_pths': None,
                          'final_attrs': None}}
 
+
+
+def _split_all_file(src: str, first_half: str, second_half: str):
+    """
+    Split a .all file in two at the datagram boundary nearest the middle of the file.  The first installation
+    parameters datagram is copied to the start of the second file, so that both files can be converted on their own.
+    """
+
+    datagrams = []
+    with open(src, 'rb') as srcfile:
+        data = srcfile.read()
+    offset = 0
+    while offset + 4 <= len(data):
+        dgram_length = struct.unpack('<I', data[offset:offset + 4])[0]
+        datagrams.append(data[offset:offset + 4 + dgram_length])
+        offset += 4 + dgram_length
+    install = [dg for dg in datagrams if dg[5] == 73][0]  # 73 = 'I', installation parameters datagram
+    split_index = len(datagrams) // 2
+    with open(first_half, 'wb') as ofile:
+        ofile.write(b''.join(datagrams[:split_index]))
+    with open(second_half, 'wb') as ofile:
+        ofile.write(install + b''.join(datagrams[split_index:]))
+
+
+class TestStreamingConversion(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.testfile = os.path.join(os.path.dirname(__file__), 'resources', '0009_20170523_181119_FA2806.all')
+        cls.clsFolder = os.path.join(tempfile.tempdir, 'TestStreamingConversion')
+        try:
+            os.mkdir(cls.clsFolder)
+        except FileExistsError:
+            shutil.rmtree(cls.clsFolder)
+            os.mkdir(cls.clsFolder)
+        cls.datafolder = os.path.join(cls.clsFolder, 'split')
+        os.mkdir(cls.datafolder)
+        _split_all_file(cls.testfile, os.path.join(cls.datafolder, '0009_20170523_181119_FA2806_a.all'),
+                        os.path.join(cls.datafolder, '0009_20170523_181119_FA2806_b.all'))
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        shutil.rmtree(cls.clsFolder)
+
+    def test_streaming_matches_batch_read(self):
+        # one file per window, the test file is less than a ping chunk, so the first window has nothing to flush
+        batch = BatchRead(self.datafolder, dest=os.path.join(self.clsFolder, 'batch'), skip_dask=True, show_progress=False)
+        batch.read()
+        with mock.patch.object(kluster_variables, 'converted_files_at_once', 1):
+            stream = BatchRead(self.datafolder, dest=os.path.join(self.clsFolder, 'stream'), skip_dask=True,
+                               show_progress=False, streaming=True)
+            stream.read()
+
+        assert len(batch.raw_ping) == len(stream.raw_ping)
+        for bping, sping in zip(batch.raw_ping, stream.raw_ping):
+            assert bping.system_identifier == sping.system_identifier
+            assert bping.time.size == sping.time.size
+            assert np.array_equal(bping.time.values, sping.time.values)
+            battrs = {k: v for k, v in bping.attrs.items() if k[0:7] in ['profile', 'install', 'runtime']}
+            sattrs = {k: v for k, v in sping.attrs.items() if k[0:7] in ['profile', 'install', 'runtime']}
+            assert battrs
+            assert battrs == sattrs
+            assert bping.attrs['multibeam_files'] == sping.attrs['multibeam_files']
+        assert batch.raw_att.time.size == stream.raw_att.time.size